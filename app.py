@@ -1,16 +1,27 @@
 import os
 from flask import Flask, request, redirect, session, url_for
 from dotenv import load_dotenv
-from services.task_service import TaskService
-from services.calendar_service import CalendarService
-from services.openai_service import OpenAIService
-from services.notification_service import NotificationService
-from services.multi_tenant_service import MultiTenantService
-from models.database import init_db, Task
-from linebot.v3.messaging import (
-    MessagingApi,
-    Configuration,
-    ApiClient,
+from services.container import container
+from models.database import init_db, Task, unit_of_work
+from werkzeug.middleware.proxy_fix import ProxyFix
+import re as regex
+from datetime import datetime, timedelta
+import pytz
+import json
+import hmac
+import hashlib
+import base64
+from utils.logger import get_logger, lazy
+from utils.metrics import (
+    WEBHOOK_DURATION,
+    render_metrics,
+    track,
+)
+from utils.lazy_import import lazy_import
+from utils.query_profiler import profile_queries
+
+# LINE SDK・Google OAuthは読み込みが重いため最初に使う時に読み込む（ワーカー起動の短縮）
+(
     ReplyMessageRequest,
     PushMessageRequest,
     TextMessage,
@@ -20,19 +31,21 @@ from linebot.v3.messaging import (
     TemplateMessage,
     QuickReply,
     QuickReplyItem,
+) = lazy_import(
+    "linebot.v3.messaging",
+    "ReplyMessageRequest",
+    "PushMessageRequest",
+    "TextMessage",
+    "FlexMessage",
+    "ImageMessage",
+    "FlexContainer",
+    "TemplateMessage",
+    "QuickReply",
+    "QuickReplyItem",
 )
-from linebot.v3.webhook import WebhookHandler
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from werkzeug.middleware.proxy_fix import ProxyFix
-import re as regex
-from datetime import datetime, timedelta
-import pytz
-import json
-import hmac
-import hashlib
-import base64
+Flow = lazy_import("google_auth_oauthlib.flow", "Flow")
+
+logger = get_logger(__name__)
 
 # ハンドラーのインポート
 from handlers.test_handler import (
@@ -104,16 +117,9 @@ def validate_line_signature(body: bytes, signature: str, channel_secret: str) ->
 db = init_db()
 print(f"[app.py] データベース初期化完了: {datetime.now()}")
 
-# PostgreSQLテーブル作成の確認
+# テーブルはinit_db()内のマイグレーションで作成済み
 if hasattr(db, 'Session') and db.Session:
     print("[app.py] PostgreSQLデータベースを使用中")
-    try:
-        # テーブル作成を確実にする
-        if hasattr(db, '_ensure_tables_exist'):
-            db._ensure_tables_exist()
-        print("[app.py] PostgreSQLテーブル作成確認完了")
-    except Exception as e:
-        print(f"[app.py] PostgreSQLテーブル作成確認エラー: {e}")
 else:
     print("[app.py] SQLiteデータベースを使用中")
 
@@ -154,6 +160,9 @@ def health_check():
             # 簡単なクエリを実行してDB接続を確認
             test_result = db.get_all_users()
             health_status["checks"]["database"] = {"connected": True, "user_count": len(test_result) if test_result else 0}
+            # 通知アウトボックスの未送信件数
+            if hasattr(db, 'get_outbox_counts'):
+                health_status["checks"]["notification_outbox"] = db.get_outbox_counts()
         except Exception as e:
             health_status["status"] = "unhealthy"
             health_status["checks"]["database"] = {"connected": False, "error": str(e)}
@@ -175,20 +184,20 @@ elif hasattr(db, 'engine'):
 else:
     print(f"[app.py] データベースインスタンス確認: {type(db).__name__}")
 
-task_service = TaskService(db)
-calendar_service = CalendarService()
-openai_service = OpenAIService(db=db, enable_cache=True, cache_ttl_hours=24)
-notification_service = NotificationService()
-multi_tenant_service = MultiTenantService()
-
-# --- 修正 ---
-# line_bot_api = MessagingApi(channel_access_token=os.getenv('LINE_CHANNEL_ACCESS_TOKEN'))
-configuration = Configuration(access_token=os.environ["LINE_CHANNEL_ACCESS_TOKEN"])
-api_client = ApiClient(configuration)
-line_bot_api = MessagingApi(api_client)
+# サービス・クライアントはコンテナがプロセスごとに1つだけ作成する（最初に使う時に作成）
+# プロキシで参照するため、フォーク後にコンテナが作り直した実体もそのまま使える
+task_service = container.proxy("task_service")
+calendar_service = container.proxy("calendar_service")
+openai_service = container.proxy("openai_service")
+notification_service = container.proxy("notification_service")
+multi_tenant_service = container.proxy("multi_tenant_service")
+line_bot_api = container.proxy("line_bot_api")
 
 # スケジューラーを確実に開始（重複開始を防ぐ）
-if not notification_service.is_running:
+# gunicorn --preload ではマスターでスレッドを開始せず、フォーク後に各ワーカーで開始する（gunicorn.conf.py）
+if container.defer_scheduler:
+    print(f"[app.py] スケジューラーはワーカーのフォーク後に開始します: {datetime.now()}")
+elif not notification_service.is_running:
     try:
         notification_service.start_scheduler()
         print(f"[app.py] スケジューラー開始完了: {datetime.now()}")
@@ -627,8 +636,57 @@ def oauth2callback():
         return f"認証エラー: {e}<br><pre>{traceback.format_exc()}</pre>", 500
 
 
+# Webhook処理時間のラベルに使うコマンド（自由入力はラベルにせず "text" にまとめる）
+WEBHOOK_COMMAND_LABELS = frozenset([
+    "タスク追加",
+    "緊急タスク追加",
+    "未来タスク追加",
+    "タスク削除",
+    "タスク一覧",
+    "未来タスク一覧",
+    "キャンセル",
+    "認証確認",
+    "DB確認",
+    "8時テスト",
+    "８時テスト",
+    "21時テスト",
+    "日曜18時テスト",
+    "はい",
+    "修正する",
+    "承認する",
+])
+
+
+def _webhook_command_label(body_bytes: bytes) -> str:
+    """Webhookの最初のイベントからメトリクス用のコマンド名を判定"""
+    try:
+        events = json.loads(body_bytes or b"{}").get("events", [])
+    except (ValueError, AttributeError):
+        return "invalid"
+    if not events:
+        return "none"
+    event = events[0]
+    if event.get("type") != "message":
+        return f"event:{event.get('type', 'unknown')}"
+    text = (event.get("message") or {}).get("text", "").strip()
+    return text if text in WEBHOOK_COMMAND_LABELS else "text"
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus形式のメトリクスを出力"""
+    body, content_type = render_metrics()
+    return body, 200, {"Content-Type": content_type}
+
+
 @app.route("/callback", methods=["POST"])
 def callback():
+    command = _webhook_command_label(request.get_data())
+    with track(WEBHOOK_DURATION, command=command), profile_queries(f"webhook:{command}"), unit_of_work():
+        return _handle_callback()
+
+
+def _handle_callback():
     # グローバル変数を明示的に宣言
     global calendar_service, openai_service, task_service, multi_tenant_service
     
@@ -639,7 +697,7 @@ def callback():
         try:
             data = json.loads(body_text) if body_text else {}
         except json.JSONDecodeError:
-            print("[callback] 受信データのJSONデコードに失敗しました")
+            logger.warning("[callback] 受信データのJSONデコードに失敗しました")
             data = {}
 
         destination = data.get("destination", "")
@@ -649,28 +707,28 @@ def callback():
         )
 
         if not channel_secret:
-            print(f"[callback] チャネルシークレットが設定されていません: {destination}")
+            logger.warning("[callback] チャネルシークレットが設定されていません: %s", destination)
             return "Internal Server Error", 500
 
         if not validate_line_signature(body_bytes, signature, channel_secret):
-            print("[callback] 署名検証に失敗しました")
+            logger.warning("[callback] 署名検証に失敗しました")
             return "Invalid signature", 403
 
-        print("受信:", data)
+        logger.debug("受信: %s", data)
         if data:
             events = data.get("events", [])
             # マルチテナント対応: チャネルID別のLINE APIクライアントを取得
             base_line_bot_api = multi_tenant_service.get_messaging_api(destination)
             active_line_bot_api = base_line_bot_api or default_line_bot_api
             if not active_line_bot_api:
-                print(f"[callback] チャネル設定が見つかりません: {destination}")
+                logger.warning("[callback] チャネル設定が見つかりません: %s", destination)
                 return "OK", 200
             
             for event in events:
                 if event.get("type") == "message" and "replyToken" in event:
                     reply_token = event["replyToken"]
                     user_message = event["message"]["text"]
-                    print(f"[DEBUG] 受信user_message長: {len(user_message)}", flush=True)
+                    logger.debug("受信user_message長: %s", len(user_message))
                     user_id = event["source"].get("userId", "")
 
                     # 入力バリデーション（セキュリティ対策）
@@ -695,7 +753,7 @@ def callback():
                     # ユーザーのチャネルIDを保存（マルチテナント対応）
                     if destination:
                         db.save_user_channel(user_id, destination)
-                        print(f"[callback] ユーザー {user_id} のチャネルID {destination} を保存")
+                        logger.debug("[callback] ユーザー %s のチャネルID %s を保存", user_id, destination)
 
                     # ここで認証未済なら認証案内のみ返す
                     if not is_google_authenticated(user_id):
@@ -712,18 +770,15 @@ def callback():
 
                     # 緊急タスク追加モードフラグを最優先で判定
                     if check_flag_file(user_id, "urgent_task"):
-                        print(f"[DEBUG] 緊急タスク追加モードフラグ検出: user_id={user_id}")
+                        logger.debug("緊急タスク追加モードフラグ検出: user_id=%s", user_id)
                         try:
                             task_info = task_service.parse_task_message(user_message)
                             task = task_service.create_task(user_id, task_info)
                             # 緊急タスクとして今日のスケジュールに追加
                             if is_google_authenticated(user_id):
                                 try:
-                                    from services.calendar_service import CalendarService
                                     import pytz
                                     
-                                    calendar_service = CalendarService()
-                                    
                                     # 今日の日付を取得（JST）
                                     jst = pytz.timezone('Asia/Tokyo')
                                     today = datetime.now(jst).replace(hour=0, minute=0, second=0, microsecond=0)
@@ -732,10 +787,10 @@ def callback():
                                     optimal_time = calendar_service.suggest_optimal_time(user_id, task.duration_minutes, "urgent")
                                     
                                     if optimal_time:
-                                        print(f"[DEBUG] 最適時刻を取得: {optimal_time.strftime('%H:%M')}")
+                                        logger.debug("最適時刻を取得: %s", optimal_time.strftime('%H:%M'))
                                         # 念のため重複チェック（空き時間から取得しているので通常は重複しない）
                                         if calendar_service.check_time_conflict(user_id, optimal_time, task.duration_minutes):
-                                            print(f"[DEBUG] 最適時刻で重複検出: {optimal_time.strftime('%H:%M')}")
+                                            logger.debug("最適時刻で重複検出: %s", optimal_time.strftime('%H:%M'))
                                             # 空き時間から別の時刻を探す
                                             free_times = calendar_service.get_free_busy_times(user_id, today)
                                             alternative_times = []
@@ -748,10 +803,10 @@ def callback():
                                             
                                             if alternative_times:
                                                 optimal_time = min(alternative_times, key=lambda x: x)
-                                                print(f"[DEBUG] 代替時刻を選択: {optimal_time.strftime('%H:%M')}")
+                                                logger.debug("代替時刻を選択: %s", optimal_time.strftime('%H:%M'))
                                             else:
                                                 optimal_time = None
-                                                print("[DEBUG] 代替時刻が見つかりません")
+                                                logger.debug("代替時刻が見つかりません")
                                     
                                     if optimal_time:
                                         # 最適な時刻にタスクを配置
@@ -788,7 +843,7 @@ def callback():
                                         else:
                                             reply_text = f"✅ 緊急タスクを追加しましたが、カレンダーへの配置に失敗しました。\n\n📋 タスク: {task.name}\n⏰ 所要時間: {task.duration_minutes}分"
                                 except Exception as e:
-                                    print(f"[DEBUG] カレンダー追加エラー: {e}")
+                                    logger.error("カレンダー追加エラー: %s", e)
                                     reply_text = f"✅ 緊急タスクを追加しましたが、カレンダーへの配置に失敗しました。\n\n📋 タスク: {task.name}\n⏰ 所要時間: {task.duration_minutes}分"
                             else:
                                 reply_text = f"✅ 緊急タスクを追加しました！\n\n📋 タスク: {task.name}\n⏰ 所要時間: {task.duration_minutes}分"
@@ -799,7 +854,7 @@ def callback():
                             send_reply_with_menu(active_line_bot_api, reply_token, get_simple_flex_menu, text=reply_text)
                             continue
                         except Exception as e:
-                            print(f"[DEBUG] 緊急タスク追加エラー: {e}")
+                            logger.error("緊急タスク追加エラー: %s", e)
                             reply_text = f"⚠️ 緊急タスク追加中にエラーが発生しました: {e}"
                             active_line_bot_api.reply_message(
                                 ReplyMessageRequest(
@@ -811,7 +866,7 @@ def callback():
 
                     # 未来タスク追加モードフラグを判定
                     if check_flag_file(user_id, "future_task"):
-                        print(f"[DEBUG] 未来タスク追加モードフラグ検出: user_id={user_id}")
+                        logger.debug("未来タスク追加モードフラグ検出: user_id=%s", user_id)
                         
                         # キャンセル処理を先に確認
                         cancel_words = ["キャンセル", "やめる", "中止", "戻る"]
@@ -835,10 +890,10 @@ def callback():
                             task_info = task_service.parse_task_message(first_line)
                             # パースが成功し、タスク名と所要時間の両方が存在する場合
                             if task_info.get("name") and task_info.get("duration_minutes"):
-                                print(f"[DEBUG] パース成功: {task_info}")
+                                logger.debug("パース成功: %s", task_info)
                                 parse_success = True
                         except Exception as parse_error:
-                            print(f"[DEBUG] パース失敗: {parse_error}")
+                            logger.debug("パース失敗: %s", parse_error)
                             parse_error_msg = str(parse_error)
                             parse_success = False
                         
@@ -878,7 +933,7 @@ def callback():
                                 send_reply_with_menu(active_line_bot_api, reply_token, get_simple_flex_menu, text=reply_text)
                                 continue
                             except Exception as e:
-                                print(f"[DEBUG] 未来タスク追加エラー: {e}")
+                                logger.error("未来タスク追加エラー: %s", e)
                                 # エラー時はモードを終了してメニューを表示
                                 delete_flag_file(user_id, "future_task")
                                 reply_text = f"⚠️ 未来タスク追加中にエラーが発生しました: {e}"
@@ -893,7 +948,7 @@ def callback():
                             intent = intent_result.get("intent", "other")
                             confidence = intent_result.get("confidence", 0.0)
                             
-                            print(f"[DEBUG] 意図分類結果: {intent} (信頼度: {confidence})")
+                            logger.debug("意図分類結果: %s (信頼度: %s)", intent, confidence)
                             
                             # ヘルプ要求の処理
                             if intent == "help" and confidence > 0.7:
@@ -941,7 +996,7 @@ def callback():
 
                     # タスク追加モードフラグを判定
                     if check_flag_file(user_id, "add_task"):
-                        print(f"[DEBUG] タスク追加モードフラグ検出: user_id={user_id}")
+                        logger.debug("タスク追加モードフラグ検出: user_id=%s", user_id)
                         
                         # キャンセル処理を先に確認
                         cancel_words = ["キャンセル", "やめる", "中止", "戻る"]
@@ -964,14 +1019,14 @@ def callback():
                             task_info = task_service.parse_task_message(first_line)
                             # パースが成功し、タスク名・所要時間・期限の全てが存在する場合
                             if task_info.get("name") and task_info.get("duration_minutes") and task_info.get("due_date"):
-                                print(f"[DEBUG] パース成功: {task_info}")
+                                logger.debug("パース成功: %s", task_info)
                                 parse_success = True
                             elif task_info.get("name") and task_info.get("duration_minutes"):
                                 # タスク名と所要時間はあるが期限がない場合は不完全
-                                print(f"[DEBUG] パース成功だが期限なし: {task_info}")
+                                logger.debug("パース成功だが期限なし: %s", task_info)
                                 parse_success = False
                         except Exception as parse_error:
-                            print(f"[DEBUG] パース失敗: {parse_error}")
+                            logger.debug("パース失敗: %s", parse_error)
                             parse_success = False
                         
                         # パースが成功した場合
@@ -979,7 +1034,7 @@ def callback():
                             try:
                                 # 改行がある場合は複数タスクとして処理
                                 if '\n' in user_message:
-                                    print(f"[DEBUG] 複数タスク検出: {user_message}")
+                                    logger.debug("複数タスク検出: %s", user_message)
                                     tasks_info = task_service.parse_multiple_tasks(user_message)
                                     created_tasks = []
                                     for task_info in tasks_info:
@@ -1015,7 +1070,7 @@ def callback():
                                 )
                                 continue
                             except Exception as e:
-                                print(f"[DEBUG] タスク追加エラー: {e}")
+                                logger.error("タスク追加エラー: %s", e)
                                 # エラー時はモードを終了してメニューを表示
                                 delete_flag_file(user_id, "add_task")
                                 reply_text = f"⚠️ タスク追加中にエラーが発生しました: {e}"
@@ -1030,7 +1085,7 @@ def callback():
                             intent = intent_result.get("intent", "other")
                             confidence = intent_result.get("confidence", 0.0)
                             
-                            print(f"[DEBUG] 意図分類結果: {intent} (信頼度: {confidence})")
+                            logger.debug("意図分類結果: %s (信頼度: %s)", intent, confidence)
                             
                             # ヘルプ要求の処理
                             if intent == "help" and confidence > 0.7:
@@ -1087,16 +1142,16 @@ def callback():
                     try:
                         # 削除モード判定を追加
                         if check_flag_file(user_id, "delete"):
-                            print(f"[DEBUG] 削除モード判定: user_id={user_id} 存在")
+                            logger.debug("削除モード判定: user_id=%s 存在", user_id)
                             
                             # 削除モードでキャンセル処理
                             cancel_words = ["キャンセル", "やめる", "中止", "戻る"]
                             normalized_message = user_message.strip().replace('　','').replace('\n','').lower()
-                            print(f"[DEBUG] 削除モードキャンセル判定: normalized_message='{normalized_message}'")
+                            logger.debug("削除モードキャンセル判定: normalized_message='%s'", normalized_message)
                             if normalized_message in [w.lower() for w in cancel_words]:
                                 # 削除モードファイルを削除してモードをリセット
                                 delete_flag_file(user_id, "delete")
-                                print(f"[DEBUG] 削除モードリセット: user_id={user_id} 削除")
+                                logger.debug("削除モードリセット: user_id=%s 削除", user_id)
                                 
                                 reply_text = "❌ タスク削除をキャンセルしました。\n\n何かお手伝いできることがあれば、お気軽にお声かけください！"
 
@@ -1108,17 +1163,15 @@ def callback():
                             # 例：「タスク 1、3」「未来タスク 2」「タスク 1、未来タスク 2」
                             import re
                             # AIで番号抽出
-                            from services.openai_service import OpenAIService
-                            local_openai_service = OpenAIService(db=db, enable_cache=True, cache_ttl_hours=24)
-                            print(f"[DEBUG] AI抽出開始: 入力メッセージ='{user_message}'")
-                            ai_result = local_openai_service.extract_task_numbers_from_message(user_message)
-                            print(f"[DEBUG] AI抽出結果: {ai_result}")
+                            logger.debug("AI抽出開始: 入力メッセージ='%s'", user_message)
+                            ai_result = openai_service.extract_task_numbers_from_message(user_message)
+                            logger.debug("AI抽出結果: %s", ai_result)
                             if ai_result and (ai_result.get("tasks") or ai_result.get("future_tasks")):
                                 task_numbers = [str(n) for n in ai_result.get("tasks", [])]
                                 future_task_numbers = [str(n) for n in ai_result.get("future_tasks", [])]
-                                print(f"[DEBUG] AI抽出成功: 通常タスク番号: {task_numbers}, 未来タスク番号: {future_task_numbers}")
+                                logger.debug("AI抽出成功: 通常タスク番号: %s, 未来タスク番号: %s", task_numbers, future_task_numbers)
                             else:
-                                print(f"[DEBUG] AI抽出失敗、フォールバック処理に移行")
+                                logger.debug("AI抽出失敗、フォールバック処理に移行")
                                 # 全角数字→半角数字へ変換
                                 def z2h(s):
                                     return s.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
@@ -1129,10 +1182,10 @@ def callback():
                                 task_match = re.search(r"タスク\s*([\d\.\,\、]+)", normalized_message)
                                 if task_match:
                                     task_numbers = re.findall(r'\d+', task_match.group(1))
-                                    print(f"[DEBUG] フォールバック抽出: タスク部分='{task_match.group(1)}', 抽出番号={task_numbers}")
+                                    logger.debug("フォールバック抽出: タスク部分='%s', 抽出番号=%s", task_match.group(1), task_numbers)
                                 else:
                                     task_numbers = re.findall(r"タスク\s*(\d+)", normalized_message)
-                                    print(f"[DEBUG] フォールバック抽出: 通常パターン, 抽出番号={task_numbers}")
+                                    logger.debug("フォールバック抽出: 通常パターン, 抽出番号=%s", task_numbers)
                                 
                                 # 未来タスクも同様に処理
                                 future_match = re.search(r"未来タスク\s*([\d\.\,\、]+)", normalized_message)
@@ -1141,30 +1194,30 @@ def callback():
                                 else:
                                     future_task_numbers = re.findall(r"未来タスク\s*(\d+)", normalized_message)
                                 
-                                print(f"[DEBUG] fallback: 通常タスク番号: {task_numbers}, 未来タスク番号: {future_task_numbers}")
+                                logger.debug("fallback: 通常タスク番号: %s, 未来タスク番号: %s", task_numbers, future_task_numbers)
                             all_tasks = task_service.get_user_tasks(user_id)
                             future_tasks = task_service.get_user_future_tasks(user_id)
                             deleted = []
                             
-                            print(f"[DEBUG] 削除対象: 通常タスク番号={task_numbers}, 未来タスク番号={future_task_numbers}")
-                            print(f"[DEBUG] 全タスク数: 通常={len(all_tasks)}, 未来={len(future_tasks)}")
+                            logger.debug("削除対象: 通常タスク番号=%s, 未来タスク番号=%s", task_numbers, future_task_numbers)
+                            logger.debug("全タスク数: 通常=%s, 未来=%s", len(all_tasks), len(future_tasks))
                             
                             # 通常タスク削除（降順で削除してインデックスのずれを防ぐ）
                             task_numbers_sorted = sorted([int(num) for num in task_numbers], reverse=True)
-                            print(f"[DEBUG] 通常タスク削除順序: {task_numbers_sorted}")
+                            logger.debug("通常タスク削除順序: %s", task_numbers_sorted)
                             for num in task_numbers_sorted:
                                 idx = num - 1
-                                print(f"[DEBUG] タスク{num}削除試行: idx={idx}, 全タスク数={len(all_tasks)}")
+                                logger.debug("タスク%s削除試行: idx=%s, 全タスク数=%s", num, idx, len(all_tasks))
                                 if 0 <= idx < len(all_tasks):
                                     task = all_tasks[idx]
-                                    print(f"[DEBUG] 削除対象タスク: {task.name} (ID: {task.task_id})")
+                                    logger.debug("削除対象タスク: %s (ID: %s)", task.name, task.task_id)
                                     if task_service.delete_task(task.task_id):
                                         deleted.append(f"タスク {num}. {task.name}")
-                                        print(f"[DEBUG] タスク削除成功: {num}. {task.name}")
+                                        logger.debug("タスク削除成功: %s. %s", num, task.name)
                                     else:
-                                        print(f"[DEBUG] タスク削除失敗: {num}. {task.name}")
+                                        logger.debug("タスク削除失敗: %s. %s", num, task.name)
                                 else:
-                                    print(f"[DEBUG] タスク{num}削除スキップ: インデックス範囲外 (idx={idx})")
+                                    logger.debug("タスク%s削除スキップ: インデックス範囲外 (idx=%s)", num, idx)
                             
                             # 未来タスク削除（降順で削除してインデックスのずれを防ぐ）
                             future_task_numbers_sorted = sorted([int(num) for num in future_task_numbers], reverse=True)
@@ -1174,12 +1227,12 @@ def callback():
                                     task = future_tasks[idx]
                                     if task_service.delete_future_task(task.task_id):
                                         deleted.append(f"未来タスク {num}. {task.name}")
-                                        print(f"[DEBUG] 未来タスク削除成功: {num}. {task.name}")
+                                        logger.debug("未来タスク削除成功: %s. %s", num, task.name)
                                     else:
-                                        print(f"[DEBUG] 未来タスク削除失敗: {num}. {task.name}")
+                                        logger.debug("未来タスク削除失敗: %s. %s", num, task.name)
                             # 削除モードファイルを削除
                             delete_flag_file(user_id, "delete")
-                            print(f"[DEBUG] 削除モードファイル削除: user_id={user_id}")
+                            logger.debug("削除モードファイル削除: user_id=%s", user_id)
                             if deleted:
                                 reply_text = "✅ タスクを削除しました！\n" + "\n".join(deleted)
                             else:
@@ -1215,10 +1268,8 @@ def callback():
                             "承認する",
                         ]
 
-                        print(
-                            f"[DEBUG] コマンド判定: user_message='{user_message.strip()}', in commands={user_message.strip() in commands}"
-                        )
-                        print(f"[DEBUG] コマンド一覧: {commands}")
+                        logger.debug("コマンド判定: user_message='%s', in commands=%s", user_message.strip(), user_message.strip() in commands)
+                        logger.debug("コマンド一覧: %s", commands)
 
                         # 自然言語でのタスク追加処理を先に実行
                         # ただしモード中（未来/緊急/削除等）はここをスキップして各モードの処理へ委譲
@@ -1226,17 +1277,17 @@ def callback():
                         urgent_mode_guard = check_flag_file(user_id, "urgent_task")
                         delete_mode_guard = check_flag_file(user_id, "delete")
                         if user_message.strip() not in commands and not (future_mode_guard or urgent_mode_guard or delete_mode_guard):
-                            print(f"[DEBUG] 自然言語タスク追加判定: '{user_message}' はコマンドではありません")
+                            logger.debug("自然言語タスク追加判定: '%s' はコマンドではありません", user_message)
                             # 時間表現が含まれているかチェック（分、時間、半など）
                             time_patterns = ['分', '時間', '半', 'hour', 'min', 'minute']
                             has_time = any(pattern in user_message for pattern in time_patterns)
                             
                             if has_time:
-                                print(f"[DEBUG] 時間表現検出: '{user_message}' をタスク追加として処理します")
+                                logger.debug("時間表現検出: '%s' をタスク追加として処理します", user_message)
                                 try:
                                     # 改行がある場合は複数タスクとして処理
                                     if '\n' in user_message:
-                                        print(f"[DEBUG] 自然言語複数タスク検出: {user_message}")
+                                        logger.debug("自然言語複数タスク検出: %s", user_message)
                                         tasks_info = task_service.parse_multiple_tasks(user_message)
                                         created_tasks = []
                                         for task_info in tasks_info:
@@ -1271,20 +1322,18 @@ def callback():
                                     )
                                     continue
                                 except Exception as e:
-                                    print(f"[DEBUG] 自然言語タスク追加エラー: {e}")
+                                    logger.error("自然言語タスク追加エラー: %s", e)
                                     # エラーの場合は通常のFlexMessageメニューを表示
                                     pass
 
                         # タスク選択処理を先に実行（数字入力の場合）
-                        print(
-                            f"[DEBUG] タスク選択フラグ確認: user_id={user_id}, exists={check_flag_file(user_id, 'task_select')}"
-                        )
+                        logger.debug("タスク選択フラグ確認: user_id=%s, exists=%s", user_id, lazy(lambda: check_flag_file(user_id, 'task_select')))
                         
                         # タスク選択モードでキャンセル処理
                         if check_flag_file(user_id, "task_select"):
                             cancel_words = ["キャンセル", "やめる", "中止", "戻る"]
                             normalized_message = user_message.strip().replace('　','').replace('\n','').lower()
-                            print(f"[DEBUG] タスク選択キャンセル判定: normalized_message='{normalized_message}'")
+                            logger.debug("タスク選択キャンセル判定: normalized_message='%s'", normalized_message)
                             if normalized_message in [w.lower() for w in cancel_words]:
                                 handle_task_selection_cancel(active_line_bot_api, reply_token, user_id, get_simple_flex_menu)
                                 continue
@@ -1294,7 +1343,7 @@ def callback():
                             ai_result = openai_service.extract_task_numbers_from_message(user_message)
                             if ai_result and ("tasks" in ai_result or "future_tasks" in ai_result):
                                 is_number_input = True
-                                print(f"[DEBUG] AI判定結果: 数字入力として認識")
+                                logger.debug("AI判定結果: 数字入力として認識")
                             else:
                                 # AI判定に失敗した場合は従来の判定を実行
                                 is_number_input = (
@@ -1303,7 +1352,7 @@ def callback():
                                     (user_message.strip().replace(".", "").isdigit() and "." in user_message)  # 小数点付き
                                 )
                         except Exception as e:
-                            print(f"[DEBUG] AI判定エラー: {e}")
+                            logger.error("AI判定エラー: %s", e)
                             # エラーの場合は従来の判定を実行
                             is_number_input = (
                                 user_message.strip().isdigit() or  # 整数
@@ -1330,7 +1379,7 @@ def callback():
 
                         # コマンド処理を先に実行
                         if user_message.strip() in commands:
-                            print(f"[DEBUG] コマンド処理開始: '{user_message.strip()}'")
+                            logger.debug("コマンド処理開始: '%s'", user_message.strip())
 
                             # --- コマンド分岐の一元化 ---
                             if user_message.strip() == "タスク追加":
@@ -1345,14 +1394,14 @@ def callback():
                             # ここで他のコマンド分岐（elif ...）をそのまま残す
                             # 既存のelse:（未登録コマンド分岐）は削除
                         else:
-                            print(f"[DEBUG] else節（未登録コマンド分岐）到達: '{user_message}' - FlexMessageボタンメニューを返します")
-                            print("[DEBUG] Flex送信直前")
+                            logger.debug("else節（未登録コマンド分岐）到達: '%s' - FlexMessageボタンメニューを返します", user_message)
+                            logger.debug("Flex送信直前")
                             button_message_sent = send_reply_with_menu(active_line_bot_api, reply_token, get_simple_flex_menu, user_id=user_id)
                             if button_message_sent:
-                                print("[DEBUG] FlexMessage送信成功")
+                                logger.debug("FlexMessage送信成功")
                             else:
-                                print("[DEBUG] ボタンメニュー送信に失敗しました")
-                            print("[DEBUG] Flex送信後")
+                                logger.debug("ボタンメニュー送信に失敗しました")
+                            logger.debug("Flex送信後")
                             continue
 
                         # タスク削除コマンドの処理
@@ -1360,8 +1409,6 @@ def callback():
                             handle_task_delete_command(active_line_bot_api, reply_token, user_id, task_service)
                             continue
                         elif user_message.strip() == "はい":
-                            from services.calendar_service import CalendarService
-                            calendar_service = CalendarService()
                             handle_approval(
                                 active_line_bot_api,
                                 reply_token,
@@ -1385,8 +1432,6 @@ def callback():
                             handle_scheduler_check(active_line_bot_api, reply_token, user_id, notification_service)
                             continue
                         elif user_message.strip() == "承認する":
-                            from services.calendar_service import CalendarService
-                            calendar_service = CalendarService()
                             handle_approval(
                                 active_line_bot_api,
                                 reply_token,
@@ -1453,8 +1498,8 @@ def callback():
                                         },
                                     )
                                     task_service.archive_task(
-                                        t.task_id
-                                    )  # 元タスクはアーカイブ
+                                        t.task_id, rollover=True
+                                    )  # 元タスクはアーカイブ（繰り越しのため週次集計には含めない）
                                 else:
                                     task_service.archive_task(t.task_id)
                             reply_text = "指定されたタスクを明日に繰り越し、それ以外は削除しました。"
@@ -1469,9 +1514,7 @@ def callback():
                         continue
 
                         # コマンドでない場合のみタスク登録処理を実行
-                        print(
-                            f"[DEBUG] コマンド以外のメッセージ処理開始: '{user_message}'"
-                        )
+                        logger.debug("コマンド以外のメッセージ処理開始: '%s'", user_message)
 
                         # 緊急タスク追加モードでの処理
                         import os
@@ -1479,8 +1522,6 @@ def callback():
 
                         # 緊急タスク追加モードでの処理
                         if check_flag_file(user_id, "urgent_task"):
-                            from services.calendar_service import CalendarService
-                            calendar_service = CalendarService()
                             handle_urgent_task_process(
                                 active_line_bot_api,
                                 reply_token,
@@ -1511,46 +1552,29 @@ def callback():
                         if db:
                             future_selection_data = db.get_user_session(user_id, 'future_task_selection')
 
-                        print(
-                            f"[DEBUG] 未来タスク選択モード確認: future_selection_data={future_selection_data is not None}"
-                        )
+                        logger.debug("未来タスク選択モード確認: future_selection_data=%s", future_selection_data is not None)
 
                         if future_selection_data:
-                            print(
-                                f"[DEBUG] 未来タスク選択モード開始: user_message='{user_message}'"
-                            )
+                            logger.debug("未来タスク選択モード開始: user_message='%s'", user_message)
                             try:
                                 # 数字の入力かどうかチェック
                                 if user_message.strip().isdigit():
                                     task_number = int(user_message.strip())
-                                    print(f"[DEBUG] 未来タスク選択番号: {task_number}")
+                                    logger.debug("未来タスク選択番号: %s", task_number)
 
                                     # 未来タスク一覧を取得
                                     future_tasks = task_service.get_user_future_tasks(
                                         user_id
                                     )
-                                    print(
-                                        f"[DEBUG] 未来タスク一覧取得: {len(future_tasks)}件"
-                                    )
+                                    logger.debug("未来タスク一覧取得: %s件", len(future_tasks))
 
                                     if 1 <= task_number <= len(future_tasks):
                                         selected_task = future_tasks[task_number - 1]
-                                        print(
-                                            f"[DEBUG] 選択された未来タスク: {selected_task.name}"
-                                        )
+                                        logger.debug("選択された未来タスク: %s", selected_task.name)
 
                                         # 選択された未来タスクをスケジュール提案用に準備
-                                        from services.calendar_service import (
-                                            CalendarService,
-                                        )
-                                        from services.openai_service import (
-                                            OpenAIService,
-                                        )
                                         import pytz
 
-                                        calendar_service = CalendarService()
-                                        local_openai_service = OpenAIService(db=db, enable_cache=True, cache_ttl_hours=24)
-
                                         jst = pytz.timezone("Asia/Tokyo")
                                         today = datetime.now(jst)
 
@@ -1564,7 +1588,7 @@ def callback():
 
                                         if free_times:
                                             # スケジュール提案を生成（来週のスケジュールとして）
-                                            proposal = local_openai_service.generate_schedule_proposal(
+                                            proposal = openai_service.generate_schedule_proposal(
                                                 [selected_task],
                                                 free_times,
                                                 week_info="来週",
@@ -1593,7 +1617,7 @@ def callback():
                                         # 未来タスク選択モードセッションを削除
                                         if db:
                                             db.delete_user_session(user_id, 'future_task_selection')
-                                            print(f"[DEBUG] 未来タスク選択セッションを削除: user_id={user_id}")
+                                            logger.debug("未来タスク選択セッションを削除: user_id=%s", user_id)
 
                                         active_line_bot_api.reply_message(
                                             ReplyMessageRequest(
@@ -1621,7 +1645,7 @@ def callback():
                                     )
                                     continue
                             except Exception as e:
-                                print(f"[DEBUG] 未来タスク選択モード処理エラー: {e}")
+                                logger.error("未来タスク選択モード処理エラー: %s", e)
                                 import traceback
 
                                 traceback.print_exc()
@@ -1629,7 +1653,7 @@ def callback():
                                 # エラー時もセッションをクリーンアップ
                                 if db:
                                     db.delete_user_session(user_id, 'future_task_selection')
-                                    print(f"[DEBUG] エラー時に未来タスク選択セッションを削除: user_id={user_id}")
+                                    logger.info("エラー時に未来タスク選択セッションを削除: user_id=%s", user_id)
 
                                 reply_text = (
                                     f"⚠️ 未来タスク選択中にエラーが発生しました: {e}"
@@ -1643,21 +1667,19 @@ def callback():
                                 continue
 
                         # 認識されないコマンドの場合、FlexMessageボタンメニューを返す
-                        print(
-                            f"[DEBUG] 認識されないコマンド: '{user_message}' - FlexMessageボタンメニューを返します"
-                        )
-                        print("[DEBUG] Flex送信直前")
+                        logger.debug("認識されないコマンド: '%s' - FlexMessageボタンメニューを返します", user_message)
+                        logger.debug("Flex送信直前")
                         # FlexMessageを使用してボタンメニューを送信
                         button_message_sent = send_reply_with_menu(active_line_bot_api, reply_token, get_simple_flex_menu, user_id=user_id)
                         if button_message_sent:
-                            print("[DEBUG] FlexMessage送信成功")
+                            logger.debug("FlexMessage送信成功")
                         else:
-                            print("[DEBUG] ボタンメニュー送信に失敗しました")
-                        print("[DEBUG] Flex送信後")
+                            logger.debug("ボタンメニュー送信に失敗しました")
+                        logger.debug("Flex送信後")
                         continue
 
                     except Exception as e:
-                        print("エラー:", e)
+                        logger.error("エラー: %s", e)
                         # 例外発生時もユーザーにエラー内容を返信
                         try:
                             active_line_bot_api.reply_message(
@@ -1671,7 +1693,7 @@ def callback():
                                 )
                             )
                         except Exception as inner_e:
-                            print("LINEへのエラー通知も失敗:", inner_e)
+                            logger.error("LINEへのエラー通知も失敗: %s", inner_e)
                             # reply_tokenが無効な場合はpush_messageで通知
                             if user_id:
                                 try:
@@ -1686,12 +1708,12 @@ def callback():
                                         )
                                     )
                                 except Exception as push_e:
-                                    print("push_messageも失敗:", push_e)
+                                    logger.error("push_messageも失敗: %s", push_e)
                             else:
-                                print("[DEBUG] user_idが取得できないため、push_messageを送信できません")
+                                logger.debug("user_idが取得できないため、push_messageを送信できません")
                         continue
     except Exception as e:
-        print("エラー:", e)
+        logger.error("エラー: %s", e)
     return "OK", 200
 
 
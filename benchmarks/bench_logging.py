@@ -0,0 +1,60 @@
+"""
+ロギングのオーバーヘッド計測
+
+DEBUG無効時の logger.debug と、従来の print(f"...") を比較する。
+
+実行:
+    python benchmarks/bench_logging.py
+"""
+import contextlib
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import configure_logging, flush_logging, get_logger, lazy  # noqa: E402
+
+ITERATIONS = 100_000
+
+tasks = [("資料作成", 30, "2024-01-01")] * 20
+slot = {"start": "09:00", "end": "10:30", "duration_minutes": 90}
+
+
+def bench_print():
+    """従来方式: f-stringを毎回作成して標準出力へ書き込む"""
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        return timeit.timeit(
+            lambda: print(f"[DEBUG] スロット確認: slot={slot}, タスク一覧={[t[0] for t in tasks]}"),
+            number=ITERATIONS,
+        )
+
+
+def bench_logger(level: str):
+    """loggerを指定レベルで計測（出力先は破棄用のStringIO）"""
+    os.environ["LOG_LEVEL"] = level
+    configure_logging(stream=io.StringIO(), force=True)
+    logger = get_logger("benchmark")
+    elapsed = timeit.timeit(
+        lambda: logger.debug("スロット確認: slot=%s, タスク一覧=%s", slot, lazy(lambda: [t[0] for t in tasks])),
+        number=ITERATIONS,
+    )
+    flush_logging()
+    return elapsed
+
+
+def main():
+    results = [
+        ("print(f-string)", bench_print()),
+        ("logger.debug (LOG_LEVEL=INFO)", bench_logger("INFO")),
+        ("logger.debug (LOG_LEVEL=DEBUG)", bench_logger("DEBUG")),
+    ]
+    print(f"{ITERATIONS}回の呼び出し")
+    for name, elapsed in results:
+        print(f"  {name:32s} 合計 {elapsed:.3f}秒 / 1回 {elapsed / ITERATIONS * 1e6:.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Webhook（/callback）のエンドツーエンドベンチマーク
+
+一時ディレクトリのSQLite（または --database-url で指定したPostgreSQL）でFlaskアプリを起動し、
+LINE / Google Calendar / OpenAI はローカルのスタブサーバーに向けて、署名付きWebhookを送信する。
+コマンド別にスループットと p50 / p95 / p99 レイテンシを出力し、
+結果を benchmarks/results/webhook.jsonl にコミットハッシュ付きで追記する。
+
+実行例:
+    python benchmarks/bench_webhook.py
+    python benchmarks/bench_webhook.py --requests 200 --concurrency 8 --openai-latency 800
+    python benchmarks/bench_webhook.py --commands task_list,approve --compare HEAD~1
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.upstream_stubs import start_upstreams  # noqa: E402
+
+RESULTS_PATH = os.path.join(ROOT_DIR, "benchmarks", "results", "webhook.jsonl")
+CHANNEL_SECRET = "benchmark-channel-secret"
+
+# 認証済みとして扱われるダミートークン（expiryを遠い未来にしてトークン更新を発生させない）
+DUMMY_TOKEN = json.dumps({
+    "token": "benchmark-access-token",
+    "refresh_token": "benchmark-refresh-token",
+    "client_id": "benchmark-client",
+    "client_secret": "benchmark-secret",
+    "scopes": ["https://www.googleapis.com/auth/calendar"],
+    "expiry": "2099-01-01T00:00:00Z",
+})
+
+
+def sign(body: bytes, channel_secret: str = CHANNEL_SECRET) -> str:
+    """validate_line_signature と同じ方式（HMAC-SHA256 → Base64）で署名"""
+    mac = hmac.new(channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(mac).decode("utf-8")
+
+
+def build_webhook_body(user_id: str, text: str) -> bytes:
+    """テキストメッセージ1件のWebhookペイロードを生成"""
+    payload = {
+        "destination": "",
+        "events": [{
+            "type": "message",
+            "replyToken": uuid.uuid4().hex,
+            "source": {"type": "user", "userId": user_id},
+            "timestamp": int(time.time() * 1000),
+            "mode": "active",
+            "message": {"type": "text", "id": uuid.uuid4().hex, "text": text},
+        }],
+    }
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _seed_user(db, user_id: str, task_count: int = 3, due_date: str = None) -> list:
+    """認証済みユーザーとタスク（期限は指定がなければ明日）を作成し、タスクIDを返す"""
+    from models.database import Task
+
+    db.register_user(user_id)
+    db.save_token(user_id, DUMMY_TOKEN)
+    due_date = due_date or (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    task_ids = []
+    for i in range(task_count):
+        task = Task(
+            task_id=str(uuid.uuid4()),
+            user_id=user_id,
+            name=f"ベンチタスク{i + 1}",
+            duration_minutes=30,
+            repeat=False,
+            due_date=due_date,
+        )
+        db.create_task(task)
+        task_ids.append(task.task_id)
+    return task_ids
+
+
+def _setup_task_list(db, user_id):
+    _seed_user(db, user_id)
+
+
+def _setup_task_add(db, user_id):
+    from handlers.helpers import create_flag_file
+    _seed_user(db, user_id)
+    create_flag_file(user_id, "add_task")
+
+
+def _setup_number_select(db, user_id):
+    from handlers.helpers import create_flag_file
+    _seed_user(db, user_id)
+    create_flag_file(user_id, "task_select", {"mode": "schedule"})
+
+
+def _setup_approve(db, user_id):
+    task_ids = _seed_user(db, user_id)
+    proposal = "\n".join(
+        f"🕐 {9 + i:02d}:00〜{9 + i:02d}:30\n📝 ベンチタスク{i + 1} (30分)" for i in range(len(task_ids))
+    )
+    db.set_user_session(user_id, "schedule_proposal", proposal)
+    db.set_user_session(user_id, "selected_tasks", json.dumps(task_ids))
+
+
+# コマンド名 -> (送信するメッセージ, ユーザーの事前状態を作る関数)
+SCENARIOS = {
+    "task_list": ("タスク一覧", _setup_task_list),
+    "task_add": ("資料作成 30分 明日", _setup_task_add),
+    "number_select": ("1", _setup_number_select),
+    "approve": ("承認する", _setup_approve),
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    """最近傍法のパーセンタイル"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_environment(upstreams: dict, workdir: str) -> dict:
+    """スタブサーバーに向けてアプリを起動するための環境変数"""
+    return {
+        "LINE_CHANNEL_ACCESS_TOKEN": "benchmark-access-token",
+        "LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+        "OPENAI_API_KEY": "benchmark-openai-key",
+        "CLIENT_SECRETS_JSON": json.dumps({"web": {"client_id": "benchmark-client", "client_secret": "benchmark-secret"}}),
+        "FLASK_SECRET_KEY": "benchmark-flask-secret",
+        "LINE_API_HOST": upstreams["line"].url,
+        "GOOGLE_CALENDAR_API_ENDPOINT": upstreams["google"].url + "/",
+        "OPENAI_BASE_URL": upstreams["openai"].url + "/v1",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "SLOW_TRACE_PATH": os.path.join(workdir, "slow_traces.jsonl"),
+    }
+
+
+def _configure_environment(args, upstreams, workdir):
+    """アプリのimport前に環境変数を設定"""
+    os.environ.update(build_environment(upstreams, workdir))
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ.pop("DATABASE_URL", None)
+
+
+def _send(port: int, body: bytes) -> tuple:
+    """Webhookを1件送信し、(ステータス, 所要秒数) を返す"""
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    try:
+        conn.request("POST", "/callback", body=body, headers={
+            "Content-Type": "application/json",
+            "X-Line-Signature": sign(body),
+        })
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    except Exception:
+        status = 0
+    finally:
+        conn.close()
+    return status, time.perf_counter() - start
+
+
+def run_scenario(port: int, db, name: str, requests: int, concurrency: int, warmup: int = 2) -> dict:
+    """1コマンド分のベンチマークを実行（最初のwarmup件は初回のみの初期化を含むため計測しない）"""
+    message, setup = SCENARIOS[name]
+    run_id = uuid.uuid4().hex[:8]
+    user_ids = [f"Ubench{name}{run_id}{i:05d}" for i in range(warmup + requests)]
+    for user_id in user_ids:
+        setup(db, user_id)
+    bodies = [build_webhook_body(user_id, message) for user_id in user_ids]
+    for body in bodies[:warmup]:
+        _send(port, body)
+    bodies = bodies[warmup:]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda body: _send(port, body), bodies))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for _, elapsed in results]
+    return {
+        "command": name,
+        "requests": requests,
+        "errors": sum(1 for status, _ in results if status != 200),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _resolve_commit(ref: str) -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", ref], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return ref
+
+
+def save_result(record: dict):
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_result(commit: str):
+    """指定コミットの最新の結果を読み込む"""
+    if not os.path.exists(RESULTS_PATH):
+        return None
+    found = None
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("commit") == commit:
+                found = record
+    return found
+
+
+def print_report(record: dict, baseline=None):
+    base = {r["command"]: r for r in (baseline or {}).get("results", [])}
+    print(f"commit={record['commit']} db={record['config']['database']} "
+          f"concurrency={record['config']['concurrency']}")
+    print(f"  {'command':14s} {'req':>5s} {'err':>4s} {'rps':>8s} {'p50ms':>9s} {'p95ms':>9s} {'p99ms':>9s}")
+    for r in record["results"]:
+        line = (f"  {r['command']:14s} {r['requests']:5d} {r['errors']:4d} {r['throughput_rps']:8.2f} "
+                f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+        prev = base.get(r["command"])
+        if prev and prev["p95_ms"]:
+            line += f"  (p95 {(r['p95_ms'] - prev['p95_ms']) / prev['p95_ms'] * 100:+.1f}% vs {baseline['commit']})"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Webhookエンドツーエンドベンチマーク")
+    parser.add_argument("--commands", default=",".join(SCENARIOS), help="実行するコマンド（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=50, help="コマンドごとのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時送信数")
+    parser.add_argument("--warmup", type=int, default=2, help="コマンドごとの計測しないウォームアップ件数")
+    parser.add_argument("--database-url", default=None, help="PostgreSQLのURL（未指定なら一時SQLite）")
+    for service, latency in (("line", 30), ("google", 80), ("openai", 500)):
+        parser.add_argument(f"--{service}-latency", type=float, default=latency, help=f"{service}スタブの遅延（ms）")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0, help=f"{service}スタブのエラー率（0〜1）")
+    parser.add_argument("--compare", default=None, help="比較対象のコミット（例: HEAD~1）")
+    parser.add_argument("--no-save", action="store_true", help="結果を保存しない")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    commands = [c.strip() for c in args.commands.split(",") if c.strip()]
+    unknown = [c for c in commands if c not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"不明なコマンド: {unknown}（指定可能: {list(SCENARIOS)}）")
+
+    upstreams = start_upstreams(
+        line=(args.line_latency, args.line_error_rate),
+        google=(args.google_latency, args.google_error_rate),
+        openai=(args.openai_latency, args.openai_error_rate),
+    )
+    workdir = tempfile.mkdtemp(prefix="remind_bench_")
+    _configure_environment(args, upstreams, workdir)
+    os.chdir(workdir)
+    if not args.database_url:
+        # Railway判定（/app の有無）に左右されないよう、SQLiteは一時ディレクトリに固定する
+        import models.database as database
+        database.db = database._instrument_db(database.Database(os.path.join(workdir, "tasks.db")))
+
+    from werkzeug.serving import make_server
+    import app as remind_app
+
+    server = make_server("127.0.0.1", 0, remind_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        results = [
+            run_scenario(server.server_port, remind_app.db, name, args.requests, args.concurrency, args.warmup)
+            for name in commands
+        ]
+    finally:
+        server.shutdown()
+        for stub in upstreams.values():
+            stub.stop()
+
+    record = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "database": "postgresql" if args.database_url else "sqlite",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "latency_ms": {"line": args.line_latency, "google": args.google_latency, "openai": args.openai_latency},
+            "error_rate": {"line": args.line_error_rate, "google": args.google_error_rate, "openai": args.openai_error_rate},
+        },
+        "upstream_calls": {name: stub.calls for name, stub in upstreams.items()},
+        "results": results,
+    }
+    baseline = load_result(_resolve_commit(args.compare)) if args.compare else None
+    if not args.no_save:
+        save_result(record)
+    print_report(record, baseline)
+    return record
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+定期通知ジョブのスケールシミュレーション
+
+合成ユーザー（tokens / user_channels / tasks）を指定の規模・タスク数分布で生成し、
+8時通知・21時通知・日曜18時通知を偽のLINE送信クライアントに対して実行する。
+ジョブごとに 実行時間 / 発行SQL数 / 読み取り行数 / DBメソッド呼び出し数 / ピークメモリ / push回数 を出力する。
+8時通知後のカレンダー事前同期は偽の事前同期に置き換え、予約されたユーザー数だけを数える（Googleには接続しない）。
+
+実行例:
+    python benchmarks/sim_notifications.py --users 10000
+    python benchmarks/sim_notifications.py --users 100000 --tasks poisson:4 --future-tasks uniform:0-3
+    python benchmarks/sim_notifications.py --users 10000 --database-url postgresql://localhost/remind_sim
+    python benchmarks/sim_notifications.py --users 1000 --jobs carryover --output result.json
+
+注意: PostgreSQLの場合は指定したデータベースに合成データを書き込むため、専用のDBを使うこと。
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.bench_webhook import DUMMY_TOKEN  # noqa: E402
+
+JST = pytz.timezone("Asia/Tokyo")
+INSERT_CHUNK = 10000
+
+JOBS = {
+    "daily": "send_daily_task_notification",
+    "carryover": "send_carryover_check",
+    "future": "send_future_task_selection",
+}
+
+
+def parse_distribution(spec: str, rng: random.Random):
+    """
+    タスク数分布の指定を乱数関数に変換
+
+    fixed:N / uniform:A-B / poisson:λ に対応。
+    """
+    kind, _, value = spec.partition(":")
+    if kind == "fixed":
+        n = int(value)
+        return lambda: n
+    if kind == "uniform":
+        low, high = (int(v) for v in value.split("-"))
+        return lambda: rng.randint(low, high)
+    if kind == "poisson":
+        lam = float(value)
+        threshold = math.exp(-lam)
+
+        def sample():
+            # Knuthの方法（λが数十程度までなら十分速い）
+            k, p = 0, 1.0
+            while True:
+                p *= rng.random()
+                if p <= threshold:
+                    return k
+                k += 1
+        return sample
+    raise ValueError(f"不明な分布指定: {spec}（fixed:N / uniform:A-B / poisson:λ）")
+
+
+def generate_rows(users: int, task_dist, future_dist, channels: int, overdue_ratio: float,
+                  today_ratio: float, rng: random.Random):
+    """合成データの行を生成（tokens, user_channels, tasks）"""
+    today = datetime.now(JST).date()
+    now = datetime.now()
+    tokens, user_channels, tasks = [], [], []
+    for i in range(users):
+        user_id = f"Usim{i:08d}"
+        tokens.append({"user_id": user_id, "token_json": DUMMY_TOKEN})
+        user_channels.append({"user_id": user_id, "channel_id": f"sim-channel-{i % channels}", "created_at": now})
+        for n in range(task_dist()):
+            r = rng.random()
+            if r < overdue_ratio:
+                due = today - timedelta(days=rng.randint(1, 7))
+            elif r < overdue_ratio + today_ratio:
+                due = today
+            else:
+                due = today + timedelta(days=rng.randint(1, 14))
+            tasks.append({
+                "task_id": str(uuid.uuid4()), "user_id": user_id, "name": f"合成タスク{n + 1}",
+                "duration_minutes": rng.choice((15, 30, 60, 90)), "repeat": False, "status": "active",
+                "created_at": now, "due_date": due.strftime("%Y-%m-%d"), "priority": "normal", "task_type": "daily",
+            })
+        # 未来タスクは tasks テーブルの task_type='future' として保存される（両バックエンド共通）
+        for n in range(future_dist()):
+            tasks.append({
+                "task_id": str(uuid.uuid4()), "user_id": user_id, "name": f"合成未来タスク{n + 1}",
+                "duration_minutes": rng.choice((60, 120)), "repeat": False, "status": "active",
+                "created_at": now, "due_date": None, "priority": "normal", "task_type": "future",
+            })
+    return tokens, user_channels, tasks
+
+
+def _chunks(rows: list):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        yield rows[start:start + INSERT_CHUNK]
+
+
+def populate(db, tokens: list, user_channels: list, tasks: list):
+    """合成データを一括投入（DBメソッドを1件ずつ呼ぶと大規模では投入自体が終わらないため）"""
+    engine = getattr(db, "engine", None)
+    if engine is not None:
+        from models.postgres_database import TaskModel, TokenModel, UserChannelModel
+        with engine.begin() as conn:
+            for model, rows in ((TokenModel, tokens), (UserChannelModel, user_channels), (TaskModel, tasks)):
+                for chunk in _chunks(rows):
+                    conn.execute(model.__table__.insert(), chunk)
+        return
+
+    conn = sqlite3.connect(db.db_path)
+    try:
+        conn.executemany("INSERT INTO tokens (user_id, token_json) VALUES (:user_id, :token_json)", tokens)
+        conn.executemany(
+            "INSERT INTO user_channels (user_id, channel_id, created_at) VALUES (:user_id, :channel_id, :created_at)",
+            user_channels,
+        )
+        conn.executemany(
+            "INSERT INTO tasks (task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type) "
+            "VALUES (:task_id, :user_id, :name, :duration_minutes, :repeat, :status, :created_at, :due_date, :priority, :task_type)",
+            tasks,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class FakeLineSender:
+    """push_messageの呼び出しを数えるだけのLINEクライアント"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.push_calls = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def push_message(self, request, x_line_retry_key=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.push_calls += 1
+            self.messages += len(request.messages)
+
+    def reply_message(self, request):
+        pass
+
+
+class FakeCalendarPrefetcher:
+    """カレンダーの事前同期の予約を数えるだけの事前同期（Google Calendarに接続せず、結果を再現可能にする）"""
+
+    def __init__(self):
+        self.scheduled = 0
+
+    def schedule(self, user_ids):
+        self.scheduled += len(list(dict.fromkeys(user_ids)))
+        return []
+
+    def reset(self):
+        pass
+
+
+def _db_method_calls() -> float:
+    """DBメソッドの呼び出し回数（metricsのヒストグラムのcount合計）"""
+    from prometheus_client import REGISTRY
+    total = 0.0
+    for metric in REGISTRY.collect():
+        if metric.name == "remind_db_query_duration_seconds":
+            total += sum(s.value for s in metric.samples if s.name.endswith("_count"))
+    return total
+
+
+def run_job(service, db, sender: FakeLineSender, job: str, trace_memory: bool = True) -> dict:
+    """通知ジョブを1つ実行して計測（SQL文・行数はクエリプロファイラーで記録）"""
+    from utils.query_profiler import profile_queries
+
+    push_before, messages_before = sender.push_calls, sender.messages
+    prefetch_before = service.calendar_prefetcher.scheduled
+    db_calls_before = _db_method_calls()
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        # ユーザーごとのprint出力は破棄する（出力先への書き込みコストを除くため）
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                profile_queries(f"job:{JOBS[job]}") as profile:
+            getattr(service, JOBS[job])()
+    finally:
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+
+    n_plus_one = profile.n_plus_one()
+    return {
+        "job": job,
+        "wall_seconds": round(wall, 3),
+        "sql_statements": profile.statements,
+        "rows_read": profile.rows,
+        "sql_ms": round(profile.total_ms, 1),
+        "db_method_calls": int(_db_method_calls() - db_calls_before),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2) if peak is not None else None,
+        "push_calls": sender.push_calls - push_before,
+        "messages": sender.messages - messages_before,
+        "prefetch_scheduled": service.calendar_prefetcher.scheduled - prefetch_before,
+        "n_plus_one": n_plus_one[:5],
+    }
+
+
+def _configure_environment(args):
+    os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "simulation-access-token")
+    os.environ["DISABLE_DUPLICATE_PREVENTION"] = "true"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ.pop("DATABASE_URL", None)
+
+
+def _init_database(args, workdir):
+    import models.database as database
+    if not args.database_url:
+        database.db = database._instrument_db(database.Database(os.path.join(workdir, "tasks.db")))
+    return database.init_db()
+
+
+def print_report(record: dict):
+    config = record["config"]
+    print(f"db={config['database']} users={config['users']} tasks={record['data']['tasks']} "
+          f"(分布 {config['tasks']}, 未来 {config['future_tasks']}) 投入 {record['data']['populate_seconds']}秒")
+    print(f"  {'job':10s} {'wall_s':>9s} {'sql':>9s} {'rows':>10s} {'db_calls':>9s} {'peak_mb':>8s} {'push':>7s}")
+    for r in record["results"]:
+        peak = f"{r['peak_memory_mb']:8.2f}" if r["peak_memory_mb"] is not None else f"{'-':>8s}"
+        print(f"  {r['job']:10s} {r['wall_seconds']:9.3f} {r['sql_statements']:9d} {r['rows_read']:10d} "
+              f"{r['db_method_calls']:9d} {peak} {r['push_calls']:7d}")
+        if config["users"]:
+            print(f"  {'':10s} 1ユーザーあたり {r['wall_seconds'] / config['users'] * 1000:.2f}ms / "
+                  f"SQL {r['sql_statements'] / config['users']:.1f}文")
+        for suspect in r["n_plus_one"]:
+            print(f"  {'':10s} N+1: {suspect['count']}回 {suspect['statement'][:80]}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="定期通知ジョブのスケールシミュレーション")
+    parser.add_argument("--users", type=int, default=1000, help="合成ユーザー数")
+    parser.add_argument("--tasks", default="poisson:4", help="ユーザーあたりのタスク数分布（fixed:N / uniform:A-B / poisson:λ）")
+    parser.add_argument("--future-tasks", default="uniform:0-3", help="ユーザーあたりの未来タスク数分布")
+    parser.add_argument("--overdue-ratio", type=float, default=0.1, help="期限切れタスクの割合")
+    parser.add_argument("--today-ratio", type=float, default=0.4, help="今日が期限のタスクの割合")
+    parser.add_argument("--channels", type=int, default=1, help="ユーザーを割り当てるチャネル数")
+    parser.add_argument("--jobs", default=",".join(JOBS), help="実行するジョブ（daily,carryover,future）")
+    parser.add_argument("--push-latency", type=float, default=0, help="偽LINEクライアントの遅延（ms）")
+    parser.add_argument("--database-url", default=None, help="PostgreSQLのURL（未指定なら一時SQLite）")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="ピークメモリ計測を無効化（計測オーバーヘッドを除く）")
+    parser.add_argument("--output", default=None, help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = [j.strip() for j in args.jobs.split(",") if j.strip()]
+    unknown = [j for j in jobs if j not in JOBS]
+    if unknown:
+        raise SystemExit(f"不明なジョブ: {unknown}（指定可能: {list(JOBS)}）")
+
+    _configure_environment(args)
+    workdir = tempfile.mkdtemp(prefix="remind_sim_")
+    os.chdir(workdir)
+    db = _init_database(args, workdir)
+
+    rng = random.Random(args.seed)
+    tokens, user_channels, tasks = generate_rows(
+        args.users,
+        parse_distribution(args.tasks, rng),
+        parse_distribution(args.future_tasks, rng),
+        args.channels,
+        args.overdue_ratio,
+        args.today_ratio,
+        rng,
+    )
+    start = time.perf_counter()
+    populate(db, tokens, user_channels, tasks)
+    populate_seconds = round(time.perf_counter() - start, 2)
+
+    from services.notification_service import NotificationService
+    sender = FakeLineSender(args.push_latency)
+    service = NotificationService()
+    service.line_bot_api = sender
+    service.multi_tenant_service.get_messaging_api = lambda channel_id: sender
+    # 事前同期は実際のGoogle Calendarに接続するため、シミュレーションでは予約数だけを数える
+    service.calendar_prefetcher = FakeCalendarPrefetcher()
+
+    results = [run_job(service, db, sender, job, trace_memory=not args.no_tracemalloc) for job in jobs]
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "database": "postgresql" if args.database_url else "sqlite",
+            "users": args.users,
+            "tasks": args.tasks,
+            "future_tasks": args.future_tasks,
+            "channels": args.channels,
+            "push_latency_ms": args.push_latency,
+        },
+        "data": {"tasks": len(tasks), "populate_seconds": populate_seconds},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+    print_report(record)
+    return record
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+ベンチマーク用の外部APIスタブサーバー
+LINE Messaging API / Google Calendar API / OpenAI API の代わりにローカルで応答する
+
+各サーバーは遅延（ms）とエラー率を指定できる。アプリ側は以下の環境変数でスタブに向ける:
+    LINE_API_HOST                 -> http://127.0.0.1:<port>
+    GOOGLE_CALENDAR_API_ENDPOINT  -> http://127.0.0.1:<port>/
+    OPENAI_BASE_URL               -> http://127.0.0.1:<port>/v1
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_OPENAI_CONTENT = json.dumps({"tasks": [1], "future_tasks": []})
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """共通処理: 遅延・エラー注入・呼び出し回数の記録"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with server.lock:
+            server.calls += 1
+            server.requests[f"{method} {self.path.split('?')[0]}"] += 1
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            self._respond(500, {"message": "injected error"})
+            return
+        status, payload = self.route(method, self.path, body)
+        self._respond(status, payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def route(self, method: str, path: str, body: bytes):
+        return 200, {}
+
+
+class LineStubHandler(_StubHandler):
+    """LINE Messaging API（reply / push / pushの残り通数）"""
+
+    def route(self, method, path, body):
+        if path == "/v2/bot/message/quota":
+            return 200, {"type": "limited", "value": 100000}
+        if path == "/v2/bot/message/quota/consumption":
+            return 200, {"totalUsage": 0}
+        if path.startswith("/v2/bot/message/"):
+            return 200, {"sentMessages": [{"id": uuid.uuid4().hex, "quoteToken": "stub"}]}
+        return 200, {}
+
+
+class GoogleCalendarStubHandler(_StubHandler):
+    """Google Calendar API（events.list / events.insert）"""
+
+    def route(self, method, path, body):
+        if "/events" in path and method == "GET":
+            return 200, {"kind": "calendar#events", "items": []}
+        if "/events" in path and method == "POST":
+            event = json.loads(body or b"{}")
+            event.update({"id": uuid.uuid4().hex, "htmlLink": "https://calendar.example/stub"})
+            return 200, event
+        return 200, {}
+
+
+class OpenAIStubHandler(_StubHandler):
+    """OpenAI Chat Completions API"""
+
+    def route(self, method, path, body):
+        if path.endswith("/chat/completions"):
+            return 200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.server.content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+        return 404, {"error": {"message": "not found"}}
+
+
+class StubServer(ThreadingHTTPServer):
+    """スタブサーバー（バックグラウンドスレッドで起動）"""
+
+    daemon_threads = True
+
+    def __init__(self, handler_class, latency_ms: float = 0, error_rate: float = 0, content: str = DEFAULT_OPENAI_CONTENT):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.content = content
+        self.calls = 0
+        self.errors = 0
+        self.requests = Counter()  # "POST /v2/bot/message/reply" -> 回数
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def reset_counts(self):
+        with self.lock:
+            self.calls = 0
+            self.errors = 0
+            self.requests.clear()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_upstreams(line=(0, 0), google=(0, 0), openai=(0, 0), openai_content: str = DEFAULT_OPENAI_CONTENT) -> dict:
+    """
+    3つのスタブサーバーを起動
+
+    Args:
+        line / google / openai: (遅延ms, エラー率) のタプル
+        openai_content: OpenAIスタブが返すメッセージ本文
+
+    Returns:
+        {"line": StubServer, "google": StubServer, "openai": StubServer}
+    """
+    return {
+        "line": StubServer(LineStubHandler, *line).start(),
+        "google": StubServer(GoogleCalendarStubHandler, *google).start(),
+        "openai": StubServer(OpenAIStubHandler, *openai, content=openai_content).start(),
+    }
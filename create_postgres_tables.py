@@ -34,9 +34,10 @@ def create_postgres_tables():
         
         print("✅ PostgreSQLデータベースの初期化が完了しました")
         
-        # テーブル作成を明示的に実行
-        if hasattr(postgres_db, '_ensure_tables_exist'):
-            postgres_db._ensure_tables_exist()
+        # 未適用のマイグレーションを適用（初期化時に適用済みなら何もしない）
+        from models.migrations import apply_postgres_migrations
+        version = apply_postgres_migrations(postgres_db.engine)
+        print(f"スキーマバージョン: v{version}")
         
         # テーブル一覧を確認
         from sqlalchemy import inspect
@@ -0,0 +1,51 @@
+"""
+gunicorn設定
+- 複数ワーカーのメトリクスを /metrics で集計するための設定
+- preload: マスターでアプリを読み込み、ワーカーはフォークして不変な部分（import済みモジュール・設定）を共有する
+  接続・スレッドは post_fork でワーカーごとに作り直す（GUNICORN_PRELOAD=false で無効化）
+"""
+import os
+import shutil
+
+# prometheus_clientの読み込み前に設定する必要があるため、ここでデフォルトを決める
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/remind_metrics")
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+if preload_app:
+    # マスターではスケジューラースレッドを開始しない（スレッドはフォークで引き継がれない）
+    os.environ["REMIND_DEFER_SCHEDULER"] = "1"
+
+
+def on_starting(server):
+    """マスター起動時に前回のメトリクスファイルを削除"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """ワーカーのフォーク前に重いSDKを読み込み、GC対象から外してコピーオンライトで共有する"""
+    if not preload_app:
+        return
+    import gc
+    from services.container import container
+    container.warm_imports()
+    gc.collect()
+    # 読み込み済みオブジェクトをGCの走査対象から外し、ワーカーでのページのコピーを減らす
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """フォーク直後のワーカーで、親から引き継いだ接続を破棄しスケジューラーを開始"""
+    if not preload_app:
+        return
+    from services.container import container
+    container.after_fork()
+    container.start_scheduler()
+
+
+def child_exit(server, worker):
+    """終了したワーカーのメトリクスを整理"""
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -6,15 +6,28 @@
 import json
 import os
 from datetime import datetime, timedelta
-from linebot.v3.messaging import (
-    TextMessage,
-    ReplyMessageRequest,
-    FlexMessage,
-    FlexContainer,
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest, FlexMessage, FlexContainer = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest", "FlexMessage", "FlexContainer"
 )
+from .deferred_reply import run_command
 from .helpers import load_flag_data
+from utils.concurrency import submit, wait_for
+from utils.tracing import traced
+
+# 並行実行するステップの待ち時間の上限（秒）
+SESSION_TIMEOUT_SECONDS = 10
+SCHEDULE_DISPLAY_TIMEOUT_SECONDS = 20
+# 承認処理中のスケジュール提案のセッションタイプと、その有効期限（分。処理が停止した場合の解放用）
+APPROVING_SESSION_TYPE = 'schedule_proposal_approving'
+APPROVING_SESSION_MINUTES = 10
+# 承認処理中に「はい」が再送された場合の返信
+APPROVAL_IN_PROGRESS_MESSAGE = "⏳ スケジュールを登録中です。\n完了までお待ちください。"
 
 
+@traced("approval.handle_approval")
 def handle_approval(
     line_bot_api,
     reply_token: str,
@@ -41,21 +54,39 @@ def handle_approval(
     Returns:
         bool: 処理成功時True
     """
-    # データベースからスケジュール提案をチェック
-    schedule_proposal = db.get_user_session(user_id, 'schedule_proposal') if db else None
+    # スケジュール提案と選択されたタスクを同時に読み込む（承認・削除のどちらでも選択されたタスクを使う）
+    schedule_proposal = None
+    selected_tasks_data = None
+    if db:
+        selected_tasks_future = submit(db.get_user_session, user_id, 'selected_tasks')
+        schedule_proposal = db.get_user_session(user_id, 'schedule_proposal')
+        selected_tasks_data = wait_for(selected_tasks_future, SESSION_TIMEOUT_SECONDS, "get_user_session")
     if schedule_proposal:
         # スケジュール提案が存在する場合、承認処理を実行
-        return _handle_schedule_approval(
+        # 処理中に「はい」が再送されてもカレンダーに二重登録しないよう、提案を処理中のセッションに移してから処理する
+        # （承認に失敗した場合は _handle_schedule_approval が提案を戻す）
+        if not db.claim_user_session(user_id, 'schedule_proposal', APPROVING_SESSION_TYPE, APPROVING_SESSION_MINUTES):
+            return _reply_approval_in_progress(line_bot_api, reply_token)
+
+        # （カレンダーへの追加は時間がかかるため、受付を先に返信して結果をpushで送る場合がある）
+        return run_command(
+            "schedule_approval",
             line_bot_api,
             reply_token,
             user_id,
+            _handle_schedule_approval,
             task_service,
             calendar_service,
             get_simple_flex_menu,
             schedule_proposal,
+            selected_tasks_data,
             db
         )
 
+    # 承認処理中の「はい」を削除の承認として扱わない
+    if db and db.get_user_session(user_id, APPROVING_SESSION_TYPE):
+        return _reply_approval_in_progress(line_bot_api, reply_token)
+
     # スケジュール提案がない場合の削除処理
     return _handle_task_deletion(
         line_bot_api,
@@ -63,10 +94,23 @@ def handle_approval(
         user_id,
         task_service,
         get_simple_flex_menu,
+        selected_tasks_data,
         db
     )
 
 
+def _reply_approval_in_progress(line_bot_api, reply_token: str) -> bool:
+    """承認処理中に「はい」が再送された場合の返信"""
+    line_bot_api.reply_message(
+        ReplyMessageRequest(
+            replyToken=reply_token,
+            messages=[TextMessage(text=APPROVAL_IN_PROGRESS_MESSAGE)],
+        )
+    )
+    return True
+
+
+@traced("approval.handle_schedule_approval")
 def _handle_schedule_approval(
     line_bot_api,
     reply_token: str,
@@ -75,13 +119,16 @@ def _handle_schedule_approval(
     calendar_service,
     get_simple_flex_menu,
     proposal: str,
+    selected_tasks_data,
     db=None
 ) -> bool:
     """スケジュール提案の承認処理"""
     try:
-        # 選択されたタスクを取得
-        selected_tasks_data = db.get_user_session(user_id, 'selected_tasks') if db else None
+        # 選択されたタスク（handle_approvalで読み込み済み）
         if not selected_tasks_data:
+            # 選択されたタスクがなければ提案は承認できないため、処理中の提案も削除する
+            if db:
+                db.delete_user_session(user_id, APPROVING_SESSION_TYPE)
             reply_text = "⚠️ セッションが期限切れになりました。\n\nスケジュール提案の有効期限は24時間です。\nもう一度タスクを選択してください。"
             line_bot_api.reply_message(
                 ReplyMessageRequest(
@@ -105,7 +152,7 @@ def _handle_schedule_approval(
             # 破損したデータを削除
             if db:
                 db.delete_user_session(user_id, 'selected_tasks')
-                db.delete_user_session(user_id, 'schedule_proposal')
+                db.delete_user_session(user_id, APPROVING_SESSION_TYPE)
             return False
 
         # モードを判定
@@ -183,25 +230,22 @@ def _handle_schedule_approval(
         success_count = calendar_service.add_events_to_calendar(user_id, proposal)
 
         if success_count == 0:
-            # パースに失敗した場合は、固定時刻で追加
+            # パースに失敗した場合は、固定時刻で追加（各タスクの追加は並行して行う）
             print("[DEBUG] スケジュール提案のパースに失敗、固定時刻で追加")
-            for task in selected_tasks:
-                start_time = target_date.replace(hour=14, minute=0, second=0, microsecond=0)
-                if calendar_service.add_event_to_calendar(
-                    user_id,
-                    task.name,
-                    start_time,
-                    task.duration_minutes,
-                ):
-                    success_count += 1
+            start_time = target_date.replace(hour=14, minute=0, second=0, microsecond=0)
+            success_count = calendar_service.add_events_in_parallel(
+                user_id,
+                [(task.name, start_time, task.duration_minutes) for task in selected_tasks]
+            )
 
         reply_text = f"✅ スケジュールを承認しました！\n\n{success_count}個のタスクをカレンダーに追加しました。\n\n"
 
         # スケジュール提案に「来週のスケジュール提案」が含まれているかチェック
         is_future_schedule_proposal = "来週のスケジュール提案" in proposal
 
-        # スケジュール表示処理
-        reply_text += _format_schedule_display(
+        # スケジュール表示（カレンダーの読み込み）と、セッションの削除・メニューの作成を並行して行う
+        schedule_display_future = submit(
+            _format_schedule_display,
             calendar_service,
             user_id,
             selected_future_tasks,
@@ -212,9 +256,11 @@ def _handle_schedule_approval(
 
         # データベースからセッションデータを削除
         if db:
-            db.delete_user_session(user_id, 'schedule_proposal')
+            db.delete_user_session(user_id, APPROVING_SESSION_TYPE)
             db.delete_user_session(user_id, 'selected_tasks')
 
+        reply_text += wait_for(schedule_display_future, SCHEDULE_DISPLAY_TIMEOUT_SECONDS, "format_schedule_display")
+
         # メニュー画面を表示
         flex_message_content = get_simple_flex_menu()
         flex_container = FlexContainer.from_dict(flex_message_content)
@@ -232,6 +278,10 @@ def _handle_schedule_approval(
         print(f"[ERROR] 承認処理（はいコマンド）: {e}")
         import traceback
         traceback.print_exc()
+        # 処理中の提案を戻し、もう一度「はい」で承認できるようにする
+        if db:
+            db.set_user_session(user_id, 'schedule_proposal', proposal, expires_hours=24)
+            db.delete_user_session(user_id, APPROVING_SESSION_TYPE)
         reply_text = f"⚠️ スケジュール承認中にエラーが発生しました: {e}"
         line_bot_api.reply_message(
             ReplyMessageRequest(
@@ -242,6 +292,7 @@ def _handle_schedule_approval(
         return False
 
 
+@traced("approval.format_schedule_display")
 def _format_schedule_display(
     calendar_service,
     user_id: str,
@@ -335,11 +386,10 @@ def _handle_task_deletion(
     user_id: str,
     task_service,
     get_simple_flex_menu,
+    selected_tasks_data,
     db=None
 ) -> bool:
     """タスク削除の承認処理"""
-    selected_tasks_data = db.get_user_session(user_id, 'selected_tasks') if db else None
-
     if not selected_tasks_data:
         reply_text = "⚠️ 先にタスクを選択してください。"
         line_bot_api.reply_message(
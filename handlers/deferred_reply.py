@@ -0,0 +1,166 @@
+"""
+時間のかかるコマンドの先送り実行（reply-now / push-later）
+スケジュール提案の生成（OpenAI）や承認（カレンダーへの追加）は数秒〜数十秒かかり、
+同期実行するとリプライトークンの期限切れやリクエストワーカーの占有につながる。
+
+先送りするコマンドは、受付メッセージをすぐに返信してから処理を返信後用のスレッドプールで実行し、
+結果はpushで送る。処理側（handler）の reply_message は PushReplyClient が push_message に置き換えるため、
+handler は同期実行・先送りのどちらでも同じコードで動く。
+
+pushは月間の送信数に上限があるため、残りが PUSH_QUOTA_RESERVE 以下の場合
+（または上限を確認できない場合）は同期実行に戻す。
+
+環境変数:
+    DEFERRED_COMMANDS: 先送りするコマンド（カンマ区切り。デフォルト: schedule_proposal,schedule_approval。
+                       空の場合は全て同期実行）
+    PUSH_QUOTA_RESERVE: 先送りをやめるpushの残り通数（デフォルト: 100。朝・夜の通知用に残す）
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Set, Tuple
+
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest, PushMessageRequest = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest", "PushMessageRequest"
+)
+from models.database import commit_unit_of_work
+from utils.concurrency import submit_background
+from utils.logger import get_logger
+from utils.metrics import COMMAND_MODE, WEBHOOK_DURATION, track
+from utils.tracing import start_root_span
+
+logger = get_logger(__name__)
+
+# コマンド -> 先送りする場合にすぐ返信する受付メッセージ
+ACK_MESSAGES = {
+    "schedule_proposal": "⏳ スケジュール提案を作成しています。\n少々お待ちください。",
+    "schedule_approval": "⏳ カレンダーに登録しています。\n少々お待ちください。",
+}
+DEFAULT_DEFERRED_COMMANDS = "schedule_proposal,schedule_approval"
+PUSH_QUOTA_RESERVE = int(os.getenv('PUSH_QUOTA_RESERVE', '100'))
+# pushの残り通数を確認し直す間隔（秒）
+QUOTA_CHECK_INTERVAL_SECONDS = 300
+
+# id(line_bot_api) -> (確認時刻, pushできるか)
+_quota_cache: Dict[int, Tuple[float, bool]] = {}
+_quota_lock = threading.Lock()
+
+
+def deferred_commands() -> Set[str]:
+    """先送りするコマンド"""
+    value = os.getenv('DEFERRED_COMMANDS', DEFAULT_DEFERRED_COMMANDS)
+    return {command.strip() for command in value.split(",") if command.strip() in ACK_MESSAGES}
+
+
+def has_push_quota(line_bot_api) -> bool:
+    """
+    pushの残り通数が PUSH_QUOTA_RESERVE を超えているか（QUOTA_CHECK_INTERVAL_SECONDS の間は前回の結果を使う）
+
+    上限を確認できない場合は、結果を届けられない可能性があるためFalse
+    """
+    key = id(line_bot_api)
+    now = time.monotonic()
+    cached = _quota_cache.get(key)
+    if cached and now - cached[0] < QUOTA_CHECK_INTERVAL_SECONDS:
+        return cached[1]
+
+    try:
+        quota = line_bot_api.get_message_quota()
+        if getattr(quota.type, "value", quota.type) == "none":
+            available = True
+        else:
+            usage = line_bot_api.get_message_quota_consumption().total_usage
+            available = quota.value - usage > PUSH_QUOTA_RESERVE
+    except Exception as e:
+        logger.warning("[has_push_quota] pushの上限を確認できません: %s", e)
+        available = False
+
+    with _quota_lock:
+        _quota_cache[key] = (now, available)
+    if not available:
+        logger.warning("[has_push_quota] pushの残りが少ないため同期実行します")
+    return available
+
+
+def mark_push_quota_exhausted(line_bot_api):
+    """pushが上限で失敗した場合に、次の確認まで先送りをやめる"""
+    with _quota_lock:
+        _quota_cache[id(line_bot_api)] = (time.monotonic(), False)
+
+
+def reset_quota_cache():
+    """pushの上限の確認結果を破棄"""
+    with _quota_lock:
+        _quota_cache.clear()
+
+
+class PushReplyClient:
+    """reply_message を push_message に置き換えるLINEクライアント（先送りした処理の結果送信用）"""
+
+    def __init__(self, line_bot_api, user_id: str):
+        self._line_bot_api = line_bot_api
+        self._user_id = user_id
+
+    def reply_message(self, reply_message_request, *args, **kwargs):
+        try:
+            return self._line_bot_api.push_message(
+                PushMessageRequest(to=self._user_id, messages=reply_message_request.messages)
+            )
+        except Exception as e:
+            if getattr(e, "status", None) == 429:
+                mark_push_quota_exhausted(self._line_bot_api)
+            raise
+
+    def __getattr__(self, name):
+        return getattr(self._line_bot_api, name)
+
+
+def run_command(command: str, line_bot_api, reply_token: str, user_id: str, func: Callable, *args, **kwargs) -> bool:
+    """
+    func(line_bot_api, reply_token, user_id, *args, **kwargs) を実行
+
+    先送りするコマンドの場合は受付メッセージを返信してから返信後用のスレッドプールで実行し、
+    func の返信はpushで送る。
+
+    Returns:
+        bool: 同期実行の場合はfuncの戻り値、先送りした場合はTrue
+    """
+    if command not in deferred_commands() or not has_push_quota(line_bot_api):
+        COMMAND_MODE.labels(command=command, mode="sync").inc()
+        return func(line_bot_api, reply_token, user_id, *args, **kwargs)
+
+    # 先送りした処理（別スレッド・別セッション）がこのリクエストの書き込みを読めるよう、受付の返信前に確定させる
+    commit_unit_of_work()
+    try:
+        line_bot_api.reply_message(
+            ReplyMessageRequest(
+                replyToken=reply_token,
+                messages=[TextMessage(text=ACK_MESSAGES[command])],
+            )
+        )
+    except Exception as e:
+        # 受付メッセージを送れなかった場合は結果を直接返信する
+        logger.warning("[run_command] 受付メッセージの送信エラー（同期実行します）: %s, %s", command, e)
+        COMMAND_MODE.labels(command=command, mode="sync").inc()
+        return func(line_bot_api, reply_token, user_id, *args, **kwargs)
+
+    COMMAND_MODE.labels(command=command, mode="deferred").inc()
+    submit_background(_run_deferred, command, PushReplyClient(line_bot_api, user_id), reply_token, user_id, func, args, kwargs)
+    logger.debug("[run_command] 処理を先送り: command=%s, user_id=%s", command, user_id)
+    return True
+
+
+def _run_deferred(command: str, client: PushReplyClient, reply_token: str, user_id: str,
+                  func: Callable, args: tuple, kwargs: dict):
+    try:
+        # リクエストのトレースは返信時に書き出し済みのため、別のトレースとして記録する
+        with start_root_span("deferred_command", command=command, user_id=user_id), \
+                track(WEBHOOK_DURATION, command=f"deferred:{command}"):
+            func(client, reply_token, user_id, *args, **kwargs)
+    except Exception as e:
+        logger.error("[run_command] 先送りした処理のエラー: command=%s, user_id=%s, %s", command, user_id, e)
+        import traceback
+        traceback.print_exc()
@@ -5,11 +5,11 @@
 
 import os
 import re as regex
-from linebot.v3.messaging import (
-    TextMessage,
-    ReplyMessageRequest,
-    FlexMessage,
-    FlexContainer,
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest, FlexMessage, FlexContainer = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest", "FlexMessage", "FlexContainer"
 )
 from .helpers import create_flag_file, send_reply_message, delete_flag_file
 
@@ -7,12 +7,11 @@ import os
 import json
 from datetime import datetime
 from typing import Optional, List, Union
-from linebot.v3.messaging import (
-    TextMessage,
-    ReplyMessageRequest,
-    PushMessageRequest,
-    FlexMessage,
-    FlexContainer,
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest, PushMessageRequest, FlexMessage, FlexContainer = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest", "PushMessageRequest", "FlexMessage", "FlexContainer"
 )
 
 
@@ -4,12 +4,26 @@
 """
 
 import json
+import logging
 from datetime import datetime, timedelta
 from typing import Optional
-from linebot.v3.messaging import (
-    TextMessage,
-    ReplyMessageRequest,
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest"
 )
+from utils.concurrency import submit, wait_for
+from utils.logger import get_logger, lazy
+from .deferred_reply import run_command
+
+logger = get_logger(__name__)
+
+# 並行実行するステップの待ち時間の上限（秒）
+# 数字解析はタイムアウトしても正規表現での解析に切り替えられるため短めにする
+NUMBER_EXTRACTION_TIMEOUT_SECONDS = 10
+GOOGLE_AUTH_TIMEOUT_SECONDS = 10
+FREE_TIMES_TIMEOUT_SECONDS = 20
 
 
 def handle_task_selection_cancel(line_bot_api, reply_token: str, user_id: str, flex_menu_func) -> bool:
@@ -29,7 +43,7 @@ def handle_task_selection_cancel(line_bot_api, reply_token: str, user_id: str, f
 
     # フラグファイルを削除してモードをリセット
     delete_flag_file(user_id, "task_select")
-    print(f"[DEBUG] タスク選択モードリセット: user_id={user_id} 削除")
+    logger.debug("タスク選択モードリセット: user_id=%s 削除", user_id)
 
     # 通常のFlexMessageメニューを表示
     send_reply_with_menu(line_bot_api, reply_token, flex_menu_func)
@@ -69,10 +83,13 @@ def handle_task_selection_process(
     """
     from .helpers import load_flag_data, delete_flag_file
 
-    print(f"[DEBUG] タスク選択フラグ検出: user_id={user_id}")
-    print(f"[DEBUG] タスク選択処理開始: user_message='{user_message}'")
+    logger.debug("タスク選択フラグ検出: user_id=%s", user_id)
+    logger.debug("タスク選択処理開始: user_message='%s'", user_message)
 
     try:
+        # AIによる数字解析はフラグ・タスクの読み込みと依存しないため、先に別スレッドで開始する
+        numbers_future = submit(openai_service.extract_task_numbers_from_message, user_message)
+
         # 選択モードを先に判定（display_tasksの作成方法を決めるため）
         flag_data = load_flag_data(user_id, "task_select")
         mode_content = ""
@@ -87,13 +104,13 @@ def handle_task_selection_process(
             if mode:
                 mode_content = f"mode={mode}"
         else:
-            print(f"[DEBUG] フラグデータの読み込みに失敗しました")
+            logger.debug("フラグデータの読み込みに失敗しました")
             mode_content = ""
 
         is_schedule_mode = "mode=schedule" in mode_content
         is_future_schedule_mode = "mode=future_schedule" in mode_content
         is_complete_mode = "mode=complete" in mode_content
-        print(f"[DEBUG] 選択モード: {'future_schedule' if is_future_schedule_mode else ('schedule' if is_schedule_mode else ('complete' if is_complete_mode else 'unknown'))}, フラグ作成時刻: {flag_timestamp}")
+        logger.debug("選択モード: %s, フラグ作成時刻: %s", 'future_schedule' if is_future_schedule_mode else ('schedule' if is_schedule_mode else ('complete' if is_complete_mode else 'unknown')), flag_timestamp)
 
         # datetime は先頭でインポート済み
         import pytz
@@ -101,28 +118,77 @@ def handle_task_selection_process(
         today = datetime.now(jst)
         today_str = today.strftime('%Y-%m-%d')
         effective_today_str = target_date_str or today_str
-        print(f"[DEBUG] 今日の日付文字列: {today_str}, target_date_str: {target_date_str}, effective_today_str: {effective_today_str}")
+        logger.debug("今日の日付文字列: %s, target_date_str: %s, effective_today_str: %s", today_str, target_date_str, effective_today_str)
+
+        # AIによる数字解析を試行
+        selected_numbers = []
+        try:
+            ai_result = wait_for(numbers_future, NUMBER_EXTRACTION_TIMEOUT_SECONDS, "extract_task_numbers")
+            if ai_result and isinstance(ai_result.get("tasks"), list):
+                selected_numbers = ai_result["tasks"]
+                logger.debug("AI数字解析成功: %s", selected_numbers)
+        except Exception as e:
+            logger.debug("AI数字解析失敗: %s, フォールバック処理に移行", e)
+            import traceback
+            traceback.print_exc()
+
+        # AIが失敗した場合は従来の方法で解析
+        if not selected_numbers:
+            import re
+            # カンマ・句読点・スペースで区切って数字を抽出
+            user_message_normalized = user_message.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
+            matches = re.findall(r'\d+', user_message_normalized)
+            selected_numbers = [int(m) for m in matches]
+            logger.debug("フォールバック数字解析: %s", selected_numbers)
+
+        if not selected_numbers:
+            reply_text = "⚠️ タスク番号を認識できませんでした。\n数字で入力してください（例：1, 3, 5）"
+            line_bot_api.reply_message(
+                ReplyMessageRequest(
+                    replyToken=reply_token,
+                    messages=[TextMessage(text=reply_text)],
+                )
+            )
+            return False
+
+        # スケジュール提案フローで使うGoogle認証の確認と空き時間の取得は、番号を認識できた場合だけ、タスクの読み込みと並行して開始する
+        auth_future = None
+        free_times_future = None
+        if is_schedule_mode or is_future_schedule_mode:
+            if is_future_schedule_mode:
+                # 来週月曜日を計算
+                next_week_monday = today + timedelta(days=(7 - today.weekday()))
+                base_date = next_week_monday
+                week_info = "来週"
+            else:
+                base_date = today
+                week_info = ""
+            auth_future = submit(is_google_authenticated, user_id)
+            # 朝の通知後に事前同期したミラーがあれば、Googleに問い合わせずに空き時間を計算する
+            max_age_seconds = None if is_future_schedule_mode else calendar_service.PREFETCH_MAX_AGE_SECONDS
+            free_times_future = submit(calendar_service.get_free_busy_times, user_id, base_date, max_age_seconds=max_age_seconds)
 
         # 未来タスク選択モードの場合は未来タスクを取得
         if is_future_schedule_mode:
             all_tasks = task_service.get_user_future_tasks(user_id)
-            print(f"[DEBUG] 未来タスク取得: {len(all_tasks)}件, タスク一覧={[(i+1, t.name, t.due_date) for i, t in enumerate(all_tasks)]}")
+            logger.debug("未来タスク取得: %s件, タスク一覧=%s", len(all_tasks), lazy(lambda: [(i+1, t.name, t.due_date) for i, t in enumerate(all_tasks)]))
         else:
             all_tasks = task_service.get_user_tasks(user_id)
-            print(f"[DEBUG] 全タスク取得: {len(all_tasks)}件, タスク一覧={[(i+1, t.name, t.due_date) for i, t in enumerate(all_tasks)]}")
+            logger.debug("全タスク取得: %s件, タスク一覧=%s", len(all_tasks), lazy(lambda: [(i+1, t.name, t.due_date) for i, t in enumerate(all_tasks)]))
 
         # 削除モード（夜の通知）の場合は、通知と同じ方法で今日のタスクを取得
         if is_complete_mode:
             # 通知と同じ方法で今日のタスクを取得（単純なフィルタリング）
-            for t in all_tasks:
-                due_date_str = str(t.due_date) if t.due_date else None
-                match = (t.due_date == effective_today_str) if t.due_date else False
-                print(f"[DEBUG] タスク比較: name={t.name}, due_date={due_date_str}, type={type(t.due_date)}, match={match}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for t in all_tasks:
+                    due_date_str = str(t.due_date) if t.due_date else None
+                    match = (t.due_date == effective_today_str) if t.due_date else False
+                    logger.debug("タスク比較: name=%s, due_date=%s, type=%s, match=%s", t.name, due_date_str, type(t.due_date), match)
             if effective_today_str:
                 display_tasks = [t for t in all_tasks if t.due_date and str(t.due_date) == effective_today_str]
             else:
                 display_tasks = [t for t in all_tasks if t.due_date and str(t.due_date) == today_str]
-            print(f"[DEBUG] 削除モード: 今日のタスク数={len(display_tasks)}, タスク一覧={[(i+1, t.name) for i, t in enumerate(display_tasks)]}")
+            logger.debug("削除モード: 今日のタスク数=%s, タスク一覧=%s", len(display_tasks), lazy(lambda: [(i+1, t.name) for i, t in enumerate(display_tasks)]))
         else:
             # スケジュールモード（朝の通知）の場合は、format_task_listと同じソート順序を適用
             def sort_key(task):
@@ -139,13 +205,13 @@ def handle_task_selection_process(
             # 優先度と期日でソート
             from collections import defaultdict
             tasks_sorted = sorted(all_tasks, key=sort_key)
-            print(f"[DEBUG] ソート後タスク数: {len(tasks_sorted)}件")
+            logger.debug("ソート後タスク数: %s件", len(tasks_sorted))
 
             # format_task_listと同じ順序でタスクを取得
             grouped = defaultdict(list)
             for task in tasks_sorted:
                 grouped[task.due_date or '未設定'].append(task)
-            print(f"[DEBUG] グループ化後: {len(grouped)}グループ")
+            logger.debug("グループ化後: %sグループ", len(grouped))
 
             # 期日の順序を正確に再現
             due_order = []
@@ -161,7 +227,7 @@ def handle_task_selection_process(
                         due_str = f"{int(m)}月{int(d)}日({weekday})"
                         due_order.append((due_str, due, group))
                     except (ValueError, IndexError) as e:
-                        print(f"[DEBUG] Date parsing error: {e}")
+                        logger.error("Date parsing error: %s", e)
                         due_order.append((due, due, group))
                 else:
                     due_order.append(('期日未設定', due, group))
@@ -171,42 +237,11 @@ def handle_task_selection_process(
             for due_str, due, group in due_order:
                 display_tasks.extend(group)
 
-            print(f"[DEBUG] スケジュールモード: タスク数={len(display_tasks)}, タスク一覧={[(i+1, t.name) for i, t in enumerate(display_tasks)]}")
+            logger.debug("スケジュールモード: タスク数=%s, タスク一覧=%s", len(display_tasks), lazy(lambda: [(i+1, t.name) for i, t in enumerate(display_tasks)]))
 
         # display_tasksが空の場合のデバッグ
         if not display_tasks:
-            print(f"[DEBUG] 警告: display_tasksが空です！ all_tasks={len(all_tasks)}, is_complete_mode={is_complete_mode}, is_schedule_mode={is_schedule_mode}, is_future_schedule_mode={is_future_schedule_mode}, mode_content='{mode_content}'")
-
-        # AIによる数字解析を試行
-        selected_numbers = []
-        try:
-            ai_result = openai_service.extract_task_numbers_from_message(user_message)
-            if ai_result and isinstance(ai_result.get("tasks"), list):
-                selected_numbers = ai_result["tasks"]
-                print(f"[DEBUG] AI数字解析成功: {selected_numbers}")
-        except Exception as e:
-            print(f"[DEBUG] AI数字解析失敗: {e}, フォールバック処理に移行")
-            import traceback
-            traceback.print_exc()
-
-        # AIが失敗した場合は従来の方法で解析
-        if not selected_numbers:
-            import re
-            # カンマ・句読点・スペースで区切って数字を抽出
-            user_message_normalized = user_message.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-            matches = re.findall(r'\d+', user_message_normalized)
-            selected_numbers = [int(m) for m in matches]
-            print(f"[DEBUG] フォールバック数字解析: {selected_numbers}")
-
-        if not selected_numbers:
-            reply_text = "⚠️ タスク番号を認識できませんでした。\n数字で入力してください（例：1, 3, 5）"
-            line_bot_api.reply_message(
-                ReplyMessageRequest(
-                    replyToken=reply_token,
-                    messages=[TextMessage(text=reply_text)],
-                )
-            )
-            return False
+            logger.warning("警告: display_tasksが空です！ all_tasks=%s, is_complete_mode=%s, is_schedule_mode=%s, is_future_schedule_mode=%s, mode_content='%s'", len(all_tasks), is_complete_mode, is_schedule_mode, is_future_schedule_mode, mode_content)
 
         # 選択されたタスクを取得
         selected_tasks = []
@@ -214,9 +249,9 @@ def handle_task_selection_process(
             idx = num - 1
             if 0 <= idx < len(display_tasks):
                 selected_tasks.append(display_tasks[idx])
-                print(f"[DEBUG] タスク選択: {num}. {display_tasks[idx].name}")
+                logger.debug("タスク選択: %s. %s", num, display_tasks[idx].name)
             else:
-                print(f"[DEBUG] 無効なタスク番号: {num} (範囲: 1-{len(display_tasks)})")
+                logger.debug("無効なタスク番号: %s (範囲: 1-%s)", num, len(display_tasks))
 
         if not selected_tasks:
             reply_text = "⚠️ 選択されたタスクが見つかりませんでした。"
@@ -231,10 +266,10 @@ def handle_task_selection_process(
         # スケジュールモードまたは完了モードに応じて処理を分岐
         if is_schedule_mode or is_future_schedule_mode:
             # スケジュール提案フロー（朝）
-            print(f"[DEBUG] スケジュール提案開始: {len(selected_tasks)}個のタスク")
+            logger.debug("スケジュール提案開始: %s個のタスク", len(selected_tasks))
 
             # Google認証チェック
-            if not is_google_authenticated(user_id):
+            if not wait_for(auth_future, GOOGLE_AUTH_TIMEOUT_SECONDS, "is_google_authenticated"):
                 auth_url = get_google_auth_url(user_id)
                 reply_text = f"📅 カレンダー連携が必要です\n\nGoogleカレンダーにアクセスして認証してください：\n{auth_url}"
                 delete_flag_file(user_id, "task_select")
@@ -246,52 +281,26 @@ def handle_task_selection_process(
                 )
                 return False
 
-            # カレンダー情報取得
-            if is_future_schedule_mode:
-                # 来週月曜日を計算
-                next_week_monday = today + timedelta(days=(7 - today.weekday()))
-                base_date = next_week_monday
-                week_info = "来週"
-            else:
-                base_date = today
-                week_info = ""
-
-            # スケジュール提案を生成
-            try:
-                from services.calendar_service import CalendarService
-                calendar_service = CalendarService()
-                free_times = calendar_service.get_free_busy_times(user_id, base_date)
-
-                # OpenAIでスケジュール提案を生成
-                proposal = openai_service.generate_schedule_proposal(
-                    selected_tasks,
-                    free_times,
-                    week_info=week_info,
-                    base_date=base_date
-                )
-
-                if proposal:
-                    reply_text = proposal
-
-                    # スケジュール提案をデータベースに保存
-                    if db:
-                        db.set_user_session(user_id, 'schedule_proposal', proposal, expires_hours=24)
-                        db.set_user_session(
-                            user_id,
-                            'selected_tasks',
-                            json.dumps([task.task_id for task in selected_tasks]),
-                            expires_hours=24
-                        )
-                else:
-                    reply_text = "⚠️ スケジュール提案の生成に失敗しました。"
-            except Exception as e:
-                print(f"[DEBUG] スケジュール提案エラー: {e}")
-                import traceback
-                traceback.print_exc()
-                reply_text = f"⚠️ スケジュール提案中にエラーが発生しました: {e}"
+            # スケジュール提案の生成（OpenAI）は時間がかかるため、受付を先に返信して結果をpushで送る場合がある
+            # （先送り中に数字が再送されても二重に提案しないよう、フラグは先に削除する）
+            delete_flag_file(user_id, "task_select")
+            logger.debug("タスク選択モードフラグ削除完了: user_id=%s", user_id)
+            return run_command(
+                "schedule_proposal",
+                line_bot_api,
+                reply_token,
+                user_id,
+                _reply_schedule_proposal,
+                selected_tasks,
+                free_times_future,
+                openai_service,
+                week_info,
+                base_date,
+                db
+            )
         else:
             # 完了（削除確認）フロー（夜）
-            print(f"[DEBUG] タスク削除開始: {len(selected_tasks)}個のタスク")
+            logger.debug("タスク削除開始: %s個のタスク", len(selected_tasks))
             task_names = [task.name for task in selected_tasks]
             reply_text = f"以下のタスクを削除しますか？\n\n"
             for i, name in enumerate(task_names, 1):
@@ -308,18 +317,18 @@ def handle_task_selection_process(
 
         # フラグ削除と送信
         delete_flag_file(user_id, "task_select")
-        print(f"[DEBUG] タスク選択モードフラグ削除完了: user_id={user_id}")
-        print(f"[DEBUG] 選択結果送信開始: {reply_text[:100]}...")
+        logger.debug("タスク選択モードフラグ削除完了: user_id=%s", user_id)
+        logger.debug("選択結果送信開始: %s...", reply_text[:100])
         line_bot_api.reply_message(
             ReplyMessageRequest(
                 replyToken=reply_token,
                 messages=[TextMessage(text=reply_text)],
             )
         )
-        print(f"[DEBUG] 選択結果送信完了")
+        logger.debug("選択結果送信完了")
         return True
     except Exception as e:
-        print(f"[DEBUG] タスク選択処理エラー: {e}")
+        logger.error("タスク選択処理エラー: %s", e)
         reply_text = "⚠️ タスク選択処理中にエラーが発生しました。"
         line_bot_api.reply_message(
             ReplyMessageRequest(
@@ -328,3 +337,57 @@ def handle_task_selection_process(
             )
         )
         return False
+
+
+def _reply_schedule_proposal(
+    line_bot_api,
+    reply_token: str,
+    user_id: str,
+    selected_tasks: list,
+    free_times_future,
+    openai_service,
+    week_info: str,
+    base_date,
+    db=None
+) -> bool:
+    """選択されたタスクのスケジュール提案を生成して返信"""
+    try:
+        free_times = wait_for(free_times_future, FREE_TIMES_TIMEOUT_SECONDS, "get_free_busy_times")
+
+        # OpenAIでスケジュール提案を生成
+        proposal = openai_service.generate_schedule_proposal(
+            selected_tasks,
+            free_times,
+            week_info=week_info,
+            base_date=base_date
+        )
+
+        if proposal:
+            reply_text = proposal
+
+            # スケジュール提案をデータベースに保存
+            if db:
+                db.set_user_session(user_id, 'schedule_proposal', proposal, expires_hours=24)
+                db.set_user_session(
+                    user_id,
+                    'selected_tasks',
+                    json.dumps([task.task_id for task in selected_tasks]),
+                    expires_hours=24
+                )
+        else:
+            reply_text = "⚠️ スケジュール提案の生成に失敗しました。"
+    except Exception as e:
+        logger.error("スケジュール提案エラー: %s", e)
+        import traceback
+        traceback.print_exc()
+        reply_text = f"⚠️ スケジュール提案中にエラーが発生しました: {e}"
+
+    logger.debug("選択結果送信開始: %s...", reply_text[:100])
+    line_bot_api.reply_message(
+        ReplyMessageRequest(
+            replyToken=reply_token,
+            messages=[TextMessage(text=reply_text)],
+        )
+    )
+    logger.debug("選択結果送信完了")
+    return True
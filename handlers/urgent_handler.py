@@ -5,13 +5,17 @@
 
 import os
 from datetime import datetime, timedelta
-from linebot.v3.messaging import (
-    TextMessage,
-    ReplyMessageRequest,
-    FlexMessage,
-    FlexContainer,
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+TextMessage, ReplyMessageRequest, FlexMessage, FlexContainer = lazy_import(
+    "linebot.v3.messaging", "TextMessage", "ReplyMessageRequest", "FlexMessage", "FlexContainer"
 )
 from .helpers import create_flag_file, send_reply_message, delete_flag_file
+from utils.concurrency import submit, wait_for
+
+# 空き時間の取得を待つ時間の上限（秒）
+FREE_TIMES_TIMEOUT_SECONDS = 20
 
 
 def handle_urgent_task_add_command(
@@ -74,14 +78,18 @@ def handle_urgent_task_process(
         bool: 処理成功時True
     """
     try:
+        import pytz
+        jst = pytz.timezone("Asia/Tokyo")
+        today = datetime.now(jst)
+
+        # 今日の空き時間はタスクの解析・作成と依存しないため、先に別スレッドで取得を開始する
+        free_times_future = submit(calendar_service.get_free_busy_times, user_id, today)
+
         # タスク情報を解析
         task_info = task_service.parse_task_message(user_message)
         task_info["priority"] = "urgent_not_important"
 
         # 今日の日付を設定
-        import pytz
-        jst = pytz.timezone("Asia/Tokyo")
-        today = datetime.now(jst)
         task_info["due_date"] = today.strftime("%Y-%m-%d")
 
         # タスク作成
@@ -89,7 +97,7 @@ def handle_urgent_task_process(
         print(f"[DEBUG] 緊急タスク作成完了: task_id={task.task_id}")
 
         # 今日の空き時間に直接スケジュール追加
-        free_times = calendar_service.get_free_busy_times(user_id, today)
+        free_times = wait_for(free_times_future, FREE_TIMES_TIMEOUT_SECONDS, "get_free_busy_times")
 
         if free_times:
             first_free_time = free_times[0]
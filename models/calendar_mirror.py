@@ -0,0 +1,73 @@
+"""
+Googleカレンダーの予定のローカルミラー（calendar_events / calendar_sync_state）
+Calendar APIのイベントとDBの行の相互変換。SQLite版・PostgreSQL版の両方から使う共通処理。
+
+期間での検索のため、開始・終了はUTCの固定書式の文字列（start_at / end_at）でも保持する。
+APIが返す元の値（dateTime または 終日イベントの date）は start_raw / end_raw にそのまま残し、
+読み出し時はAPIのイベントと同じ形に戻す（呼び出し側の処理を変えずに使えるようにするため）。
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+
+JST = pytz.timezone('Asia/Tokyo')
+
+# ミラーのカラム（SELECT・INSERTの順序）
+CALENDAR_EVENT_COLUMNS = ('event_id', 'summary', 'description', 'start_raw', 'end_raw', 'all_day', 'start_at', 'end_at')
+
+
+def to_utc_key(value: datetime) -> str:
+    """期間検索用のキー（UTC・秒単位の固定書式）。タイムゾーンなしの日時はJSTとみなす"""
+    if value.tzinfo is None:
+        value = JST.localize(value)
+    return value.astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_event_time(raw: str) -> datetime:
+    """イベントの日時（dateTime / 終日イベントのdate）をdatetimeに変換。終日イベントはJSTの0時"""
+    if 'T' in raw:
+        return datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    return JST.localize(datetime.fromisoformat(raw))
+
+
+def event_to_row(event: dict) -> Optional[dict]:
+    """APIのイベントをミラーの行に変換（開始・終了がないイベントはNone）"""
+    if not event or not event.get('id') or not event.get('start') or not event.get('end'):
+        return None
+    start_raw = event['start'].get('dateTime', event['start'].get('date'))
+    end_raw = event['end'].get('dateTime', event['end'].get('date'))
+    if not start_raw or not end_raw:
+        return None
+    start = _parse_event_time(start_raw)
+    end = _parse_event_time(end_raw)
+    if 'T' not in end_raw and end <= start:
+        # 終日イベントの終了日はAPIでは翌日（排他的）だが、同じ日の場合も1日分とする
+        end = start + timedelta(days=1)
+    return {
+        'event_id': event['id'],
+        'summary': event.get('summary'),
+        'description': event.get('description'),
+        'start_raw': start_raw,
+        'end_raw': end_raw,
+        'all_day': 'T' not in start_raw,
+        'start_at': to_utc_key(start),
+        'end_at': to_utc_key(end),
+    }
+
+
+def row_to_event(row) -> dict:
+    """ミラーの行（CALENDAR_EVENT_COLUMNSの順）をAPIのイベントと同じ形に戻す"""
+    event_id, summary, description, start_raw, end_raw, all_day = row[:6]
+    key = 'date' if all_day else 'dateTime'
+    event = {
+        'id': event_id,
+        'start': {key: start_raw},
+        'end': {key: end_raw},
+    }
+    # APIと同様、値がないフィールドは含めない（呼び出し側の event.get(..., 既定値) をそのまま使う）
+    if summary is not None:
+        event['summary'] = summary
+    if description is not None:
+        event['description'] = description
+    return event
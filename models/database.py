@@ -1,9 +1,12 @@
 import os
 import sqlite3
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 import json
-from sqlalchemy import Column, String, Text
+from contextlib import contextmanager
+from models.calendar_mirror import CALENDAR_EVENT_COLUMNS, row_to_event, to_utc_key
+from models.weekly_stats import WEEKLY_STAT_STATUSES, iso_week_key, merge_top_tasks, stats_row_to_dict
+from utils.query_profiler import ProfilingConnection
 
 class Task:
     """タスクモデルクラス"""
@@ -50,6 +53,10 @@ class Database:
             self.db_path = db_path
         self.init_database()
 
+    def _connect(self) -> sqlite3.Connection:
+        """SQLite接続を作成（クエリプロファイラーのスコープ内では実行SQLを記録する）"""
+        return sqlite3.connect(self.db_path, factory=ProfilingConnection)
+
     def init_database(self):
         """データベースとテーブルの初期化"""
         # データベースファイルの親ディレクトリを必ず作成
@@ -65,165 +72,21 @@ class Database:
                 print(f"[init_database] 現在のDBパス: {self.db_path}")
         
         print(f"[init_database] 開始: {self.db_path}")
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # タスクテーブルの作成（task_typeカラムを追加）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                duration_minutes INTEGER NOT NULL,
-                repeat BOOLEAN NOT NULL,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                due_date TEXT,
-                priority TEXT DEFAULT 'normal',
-                task_type TEXT DEFAULT 'daily'
-            )
-        ''')
-        
-        # 既存のテーブルにtask_typeカラムが存在しない場合は追加
-        try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN task_type TEXT DEFAULT "daily"')
-            print("[init_database] task_typeカラムを追加しました")
-        except sqlite3.OperationalError:
-            print("[init_database] task_typeカラムは既に存在します")
-        
-        # 既存のテーブルにpriorityカラムが存在しない場合は追加
+        # 未適用のマイグレーションだけを適用（適用済みならバージョン確認の1文のみ）
+        from models.migrations import apply_sqlite_migrations
+        conn = self._connect()
         try:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT "normal"')
-            print("[init_database] priorityカラムを追加しました")
-        except sqlite3.OperationalError:
-            print("[init_database] priorityカラムは既に存在します")
-        
-        # 未来タスクテーブルの作成
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS future_tasks (
-                task_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                duration_minutes INTEGER NOT NULL,
-                priority TEXT DEFAULT 'normal',
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                category TEXT DEFAULT 'investment'
-            )
-        ''')
-        
-        # スケジュール提案テーブルの作成
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS schedule_proposals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                proposal_data TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # ユーザー設定テーブルの作成
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id TEXT PRIMARY KEY,
-                calendar_id TEXT,
-                notification_time TEXT DEFAULT '08:00',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # tokensテーブルの作成
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tokens (
-                user_id TEXT PRIMARY KEY,
-                token_json TEXT NOT NULL
-            )
-        ''')
-        
-        # notification_executionsテーブルの作成（重複実行防止用）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notification_executions (
-                notification_type TEXT PRIMARY KEY,
-                last_execution_time TEXT NOT NULL
-            )
-        ''')
-        
-        # user_channelsテーブルの作成（ユーザーとチャネルIDの関連付け）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_channels (
-                user_id TEXT PRIMARY KEY,
-                channel_id TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # user_statesテーブルの作成（ユーザーの状態管理：フラグファイルの代替）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_states (
-                user_id TEXT NOT NULL,
-                state_type TEXT NOT NULL,
-                state_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (user_id, state_type)
-            )
-        ''')
-
-        # openai_cacheテーブルの作成（OpenAI APIレスポンスのキャッシュ）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS openai_cache (
-                cache_key TEXT PRIMARY KEY,
-                model TEXT NOT NULL,
-                prompt_hash TEXT NOT NULL,
-                prompt_preview TEXT,
-                response TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                hit_count INTEGER DEFAULT 0
-            )
-        ''')
-
-        # expires_atにインデックスを作成（クリーンアップクエリの高速化）
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_openai_cache_expires_at
-            ON openai_cache(expires_at)
-        ''')
-
-        # user_sessionsテーブルの作成（一時ファイルの代替）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                session_type TEXT NOT NULL,
-                data TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                UNIQUE(user_id, session_type)
-            )
-        ''')
-
-        # user_sessionsテーブルのインデックス作成
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id
-            ON user_sessions(user_id)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at
-            ON user_sessions(expires_at)
-        ''')
-
-        conn.commit()
-        conn.close()
-        print(f"[init_database] 完了: {self.db_path}")
+            version = apply_sqlite_migrations(conn)
+        finally:
+            conn.close()
+        print(f"[init_database] 完了: {self.db_path} (schema v{version})")
 
     def create_task(self, task: Task) -> bool:
         """タスクを作成"""
         conn = None
         try:
             print(f"[create_task] INSERT値: task_id={task.task_id}, user_id={task.user_id}, name={task.name}, duration_minutes={task.duration_minutes}, repeat={task.repeat}, status={task.status}, created_at={task.created_at}, due_date={task.due_date}, priority={task.priority}, task_type={task.task_type}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO tasks (task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type)
@@ -248,7 +111,7 @@ class Database:
         conn = None
         try:
             print(f"[create_future_task] INSERT値: task_id={task.task_id}, user_id={task.user_id}, name={task.name}, duration_minutes={task.duration_minutes}, priority={task.priority}, status={task.status}, created_at={task.created_at}, task_type={task.task_type}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO tasks (task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type)
@@ -268,19 +131,34 @@ class Database:
             if conn:
                 conn.close()
 
+    # tasks / tasks_archive 共通のカラム
+    TASK_COLUMNS = "task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type"
+
     def get_user_tasks(self, user_id: str, status: str = "active", task_type: str = "daily") -> List[Task]:
         """ユーザーのタスク一覧を取得"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
-            cursor.execute('''
-                SELECT task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type
-                FROM tasks
-                WHERE user_id = ? AND status = ? AND task_type = ?
-                ORDER BY created_at DESC
-            ''', (user_id, status, task_type))
+            if status == "active":
+                # アクティブなタスクはtasks（ホット）だけを参照する
+                cursor.execute('''
+                    SELECT task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority, task_type
+                    FROM tasks
+                    WHERE user_id = ? AND status = ? AND task_type = ?
+                    ORDER BY created_at DESC
+                ''', (user_id, status, task_type))
+            else:
+                # アーカイブ済みなどはコンパクション前（tasks）と後（tasks_archive）の両方を参照する
+                cursor.execute(f'''
+                    SELECT {self.TASK_COLUMNS} FROM tasks
+                    WHERE user_id = ? AND status = ? AND task_type = ?
+                    UNION ALL
+                    SELECT {self.TASK_COLUMNS} FROM tasks_archive
+                    WHERE user_id = ? AND status = ? AND task_type = ?
+                    ORDER BY created_at DESC
+                ''', (user_id, status, task_type) * 2)
 
             tasks = []
             for row in cursor.fetchall():
@@ -308,10 +186,56 @@ class Database:
             if conn:
                 conn.close()
 
+    # IN句1文あたりの最大ユーザー数（バインドパラメータ数の上限対策）
+    IN_CLAUSE_CHUNK_SIZE = 500
+
+    def get_active_tasks_by_user(self, user_ids: List[str], task_type: str = "daily") -> Dict[str, List[Task]]:
+        """
+        複数ユーザーのアクティブなタスクを一括取得（ユーザーごとの get_user_tasks の代わり）
+
+        Returns:
+            {user_id: [Task, ...]}（タスクのないユーザーは空リスト。並び順は get_user_tasks と同じ）
+        """
+        tasks_by_user: Dict[str, List[Task]] = {user_id: [] for user_id in user_ids}
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            for i in range(0, len(user_ids), self.IN_CLAUSE_CHUNK_SIZE):
+                chunk = user_ids[i:i + self.IN_CLAUSE_CHUNK_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f'''
+                    SELECT {self.TASK_COLUMNS} FROM tasks
+                    WHERE user_id IN ({placeholders}) AND status = 'active' AND task_type = ?
+                    ORDER BY user_id, created_at DESC
+                ''', (*chunk, task_type))
+                for row in cursor.fetchall():
+                    tasks_by_user[row[1]].append(Task(
+                        task_id=row[0],
+                        user_id=row[1],
+                        name=row[2],
+                        duration_minutes=row[3],
+                        repeat=bool(row[4]),
+                        status=row[5],
+                        created_at=datetime.fromisoformat(row[6]),
+                        due_date=row[7],
+                        priority=row[8] if row[8] else "normal",
+                        task_type=row[9] if row[9] else "daily"
+                    ))
+            return tasks_by_user
+        except Exception as e:
+            print(f"[get_active_tasks_by_user] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return {}
+        finally:
+            if conn:
+                conn.close()
+
     def get_user_future_tasks(self, user_id: str, status: str = "active") -> List[Task]:
         """ユーザーの未来タスク一覧を取得"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -346,7 +270,7 @@ class Database:
     def get_task_by_id(self, task_id: str) -> Optional[Task]:
         """タスクIDでタスクを取得"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -356,6 +280,14 @@ class Database:
             ''', (task_id,))
             
             row = cursor.fetchone()
+            if row is None:
+                # コンパクション済みのタスクはアーカイブから取得
+                cursor.execute('''
+                    SELECT task_id, user_id, name, duration_minutes, repeat, status, created_at, due_date, priority
+                    FROM tasks_archive
+                    WHERE task_id = ?
+                ''', (task_id,))
+                row = cursor.fetchone()
             conn.close()
             
             if row:
@@ -375,11 +307,26 @@ class Database:
             print(f"Error getting task by id: {e}")
             return None
 
-    def update_task_status(self, task_id: str, status: str) -> bool:
-        """タスクのステータスを更新（通常タスクと未来タスクの両方に対応）"""
+    def update_task_status(self, task_id: str, status: str, count_in_stats: bool = True) -> bool:
+        """
+        タスクのステータスを更新（通常タスクと未来タスクの両方に対応）
+
+        count_in_stats=False の場合は週次集計に加算しない（期日の繰り越しで新しいタスクに置き換えるアーカイブなど）
+        """
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
+            # 週次集計の二重加算を防ぐため、更新前の状態の読み取りから書き込みロックを取る
+            conn.execute('BEGIN IMMEDIATE')
             cursor = conn.cursor()
+
+            # 週次集計用に更新前のタスクを取得（アーカイブ済みを含む）
+            cursor.execute('''
+                SELECT user_id, name, duration_minutes, status FROM tasks WHERE task_id = ?
+                UNION ALL
+                SELECT user_id, name, duration_minutes, status FROM tasks_archive WHERE task_id = ?
+            ''', (task_id, task_id))
+            previous = cursor.fetchone()
             
             # 通常タスクテーブルで更新を試行
             cursor.execute('''
@@ -399,9 +346,27 @@ class Database:
                     WHERE task_id = ?
                 ''', (status, task_id))
                 rows_updated = cursor.rowcount
+
+            # アーカイブ済みのタスク: 再アクティブ化はtasksに戻し、それ以外はアーカイブ上で更新
+            if rows_updated == 0:
+                if status == "active":
+                    cursor.execute(f'''
+                        INSERT INTO tasks ({self.TASK_COLUMNS})
+                        SELECT {self.TASK_COLUMNS} FROM tasks_archive WHERE task_id = ?
+                    ''', (task_id,))
+                    rows_updated = cursor.rowcount
+                    cursor.execute('UPDATE tasks SET status = ? WHERE task_id = ?', (status, task_id))
+                    cursor.execute('DELETE FROM tasks_archive WHERE task_id = ?', (task_id,))
+                else:
+                    cursor.execute('UPDATE tasks_archive SET status = ? WHERE task_id = ?', (status, task_id))
+                    rows_updated = cursor.rowcount
+
+            # 完了・アーカイブになったタスクを週次集計に加算（同じトランザクション内）
+            if (count_in_stats and rows_updated > 0 and previous and previous[3] != status
+                    and status in WEEKLY_STAT_STATUSES):
+                self._add_weekly_stats(cursor, previous[0], previous[1], previous[2], status)
             
             conn.commit()
-            conn.close()
             
             if rows_updated > 0:
                 print(f"[update_task_status] 成功: task_id={task_id}, status={status}, rows_updated={rows_updated}")
@@ -411,13 +376,76 @@ class Database:
                 return False
         except Exception as e:
             print(f"Error updating task status: {e}")
+            if conn:
+                conn.rollback()
             return False
+        finally:
+            if conn:
+                conn.close()
+
+    def _add_weekly_stats(self, cursor, user_id: str, name: str, minutes: int, status: str):
+        """今週の集計行に1件加算（呼び出し元のトランザクション内で実行）"""
+        iso_week = iso_week_key()
+        cursor.execute('''
+            SELECT top_tasks FROM user_stats_weekly WHERE user_id = ? AND iso_week = ?
+        ''', (user_id, iso_week))
+        row = cursor.fetchone()
+        completed = status == 'completed'
+        top_tasks = merge_top_tasks(row[0] if row else None, name, minutes) if completed else (row[0] if row else None)
+        cursor.execute('''
+            INSERT INTO user_stats_weekly
+                (user_id, iso_week, completed_count, completed_minutes, archived_count, archived_minutes, top_tasks, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, iso_week) DO UPDATE SET
+                completed_count = completed_count + excluded.completed_count,
+                completed_minutes = completed_minutes + excluded.completed_minutes,
+                archived_count = archived_count + excluded.archived_count,
+                archived_minutes = archived_minutes + excluded.archived_minutes,
+                top_tasks = excluded.top_tasks,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (
+            user_id, iso_week,
+            1 if completed else 0, (minutes or 0) if completed else 0,
+            0 if completed else 1, 0 if completed else (minutes or 0),
+            top_tasks
+        ))
+
+    def get_weekly_stats(self, user_id: str, iso_week: Optional[str] = None) -> Optional[dict]:
+        """
+        週次集計を取得（主キーで1件読むだけ）
+
+        Args:
+            user_id: ユーザーID
+            iso_week: ISO週のキー（例: 2026-W42）。Noneの場合は今週
+
+        Returns:
+            集計（completed_count, completed_minutes, archived_count, archived_minutes, top_tasks）。未集計の場合はNone
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, iso_week, completed_count, completed_minutes, archived_count, archived_minutes, top_tasks
+                FROM user_stats_weekly
+                WHERE user_id = ? AND iso_week = ?
+            ''', (user_id, iso_week or iso_week_key()))
+            row = cursor.fetchone()
+            return stats_row_to_dict(row) if row else None
+        except Exception as e:
+            print(f"[get_weekly_stats] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+        finally:
+            if conn:
+                conn.close()
 
     def delete_task(self, task_id: str) -> bool:
         """タスクを削除（通常タスクと未来タスクの両方に対応）"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # tasksテーブルから削除を試行
@@ -448,10 +476,114 @@ class Database:
             if conn:
                 conn.close()
 
+    def archive_inactive_tasks(self, batch_size: int) -> int:
+        """
+        アクティブでないタスクを最大batch_size件 tasks から tasks_archive に移動（コンパクション）
+
+        Returns:
+            移動した件数
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            # 移動中に他の接続がステータスを変えないよう書き込みロックを先に取る
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT task_id FROM tasks WHERE status != 'active' LIMIT ?
+            ''', (batch_size,))
+            task_ids = [row[0] for row in cursor.fetchall()]
+            if not task_ids:
+                conn.rollback()
+                return 0
+
+            placeholders = ', '.join('?' for _ in task_ids)
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO tasks_archive ({self.TASK_COLUMNS}, archived_at)
+                SELECT {self.TASK_COLUMNS}, CURRENT_TIMESTAMP FROM tasks WHERE task_id IN ({placeholders})
+            ''', task_ids)
+            cursor.execute(f'DELETE FROM tasks WHERE task_id IN ({placeholders})', task_ids)
+            moved_count = cursor.rowcount
+            conn.commit()
+            return moved_count
+
+        except Exception as e:
+            print(f"[archive_inactive_tasks] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def get_task_history(self, user_id: str, since: Optional[datetime] = None, status: Optional[str] = None) -> List[Task]:
+        """
+        アクティブでないタスクの履歴を取得（週次レポートなど）
+
+        コンパクション前（tasks）と後（tasks_archive）の両方を参照する。
+        sinceはアーカイブへの移動日時で絞り込む（未移動のタスクは直近のものとして常に含める）。
+
+        Args:
+            user_id: ユーザーID
+            since: この日時以降にアーカイブされたタスクのみ（Noneの場合は全期間）
+            status: ステータスで絞り込む（Noneの場合はアクティブ以外の全て）
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            hot_conditions = ["user_id = ?", "status != 'active'"]
+            hot_params = [user_id]
+            archive_conditions = ["user_id = ?"]
+            archive_params = [user_id]
+            if status:
+                hot_conditions.append("status = ?")
+                hot_params.append(status)
+                archive_conditions.append("status = ?")
+                archive_params.append(status)
+            if since:
+                # archived_at は CURRENT_TIMESTAMP（UTC）で記録されるため、sinceもUTCに揃えて比較する
+                # （タイムゾーンなしのsinceはローカル時刻とみなす）
+                archive_conditions.append("archived_at >= ?")
+                archive_params.append(since.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+
+            cursor.execute(f'''
+                SELECT {self.TASK_COLUMNS} FROM tasks WHERE {' AND '.join(hot_conditions)}
+                UNION ALL
+                SELECT {self.TASK_COLUMNS} FROM tasks_archive WHERE {' AND '.join(archive_conditions)}
+                ORDER BY created_at DESC
+            ''', hot_params + archive_params)
+
+            return [
+                Task(
+                    task_id=row[0],
+                    user_id=row[1],
+                    name=row[2],
+                    duration_minutes=row[3],
+                    repeat=bool(row[4]),
+                    status=row[5],
+                    created_at=datetime.fromisoformat(row[6]),
+                    due_date=row[7],
+                    priority=row[8] if row[8] else "normal",
+                    task_type=row[9] if row[9] else "daily"
+                )
+                for row in cursor.fetchall()
+            ]
+        except Exception as e:
+            print(f"[get_task_history] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+        finally:
+            if conn:
+                conn.close()
+
     def save_schedule_proposal(self, user_id: str, proposal_data: dict) -> bool:
         """スケジュール提案を保存"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # 古い提案を削除
@@ -473,7 +605,7 @@ class Database:
     def get_schedule_proposal(self, user_id: str) -> Optional[dict]:
         """スケジュール提案を取得"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -498,7 +630,7 @@ class Database:
                           notification_time: str = "08:00") -> bool:
         """ユーザー設定を保存"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -516,7 +648,7 @@ class Database:
     def get_user_settings(self, user_id: str) -> Optional[dict]:
         """ユーザー設定を取得"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -541,7 +673,7 @@ class Database:
     def register_user(self, user_id: str) -> bool:
         """ユーザーを登録（初回メッセージ時に呼び出し）"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # user_settingsテーブルにユーザーを登録（既に存在する場合は何もしない）
@@ -563,7 +695,7 @@ class Database:
         全ユーザーのuser_id一覧を取得（tasksテーブルとuser_settingsテーブルから一意に抽出）
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # tasksテーブルとuser_settingsテーブルの両方からユーザーIDを取得
@@ -587,7 +719,7 @@ class Database:
         """Google認証トークンを保存"""
         try:
             print(f"[save_token] 開始: user_id={user_id}, db_path={self.db_path}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -607,7 +739,7 @@ class Database:
         """Google認証トークンを取得"""
         try:
             print(f"[get_token] 開始: user_id={user_id}, db_path={self.db_path}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -632,7 +764,7 @@ class Database:
         """通知実行時刻を保存"""
         try:
             print(f"[save_notification_execution] 開始: type={notification_type}, time={execution_time}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -652,7 +784,7 @@ class Database:
         """最後の通知実行時刻を取得"""
         try:
             print(f"[get_last_notification_execution] 開始: type={notification_type}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -677,7 +809,7 @@ class Database:
         """ユーザーのチャネルIDを保存"""
         try:
             print(f"[save_user_channel] 開始: user_id={user_id}, channel_id={channel_id}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -697,7 +829,7 @@ class Database:
         """ユーザーのチャネルIDを取得"""
         try:
             print(f"[get_user_channel] 開始: user_id={user_id}")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -723,7 +855,7 @@ class Database:
         conn = None
         try:
             print(f"[get_all_user_channels] 開始")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -757,7 +889,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             state_data_json = json.dumps(state_data) if state_data else None
@@ -784,6 +916,56 @@ class Database:
             if conn:
                 conn.close()
 
+    def set_user_states(self, entries: List[dict]) -> bool:
+        """
+        複数ユーザーの状態を一括設定（1トランザクション）
+
+        Args:
+            entries: [{"user_id": ..., "state_type": ..., "state_data": {...}}, ...]
+
+        Returns:
+            bool: 成功時True
+        """
+        if not entries:
+            return True
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            current_time = datetime.now().isoformat()
+            cursor.executemany('''
+                INSERT INTO user_states (user_id, state_type, state_data, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, state_type)
+                DO UPDATE SET
+                    state_data = excluded.state_data,
+                    updated_at = excluded.updated_at
+            ''', [
+                (
+                    entry['user_id'],
+                    entry['state_type'],
+                    json.dumps(entry['state_data']) if entry.get('state_data') else None,
+                    current_time,
+                    current_time,
+                )
+                for entry in entries
+            ])
+
+            conn.commit()
+            print(f"[set_user_states] 状態一括設定: {len(entries)}件")
+            return True
+        except Exception as e:
+            print(f"[set_user_states] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
     def get_user_state(self, user_id: str, state_type: str) -> Optional[dict]:
         """
         ユーザーの状態を取得
@@ -797,7 +979,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -831,7 +1013,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -861,7 +1043,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -888,7 +1070,7 @@ class Database:
         conn = None
         try:
             cache_key = f"{model}:{prompt_hash}"
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # 有効期限内のキャッシュを取得
@@ -934,7 +1116,7 @@ class Database:
             # prompt_previewは最初の200文字のみ保存
             preview = prompt_preview[:200] if prompt_preview else ""
 
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # UPSERT操作（既存の場合は更新、存在しない場合は挿入）
@@ -963,11 +1145,69 @@ class Database:
             if conn:
                 conn.close()
 
+    def claim_openai_request(self, cache_key: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        OpenAI呼び出しの実行権を取得（同じキーの呼び出しを他のプロセスが実行中の場合はFalse）
+
+        期限切れの取得権（実行したプロセスが終了した場合など）は上書きして取得する。
+        """
+        conn = None
+        try:
+            from datetime import datetime, timedelta
+            now = datetime.now()
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO openai_inflight (cache_key, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE openai_inflight.expires_at <= ?
+            ''', (cache_key, owner, now + timedelta(seconds=ttl_seconds), now))
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            return claimed
+        except Exception as e:
+            print(f"[claim_openai_request] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            # 取得権を確認できない場合は呼び出し側で実行する
+            return True
+        finally:
+            if conn:
+                conn.close()
+
+    def release_openai_request(self, cache_key: str, owner: str) -> bool:
+        """OpenAI呼び出しの実行権を解放（自分が取得したものだけ）"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM openai_inflight WHERE cache_key = ? AND owner = ?',
+                (cache_key, owner)
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"[release_openai_request] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
     def cleanup_expired_cache(self) -> int:
         """期限切れのキャッシュを削除"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # 期限切れのキャッシュを削除
@@ -999,7 +1239,7 @@ class Database:
         """キャッシュ統計を取得"""
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # 総キャッシュ数
@@ -1065,7 +1305,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # 有効期限内のセッションデータを取得
@@ -1107,7 +1347,7 @@ class Database:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             # 有効期限を計算（SQLインジェクション対策：Python側で計算）
@@ -1142,35 +1382,45 @@ class Database:
             if conn:
                 conn.close()
 
-    def delete_user_session(self, user_id: str, session_type: str) -> bool:
+    def set_user_sessions(self, entries: List[dict], expires_hours: Optional[int] = None) -> bool:
         """
-        ユーザーセッションデータを削除
+        複数ユーザーのセッションデータを一括保存（1トランザクション）
 
         Args:
-            user_id: ユーザーID
-            session_type: セッションタイプ ('selected_tasks', 'schedule_proposal', 'future_task_selection')
+            entries: [{"user_id": ..., "session_type": ..., "data": ...}, ...]
+            expires_hours: 有効期限（時間）、Noneの場合は無期限
 
         Returns:
-            削除成功時True、失敗時False
+            保存成功時True、失敗時False
         """
+        if not entries:
+            return True
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
-            cursor.execute('''
-                DELETE FROM user_sessions
-                WHERE user_id = ? AND session_type = ?
-            ''', (user_id, session_type))
+            expires_at = None
+            if expires_hours is not None:
+                from datetime import timedelta
+                expires_at = (datetime.now() + timedelta(hours=expires_hours)).isoformat()
 
-            deleted_count = cursor.rowcount
-            conn.commit()
+            cursor.executemany('''
+                INSERT INTO user_sessions (user_id, session_type, data, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, session_type)
+                DO UPDATE SET
+                    data = excluded.data,
+                    expires_at = excluded.expires_at,
+                    created_at = CURRENT_TIMESTAMP
+            ''', [(entry['user_id'], entry['session_type'], entry['data'], expires_at) for entry in entries])
 
-            print(f"[delete_user_session] セッション削除: user_id={user_id}, type={session_type}, 削除数={deleted_count}")
+            conn.commit()
+            print(f"[set_user_sessions] セッション一括保存: {len(entries)}件, 期限={expires_at}")
             return True
 
         except Exception as e:
-            print(f"[delete_user_session] エラー: {e}")
+            print(f"[set_user_sessions] エラー: {e}")
             import traceback
             traceback.print_exc()
             if conn:
@@ -1180,16 +1430,110 @@ class Database:
             if conn:
                 conn.close()
 
-    def cleanup_expired_sessions(self) -> int:
+    def delete_user_session(self, user_id: str, session_type: str) -> bool:
         """
-        期限切れのセッションデータを削除
+        ユーザーセッションデータを削除
+
+        Args:
+            user_id: ユーザーID
+            session_type: セッションタイプ ('selected_tasks', 'schedule_proposal', 'future_task_selection')
+
+        Returns:
+            削除成功時True、失敗時False
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                DELETE FROM user_sessions
+                WHERE user_id = ? AND session_type = ?
+            ''', (user_id, session_type))
+
+            deleted_count = cursor.rowcount
+            conn.commit()
+
+            print(f"[delete_user_session] セッション削除: user_id={user_id}, type={session_type}, 削除数={deleted_count}")
+            return True
+
+        except Exception as e:
+            print(f"[delete_user_session] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def claim_user_session(self, user_id: str, session_type: str, claimed_type: str, expires_minutes: int = 10) -> bool:
+        """
+        ユーザーセッションデータを処理中のセッションタイプに移して実行権を取得（同じセッションを同時に処理しないため）
+
+        Args:
+            user_id: ユーザーID
+            session_type: 取得するセッションタイプ（例: 'schedule_proposal'）
+            claimed_type: 処理中のセッションタイプ（例: 'schedule_proposal_approving'）
+            expires_minutes: 処理中のセッションの有効期限（分）。処理が終わらずに停止した場合はこの時間で解放される
+
+        Returns:
+            取得できた場合True（既に他の処理が取得していた場合False）
+            取得を確認できない場合は呼び出し側で処理を続けるためTrue
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            from datetime import datetime, timedelta
+            now = datetime.now()
+            # 期限切れの処理中セッション（処理が停止した場合）を削除
+            cursor.execute('''
+                DELETE FROM user_sessions
+                WHERE user_id = ? AND session_type = ? AND expires_at <= ?
+            ''', (user_id, claimed_type, now.isoformat()))
+            cursor.execute('''
+                UPDATE user_sessions
+                SET session_type = ?, expires_at = ?, created_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND session_type = ?
+                AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+            ''', (claimed_type, (now + timedelta(minutes=expires_minutes)).isoformat(), user_id, session_type))
+
+            claimed = cursor.rowcount > 0
+            conn.commit()
+
+            print(f"[claim_user_session] セッション取得: user_id={user_id}, type={session_type}, 取得={claimed}")
+            return claimed
+
+        except sqlite3.IntegrityError:
+            # 処理中のセッションが既にある（他の処理が実行中）
+            if conn:
+                conn.rollback()
+            print(f"[claim_user_session] 処理中のセッションあり: user_id={user_id}, type={claimed_type}")
+            return False
+        except Exception as e:
+            print(f"[claim_user_session] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return True
+        finally:
+            if conn:
+                conn.close()
+
+    def cleanup_expired_sessions(self) -> int:
+        """
+        期限切れのセッションデータを削除
 
         Returns:
             削除したセッション数
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -1214,9 +1558,431 @@ class Database:
             if conn:
                 conn.close()
 
+    # TTLスイーパーの対象テーブルと期限切れの条件（読み取り側と同じ条件）
+    EXPIRED_ROW_CONDITIONS = {
+        'openai_cache': 'expires_at <= CURRENT_TIMESTAMP',
+        'user_sessions': 'expires_at IS NOT NULL AND expires_at <= CURRENT_TIMESTAMP',
+    }
+
+    def delete_expired_batch(self, table: str, batch_size: int) -> int:
+        """
+        期限切れの行を最大batch_size件削除（TTLスイーパー用）
+
+        1バッチを1トランザクションで削除するため、書き込みロックの保持はバッチ1回分で済む。
+
+        Args:
+            table: テーブル名（EXPIRED_ROW_CONDITIONS のキー）
+            batch_size: 1回に削除する最大件数
+
+        Returns:
+            削除した行数
+        """
+        condition = self.EXPIRED_ROW_CONDITIONS[table]
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            # expires_atのインデックスで対象のrowidを絞ってから削除する
+            cursor.execute(f'''
+                DELETE FROM {table}
+                WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT ?)
+            ''', (batch_size,))
+            deleted_count = cursor.rowcount
+            conn.commit()
+            return deleted_count
+
+        except Exception as e:
+            print(f"[delete_expired_batch] エラー: table={table}, {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def enqueue_outbox_messages(self, run_id: str, notification_type: str, entries: List[dict], status: str = 'pending') -> int:
+        """
+        通知をアウトボックスに登録（同じrun_id・user_idの既存行は上書きしない）
+
+        Args:
+            run_id: 送信実行ID（例: 'daily_task_notification:2024-01-01'）
+            notification_type: 通知タイプ
+            entries: {'user_id', 'channel_id', 'payload', 'retry_key'} の辞書リスト
+            status: 登録時の状態（'staged'は送信時刻まで保留、ドレイン対象外）
+
+        Returns:
+            新規登録した件数
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            inserted = 0
+            for entry in entries:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO notification_outbox
+                    (run_id, user_id, notification_type, channel_id, payload, retry_key, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (run_id, entry['user_id'], notification_type, entry.get('channel_id'),
+                      entry['payload'], entry['retry_key'], status))
+                inserted += cursor.rowcount
+
+            conn.commit()
+            print(f"[enqueue_outbox_messages] 登録: run_id={run_id}, 新規={inserted}件")
+            return inserted
+
+        except Exception as e:
+            print(f"[enqueue_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def get_outbox_user_ids(self, run_id: str) -> List[str]:
+        """指定した実行IDでアウトボックスに登録済みのユーザーIDを取得"""
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id FROM notification_outbox WHERE run_id = ?
+            ''', (run_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"[get_outbox_user_ids] エラー: {e}")
+            return []
+        finally:
+            if conn:
+                conn.close()
+
+    def get_pending_outbox_messages(self, run_id: Optional[str] = None, limit: int = 500, status: str = 'pending',
+                                    after: Optional[Tuple[str, str]] = None) -> List[dict]:
+        """
+        未送信の通知を取得
+
+        Args:
+            run_id: 実行ID（Noneの場合は全実行分）
+            limit: 最大取得件数
+            status: 取得する状態（事前作成分は'staged'）
+            after: この (run_id, user_id) より後の行だけを取得（ページ送り用）
+
+        Returns:
+            アウトボックス行の辞書リスト（run_id・user_id順）
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            query = '''
+                SELECT run_id, user_id, notification_type, channel_id, payload, retry_key, attempts
+                FROM notification_outbox
+                WHERE status = ?
+            '''
+            params = [status]
+            if run_id is not None:
+                query += " AND run_id = ?"
+                params.append(run_id)
+            if after is not None:
+                query += " AND (run_id > ? OR (run_id = ? AND user_id > ?))"
+                params.extend([after[0], after[0], after[1]])
+            query += " ORDER BY run_id, user_id LIMIT ?"
+            params.append(limit)
+
+            cursor.execute(query, params)
+            keys = ['run_id', 'user_id', 'notification_type', 'channel_id', 'payload', 'retry_key', 'attempts']
+            return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"[get_pending_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+        finally:
+            if conn:
+                conn.close()
+
+    def update_outbox_status(self, run_id: str, user_id: str, status: str, error: Optional[str] = None) -> bool:
+        """
+        アウトボックス行の状態を更新し、試行回数を加算
+
+        Args:
+            run_id: 実行ID
+            user_id: ユーザーID
+            status: 'pending' / 'sent' / 'failed'
+            error: 最後のエラー内容
+
+        Returns:
+            更新成功時True
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notification_outbox
+                SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE run_id = ? AND user_id = ?
+            ''', (status, error, run_id, user_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            print(f"[update_outbox_status] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def release_outbox_message(self, run_id: str, user_id: str, payload: Optional[str] = None) -> bool:
+        """
+        事前作成（staged）の通知を送信待ち（pending）にする
+
+        Args:
+            run_id: 実行ID
+            user_id: ユーザーID
+            payload: 再作成した送信内容（Noneの場合は事前作成分をそのまま使う）
+
+        Returns:
+            更新成功時True
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notification_outbox
+                SET status = 'pending', payload = COALESCE(?, payload), updated_at = CURRENT_TIMESTAMP
+                WHERE run_id = ? AND user_id = ? AND status = 'staged'
+            ''', (payload, run_id, user_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            print(f"[release_outbox_message] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def release_outbox_messages(self, run_id: str) -> int:
+        """
+        実行IDの事前作成（staged）の通知を全て送信待ち（pending）にする（1回のUPDATE）
+
+        Returns:
+            送信待ちにした件数
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notification_outbox
+                SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                WHERE run_id = ? AND status = 'staged'
+            ''', (run_id,))
+            conn.commit()
+            return cursor.rowcount
+
+        except Exception as e:
+            print(f"[release_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def get_outbox_counts(self, run_id: Optional[str] = None) -> dict:
+        """
+        アウトボックスの状態別件数を取得（運用確認用）
+
+        Returns:
+            {'staged': n, 'pending': n, 'sent': n, 'failed': n}
+        """
+        conn = None
+        counts = {'staged': 0, 'pending': 0, 'sent': 0, 'failed': 0}
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            if run_id is not None:
+                cursor.execute('''
+                    SELECT status, COUNT(*) FROM notification_outbox WHERE run_id = ? GROUP BY status
+                ''', (run_id,))
+            else:
+                cursor.execute('''
+                    SELECT status, COUNT(*) FROM notification_outbox GROUP BY status
+                ''')
+            for status, count in cursor.fetchall():
+                counts[status] = count
+            return counts
+
+        except Exception as e:
+            print(f"[get_outbox_counts] エラー: {e}")
+            return counts
+        finally:
+            if conn:
+                conn.close()
+
+    def get_calendar_sync_state(self, user_id: str) -> Optional[dict]:
+        """
+        カレンダーミラーの同期状態を取得
+
+        Returns:
+            {'sync_token', 'window_start', 'window_end', 'synced_at', 'prefetched'}。未同期の場合はNone
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sync_token, window_start, window_end, synced_at, prefetched FROM calendar_sync_state WHERE user_id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {
+                'sync_token': row[0],
+                'window_start': row[1],
+                'window_end': row[2],
+                'synced_at': datetime.fromisoformat(row[3]),
+                'prefetched': bool(row[4]),
+            }
+        except Exception as e:
+            print(f"[get_calendar_sync_state] エラー: {e}")
+            return None
+        finally:
+            if conn:
+                conn.close()
+
+    def apply_calendar_sync(self, user_id: str, events: List[dict], deleted_ids: List[str],
+                            sync_token: Optional[str], window_start: str, window_end: str, full: bool,
+                            prefetched: bool = False) -> bool:
+        """
+        カレンダーの同期結果をミラーに反映（1トランザクション）
+
+        Args:
+            events: 追加・更新されたイベント（calendar_mirror.event_to_row の形）
+            deleted_ids: 削除されたイベントのID
+            sync_token: 次回の差分同期に使うトークン（返されなかった場合はNone）
+            window_start, window_end: ミラーが保持している期間（UTCのキー）
+            full: 全件同期の場合True（既存のミラーを置き換える）
+            prefetched: 朝の通知後の事前同期（CalendarPrefetcher）による同期の場合True
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            if full:
+                cursor.execute('DELETE FROM calendar_events WHERE user_id = ?', (user_id,))
+            self._upsert_calendar_events(cursor, user_id, events)
+            if deleted_ids:
+                cursor.executemany(
+                    'DELETE FROM calendar_events WHERE user_id = ? AND event_id = ?',
+                    [(user_id, event_id) for event_id in deleted_ids]
+                )
+            cursor.execute('''
+                INSERT INTO calendar_sync_state (user_id, sync_token, window_start, window_end, synced_at, prefetched)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    sync_token = excluded.sync_token,
+                    window_start = excluded.window_start,
+                    window_end = excluded.window_end,
+                    synced_at = excluded.synced_at,
+                    prefetched = excluded.prefetched
+            ''', (user_id, sync_token, window_start, window_end, datetime.now().isoformat(), prefetched))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"[apply_calendar_sync] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def save_calendar_events(self, user_id: str, events: List[dict]) -> bool:
+        """自分で追加したイベントをミラーに反映（同期状態は変えない）"""
+        if not events:
+            return True
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            self._upsert_calendar_events(cursor, user_id, events)
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"[save_calendar_events] エラー: {e}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def _upsert_calendar_events(self, cursor, user_id: str, events: List[dict]):
+        cursor.executemany(f'''
+            INSERT INTO calendar_events (user_id, {', '.join(CALENDAR_EVENT_COLUMNS)}, updated_at)
+            VALUES (?, {', '.join('?' for _ in CALENDAR_EVENT_COLUMNS)}, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, event_id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in CALENDAR_EVENT_COLUMNS[1:])},
+                updated_at = CURRENT_TIMESTAMP
+        ''', [(user_id, *(event[column] for column in CALENDAR_EVENT_COLUMNS)) for event in events])
+
+    def get_calendar_events(self, user_id: str, time_min: datetime, time_max: datetime) -> List[dict]:
+        """
+        ミラーから期間と重なる予定を開始時刻順に取得
+
+        Returns:
+            Calendar APIの events().list と同じ形のイベントのリスト
+        """
+        conn = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {', '.join(CALENDAR_EVENT_COLUMNS)} FROM calendar_events
+                WHERE user_id = ? AND start_at < ? AND end_at > ?
+                ORDER BY start_at, event_id
+            ''', (user_id, to_utc_key(time_max), to_utc_key(time_min)))
+            return [row_to_event(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"[get_calendar_events] エラー: {e}")
+            return []
+        finally:
+            if conn:
+                conn.close()
+
 # グローバルデータベースインスタンス
 db = None
 
+def _instrument_db(instance):
+    """DBメソッドごとの実行時間をメトリクスに記録する"""
+    from utils.metrics import DB_QUERY_DURATION, instrument_methods
+    return instrument_methods(instance, DB_QUERY_DURATION, "method")
+
 def init_db():
     """データベースの初期化（PostgreSQL優先、SQLiteフォールバック）"""
     global db
@@ -1228,7 +1994,7 @@ def init_db():
                 postgres_db = init_postgres_db()
                 if postgres_db.Session:
                     print("[init_db] PostgreSQLデータベースを使用")
-                    db = postgres_db
+                    db = _instrument_db(postgres_db)
                     return db
                 else:
                     print("[init_db] PostgreSQLセッションが作成されませんでした")
@@ -1241,8 +2007,33 @@ def init_db():
         
         # SQLiteフォールバック
         print("[init_db] SQLiteデータベースを使用")
-        db = Database()
+        db = _instrument_db(Database())
         print(f"[init_db] 新しいデータベースインスタンスを作成: {db.db_path}")
     else:
         print(f"[init_db] 既存のデータベースインスタンスを再利用")
-    return db 
\ No newline at end of file
+    return db 
+
+
+@contextmanager
+def unit_of_work():
+    """
+    ブロック内のDB操作を1つの接続・1回のコミットにまとめる（PostgreSQL使用時）
+
+    SQLiteではメソッドごとの接続のまま何もしない。
+    """
+    instance = db if db is not None else init_db()
+    if getattr(instance, "Session", None) is None:
+        yield
+        return
+
+    from models.postgres_database import unit_of_work as postgres_unit_of_work
+    with postgres_unit_of_work(instance):
+        yield
+
+
+def commit_unit_of_work():
+    """現在のユニットオブワークをここまでコミット（スコープ外・SQLiteでは何もしない）"""
+    if db is None or getattr(db, "Session", None) is None:
+        return
+    from models.postgres_database import commit_current_unit_of_work
+    commit_current_unit_of_work()
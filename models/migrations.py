@@ -0,0 +1,493 @@
+"""
+スキーマのバージョン管理（マイグレーション）
+
+schema_version テーブルに適用済みのバージョンを記録し、未適用のマイグレーションだけを順番に適用する。
+適用はロック（SQLite: BEGIN IMMEDIATE / PostgreSQL: アドバイザリロック）の中で行い、
+ロック取得後にバージョンを再確認するため、複数ワーカーが同時に起動しても1回だけ実行される。
+適用済みの環境での起動時は SELECT MAX(version) の1文だけで済む。
+
+スキーマを変更する場合は、既存のマイグレーションは変更せずに
+SQLITE_MIGRATIONS / POSTGRES_MIGRATIONS の末尾に新しいバージョンを追加する。
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+# PostgreSQLのアドバイザリロックのキー（任意の固定値）
+MIGRATION_LOCK_KEY = 7_301_428_001
+
+SCHEMA_VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+# ---- SQLite ----
+
+def _sqlite_initial_schema(cursor):
+    """初期スキーマ（schema_version導入前に作成済みのDBでもそのまま適用できる）"""
+    # タスクテーブルの作成（task_typeカラムを追加）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            repeat BOOLEAN NOT NULL,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            due_date TEXT,
+            priority TEXT DEFAULT 'normal',
+            task_type TEXT DEFAULT 'daily'
+        )
+    ''')
+
+    # 既存のテーブルにtask_typeカラムが存在しない場合は追加
+    try:
+        cursor.execute('ALTER TABLE tasks ADD COLUMN task_type TEXT DEFAULT "daily"')
+        print("[migrations] task_typeカラムを追加しました")
+    except sqlite3.OperationalError:
+        print("[migrations] task_typeカラムは既に存在します")
+
+    # 既存のテーブルにpriorityカラムが存在しない場合は追加
+    try:
+        cursor.execute('ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT "normal"')
+        print("[migrations] priorityカラムを追加しました")
+    except sqlite3.OperationalError:
+        print("[migrations] priorityカラムは既に存在します")
+
+    # 未来タスクテーブルの作成
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS future_tasks (
+            task_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            priority TEXT DEFAULT 'normal',
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            category TEXT DEFAULT 'investment'
+        )
+    ''')
+
+    # スケジュール提案テーブルの作成
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_proposals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            proposal_data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ユーザー設定テーブルの作成
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id TEXT PRIMARY KEY,
+            calendar_id TEXT,
+            notification_time TEXT DEFAULT '08:00',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # tokensテーブルの作成
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tokens (
+            user_id TEXT PRIMARY KEY,
+            token_json TEXT NOT NULL
+        )
+    ''')
+
+    # notification_executionsテーブルの作成（重複実行防止用）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notification_executions (
+            notification_type TEXT PRIMARY KEY,
+            last_execution_time TEXT NOT NULL
+        )
+    ''')
+
+    # user_channelsテーブルの作成（ユーザーとチャネルIDの関連付け）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_channels (
+            user_id TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # user_statesテーブルの作成（ユーザーの状態管理：フラグファイルの代替）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id TEXT NOT NULL,
+            state_type TEXT NOT NULL,
+            state_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, state_type)
+        )
+    ''')
+
+    # openai_cacheテーブルの作成（OpenAI APIレスポンスのキャッシュ）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS openai_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            prompt_hash TEXT NOT NULL,
+            prompt_preview TEXT,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            hit_count INTEGER DEFAULT 0
+        )
+    ''')
+
+    # expires_atにインデックスを作成（クリーンアップクエリの高速化）
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_openai_cache_expires_at
+        ON openai_cache(expires_at)
+    ''')
+
+    # user_sessionsテーブルの作成（一時ファイルの代替）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            session_type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP,
+            UNIQUE(user_id, session_type)
+        )
+    ''')
+
+    # user_sessionsテーブルのインデックス作成
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id
+        ON user_sessions(user_id)
+    ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at
+        ON user_sessions(expires_at)
+    ''')
+
+    # notification_outboxテーブルの作成（一斉通知の送信待ち行列）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            run_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            notification_type TEXT NOT NULL,
+            channel_id TEXT,
+            payload TEXT NOT NULL,
+            retry_key TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, user_id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_status
+        ON notification_outbox(status)
+    ''')
+
+
+def _sqlite_tasks_archive(cursor):
+    """アーカイブ済みタスクの保管テーブル（tasksにはアクティブなタスクだけを残す）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            task_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            repeat BOOLEAN NOT NULL,
+            status TEXT,
+            created_at TIMESTAMP,
+            due_date TEXT,
+            priority TEXT DEFAULT 'normal',
+            task_type TEXT DEFAULT 'daily',
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_archive_user_archived_at
+        ON tasks_archive(user_id, archived_at)
+    ''')
+    # アクティブなタスクの取得（user_id, status, task_type）をインデックスで引く
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status_type
+        ON tasks(user_id, status, task_type)
+    ''')
+
+
+def _sqlite_user_stats_weekly(cursor):
+    """ユーザーごとのISO週の完了・アーカイブ集計（週次レポート用）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats_weekly (
+            user_id TEXT NOT NULL,
+            iso_week TEXT NOT NULL,
+            completed_count INTEGER DEFAULT 0,
+            completed_minutes INTEGER DEFAULT 0,
+            archived_count INTEGER DEFAULT 0,
+            archived_minutes INTEGER DEFAULT 0,
+            top_tasks TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, iso_week)
+        )
+    ''')
+
+
+def _sqlite_calendar_mirror(cursor):
+    """Googleカレンダーの予定のローカルミラーと、ユーザーごとの同期状態（syncToken）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            user_id TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            summary TEXT,
+            description TEXT,
+            start_raw TEXT NOT NULL,
+            end_raw TEXT NOT NULL,
+            all_day BOOLEAN NOT NULL DEFAULT 0,
+            start_at TEXT NOT NULL,
+            end_at TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, event_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_calendar_events_user_start ON calendar_events (user_id, start_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calendar_sync_state (
+            user_id TEXT PRIMARY KEY,
+            sync_token TEXT,
+            window_start TEXT NOT NULL,
+            window_end TEXT NOT NULL,
+            synced_at TIMESTAMP NOT NULL
+        )
+    ''')
+
+
+def _sqlite_openai_inflight(cursor):
+    """実行中のOpenAI呼び出しの取得権（プロセス間で同じプロンプトの呼び出しを1回にまとめる）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS openai_inflight (
+            cache_key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+    ''')
+
+
+def _sqlite_calendar_prefetched(cursor):
+    """同期状態に事前同期（CalendarPrefetcher）による同期かを記録する"""
+    cursor.execute('ALTER TABLE calendar_sync_state ADD COLUMN prefetched BOOLEAN NOT NULL DEFAULT 0')
+
+
+# (バージョン, 説明, 適用関数(cursor))
+SQLITE_MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "initial schema", _sqlite_initial_schema),
+    (2, "tasks archive", _sqlite_tasks_archive),
+    (3, "user stats weekly", _sqlite_user_stats_weekly),
+    (4, "calendar mirror", _sqlite_calendar_mirror),
+    (5, "openai inflight claims", _sqlite_openai_inflight),
+    (6, "calendar prefetched marker", _sqlite_calendar_prefetched),
+]
+
+
+def _sqlite_version(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0  # schema_versionテーブルがない
+    return row[0] or 0
+
+
+def apply_sqlite_migrations(conn: sqlite3.Connection) -> int:
+    """
+    未適用のマイグレーションを適用
+
+    Args:
+        conn: SQLite接続
+
+    Returns:
+        int: 適用後のスキーマバージョン
+    """
+    latest = SQLITE_MIGRATIONS[-1][0]
+    version = _sqlite_version(conn)
+    if version >= latest:
+        return version
+
+    # 書き込みロックを取ってから再確認（他のワーカーが適用済みの場合は何もしない）
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(SCHEMA_VERSION_DDL)
+        version = _sqlite_version(conn)
+        cursor = conn.cursor()
+        for migration_version, description, migrate in SQLITE_MIGRATIONS:
+            if migration_version <= version:
+                continue
+            print(f"[migrations] SQLite v{migration_version} 適用開始: {description}")
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (migration_version, description)
+            )
+            version = migration_version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"[migrations] SQLiteスキーマバージョン: v{version}")
+    return version
+
+
+# ---- PostgreSQL ----
+
+def _postgres_initial_schema(conn):
+    """初期スキーマ（schema_version導入前に作成済みのDBでもそのまま適用できる）"""
+    from sqlalchemy import inspect, text
+    from models.postgres_database import (
+        NotificationExecutionModel,
+        NotificationOutboxModel,
+        OpenAICacheModel,
+        ScheduleProposalModel,
+        TaskModel,
+        TokenModel,
+        UserChannelModel,
+        UserSessionModel,
+        UserSettingsModel,
+        UserStateModel,
+    )
+
+    for model in (
+        TaskModel,
+        TokenModel,
+        NotificationExecutionModel,
+        UserChannelModel,
+        ScheduleProposalModel,
+        UserSettingsModel,
+        UserStateModel,
+        OpenAICacheModel,
+        UserSessionModel,
+        NotificationOutboxModel,
+    ):
+        model.__table__.create(conn, checkfirst=True)
+
+    # 古いuser_statesテーブルに不足しているカラムを追加
+    existing_columns = {col['name'] for col in inspect(conn).get_columns('user_states')}
+    if 'state_data' not in existing_columns:
+        conn.execute(text('ALTER TABLE user_states ADD COLUMN state_data TEXT'))
+        print("[migrations] user_states.state_dataカラムを追加しました")
+    if 'updated_at' not in existing_columns:
+        conn.execute(text('ALTER TABLE user_states ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'))
+        print("[migrations] user_states.updated_atカラムを追加しました")
+
+
+def _postgres_expires_at_indexes(conn):
+    """TTLスイーパーが期限切れの行をインデックスで探せるようにする（SQLiteは初期スキーマで作成済み）"""
+    from sqlalchemy import text
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_openai_cache_expires_at ON openai_cache (expires_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions (expires_at)'))
+
+
+def _postgres_tasks_archive(conn):
+    """アーカイブ済みタスクの保管テーブル（tasksにはアクティブなタスクだけを残す）"""
+    from sqlalchemy import text
+    from models.postgres_database import TaskArchiveModel
+    TaskArchiveModel.__table__.create(conn, checkfirst=True)
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_tasks_archive_user_archived_at ON tasks_archive (user_id, archived_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_tasks_user_status_type ON tasks (user_id, status, task_type)'))
+
+
+def _postgres_user_stats_weekly(conn):
+    """ユーザーごとのISO週の完了・アーカイブ集計（週次レポート用）"""
+    from models.postgres_database import UserStatsWeeklyModel
+    UserStatsWeeklyModel.__table__.create(conn, checkfirst=True)
+
+
+def _postgres_calendar_mirror(conn):
+    """Googleカレンダーの予定のローカルミラーと、ユーザーごとの同期状態（syncToken）"""
+    from sqlalchemy import text
+    from models.postgres_database import CalendarEventModel, CalendarSyncStateModel
+    CalendarEventModel.__table__.create(conn, checkfirst=True)
+    CalendarSyncStateModel.__table__.create(conn, checkfirst=True)
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_calendar_events_user_start ON calendar_events (user_id, start_at)'))
+
+
+def _postgres_openai_inflight(conn):
+    """実行中のOpenAI呼び出しの取得権（プロセス間で同じプロンプトの呼び出しを1回にまとめる）"""
+    from models.postgres_database import OpenAIInflightModel
+    OpenAIInflightModel.__table__.create(conn, checkfirst=True)
+
+
+def _postgres_calendar_prefetched(conn):
+    """同期状態に事前同期（CalendarPrefetcher）による同期かを記録する"""
+    from sqlalchemy import inspect, text
+    # 新規のDBではv5でモデルから作成したテーブルに既にある
+    if 'prefetched' not in {col['name'] for col in inspect(conn).get_columns('calendar_sync_state')}:
+        conn.execute(text('ALTER TABLE calendar_sync_state ADD COLUMN prefetched BOOLEAN NOT NULL DEFAULT FALSE'))
+
+
+# (バージョン, 説明, 適用関数(SQLAlchemy Connection))
+POSTGRES_MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "initial schema", _postgres_initial_schema),
+    (2, "expires_at indexes", _postgres_expires_at_indexes),
+    (3, "tasks archive", _postgres_tasks_archive),
+    (4, "user stats weekly", _postgres_user_stats_weekly),
+    (5, "calendar mirror", _postgres_calendar_mirror),
+    (6, "openai inflight claims", _postgres_openai_inflight),
+    (7, "calendar prefetched marker", _postgres_calendar_prefetched),
+]
+
+
+def _postgres_version(conn) -> int:
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except DBAPIError:
+        conn.rollback()
+        return 0  # schema_versionテーブルがない
+
+
+def apply_postgres_migrations(engine) -> int:
+    """
+    未適用のマイグレーションを適用
+
+    Args:
+        engine: SQLAlchemyエンジン
+
+    Returns:
+        int: 適用後のスキーマバージョン
+    """
+    from sqlalchemy import text
+
+    latest = POSTGRES_MIGRATIONS[-1][0]
+    with engine.connect() as conn:
+        version = _postgres_version(conn)
+    if version >= latest:
+        return version
+
+    with engine.begin() as conn:
+        # トランザクション終了まで保持されるロックで他のワーカーの適用を待つ
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.execute(text(SCHEMA_VERSION_DDL))
+        version = _postgres_version(conn)
+        for migration_version, description, migrate in POSTGRES_MIGRATIONS:
+            if migration_version <= version:
+                continue
+            print(f"[migrations] PostgreSQL v{migration_version} 適用開始: {description}")
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                {"version": migration_version, "description": description}
+            )
+            version = migration_version
+    print(f"[migrations] PostgreSQLスキーマバージョン: v{version}")
+    return version
@@ -1,15 +1,25 @@
+import contextvars
 import os
+import threading
+from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
-from sqlalchemy import create_engine, Column, String, Text, Integer, Boolean, DateTime
+from sqlalchemy import create_engine, event, Column, String, Text, Integer, Boolean, DateTime, and_, or_
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from models.calendar_mirror import CALENDAR_EVENT_COLUMNS, row_to_event, to_utc_key
+from models.weekly_stats import WEEKLY_STAT_STATUSES, iso_week_key, merge_top_tasks, stats_row_to_dict
+from utils.metrics import register_before_upstream
 
 Base = declarative_base()
 
+# 現在のユニットオブワーク（unit_of_work() のスコープ内のみ設定される）
+_current_unit_of_work: contextvars.ContextVar = contextvars.ContextVar("db_unit_of_work", default=None)
+
 class TaskModel(Base):
     """タスクモデル（SQLAlchemy）"""
     __tablename__ = 'tasks'
@@ -25,6 +35,62 @@ class TaskModel(Base):
     priority = Column(String, default='normal')
     task_type = Column(String, default='daily')
 
+class TaskArchiveModel(Base):
+    """アーカイブ済みタスクモデル（SQLAlchemy）。アクティブでなくなったタスクをtasksから移動して保管する"""
+    __tablename__ = 'tasks_archive'
+
+    task_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    duration_minutes = Column(Integer, nullable=False)
+    repeat = Column(Boolean, nullable=False)
+    status = Column(String)
+    created_at = Column(DateTime)
+    due_date = Column(String)
+    priority = Column(String, default='normal')
+    task_type = Column(String, default='daily')
+    archived_at = Column(DateTime, default=datetime.now)
+
+class UserStatsWeeklyModel(Base):
+    """ユーザーごとのISO週の完了・アーカイブ集計モデル（SQLAlchemy）"""
+    __tablename__ = 'user_stats_weekly'
+
+    user_id = Column(String, primary_key=True)
+    iso_week = Column(String, primary_key=True)
+    completed_count = Column(Integer, default=0)
+    completed_minutes = Column(Integer, default=0)
+    archived_count = Column(Integer, default=0)
+    archived_minutes = Column(Integer, default=0)
+    top_tasks = Column(Text)
+    updated_at = Column(DateTime, default=datetime.now)
+
+class CalendarEventModel(Base):
+    """Googleカレンダーの予定のローカルミラーモデル（SQLAlchemy）"""
+    __tablename__ = 'calendar_events'
+
+    user_id = Column(String, primary_key=True)
+    event_id = Column(String, primary_key=True)
+    summary = Column(Text)
+    description = Column(Text)
+    start_raw = Column(String, nullable=False)
+    end_raw = Column(String, nullable=False)
+    all_day = Column(Boolean, nullable=False, default=False)
+    start_at = Column(String, nullable=False)
+    end_at = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now)
+
+class CalendarSyncStateModel(Base):
+    """カレンダーミラーの同期状態モデル（SQLAlchemy）"""
+    __tablename__ = 'calendar_sync_state'
+
+    user_id = Column(String, primary_key=True)
+    sync_token = Column(Text)
+    window_start = Column(String, nullable=False)
+    window_end = Column(String, nullable=False)
+    synced_at = Column(DateTime, nullable=False)
+    # 最後の同期が朝の通知後の事前同期（CalendarPrefetcher）によるものか
+    prefetched = Column(Boolean, nullable=False, default=False)
+
 class TokenModel(Base):
     """トークンモデル（SQLAlchemy）"""
     __tablename__ = 'tokens'
@@ -89,6 +155,14 @@ class OpenAICacheModel(Base):
     hit_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.now)
 
+class OpenAIInflightModel(Base):
+    """実行中のOpenAI呼び出しの取得権モデル（SQLAlchemy）"""
+    __tablename__ = 'openai_inflight'
+
+    cache_key = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
 class UserSessionModel(Base):
     """ユーザーセッションモデル（SQLAlchemy）"""
     __tablename__ = 'user_sessions'
@@ -99,6 +173,22 @@ class UserSessionModel(Base):
     expires_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.now)
 
+class NotificationOutboxModel(Base):
+    """通知アウトボックスモデル（SQLAlchemy）"""
+    __tablename__ = 'notification_outbox'
+
+    run_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    notification_type = Column(String, nullable=False)
+    channel_id = Column(String)
+    payload = Column(Text, nullable=False)
+    retry_key = Column(String, nullable=False)
+    status = Column(String, default='pending', index=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 class Task:
     """タスクモデルクラス（互換性維持）"""
     def __init__(self, task_id: str, user_id: str, name: str, duration_minutes: int, 
@@ -115,6 +205,139 @@ class Task:
         self.priority = priority
         self.task_type = task_type
 
+class _UnitOfWork:
+    """1リクエスト（または1ジョブ単位）で共有するセッション"""
+
+    def __init__(self, database: "PostgreSQLDatabase"):
+        self.database = database
+        self.thread_id = threading.get_ident()
+        self.session = database.Session()
+        # 共有セッションの接続でSQLが失敗したか（PostgreSQLではトランザクションが使えなくなる）
+        self.statement_failed = False
+
+    def scoped_session(self, write: bool = False) -> "_ScopedSession":
+        return _ScopedSession(self, write)
+
+    def commit(self):
+        """ここまでの変更をコミット（次の操作で新しいトランザクションを開始する）"""
+        if self.statement_failed:
+            # 失敗したSQLの後のCOMMITはPostgreSQLではROLLBACKになるため、明示的に取り消す
+            self.discard_after_error()
+            return
+        try:
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def discard_after_error(self):
+        """読み取りの失敗で使えなくなったトランザクションを取り消す"""
+        print("[unit_of_work] 読み取りエラーのためトランザクションを取り消し（前回のコミット以降の書き込みを含む）")
+        self.statement_failed = False
+        self.session.rollback()
+
+
+class _ScopedSession:
+    """
+    ユニットオブワーク内で各メソッドに渡すセッション
+
+    書き込むメソッド（write=True）の commit() / rollback() / close() はメソッドごとのセーブポイントに対して行い、
+    1つのメソッドが失敗しても、そのメソッドの変更だけが取り消される（従来と同じ）。
+    読み取りだけのメソッドはセーブポイントを使わず、SQLの往復を増やさない。
+    実際のCOMMITはスコープ終了時と、外部APIの呼び出し前（commit_current_unit_of_work）に行う。
+    """
+
+    def __init__(self, unit: _UnitOfWork, write: bool = False):
+        self._unit = unit
+        self._session = unit.session
+        if unit.statement_failed:
+            # 前のメソッドが失敗したSQLを取り消さずに終わった場合
+            unit.discard_after_error()
+        self._savepoint = self._session.begin_nested() if write else None
+        self._finished = False
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def commit(self):
+        if self._finished:
+            return
+        if self._savepoint is not None:
+            self._savepoint.commit()
+            # 一括UPDATEなどで変わった行を、後のメソッドが古い値のまま読まないようにする
+            self._session.expire_all()
+        else:
+            self._session.flush()
+        self._finished = True
+
+    def rollback(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._savepoint is not None:
+            # flush失敗後はis_activeがFalseになるが、セーブポイントのロールバックは必要
+            self._savepoint.rollback()
+            self._unit.statement_failed = False
+            self._session.expire_all()
+        elif self._unit.statement_failed:
+            self._unit.discard_after_error()
+
+    def close(self):
+        # コミットされなかった変更は従来どおり破棄する
+        self.rollback()
+
+
+@event.listens_for(Engine, "handle_error")
+def _mark_unit_of_work_error(context):
+    """ユニットオブワークのスレッドでSQLが失敗したことを記録（読み取りメソッドの終了時に取り消す）"""
+    unit = _current_unit_of_work.get()
+    if unit is not None and unit.thread_id == threading.get_ident():
+        unit.statement_failed = True
+
+
+@contextmanager
+def unit_of_work(database: "PostgreSQLDatabase"):
+    """
+    ブロック内のDB操作で1つの接続を共有し、コミットをまとめる
+
+    スコープ外（および別スレッド）からのメソッド呼び出しは従来どおりメソッドごとのセッションを使う。
+    既にスコープ内の場合は外側のスコープにまとめる。例外で抜けた場合はコミット済みでない分をロールバックする。
+    外部API（LINE / Google / OpenAI）の呼び出し前にはそこまでをコミットし、
+    行ロックを持ったまま・トランザクションを開いたまま外部の応答を待たない（commit_current_unit_of_work）。
+    """
+    if not database.Session or _current_unit_of_work.get() is not None:
+        yield
+        return
+
+    unit = _UnitOfWork(database)
+    token = _current_unit_of_work.set(unit)
+    try:
+        yield
+        unit.commit()
+    except Exception:
+        unit.session.rollback()
+        raise
+    finally:
+        _current_unit_of_work.reset(token)
+        unit.session.close()
+
+
+def commit_current_unit_of_work():
+    """
+    現在のスレッドのユニットオブワークをここまでコミット（スコープ外・別スレッドでは何もしない）
+
+    ユーザーへの返信より前に書き込みを確定させ、コミットの失敗を返信前のエラーとして扱えるようにする。
+    """
+    unit = _current_unit_of_work.get()
+    if unit is None or unit.thread_id != threading.get_ident():
+        return
+    unit.commit()
+
+
+# 外部APIの呼び出し（utils.metrics.track(UPSTREAM_DURATION)）の前にコミットする
+register_before_upstream(commit_current_unit_of_work)
+
+
 class PostgreSQLDatabase:
     """PostgreSQLデータベース操作クラス"""
     
@@ -143,98 +366,20 @@ class PostgreSQLDatabase:
                 pool_pre_ping=True,  # 接続が有効かチェック
                 pool_recycle=3600  # 1時間で接続をリサイクル
             )
+            from utils.query_profiler import install_engine_hooks
+            install_engine_hooks(self.engine)
             self.Session = sessionmaker(bind=self.engine)
-            
-            # テーブル作成
-            print("[PostgreSQLDatabase] テーブル作成開始...")
-            Base.metadata.create_all(self.engine)
-            print("[PostgreSQLDatabase] テーブル作成完了")
-            
-            # 作成されたテーブルを確認
-            from sqlalchemy import inspect
-            inspector = inspect(self.engine)
-            tables = inspector.get_table_names()
-            print(f"[PostgreSQLDatabase] 作成されたテーブル: {tables}")
-            
-            print("[PostgreSQLDatabase] PostgreSQL接続完了")
-            
-            # テーブル作成を確実にするため、明示的に実行
-            self._ensure_tables_exist()
-            
+
+            # 未適用のマイグレーションだけを適用（適用済みならバージョン確認の1文のみ）
+            from models.migrations import apply_postgres_migrations
+            version = apply_postgres_migrations(self.engine)
+            print(f"[PostgreSQLDatabase] PostgreSQL接続完了 (schema v{version})")
+
         except Exception as e:
             print(f"[PostgreSQLDatabase] PostgreSQL接続エラー: {e}")
             print("[PostgreSQLDatabase] SQLiteにフォールバック")
             self._fallback_to_sqlite()
-    
-    def _ensure_tables_exist(self):
-        """テーブルの存在を確認し、必要に応じて作成"""
-        try:
-            if not self.engine:
-                print("[_ensure_tables_exist] エンジンが初期化されていません")
-                return
-            
-            # 各テーブルを明示的に作成
-            tables_to_create = [
-                TaskModel.__table__,
-                TokenModel.__table__,
-                NotificationExecutionModel.__table__,
-                UserChannelModel.__table__,
-                ScheduleProposalModel.__table__,
-                UserSettingsModel.__table__,
-                UserStateModel.__table__,
-                OpenAICacheModel.__table__,
-                UserSessionModel.__table__
-            ]
-            
-            for table in tables_to_create:
-                try:
-                    table.create(self.engine, checkfirst=True)
-                    print(f"[_ensure_tables_exist] テーブル作成確認: {table.name}")
-                except Exception as e:
-                    print(f"[_ensure_tables_exist] テーブル作成エラー {table.name}: {e}")
-            
-            # カラムのマイグレーション処理
-            self._migrate_columns()
-
-            # 最終確認
-            from sqlalchemy import inspect
-            inspector = inspect(self.engine)
-            tables = inspector.get_table_names()
-            print(f"[_ensure_tables_exist] 最終テーブル一覧: {tables}")
-
-        except Exception as e:
-            print(f"[_ensure_tables_exist] テーブル確認エラー: {e}")
 
-    def _migrate_columns(self):
-        """既存テーブルに不足しているカラムを追加"""
-        try:
-            from sqlalchemy import inspect, text
-            inspector = inspect(self.engine)
-
-            # user_statesテーブルのカラムを確認
-            if 'user_states' in inspector.get_table_names():
-                existing_columns = {col['name'] for col in inspector.get_columns('user_states')}
-                print(f"[_migrate_columns] user_states既存カラム: {existing_columns}")
-
-                # state_dataカラムが存在しない場合は追加
-                if 'state_data' not in existing_columns:
-                    with self.engine.connect() as conn:
-                        conn.execute(text('ALTER TABLE user_states ADD COLUMN state_data TEXT'))
-                        conn.commit()
-                        print(f"[_migrate_columns] user_states.state_dataカラムを追加しました")
-
-                # updated_atカラムが存在しない場合は追加
-                if 'updated_at' not in existing_columns:
-                    with self.engine.connect() as conn:
-                        conn.execute(text('ALTER TABLE user_states ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'))
-                        conn.commit()
-                        print(f"[_migrate_columns] user_states.updated_atカラムを追加しました")
-
-        except Exception as e:
-            print(f"[_migrate_columns] マイグレーションエラー: {e}")
-            import traceback
-            traceback.print_exc()
-    
     def _fallback_to_sqlite(self):
         """SQLiteにフォールバック"""
         try:
@@ -244,11 +389,85 @@ class PostgreSQLDatabase:
         except Exception as e:
             print(f"[PostgreSQLDatabase] SQLiteフォールバックエラー: {e}")
     
-    def _get_session(self):
-        """セッションを取得"""
+    def _get_session(self, write: bool = False):
+        """
+        セッションを取得（ユニットオブワーク内では共有セッションを返す）
+
+        書き込む（commitする）メソッドは write=True を指定する。ユニットオブワーク内ではセーブポイントを使い、
+        失敗時にそのメソッドの変更だけを取り消す。
+        """
         if self.Session:
+            unit = _current_unit_of_work.get()
+            if unit is not None and unit.database is self and unit.thread_id == threading.get_ident():
+                return unit.scoped_session(write)
             return self.Session()
         return None
+
+    def _get_own_session(self):
+        """
+        ユニットオブワークに参加しないセッションを取得
+
+        他のプロセスにすぐ見せる必要がある書き込み（OpenAIのキャッシュ・実行権）用。
+        共有セッションではリクエストの終了までコミットされず、他のプロセスが待ちきれずに重複して呼び出す。
+        """
+        return self.Session() if self.Session else None
+
+    # 複数行UPSERTの1文あたりの最大行数（バインドパラメータ数の上限対策）
+    UPSERT_CHUNK_SIZE = 500
+    # tasks / tasks_archive 共通のカラム
+    TASK_COLUMNS = ('task_id', 'user_id', 'name', 'duration_minutes', 'repeat', 'status',
+                    'created_at', 'due_date', 'priority', 'task_type')
+
+    def _insert_function(self):
+        """ON CONFLICT に対応したダイアレクトのinsert（テストではSQLiteエンジンを使うため切り替える）"""
+        if self.engine.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        return insert
+
+    def _upsert(self, session, model, rows: List[dict], update_columns: List[str]):
+        """
+        INSERT ... ON CONFLICT DO UPDATE を実行（複数行は1文のVALUESにまとめる）
+
+        Args:
+            session: セッション
+            model: 対象モデル（主キーで競合を判定）
+            rows: 挿入する行（同じ主キーの行は最後のものを使う）
+            update_columns: 競合時に新しい値で更新するカラム
+        """
+        insert = self._insert_function()
+        keys = [column.name for column in model.__table__.primary_key.columns]
+        # 同じ文の中で同じ行を2回更新するとエラーになるため主キーで重複を除く
+        unique_rows = list({tuple(row[key] for key in keys): row for row in rows}.values())
+        for start in range(0, len(unique_rows), self.UPSERT_CHUNK_SIZE):
+            stmt = insert(model.__table__).values(unique_rows[start:start + self.UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={column: stmt.excluded[column] for column in update_columns}
+            )
+            session.execute(stmt)
+
+    @staticmethod
+    def _user_state_row(user_id: str, state_type: str, state_data: Optional[dict]) -> dict:
+        now = datetime.now()
+        return {
+            'user_id': user_id,
+            'state_type': state_type,
+            'state_data': json.dumps(state_data) if state_data else None,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+    @staticmethod
+    def _user_session_row(user_id: str, session_type: str, data: str, expires_at: Optional[datetime]) -> dict:
+        return {
+            'user_id': user_id,
+            'session_type': session_type,
+            'data': data,
+            'expires_at': expires_at,
+            'created_at': datetime.now(),
+        }
     
     def register_user(self, user_id: str) -> bool:
         """ユーザーを登録"""
@@ -270,16 +489,13 @@ class PostgreSQLDatabase:
         """Google認証トークンを保存"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
-                        # 既存のトークンを更新または新規作成
-                        token = session.query(TokenModel).filter_by(user_id=user_id).first()
-                        if token:
-                            token.token_json = token_json
-                        else:
-                            token = TokenModel(user_id=user_id, token_json=token_json)
-                            session.add(token)
+                        # 既存のトークンを更新または新規作成（1文のUPSERT）
+                        self._upsert(session, TokenModel, [
+                            {'user_id': user_id, 'token_json': token_json}
+                        ], ['token_json'])
 
                         session.commit()
                         print(f"[save_token] PostgreSQL保存成功: user_id={user_id}")
@@ -336,17 +552,14 @@ class PostgreSQLDatabase:
         """ユーザーのチャネルIDを保存"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
-                        # 既存のチャネル情報を更新または新規作成
-                        user_channel = session.query(UserChannelModel).filter_by(user_id=user_id).first()
-                        if user_channel:
-                            user_channel.channel_id = channel_id
-                        else:
-                            user_channel = UserChannelModel(user_id=user_id, channel_id=channel_id)
-                            session.add(user_channel)
-                        
+                        # 既存のチャネル情報を更新または新規作成（1文のUPSERT）
+                        self._upsert(session, UserChannelModel, [
+                            {'user_id': user_id, 'channel_id': channel_id}
+                        ], ['channel_id'])
+
                         session.commit()
                         session.close()
                         print(f"[save_user_channel] PostgreSQL保存成功: user_id={user_id}, channel_id={channel_id}")
@@ -390,6 +603,49 @@ class PostgreSQLDatabase:
             print(f"Error getting user channel: {e}")
             return None
 
+    def get_active_tasks_by_user(self, user_ids: List[str], task_type: str = "daily") -> Dict[str, List[Task]]:
+        """複数ユーザーのアクティブなタスクを一括取得（ユーザーごとの get_user_tasks の代わり）"""
+        tasks_by_user: Dict[str, List[Task]] = {user_id: [] for user_id in user_ids}
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    for i in range(0, len(user_ids), self.UPSERT_CHUNK_SIZE):
+                        rows = session.query(TaskModel).filter(
+                            TaskModel.user_id.in_(user_ids[i:i + self.UPSERT_CHUNK_SIZE]),
+                            TaskModel.status == 'active',
+                            TaskModel.task_type == task_type
+                        ).order_by(TaskModel.user_id, TaskModel.created_at.desc()).all()
+                        for row in rows:
+                            tasks_by_user[row.user_id].append(Task(
+                                task_id=row.task_id,
+                                user_id=row.user_id,
+                                name=row.name,
+                                duration_minutes=row.duration_minutes,
+                                repeat=row.repeat,
+                                status=row.status,
+                                created_at=row.created_at,
+                                due_date=row.due_date,
+                                priority=row.priority,
+                                task_type=row.task_type
+                            ))
+                    return tasks_by_user
+                except Exception as e:
+                    print(f"[get_active_tasks_by_user] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return {}
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_active_tasks_by_user(user_ids, task_type)
+        except Exception as e:
+            print(f"[get_active_tasks_by_user] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return {}
+
     def get_all_user_channels(self) -> dict:
         """全ユーザーのチャネルIDを一括取得（N+1クエリ問題の解決）"""
         try:
@@ -446,7 +702,7 @@ class PostgreSQLDatabase:
         """通知実行時刻を保存"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         # 既存の実行履歴を更新または新規作成
@@ -547,7 +803,7 @@ class PostgreSQLDatabase:
         """タスクを追加（SQLite互換性）"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         task_model = TaskModel(
@@ -583,7 +839,7 @@ class PostgreSQLDatabase:
         """タスクを作成（SQLite互換性）"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         task_model = TaskModel(
@@ -619,7 +875,7 @@ class PostgreSQLDatabase:
         """タスクを削除（SQLite互換性）"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         task = session.query(TaskModel).filter_by(task_id=task_id).first()
@@ -657,6 +913,13 @@ class PostgreSQLDatabase:
                             status=status, 
                             task_type=task_type
                         ).all()
+                        if status != "active":
+                            # アーカイブ済みなどはコンパクション後（tasks_archive）も参照する（アクティブはtasksのみ）
+                            tasks += session.query(TaskArchiveModel).filter_by(
+                                user_id=user_id,
+                                status=status,
+                                task_type=task_type
+                            ).all()
                         session.close()
                         
                         # TaskModelをTaskオブジェクトに変換
@@ -693,7 +956,7 @@ class PostgreSQLDatabase:
         """未来タスクを作成"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         task_model = TaskModel(
@@ -776,6 +1039,9 @@ class PostgreSQLDatabase:
                 if session:
                     try:
                         task_model = session.query(TaskModel).filter_by(task_id=task_id).first()
+                        if task_model is None:
+                            # コンパクション済みのタスクはアーカイブから取得
+                            task_model = session.query(TaskArchiveModel).filter_by(task_id=task_id).first()
                         session.close()
                         
                         if task_model:
@@ -807,15 +1073,27 @@ class PostgreSQLDatabase:
             print(f"Error getting task by id: {e}")
             return None
 
-    def update_task_status(self, task_id: str, status: str) -> bool:
-        """タスクのステータスを更新"""
+    def update_task_status(self, task_id: str, status: str, count_in_stats: bool = True) -> bool:
+        """タスクのステータスを更新（count_in_stats=False の場合は週次集計に加算しない）"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
-                        task = session.query(TaskModel).filter_by(task_id=task_id).first()
+                        # 週次集計の二重加算を防ぐため行ロックを取ってから更新前の状態を読む
+                        task = session.query(TaskModel).filter_by(task_id=task_id).with_for_update().first()
+                        if task is None:
+                            # アーカイブ済みのタスク: 再アクティブ化はtasksに戻し、それ以外はアーカイブ上で更新
+                            task = session.query(TaskArchiveModel).filter_by(task_id=task_id).with_for_update().first()
+                            if task is not None and status == "active":
+                                archived = task
+                                task = TaskModel(**{column: getattr(archived, column) for column in self.TASK_COLUMNS})
+                                session.add(task)
+                                session.delete(archived)
                         if task:
+                            if count_in_stats and task.status != status and status in WEEKLY_STAT_STATUSES:
+                                # 完了・アーカイブになったタスクを週次集計に加算（同じトランザクション内）
+                                self._add_weekly_stats(session, task.user_id, task.name, task.duration_minutes, status)
                             task.status = status
                             session.commit()
                             session.close()
@@ -832,16 +1110,176 @@ class PostgreSQLDatabase:
                         return False
             else:
                 # SQLiteフォールバック
-                return self.sqlite_db.update_task_status(task_id, status)
+                return self.sqlite_db.update_task_status(task_id, status, count_in_stats)
         except Exception as e:
             print(f"Error updating task status: {e}")
             return False
 
+    def _add_weekly_stats(self, session, user_id: str, name: str, minutes: int, status: str):
+        """今週の集計行に1件加算（呼び出し元のトランザクション内で実行）"""
+        iso_week = iso_week_key()
+        insert = self._insert_function()
+        # 集計行がなければ作成してから行ロックを取って加算する（同時更新でも加算を失わない）
+        session.execute(
+            insert(UserStatsWeeklyModel.__table__).values(
+                user_id=user_id, iso_week=iso_week, completed_count=0, completed_minutes=0,
+                archived_count=0, archived_minutes=0
+            ).on_conflict_do_nothing(index_elements=['user_id', 'iso_week'])
+        )
+        stats = session.query(UserStatsWeeklyModel).filter_by(
+            user_id=user_id, iso_week=iso_week
+        ).with_for_update().populate_existing().one()
+        if status == 'completed':
+            stats.completed_count += 1
+            stats.completed_minutes += minutes or 0
+            stats.top_tasks = merge_top_tasks(stats.top_tasks, name, minutes)
+        else:
+            stats.archived_count += 1
+            stats.archived_minutes += minutes or 0
+        stats.updated_at = datetime.now()
+
+    def get_weekly_stats(self, user_id: str, iso_week: Optional[str] = None) -> Optional[dict]:
+        """週次集計を取得（主キーで1件読むだけ）。未集計の場合はNone"""
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    stats = session.get(UserStatsWeeklyModel, (user_id, iso_week or iso_week_key()))
+                    if stats is None:
+                        return None
+                    return stats_row_to_dict((
+                        stats.user_id, stats.iso_week, stats.completed_count, stats.completed_minutes,
+                        stats.archived_count, stats.archived_minutes, stats.top_tasks
+                    ))
+                except Exception as e:
+                    print(f"[get_weekly_stats] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return None
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_weekly_stats(user_id, iso_week)
+        except Exception as e:
+            print(f"[get_weekly_stats] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    @staticmethod
+    def _task_from_model(task_model) -> Task:
+        return Task(
+            task_id=task_model.task_id,
+            user_id=task_model.user_id,
+            name=task_model.name,
+            duration_minutes=task_model.duration_minutes,
+            repeat=task_model.repeat,
+            status=task_model.status,
+            created_at=task_model.created_at,
+            due_date=task_model.due_date,
+            priority=task_model.priority,
+            task_type=task_model.task_type
+        )
+
+    def archive_inactive_tasks(self, batch_size: int) -> int:
+        """
+        アクティブでないタスクを最大batch_size件 tasks から tasks_archive に移動（コンパクション）
+
+        移動対象は行ロックを取ってから選ぶ（Webhookが更新中の行はSKIP LOCKEDで次回に回す）。
+
+        Returns:
+            移動した件数
+        """
+        try:
+            if self.engine:
+                from sqlalchemy import delete, literal, select
+                insert = self._insert_function()
+
+                session = self._get_session(write=True)
+                try:
+                    task_ids = session.execute(
+                        select(TaskModel.task_id).where(TaskModel.status != 'active')
+                        .limit(batch_size).with_for_update(skip_locked=True)
+                    ).scalars().all()
+                    if not task_ids:
+                        session.rollback()
+                        return 0
+
+                    columns = [TaskModel.__table__.c[column] for column in self.TASK_COLUMNS]
+                    stmt = insert(TaskArchiveModel.__table__).from_select(
+                        list(self.TASK_COLUMNS) + ['archived_at'],
+                        select(*columns, literal(datetime.now())).where(TaskModel.task_id.in_(task_ids))
+                    )
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['task_id'],
+                        set_={column: stmt.excluded[column] for column in list(self.TASK_COLUMNS[1:]) + ['archived_at']}
+                    )
+                    session.execute(stmt)
+                    result = session.execute(
+                        delete(TaskModel).where(TaskModel.task_id.in_(task_ids)).execution_options(synchronize_session=False)
+                    )
+                    session.commit()
+                    return result.rowcount
+                except Exception as e:
+                    session.rollback()
+                    print(f"[archive_inactive_tasks] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.archive_inactive_tasks(batch_size)
+        except Exception as e:
+            print(f"[archive_inactive_tasks] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def get_task_history(self, user_id: str, since: Optional[datetime] = None, status: Optional[str] = None) -> List[Task]:
+        """
+        アクティブでないタスクの履歴を取得（週次レポートなど）
+
+        コンパクション前（tasks）と後（tasks_archive）の両方を参照する。
+        sinceはアーカイブへの移動日時で絞り込む（未移動のタスクは直近のものとして常に含める）。
+        """
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    hot = session.query(TaskModel).filter(TaskModel.user_id == user_id, TaskModel.status != 'active')
+                    archived = session.query(TaskArchiveModel).filter(TaskArchiveModel.user_id == user_id)
+                    if status:
+                        hot = hot.filter(TaskModel.status == status)
+                        archived = archived.filter(TaskArchiveModel.status == status)
+                    if since:
+                        archived = archived.filter(TaskArchiveModel.archived_at >= since)
+                    task_models = hot.all() + archived.all()
+                    task_models.sort(key=lambda task_model: task_model.created_at or datetime.min, reverse=True)
+                    return [self._task_from_model(task_model) for task_model in task_models]
+                except Exception as e:
+                    print(f"[get_task_history] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return []
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_task_history(user_id, since, status)
+        except Exception as e:
+            print(f"[get_task_history] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
     def save_schedule_proposal(self, user_id: str, proposal_data: dict) -> bool:
         """スケジュール提案を保存"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         # 古い提案を削除
@@ -903,7 +1341,7 @@ class PostgreSQLDatabase:
         """ユーザー設定を保存"""
         try:
             if self.Session:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 if session:
                     try:
                         # 既存の設定を更新または新規作成
@@ -1012,7 +1450,7 @@ class PostgreSQLDatabase:
         """
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 try:
                     session.query(UserStateModel).filter_by(
                         user_id=user_id,
@@ -1042,7 +1480,7 @@ class PostgreSQLDatabase:
         """キャッシュされたOpenAI APIレスポンスを取得"""
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_own_session()
                 try:
                     cache_key = f"{model}:{prompt_hash}"
                     # 有効期限内のキャッシュを取得
@@ -1080,7 +1518,7 @@ class PostgreSQLDatabase:
         """OpenAI APIレスポンスをキャッシュに保存"""
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_own_session()
                 try:
                     from datetime import timedelta
                     cache_key = f"{model}:{prompt_hash}"
@@ -1090,23 +1528,16 @@ class PostgreSQLDatabase:
                     preview = prompt_preview[:200] if prompt_preview else ""
 
                     # UPSERT操作（既存の場合は更新、存在しない場合は挿入）
-                    existing = session.query(OpenAICacheModel).filter_by(cache_key=cache_key).first()
-                    if existing:
-                        existing.response = response
-                        existing.expires_at = expires_at
-                        existing.created_at = datetime.now()
-                        existing.hit_count = 0
-                    else:
-                        new_cache = OpenAICacheModel(
-                            cache_key=cache_key,
-                            model=model,
-                            prompt_hash=prompt_hash,
-                            prompt_preview=preview,
-                            response=response,
-                            expires_at=expires_at,
-                            hit_count=0
-                        )
-                        session.add(new_cache)
+                    self._upsert(session, OpenAICacheModel, [{
+                        'cache_key': cache_key,
+                        'model': model,
+                        'prompt_hash': prompt_hash,
+                        'prompt_preview': preview,
+                        'response': response,
+                        'expires_at': expires_at,
+                        'hit_count': 0,
+                        'created_at': datetime.now(),
+                    }], ['response', 'expires_at', 'created_at', 'hit_count'])
 
                     session.commit()
                     print(f"[set_cached_response] キャッシュ保存: key={cache_key}, ttl={ttl_hours}h, expires_at={expires_at}")
@@ -1143,7 +1574,7 @@ class PostgreSQLDatabase:
         """
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 try:
                     from datetime import timedelta
 
@@ -1153,23 +1584,9 @@ class PostgreSQLDatabase:
                         expires_at = datetime.now() + timedelta(hours=expires_hours)
 
                     # UPSERT: 既存レコードがあれば更新、なければ挿入
-                    existing = session.query(UserSessionModel).filter_by(
-                        user_id=user_id,
-                        session_type=session_type
-                    ).first()
-
-                    if existing:
-                        existing.data = data
-                        existing.expires_at = expires_at
-                        existing.created_at = datetime.now()
-                    else:
-                        new_session = UserSessionModel(
-                            user_id=user_id,
-                            session_type=session_type,
-                            data=data,
-                            expires_at=expires_at
-                        )
-                        session.add(new_session)
+                    self._upsert(session, UserSessionModel, [
+                        self._user_session_row(user_id, session_type, data, expires_at)
+                    ], ['data', 'expires_at', 'created_at'])
 
                     session.commit()
                     print(f"[set_user_session] セッション保存成功: user_id={user_id}, type={session_type}, データ長={len(data)}, 期限={expires_at}")
@@ -1230,6 +1647,54 @@ class PostgreSQLDatabase:
             traceback.print_exc()
             return None
 
+    def set_user_sessions(self, entries: List[dict], expires_hours: Optional[int] = None) -> bool:
+        """
+        複数ユーザーのセッションデータを一括保存（複数行UPSERT）
+
+        Args:
+            entries: [{"user_id": ..., "session_type": ..., "data": ...}, ...]
+            expires_hours: 有効期限（時間）、Noneの場合は無期限
+
+        Returns:
+            保存成功時True、失敗時False
+        """
+        if not entries:
+            return True
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    from datetime import timedelta
+
+                    expires_at = None
+                    if expires_hours is not None:
+                        expires_at = datetime.now() + timedelta(hours=expires_hours)
+
+                    self._upsert(session, UserSessionModel, [
+                        self._user_session_row(entry['user_id'], entry['session_type'], entry['data'], expires_at)
+                        for entry in entries
+                    ], ['data', 'expires_at', 'created_at'])
+
+                    session.commit()
+                    print(f"[set_user_sessions] セッション一括保存: {len(entries)}件, 期限={expires_at}")
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[set_user_sessions] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.set_user_sessions(entries, expires_hours)
+        except Exception as e:
+            print(f"[set_user_sessions] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
     def delete_user_session(self, user_id: str, session_type: str) -> bool:
         """
         ユーザーセッションデータを削除
@@ -1243,7 +1708,7 @@ class PostgreSQLDatabase:
         """
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 try:
                     deleted_count = session.query(UserSessionModel).filter(
                         UserSessionModel.user_id == user_id,
@@ -1270,69 +1735,243 @@ class PostgreSQLDatabase:
             traceback.print_exc()
             return False
 
-    def cleanup_expired_cache(self) -> int:
-        """期限切れのキャッシュを削除"""
+    def claim_user_session(self, user_id: str, session_type: str, claimed_type: str, expires_minutes: int = 10) -> bool:
+        """
+        ユーザーセッションデータを処理中のセッションタイプに移して実行権を取得（同じセッションを同時に処理しないため）
+
+        リクエストのユニットオブワークの終了を待たずに他のリクエストから見えるよう、すぐにコミットする。
+        """
         try:
             if self.engine:
-                session = self._get_session()
+                from sqlalchemy.exc import IntegrityError
+                session = self._get_own_session()
                 try:
-                    deleted_count = session.query(OpenAICacheModel).filter(
-                        OpenAICacheModel.expires_at <= datetime.now()
-                    ).delete()
+                    from datetime import timedelta
+                    now = datetime.now()
+                    # 期限切れの処理中セッション（処理が停止した場合）を削除
+                    session.query(UserSessionModel).filter(
+                        UserSessionModel.user_id == user_id,
+                        UserSessionModel.session_type == claimed_type,
+                        UserSessionModel.expires_at <= now
+                    ).delete(synchronize_session=False)
+                    claimed_count = session.query(UserSessionModel).filter(
+                        UserSessionModel.user_id == user_id,
+                        UserSessionModel.session_type == session_type,
+                        or_(UserSessionModel.expires_at.is_(None), UserSessionModel.expires_at > now)
+                    ).update({
+                        'session_type': claimed_type,
+                        'expires_at': now + timedelta(minutes=expires_minutes),
+                        'created_at': now,
+                    }, synchronize_session=False)
 
                     session.commit()
-                    if deleted_count > 0:
-                        print(f"[cleanup_expired_cache] {deleted_count}件の期限切れキャッシュを削除")
-                    return deleted_count
+                    print(f"[claim_user_session] セッション取得: user_id={user_id}, type={session_type}, 取得={claimed_count > 0}")
+                    return claimed_count > 0
+                except IntegrityError:
+                    # 処理中のセッションが既にある（他の処理が実行中）
+                    session.rollback()
+                    print(f"[claim_user_session] 処理中のセッションあり: user_id={user_id}, type={claimed_type}")
+                    return False
                 except Exception as e:
                     session.rollback()
-                    print(f"[cleanup_expired_cache] PostgreSQLエラー: {e}")
+                    print(f"[claim_user_session] PostgreSQLエラー: {e}")
                     import traceback
                     traceback.print_exc()
-                    return 0
+                    # 取得を確認できない場合は呼び出し側で処理を続ける
+                    return True
                 finally:
                     session.close()
             else:
                 # SQLiteフォールバック
-                return self.sqlite_db.cleanup_expired_cache()
+                return self.sqlite_db.claim_user_session(user_id, session_type, claimed_type, expires_minutes)
         except Exception as e:
-            print(f"[cleanup_expired_cache] エラー: {e}")
+            print(f"[claim_user_session] エラー: {e}")
             import traceback
             traceback.print_exc()
-            return 0
+            return True
 
-    def cleanup_expired_sessions(self) -> int:
-        """期限切れのセッションデータを削除"""
+    def claim_openai_request(self, cache_key: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        OpenAI呼び出しの実行権を取得（同じキーの呼び出しを他のプロセスが実行中の場合はFalse）
+
+        期限切れの取得権（実行したプロセスが終了した場合など）は上書きして取得する。
+        """
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_own_session()
                 try:
-                    deleted_count = session.query(UserSessionModel).filter(
-                        UserSessionModel.expires_at.isnot(None),
-                        UserSessionModel.expires_at <= datetime.now()
-                    ).delete()
-
+                    from datetime import timedelta
+                    now = datetime.now()
+                    insert = self._insert_function()
+                    stmt = insert(OpenAIInflightModel.__table__).values(
+                        cache_key=cache_key, owner=owner, expires_at=now + timedelta(seconds=ttl_seconds)
+                    )
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['cache_key'],
+                        set_={'owner': stmt.excluded.owner, 'expires_at': stmt.excluded.expires_at},
+                        where=OpenAIInflightModel.__table__.c.expires_at <= now
+                    )
+                    claimed = session.execute(stmt).rowcount == 1
                     session.commit()
-                    print(f"[cleanup_expired_sessions] 期限切れセッション削除: {deleted_count}件")
-                    return deleted_count
+                    return claimed
                 except Exception as e:
                     session.rollback()
-                    print(f"[cleanup_expired_sessions] PostgreSQLエラー: {e}")
+                    print(f"[claim_openai_request] PostgreSQLエラー: {e}")
                     import traceback
                     traceback.print_exc()
-                    return 0
+                    # 取得権を確認できない場合は呼び出し側で実行する
+                    return True
                 finally:
                     session.close()
             else:
                 # SQLiteフォールバック
-                return self.sqlite_db.cleanup_expired_sessions()
+                return self.sqlite_db.claim_openai_request(cache_key, owner, ttl_seconds)
         except Exception as e:
-            print(f"[cleanup_expired_sessions] エラー: {e}")
+            print(f"[claim_openai_request] エラー: {e}")
             import traceback
             traceback.print_exc()
-            return 0
+            return True
 
-    def get_cache_stats(self) -> dict:
+    def release_openai_request(self, cache_key: str, owner: str) -> bool:
+        """OpenAI呼び出しの実行権を解放（自分が取得したものだけ）"""
+        try:
+            if self.engine:
+                session = self._get_own_session()
+                try:
+                    session.query(OpenAIInflightModel).filter(
+                        OpenAIInflightModel.cache_key == cache_key,
+                        OpenAIInflightModel.owner == owner
+                    ).delete(synchronize_session=False)
+                    session.commit()
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[release_openai_request] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.release_openai_request(cache_key, owner)
+        except Exception as e:
+            print(f"[release_openai_request] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def cleanup_expired_cache(self) -> int:
+        """期限切れのキャッシュを削除"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    deleted_count = session.query(OpenAICacheModel).filter(
+                        OpenAICacheModel.expires_at <= datetime.now()
+                    ).delete()
+
+                    session.commit()
+                    if deleted_count > 0:
+                        print(f"[cleanup_expired_cache] {deleted_count}件の期限切れキャッシュを削除")
+                    return deleted_count
+                except Exception as e:
+                    session.rollback()
+                    print(f"[cleanup_expired_cache] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.cleanup_expired_cache()
+        except Exception as e:
+            print(f"[cleanup_expired_cache] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def cleanup_expired_sessions(self) -> int:
+        """期限切れのセッションデータを削除"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    deleted_count = session.query(UserSessionModel).filter(
+                        UserSessionModel.expires_at.isnot(None),
+                        UserSessionModel.expires_at <= datetime.now()
+                    ).delete()
+
+                    session.commit()
+                    print(f"[cleanup_expired_sessions] 期限切れセッション削除: {deleted_count}件")
+                    return deleted_count
+                except Exception as e:
+                    session.rollback()
+                    print(f"[cleanup_expired_sessions] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.cleanup_expired_sessions()
+        except Exception as e:
+            print(f"[cleanup_expired_sessions] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def _expired_row_condition(self, table: str):
+        """TTLスイーパーの対象テーブルのモデルと期限切れの条件"""
+        now = datetime.now()
+        if table == 'openai_cache':
+            return OpenAICacheModel, OpenAICacheModel.expires_at <= now
+        if table == 'user_sessions':
+            return UserSessionModel, (UserSessionModel.expires_at.isnot(None)) & (UserSessionModel.expires_at <= now)
+        raise KeyError(table)
+
+    def delete_expired_batch(self, table: str, batch_size: int) -> int:
+        """
+        期限切れの行を最大batch_size件削除（TTLスイーパー用）
+
+        主キーで対象を絞って1バッチを1トランザクションで削除する。
+        Webhookが更新中の行はSKIP LOCKEDで飛ばし、次のバッチ以降に回す。
+        """
+        try:
+            if self.engine:
+                from sqlalchemy import delete, select, tuple_
+                model, condition = self._expired_row_condition(table)
+                primary_key = list(model.__table__.primary_key.columns)
+                keys = select(*primary_key).where(condition).limit(batch_size).with_for_update(skip_locked=True)
+                key_column = primary_key[0] if len(primary_key) == 1 else tuple_(*primary_key)
+
+                session = self._get_session(write=True)
+                try:
+                    result = session.execute(
+                        delete(model).where(key_column.in_(keys)).execution_options(synchronize_session=False)
+                    )
+                    session.commit()
+                    return result.rowcount
+                except Exception as e:
+                    session.rollback()
+                    print(f"[delete_expired_batch] PostgreSQLエラー: table={table}, {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.delete_expired_batch(table, batch_size)
+        except Exception as e:
+            print(f"[delete_expired_batch] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def get_cache_stats(self) -> dict:
         """キャッシュ統計を取得"""
         try:
             if self.engine:
@@ -1405,27 +2044,12 @@ class PostgreSQLDatabase:
         """
         try:
             if self.engine:
-                session = self._get_session()
+                session = self._get_session(write=True)
                 try:
-                    import json
-                    state_data_json = json.dumps(state_data) if state_data else None
-
-                    # UPSERT: 既存レコードがあれば更新、なければ挿入
-                    existing = session.query(UserStateModel).filter_by(
-                        user_id=user_id,
-                        state_type=state_type
-                    ).first()
-
-                    if existing:
-                        existing.state_data = state_data_json
-                        existing.updated_at = datetime.now()
-                    else:
-                        new_state = UserStateModel(
-                            user_id=user_id,
-                            state_type=state_type,
-                            state_data=state_data_json
-                        )
-                        session.add(new_state)
+                    # UPSERT: 既存レコードがあれば更新（created_atは維持）、なければ挿入
+                    self._upsert(session, UserStateModel, [
+                        self._user_state_row(user_id, state_type, state_data)
+                    ], ['state_data', 'updated_at'])
 
                     session.commit()
                     print(f"[set_user_state] 状態設定: user_id={user_id}, state_type={state_type}")
@@ -1447,6 +2071,47 @@ class PostgreSQLDatabase:
             traceback.print_exc()
             return False
 
+    def set_user_states(self, entries: List[dict]) -> bool:
+        """
+        複数ユーザーの状態を一括設定（複数行UPSERT）
+
+        Args:
+            entries: [{"user_id": ..., "state_type": ..., "state_data": {...}}, ...]
+
+        Returns:
+            bool: 成功時True
+        """
+        if not entries:
+            return True
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    self._upsert(session, UserStateModel, [
+                        self._user_state_row(entry['user_id'], entry['state_type'], entry.get('state_data'))
+                        for entry in entries
+                    ], ['state_data', 'updated_at'])
+
+                    session.commit()
+                    print(f"[set_user_states] 状態一括設定: {len(entries)}件")
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[set_user_states] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.set_user_states(entries)
+        except Exception as e:
+            print(f"[set_user_states] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
     def get_user_state(self, user_id: str, state_type: str) -> Optional[dict]:
         """
         ユーザーの状態を取得
@@ -1487,6 +2152,356 @@ class PostgreSQLDatabase:
             traceback.print_exc()
             return None
 
+    def enqueue_outbox_messages(self, run_id: str, notification_type: str, entries: List[dict], status: str = 'pending') -> int:
+        """通知をアウトボックスに登録（同じrun_id・user_idの既存行は上書きしない）"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    existing = {
+                        row.user_id for row in
+                        session.query(NotificationOutboxModel.user_id).filter_by(run_id=run_id).all()
+                    }
+                    inserted = 0
+                    for entry in entries:
+                        if entry['user_id'] in existing:
+                            continue
+                        session.add(NotificationOutboxModel(
+                            run_id=run_id,
+                            user_id=entry['user_id'],
+                            notification_type=notification_type,
+                            channel_id=entry.get('channel_id'),
+                            payload=entry['payload'],
+                            retry_key=entry['retry_key'],
+                            status=status,
+                            attempts=0
+                        ))
+                        existing.add(entry['user_id'])
+                        inserted += 1
+
+                    session.commit()
+                    print(f"[enqueue_outbox_messages] 登録: run_id={run_id}, 新規={inserted}件")
+                    return inserted
+                except Exception as e:
+                    session.rollback()
+                    print(f"[enqueue_outbox_messages] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.enqueue_outbox_messages(run_id, notification_type, entries, status)
+        except Exception as e:
+            print(f"[enqueue_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def get_outbox_user_ids(self, run_id: str) -> List[str]:
+        """指定した実行IDでアウトボックスに登録済みのユーザーIDを取得"""
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    rows = session.query(NotificationOutboxModel.user_id).filter_by(run_id=run_id).all()
+                    return [row.user_id for row in rows]
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_outbox_user_ids(run_id)
+        except Exception as e:
+            print(f"[get_outbox_user_ids] エラー: {e}")
+            return []
+
+    def get_pending_outbox_messages(self, run_id: Optional[str] = None, limit: int = 500, status: str = 'pending',
+                                    after: Optional[Tuple[str, str]] = None) -> List[dict]:
+        """未送信の通知を取得（after: この (run_id, user_id) より後の行だけを取得）"""
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    query = session.query(NotificationOutboxModel).filter(
+                        NotificationOutboxModel.status == status
+                    )
+                    if run_id is not None:
+                        query = query.filter(NotificationOutboxModel.run_id == run_id)
+                    if after is not None:
+                        query = query.filter(or_(
+                            NotificationOutboxModel.run_id > after[0],
+                            and_(NotificationOutboxModel.run_id == after[0], NotificationOutboxModel.user_id > after[1]),
+                        ))
+                    rows = query.order_by(
+                        NotificationOutboxModel.run_id, NotificationOutboxModel.user_id
+                    ).limit(limit).all()
+                    return [
+                        {
+                            'run_id': row.run_id,
+                            'user_id': row.user_id,
+                            'notification_type': row.notification_type,
+                            'channel_id': row.channel_id,
+                            'payload': row.payload,
+                            'retry_key': row.retry_key,
+                            'attempts': row.attempts or 0,
+                        }
+                        for row in rows
+                    ]
+                except Exception as e:
+                    print(f"[get_pending_outbox_messages] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return []
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_pending_outbox_messages(run_id, limit, status, after)
+        except Exception as e:
+            print(f"[get_pending_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def update_outbox_status(self, run_id: str, user_id: str, status: str, error: Optional[str] = None) -> bool:
+        """アウトボックス行の状態を更新し、試行回数を加算"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    row = session.query(NotificationOutboxModel).filter_by(run_id=run_id, user_id=user_id).first()
+                    if not row:
+                        return False
+                    row.status = status
+                    row.attempts = (row.attempts or 0) + 1
+                    row.last_error = error
+                    row.updated_at = datetime.now()
+                    session.commit()
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[update_outbox_status] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.update_outbox_status(run_id, user_id, status, error)
+        except Exception as e:
+            print(f"[update_outbox_status] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def release_outbox_message(self, run_id: str, user_id: str, payload: Optional[str] = None) -> bool:
+        """事前作成（staged）の通知を送信待ち（pending）にする"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    row = session.query(NotificationOutboxModel).filter_by(
+                        run_id=run_id, user_id=user_id, status='staged'
+                    ).first()
+                    if not row:
+                        return False
+                    row.status = 'pending'
+                    if payload is not None:
+                        row.payload = payload
+                    row.updated_at = datetime.now()
+                    session.commit()
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[release_outbox_message] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.release_outbox_message(run_id, user_id, payload)
+        except Exception as e:
+            print(f"[release_outbox_message] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def release_outbox_messages(self, run_id: str) -> int:
+        """実行IDの事前作成（staged）の通知を全て送信待ち（pending）にする（1回のUPDATE）"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    released = session.query(NotificationOutboxModel).filter_by(
+                        run_id=run_id, status='staged'
+                    ).update({'status': 'pending', 'updated_at': datetime.now()}, synchronize_session=False)
+                    session.commit()
+                    return released
+                except Exception as e:
+                    session.rollback()
+                    print(f"[release_outbox_messages] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return 0
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.release_outbox_messages(run_id)
+        except Exception as e:
+            print(f"[release_outbox_messages] エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+    def get_outbox_counts(self, run_id: Optional[str] = None) -> dict:
+        """アウトボックスの状態別件数を取得（運用確認用）"""
+        counts = {'staged': 0, 'pending': 0, 'sent': 0, 'failed': 0}
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    from sqlalchemy import func
+                    query = session.query(NotificationOutboxModel.status, func.count())
+                    if run_id is not None:
+                        query = query.filter(NotificationOutboxModel.run_id == run_id)
+                    for status, count in query.group_by(NotificationOutboxModel.status).all():
+                        counts[status] = count
+                    return counts
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_outbox_counts(run_id)
+        except Exception as e:
+            print(f"[get_outbox_counts] エラー: {e}")
+            return counts
+
+    def get_calendar_sync_state(self, user_id: str) -> Optional[dict]:
+        """カレンダーミラーの同期状態を取得。未同期の場合はNone"""
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    state = session.get(CalendarSyncStateModel, user_id)
+                    if state is None:
+                        return None
+                    return {
+                        'sync_token': state.sync_token,
+                        'window_start': state.window_start,
+                        'window_end': state.window_end,
+                        'synced_at': state.synced_at,
+                        'prefetched': bool(state.prefetched),
+                    }
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_calendar_sync_state(user_id)
+        except Exception as e:
+            print(f"[get_calendar_sync_state] エラー: {e}")
+            return None
+
+    def apply_calendar_sync(self, user_id: str, events: List[dict], deleted_ids: List[str],
+                            sync_token: Optional[str], window_start: str, window_end: str, full: bool,
+                            prefetched: bool = False) -> bool:
+        """カレンダーの同期結果をミラーに反映（1トランザクション、全件同期の場合は既存のミラーを置き換える）"""
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    if full:
+                        session.query(CalendarEventModel).filter_by(user_id=user_id).delete(synchronize_session=False)
+                    self._upsert_calendar_events(session, user_id, events)
+                    if deleted_ids:
+                        session.query(CalendarEventModel).filter(
+                            CalendarEventModel.user_id == user_id,
+                            CalendarEventModel.event_id.in_(deleted_ids)
+                        ).delete(synchronize_session=False)
+                    self._upsert(session, CalendarSyncStateModel, [{
+                        'user_id': user_id,
+                        'sync_token': sync_token,
+                        'window_start': window_start,
+                        'window_end': window_end,
+                        'synced_at': datetime.now(),
+                        'prefetched': prefetched,
+                    }], ['sync_token', 'window_start', 'window_end', 'synced_at', 'prefetched'])
+                    session.commit()
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[apply_calendar_sync] PostgreSQLエラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.apply_calendar_sync(
+                    user_id, events, deleted_ids, sync_token, window_start, window_end, full, prefetched
+                )
+        except Exception as e:
+            print(f"[apply_calendar_sync] エラー: {e}")
+            return False
+
+    def save_calendar_events(self, user_id: str, events: List[dict]) -> bool:
+        """自分で追加したイベントをミラーに反映（同期状態は変えない）"""
+        if not events:
+            return True
+        try:
+            if self.engine:
+                session = self._get_session(write=True)
+                try:
+                    self._upsert_calendar_events(session, user_id, events)
+                    session.commit()
+                    return True
+                except Exception as e:
+                    session.rollback()
+                    print(f"[save_calendar_events] PostgreSQLエラー: {e}")
+                    return False
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.save_calendar_events(user_id, events)
+        except Exception as e:
+            print(f"[save_calendar_events] エラー: {e}")
+            return False
+
+    def _upsert_calendar_events(self, session, user_id: str, events: List[dict]):
+        if not events:
+            return
+        now = datetime.now()
+        rows = [dict(event, user_id=user_id, updated_at=now) for event in events]
+        self._upsert(session, CalendarEventModel, rows, list(CALENDAR_EVENT_COLUMNS[1:]) + ['updated_at'])
+
+    def get_calendar_events(self, user_id: str, time_min: datetime, time_max: datetime) -> List[dict]:
+        """ミラーから期間と重なる予定を開始時刻順に取得（Calendar APIのイベントと同じ形）"""
+        try:
+            if self.engine:
+                session = self._get_session()
+                try:
+                    columns = [getattr(CalendarEventModel, column) for column in CALENDAR_EVENT_COLUMNS]
+                    rows = session.query(*columns).filter(
+                        CalendarEventModel.user_id == user_id,
+                        CalendarEventModel.start_at < to_utc_key(time_max),
+                        CalendarEventModel.end_at > to_utc_key(time_min)
+                    ).order_by(CalendarEventModel.start_at, CalendarEventModel.event_id).all()
+                    return [row_to_event(row) for row in rows]
+                finally:
+                    session.close()
+            else:
+                # SQLiteフォールバック
+                return self.sqlite_db.get_calendar_events(user_id, time_min, time_max)
+        except Exception as e:
+            print(f"[get_calendar_events] エラー: {e}")
+            return []
+
 # グローバルデータベースインスタンス
 postgres_db = None
 
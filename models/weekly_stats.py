@@ -0,0 +1,49 @@
+"""
+ユーザーごとの週次集計（user_stats_weekly）
+タスクが完了・アーカイブされた時点で、ISO週ごとの件数・分数・上位タスクを加算していく
+
+週次レポートはレポート時にタスクを走査せず、集計行を主キーで1件読むだけで済む。
+SQLite版・PostgreSQL版の両方から使う共通処理。
+"""
+import json
+from datetime import datetime
+from typing import List, Optional
+
+import pytz
+
+# 集計対象のステータス
+WEEKLY_STAT_STATUSES = ("completed", "archived")
+# 上位タスクとして保持する件数（週次レポートの表示件数）
+WEEKLY_TOP_TASKS = 5
+
+
+def iso_week_key(when: Optional[datetime] = None) -> str:
+    """ISO週のキー（例: 2026-W42）。日付はJSTで判定する"""
+    jst = pytz.timezone('Asia/Tokyo')
+    if when is None:
+        when = datetime.now(jst)
+    elif when.tzinfo is not None:
+        when = when.astimezone(jst)
+    iso_year, iso_week, _ = when.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def merge_top_tasks(top_tasks_json: Optional[str], name: str, minutes: int, limit: int = WEEKLY_TOP_TASKS) -> str:
+    """上位タスクのリスト（所要時間の長い順）にタスクを加えて上位limit件を返す"""
+    top_tasks: List[dict] = json.loads(top_tasks_json) if top_tasks_json else []
+    top_tasks.append({"name": name, "duration_minutes": minutes or 0})
+    top_tasks.sort(key=lambda task: task["duration_minutes"], reverse=True)
+    return json.dumps(top_tasks[:limit], ensure_ascii=False)
+
+
+def stats_row_to_dict(row) -> dict:
+    """集計行（user_id, iso_week, completed_count, completed_minutes, archived_count, archived_minutes, top_tasks）を辞書に変換"""
+    return {
+        "user_id": row[0],
+        "iso_week": row[1],
+        "completed_count": row[2] or 0,
+        "completed_minutes": row[3] or 0,
+        "archived_count": row[4] or 0,
+        "archived_minutes": row[5] or 0,
+        "top_tasks": json.loads(row[6]) if row[6] else [],
+    }
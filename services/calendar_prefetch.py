@@ -0,0 +1,101 @@
+"""
+朝の通知後のカレンダー事前同期
+8:00のタスク一覧を送ったユーザーは数分以内にタスク番号を返信することが多いため、
+送信直後にバックグラウンドでGoogleカレンダーのミラーを同期しておく。
+
+- 同期時に認証を行うため、期限切れのアクセストークンもここで更新される
+- 返信時のタスク選択は CalendarService.PREFETCH_MAX_AGE_SECONDS 以内の同期結果をそのまま使い、
+  Googleへの往復なしで空き時間を計算する（ヒット率は calendar_prefetch のキャッシュ指標で確認する）
+- Webhook用のスレッドプールとは別の小さなスレッドプールで実行し、同時実行数を制限する
+- 開始が遅れた分（返信が済んでいる可能性が高い）は実行しない
+
+環境変数:
+    CALENDAR_PREFETCH_CONCURRENCY: 同時に同期するユーザー数（デフォルト: 2）
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CalendarPrefetcher:
+    """通知したユーザーのカレンダーをバックグラウンドで同期する"""
+
+    LOG_NAME = "calendar_prefetch"
+    MAX_CONCURRENCY = int(os.getenv('CALENDAR_PREFETCH_CONCURRENCY', '2'))
+    # 予約からこの時間（秒）を過ぎても開始できなかった同期は行わない
+    DEADLINE_SECONDS = 600
+
+    def __init__(
+        self,
+        calendar_service,
+        max_concurrency: Optional[int] = None,
+        deadline_seconds: Optional[float] = None,
+        clock=time.monotonic,
+    ):
+        self.calendar_service = calendar_service
+        self.max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        self.deadline_seconds = deadline_seconds if deadline_seconds is not None else self.DEADLINE_SECONDS
+        self._clock = clock
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 起動からの累計（scheduled: 予約, synced: 同期成功, failed: 同期失敗, expired: 期限切れで未実行）
+        self.stats: Dict[str, int] = {"scheduled": 0, "synced": 0, "failed": 0, "expired": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="remind-prefetch"
+                )
+            return self._executor
+
+    def reset(self):
+        """フォーク後にスレッドプールを破棄（次に使う時に作り直す）"""
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def schedule(self, user_ids: Iterable[str]) -> List[Future]:
+        """
+        ユーザーごとの同期を予約（すぐに戻る）
+
+        Returns:
+            ユーザーごとのFuture（同期できた場合はTrue）
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        deadline = self._clock() + self.deadline_seconds
+        executor = self._get_executor()
+        futures = []
+        for user_id in user_ids:
+            self._count("scheduled")
+            futures.append(executor.submit(self._prefetch_user, user_id, deadline))
+        logger.info(
+            "[%s] 事前同期を予約: %d件 (同時実行数=%d)", self.LOG_NAME, len(user_ids), self.max_concurrency
+        )
+        return futures
+
+    def _prefetch_user(self, user_id: str, deadline: float) -> bool:
+        if self._clock() > deadline:
+            self._count("expired")
+            return False
+        try:
+            # 認証（アクセストークンの更新）とミラーの同期をまとめて行う
+            synced = self.calendar_service.sync_calendar(user_id, force=True, prefetch=True)
+        except Exception as e:
+            logger.error("[%s] 事前同期エラー: user_id=%s, %s", self.LOG_NAME, user_id, e)
+            import traceback
+            traceback.print_exc()
+            synced = False
+        self._count("synced" if synced else "failed")
+        return synced
@@ -1,24 +1,233 @@
 import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import json
 import re
+import threading
+from models.calendar_mirror import event_to_row, to_utc_key
+from utils.lazy_import import lazy_import
+from utils.tracing import current_span, traced
+
+# Google APIクライアントは読み込みが重いため最初に使う時に読み込む（例外クラスは except 節で使うため通常どおり）
+Request = lazy_import("google.auth.transport.requests", "Request")
+Credentials = lazy_import("google.oauth2.credentials", "Credentials")
+InstalledAppFlow = lazy_import("google_auth_oauthlib.flow", "InstalledAppFlow")
+build = lazy_import("googleapiclient.discovery", "build")
 
 class CalendarService:
     """Googleカレンダー操作サービスクラス"""
 
-    def __init__(self):
+    # 予定の読み取りはDB上のローカルミラー（calendar_events）から行い、syncTokenで差分同期する
+    # ミラーを同期せずにそのまま使う時間（秒）
+    MIRROR_MAX_AGE_SECONDS = int(os.getenv('CALENDAR_MIRROR_MAX_AGE_SECONDS', '60'))
+    # 朝の通知後に事前同期したミラーを、タスク選択の返信で同期せずに使う時間（秒）。
+    # 最後の同期が事前同期（sync_calendar(prefetch=True)）の場合だけ適用し、それ以外は MIRROR_MAX_AGE_SECONDS
+    PREFETCH_MAX_AGE_SECONDS = int(os.getenv('CALENDAR_PREFETCH_MAX_AGE_SECONDS', '900'))
+    # ミラーで保持する期間（今日の何日前から何日後まで）。期間外の読み取りはAPIから直接取得する
+    MIRROR_PAST_DAYS = 1
+    MIRROR_FUTURE_DAYS = 35
+    # 予定の並行追加で1件を待つ時間の上限（秒）
+    EVENT_INSERT_TIMEOUT_SECONDS = 20
+
+    def __init__(self, db=None):
         self.SCOPES = ['https://www.googleapis.com/auth/calendar']
-        self.service = None
-        self.credentials = None
+        # 認証済みのクライアントはユーザーごとに異なるため、インスタンスを共有してもスレッドごとに保持する
+        self._local = threading.local()
+        # 同じユーザーの同期を同時に1つだけ行うためのロック
+        self._sync_locks = {}
+        self._sync_locks_guard = threading.Lock()
+        # 空き時間のキャッシュ {(user_id, 日付): (分単位のバケット, 空き時間)}
+        # 1回の操作の中で選択→承認→緊急追加と同じ日の空き時間を何度も計算しないようにする
+        self._free_slot_cache = {}
+        self._free_slot_lock = threading.Lock()
+        self.free_slot_cache_stats = {'hit': 0, 'miss': 0}
         # データベースインスタンスを初期化
-        from models.database import init_db
-        self.db = init_db()
+        if db is None:
+            from models.database import init_db
+            db = init_db()
+        self.db = db
+
+    @property
+    def service(self):
+        """authenticate_user() で作成したGoogle Calendar APIクライアント（スレッドごと）"""
+        return getattr(self._local, 'service', None)
+
+    @service.setter
+    def service(self, value):
+        self._local.service = value
+
+    @property
+    def credentials(self):
+        """authenticate_user() で読み込んだ認証情報（スレッドごと）"""
+        return getattr(self._local, 'credentials', None)
+
+    @credentials.setter
+    def credentials(self, value):
+        self._local.credentials = value
+
+    def _execute(self, operation: str, request, **span_attributes):
+        """Google Calendar APIリクエストを実行（所要時間をメトリクス・トレースに記録）"""
+        from utils.metrics import UPSTREAM_DURATION, track
+        with track(UPSTREAM_DURATION, service="google_calendar", operation=operation):
+            span = current_span()
+            if span is not None and span_attributes:
+                span.attributes.update(span_attributes)
+            return request.execute()
+
+    @staticmethod
+    def _as_jst(value: datetime) -> datetime:
+        import pytz
+        jst = pytz.timezone('Asia/Tokyo')
+        if value.tzinfo is None:
+            return jst.localize(value)
+        return value.astimezone(jst)
+
+    def _mirror_window(self):
+        """ミラーで保持する期間（JSTの日単位）"""
+        import pytz
+        today = datetime.now(pytz.timezone('Asia/Tokyo')).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=self.MIRROR_PAST_DAYS), today + timedelta(days=self.MIRROR_FUTURE_DAYS)
+
+    def _is_mirror_fresh(self, state: Optional[Dict], window_start: datetime,
+                         max_age_seconds: Optional[int] = None) -> bool:
+        """
+        ミラーが今日の期間で同期済みで、同期から MIRROR_MAX_AGE_SECONDS 以内か
+
+        max_age_seconds は最後の同期が事前同期の場合だけ使う（通常の同期の後に追加された予定を見落とさないため）。
+        """
+        if not state or state['window_start'] != to_utc_key(window_start):
+            return False
+        if max_age_seconds is None or not state.get('prefetched'):
+            max_age_seconds = self.MIRROR_MAX_AGE_SECONDS
+        return (datetime.now() - state['synced_at']).total_seconds() < max_age_seconds
+
+    def _get_sync_lock(self, user_id: str) -> threading.Lock:
+        with self._sync_locks_guard:
+            return self._sync_locks.setdefault(user_id, threading.Lock())
+
+    def _fetch_events(self, **params):
+        """events().list を全ページ取得し、(イベントのリスト, nextSyncToken) を返す"""
+        items = []
+        page_token = None
+        while True:
+            result = self._execute("events_sync", self.service.events().list(
+                calendarId='primary',
+                singleEvents=True,
+                maxResults=2500,
+                pageToken=page_token,
+                **params
+            ))
+            items.extend(result.get('items') or [])
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return items, result.get('nextSyncToken')
+
+    def sync_calendar(self, user_id: str, force: bool = False, prefetch: bool = False) -> bool:
+        """
+        ローカルミラーを同期
+
+        syncTokenがあれば差分だけを取得し、ない場合・期限切れ（410）の場合・日付が変わって
+        保持期間がずれた場合は期間内の全件を取得し直す。
+
+        Args:
+            user_id: ユーザーID
+            force: Trueの場合はミラーが新しくても同期する
+            prefetch: 朝の通知後の事前同期（CalendarPrefetcher）の場合True。タスク選択の返信で長めに使える
+
+        Returns:
+            bool: ミラーが使える状態ならTrue（認証・APIの失敗時はFalse）
+        """
+        window_start, window_end = self._mirror_window()
+        with self._get_sync_lock(user_id):
+            state = self.db.get_calendar_sync_state(user_id)
+            if not force and self._is_mirror_fresh(state, window_start):
+                return True  # 待っている間に他のスレッドが同期済み
+            if not self.authenticate_user(user_id):
+                return False
+
+            full = not state or not state['sync_token'] or state['window_start'] != to_utc_key(window_start)
+            try:
+                if not full:
+                    try:
+                        items, sync_token = self._fetch_events(syncToken=state['sync_token'])
+                    except HttpError as error:
+                        if getattr(error.resp, 'status', None) != 410:
+                            raise
+                        print(f"[sync_calendar] syncTokenが無効のため全件同期: user_id={user_id}")
+                        full = True
+                if full:
+                    items, sync_token = self._fetch_events(
+                        timeMin=window_start.isoformat(),
+                        timeMax=window_end.isoformat()
+                    )
+            except HttpError as error:
+                print(f'[sync_calendar] Calendar API error: {error}')
+                return False
+
+            events, deleted_ids = [], []
+            for item in items:
+                if item.get('status') == 'cancelled':
+                    deleted_ids.append(item.get('id'))
+                    continue
+                row = event_to_row(item)
+                if row:
+                    events.append(row)
+            print(f"[sync_calendar] user_id={user_id}, {'全件' if full else '差分'}同期: 更新{len(events)}件, 削除{len(deleted_ids)}件")
+            if full or events or deleted_ids:
+                self.invalidate_free_slots(user_id)
+            return self.db.apply_calendar_sync(
+                user_id, events, deleted_ids, sync_token,
+                to_utc_key(window_start), to_utc_key(window_end), full, prefetch
+            )
+
+    def _list_events(self, user_id: str, time_min: datetime, time_max: datetime,
+                     force_refresh: bool = False, max_age_seconds: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        期間と重なる予定を開始時刻順に取得（events().list と同じ形のイベント）
+
+        ミラーの保持期間内はローカルミラーから読み、ミラーが古い場合（または force_refresh）は
+        先に差分同期する。保持期間外の場合はAPIから直接取得する。
+
+        Args:
+            max_age_seconds: 事前同期したミラーを同期せずに使う古さの上限（Noneの場合・事前同期でない場合は MIRROR_MAX_AGE_SECONDS）
+
+        Returns:
+            イベントのリスト。認証・APIの失敗時はNone
+        """
+        from utils.metrics import record_cache
+        time_min = self._as_jst(time_min)
+        time_max = self._as_jst(time_max)
+        window_start, window_end = self._mirror_window()
+        if time_min < window_start or time_max > window_end:
+            return self._list_events_live(user_id, time_min, time_max)
+
+        fresh = not force_refresh and self._is_mirror_fresh(
+            self.db.get_calendar_sync_state(user_id), window_start, max_age_seconds
+        )
+        # 同期なしで読めたかを記録（事前同期を前提にした読み取りは calendar_prefetch として分けて数える）
+        record_cache("calendar_mirror" if max_age_seconds is None else "calendar_prefetch", fresh)
+        if not fresh:
+            if not self.sync_calendar(user_id, force=force_refresh):
+                return None
+        return self.db.get_calendar_events(user_id, time_min, time_max)
+
+    def _list_events_live(self, user_id: str, time_min: datetime, time_max: datetime) -> Optional[List[Dict]]:
+        """ミラーの保持期間外の予定をAPIから直接取得"""
+        if not self.authenticate_user(user_id):
+            return None
+        try:
+            events_result = self._execute("events_list", self.service.events().list(
+                calendarId='primary',
+                timeMin=time_min.isoformat(),
+                timeMax=time_max.isoformat(),
+                singleEvents=True,
+                orderBy='startTime'
+            ))
+            return events_result.get('items') or []
+        except HttpError as error:
+            print(f'[_list_events_live] Calendar API error: {error}')
+            return None
 
     def authenticate_user(self, user_id: str) -> bool:
         """ユーザーの認証を行う（DB保存方式）"""
@@ -47,18 +256,62 @@ class CalendarService:
                     return False
             
             self.credentials = creds
-            self.service = build('calendar', 'v3', credentials=creds)
+            # GOOGLE_CALENDAR_API_ENDPOINT: ベンチマーク等でスタブサーバーに向ける場合に指定
+            api_endpoint = os.getenv('GOOGLE_CALENDAR_API_ENDPOINT')
+            client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+            self.service = build('calendar', 'v3', credentials=creds, client_options=client_options)
             return True
             
         except Exception as e:
             print(f"Authentication error: {e}")
             return False
 
-    def get_free_busy_times(self, user_id: str, date: datetime) -> List[Dict]:
-        """指定日の空き時間を取得"""
-        if not self.authenticate_user(user_id):
-            return []
-        
+    @staticmethod
+    def _free_slot_bucket() -> str:
+        """キャッシュのバケット（今日の空き時間は現在時刻から計算するため分単位）"""
+        import pytz
+        return datetime.now(pytz.timezone('Asia/Tokyo')).strftime('%Y-%m-%dT%H:%M')
+
+    def invalidate_free_slots(self, user_id: str):
+        """ユーザーの空き時間のキャッシュを破棄（予定の追加・スケジュール承認・同期で変更があった時）"""
+        with self._free_slot_lock:
+            for key in [key for key in self._free_slot_cache if key[0] == user_id]:
+                del self._free_slot_cache[key]
+
+    def get_free_busy_times(self, user_id: str, date: datetime, force_refresh: bool = False,
+                            max_age_seconds: Optional[int] = None) -> List[Dict]:
+        """
+        指定日の空き時間を取得（同じ分の間はキャッシュから返す）
+
+        max_age_seconds を指定した場合は、その時間以内に事前同期したミラーを同期せずに使う
+        （朝の通知後に事前同期したミラーをタスク選択の返信で使う場合）。
+        """
+        from utils.metrics import record_cache
+        key = (user_id, self._as_jst(date).date())
+        bucket = self._free_slot_bucket()
+        with self._free_slot_lock:
+            cached = None if force_refresh else self._free_slot_cache.get(key)
+            hit = bool(cached) and cached[0] == bucket
+            # 並行する返信の処理から更新されるため、集計もロック内で加算する
+            self.free_slot_cache_stats['hit' if hit else 'miss'] += 1
+        record_cache("free_slots", hit)
+        if hit:
+            # 呼び出し側が要素を書き換えても（get_week_free_busy_timesの'date'など）キャッシュに影響しないようにコピーを返す
+            return [dict(slot) for slot in cached[1]]
+
+        free_times = self._compute_free_busy_times(user_id, date, force_refresh, max_age_seconds)
+        # 空の結果は認証・APIの失敗の場合もあるためキャッシュしない
+        if free_times:
+            with self._free_slot_lock:
+                # 古いバケットの結果は使われないため、保存のついでに捨てる
+                for stale_key in [k for k, (b, _) in self._free_slot_cache.items() if b != bucket]:
+                    del self._free_slot_cache[stale_key]
+                self._free_slot_cache[key] = (bucket, [dict(slot) for slot in free_times])
+        return free_times
+
+    def _compute_free_busy_times(self, user_id: str, date: datetime, force_refresh: bool = False,
+                                 max_age_seconds: Optional[int] = None) -> List[Dict]:
+        """指定日の空き時間を予定から計算"""
         try:
             # 現在時刻を取得（JST）
             import pytz
@@ -87,19 +340,9 @@ class CalendarService:
             print(f"[get_free_busy_times] 日付={date.date()}, 開始時刻={start_time}, 終了時刻={end_time}")
             
             # 既存の予定を取得
-            time_min_str = start_time.isoformat()
-            time_max_str = end_time.isoformat()
-            print(f"[get_free_busy_times] カレンダーAPI呼び出し: timeMin={time_min_str}, timeMax={time_max_str}")
-            
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=time_min_str,
-                timeMax=time_max_str,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            events = self._list_events(user_id, start_time, end_time, force_refresh, max_age_seconds)
+            if events is None:
+                return []
             print(f"[get_free_busy_times] 取得したイベント数: {len(events)}")
             
             # 空き時間を計算
@@ -160,10 +403,7 @@ class CalendarService:
             return []
 
     def get_week_free_busy_times(self, user_id: str, start_date: datetime) -> List[Dict]:
-        """指定週の空き時間を取得（7日間）"""
-        if not self.authenticate_user(user_id):
-            return []
-        
+        """指定週の空き時間を取得（7日間、予定はミラーから読むため日ごとにAPIは呼ばない）"""
         try:
             # start_dateがタイムゾーン情報を持っていない場合はJSTを設定
             import pytz
@@ -228,11 +468,16 @@ class CalendarService:
                 },
             }
             print(f"[add_event_to_calendar] 追加内容: user_id={user_id}, task_name={task_name}, start_time={start_time}, duration={duration_minutes}, event={event}")
-            event_result = self.service.events().insert(
+            event_result = self._execute("events_insert", self.service.events().insert(
                 calendarId='primary',
                 body=event
-            ).execute()
+            ), task_name=clean_task_name, start_time=start_time.isoformat())
             print(f'[add_event_to_calendar] Event created: {event_result.get("htmlLink")}, id={event_result.get("id")}, summary={event_result.get("summary")}, start={event_result.get("start")}, end={event_result.get("end")}')
+            # 追加した予定はすぐにミラーへ反映（次の差分同期を待たずに空き時間の計算に含める）
+            row = event_to_row(event_result)
+            if row:
+                self.db.save_calendar_events(user_id, [row])
+            self.invalidate_free_slots(user_id)
             return True
         except HttpError as error:
             print(f'[add_event_to_calendar] Calendar API error: {error}')
@@ -243,8 +488,11 @@ class CalendarService:
             traceback.print_exc()
             return False
 
+    @traced("calendar.add_events_to_calendar")
     def add_events_to_calendar(self, user_id: str, schedule_proposal: str) -> int:
         """スケジュール提案をカレンダーに反映（日付パース強化・2行セット対応・未来タスク対応）"""
+        # スケジュールの承認で予定が変わるため、承認前に計算した空き時間は使わない
+        self.invalidate_free_slots(user_id)
         try:
             import re
             from datetime import datetime, timedelta
@@ -252,7 +500,8 @@ class CalendarService:
             lines = [line.strip() for line in schedule_proposal.split('\n') if line.strip()]
             jst = pytz.timezone('Asia/Tokyo')
             today = datetime.now(jst).replace(hour=0, minute=0, second=0, microsecond=0)
-            success_count = 0
+            # パースした予定（タスク名, 開始時刻, 所要時間）。追加は最後にまとめて並行して行う
+            events = []
             unparsable_lines = []
             i = 0
             
@@ -310,8 +559,7 @@ class CalendarService:
                         task_name = m_task.group(1).strip()
                         duration = int(m_task.group(2))
                         start_time = target_date.replace(hour=start_hour, minute=start_min)
-                        if self.add_event_to_calendar(user_id, task_name, start_time, duration):
-                            success_count += 1
+                        events.append((task_name, start_time, duration))
                         i += 2
                         continue
                 
@@ -335,8 +583,7 @@ class CalendarService:
                             task_name = m_task.group(1).strip()
                             duration = int(m_task.group(2))
                             start_time = target_date.replace(hour=start_hour, minute=start_min)
-                            if self.add_event_to_calendar(user_id, task_name, start_time, duration):
-                                success_count += 1
+                            events.append((task_name, start_time, duration))
                             i = next_line_idx + 1
                             continue
                 
@@ -362,8 +609,7 @@ class CalendarService:
                         task_name = m_task.group(1).strip()
                         duration = int(m_task.group(2))
                         start_time = target_date.replace(hour=start_hour, minute=start_min)
-                        if self.add_event_to_calendar(user_id, task_name, start_time, duration):
-                            success_count += 1
+                        events.append((task_name, start_time, duration))
                         i += 2
                         continue
                 # 既存の1行パターンもサポート
@@ -377,8 +623,7 @@ class CalendarService:
                     task_name = m.group(6).strip()
                     duration = int(m.group(7))
                     start_time = target_date.replace(hour=start_hour, minute=start_min)
-                    if self.add_event_to_calendar(user_id, task_name, start_time, duration):
-                        success_count += 1
+                    events.append((task_name, start_time, duration))
                     i += 1
                     continue
                 # 2. (所要時間明示なし) 例: - **08:00〜08:20** 書類作成 など
@@ -396,8 +641,7 @@ class CalendarService:
                             end += timedelta(days=1)
                         duration = int((end-start).total_seconds()//60)
                         start_time = target_date.replace(hour=start_hour, minute=start_min)
-                        if self.add_event_to_calendar(user_id, task_name, start_time, duration):
-                            success_count += 1
+                        events.append((task_name, start_time, duration))
                     except Exception as e:
                         print(f"[add_events_to_calendar] パース失敗: {line} err={e}")
                     i += 1
@@ -407,30 +651,43 @@ class CalendarService:
                     print(f"[add_events_to_calendar] パースできなかった行: {line}")
                     unparsable_lines.append(line)
                 i += 1
-            return success_count
+            return self.add_events_in_parallel(user_id, events)
         except Exception as e:
             print(f"Error adding events to calendar: {e}")
             return 0
 
-    def get_today_schedule(self, user_id: str) -> List[Dict]:
+    def add_events_in_parallel(self, user_id: str, events: List[tuple]) -> int:
+        """
+        複数の予定を並行して追加（予定の追加は互いに依存しないため）
+
+        Args:
+            user_id: ユーザーID
+            events: [(タスク名, 開始時刻, 所要時間(分)), ...]
+
+        Returns:
+            int: 追加に成功した件数
+        """
+        from utils.concurrency import submit, wait_or_default
+        futures = [
+            submit(self.add_event_to_calendar, user_id, task_name, start_time, duration)
+            for task_name, start_time, duration in events
+        ]
+        return sum(
+            1 for future in futures
+            if wait_or_default(future, self.EVENT_INSERT_TIMEOUT_SECONDS, "add_event_to_calendar", default=False)
+        )
+
+    @traced("calendar.get_today_schedule")
+    def get_today_schedule(self, user_id: str, force_refresh: bool = False) -> List[Dict]:
         """今日のスケジュールを取得（JST厳密化）"""
-        if not self.authenticate_user(user_id):
-            return []
         try:
             import pytz
             jst = pytz.timezone('Asia/Tokyo')
             today = datetime.now(jst).replace(hour=0, minute=0, second=0, microsecond=0)
             tomorrow = today + timedelta(days=1)
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=today.isoformat(),
-                timeMax=tomorrow.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
+            events = self._list_events(user_id, today, tomorrow, force_refresh)
             if events is None:
-                events = []
+                return []
             schedule = []
             for event in events:
                 if not event or not event.get('start') or not event.get('end'):
@@ -448,25 +705,16 @@ class CalendarService:
             print(f'Calendar API error: {error}')
             return []
 
-    def get_day_schedule(self, user_id: str, target_date: datetime) -> List[Dict]:
+    def get_day_schedule(self, user_id: str, target_date: datetime, force_refresh: bool = False) -> List[Dict]:
         """指定日のスケジュールを取得"""
-        if not self.authenticate_user(user_id):
-            return []
         try:
             # 指定日の開始と終了時間
             start_time = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
             end_time = start_time + timedelta(days=1)
             
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_time.isoformat(),
-                timeMax=end_time.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
+            events = self._list_events(user_id, start_time, end_time, force_refresh)
             if events is None:
-                events = []
+                return []
             schedule = []
             for event in events:
                 if not event or not event.get('start') or not event.get('end'):
@@ -484,23 +732,16 @@ class CalendarService:
             print(f'Calendar API error: {error}')
             return []
 
-    def get_week_schedule(self, user_id: str, start_date: datetime) -> List[Dict]:
+    def get_week_schedule(self, user_id: str, start_date: datetime, force_refresh: bool = False) -> List[Dict]:
         """指定週のスケジュールを取得（7日間）"""
-        if not self.authenticate_user(user_id):
-            return []
         try:
             # 週の開始と終了時間
             week_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
             week_end = week_start + timedelta(days=7)
             
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=week_start.isoformat(),
-                timeMax=week_end.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
+            events = self._list_events(user_id, week_start, week_end, force_refresh)
+            if events is None:
+                return []
             
             # 日付ごとにグループ化
             schedule_by_day = {}
@@ -545,22 +786,14 @@ class CalendarService:
             return []
 
     def check_time_conflict(self, user_id: str, start_time: datetime, 
-                          duration_minutes: int) -> bool:
+                          duration_minutes: int, force_refresh: bool = False) -> bool:
         """時間の重複をチェック"""
-        if not self.authenticate_user(user_id):
-            return True  # 認証できない場合は重複とみなす
-        
         try:
             end_time = start_time + timedelta(minutes=duration_minutes)
             
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_time.isoformat(),
-                timeMax=end_time.isoformat(),
-                singleEvents=True
-            ).execute()
-            
-            events = events_result.get('items', [])
+            events = self._list_events(user_id, start_time, end_time, force_refresh)
+            if events is None:
+                return True  # 認証できない場合は重複とみなす
             return len(events) > 0
             
         except HttpError as error:
@@ -0,0 +1,217 @@
+"""
+サービスコンテナ
+プロセスごとに各サービス・APIクライアントを1つだけ作成して共有する
+
+gunicorn --preload ではマスターでアプリを読み込んでからワーカーをフォークするため、
+設定やimport済みモジュールなどの不変な部分はコピーオンライトで共有される。
+ソケット・コネクションプール・スレッドはフォーク後に使えないため、
+各ワーカーで after_fork() を呼んで作り直す（gunicorn.conf.py の post_fork）。
+
+使い方:
+    from services.container import container
+    container.task_service.get_user_tasks(user_id)
+    openai_service = container.proxy("openai_service")  # after_fork() 後も新しい実体を参照する
+"""
+import os
+import threading
+from typing import Callable, Dict, List
+
+# スケジューラーの開始をフォーク後まで遅らせる（gunicorn.conf.py が preload 時に設定）
+DEFER_SCHEDULER_ENV = "REMIND_DEFER_SCHEDULER"
+
+
+class ServiceProxy:
+    """
+    コンテナのサービスを名前で参照するプロキシ
+
+    参照のたびにコンテナから取得するため、after_fork() でサービスを作り直しても
+    モジュール変数に保持したプロキシはそのまま使える。
+    """
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def _resolve(self):
+        return getattr(object.__getattribute__(self, "_container"), object.__getattribute__(self, "_name"))
+
+    def __getattr__(self, name):
+        # typing（Optional[X]など）やmockが調べる特殊属性では作成しない
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return f"<ServiceProxy {object.__getattribute__(self, '_name')}>"
+
+
+class ServiceContainer:
+    """サービス・APIクライアントをプロセスごとに1つずつ保持するコンテナ"""
+
+    # ソケット・コネクションプールを持つため、フォーク後に作り直すサービス
+    PER_PROCESS = ("line_bot_api", "multi_tenant_service", "openai_service", "calendar_service")
+
+    def __init__(self):
+        # サービスの作成中に他のサービスを参照するため再入可能なロックを使う
+        self._lock = threading.RLock()
+        self._instances: Dict[str, object] = {}
+        self._after_fork_callbacks: List[Callable[[], None]] = []
+        self.pid = os.getpid()
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def proxy(self, name: str) -> ServiceProxy:
+        """サービスを名前で参照するプロキシを作成"""
+        if not hasattr(type(self), name):
+            raise AttributeError(f"未知のサービスです: {name}")
+        return ServiceProxy(self, name)
+
+    def is_created(self, name: str) -> bool:
+        """サービスを作成済みか"""
+        return name in self._instances
+
+    @property
+    def db(self):
+        from models.database import init_db
+        return init_db()
+
+    @property
+    def task_service(self):
+        def create():
+            from services.task_service import TaskService
+            return TaskService(self.db)
+        return self._get("task_service", create)
+
+    @property
+    def calendar_service(self):
+        def create():
+            from services.calendar_service import CalendarService
+            return CalendarService(self.db)
+        return self._get("calendar_service", create)
+
+    @property
+    def openai_service(self):
+        def create():
+            from services.openai_service import OpenAIService
+            return OpenAIService(db=self.db, enable_cache=True, cache_ttl_hours=24)
+        return self._get("openai_service", create)
+
+    @property
+    def multi_tenant_service(self):
+        def create():
+            from services.multi_tenant_service import MultiTenantService
+            return MultiTenantService()
+        return self._get("multi_tenant_service", create)
+
+    @property
+    def notification_service(self):
+        def create():
+            from services.notification_service import NotificationService
+            return NotificationService()
+        return self._get("notification_service", create)
+
+    @property
+    def line_bot_api(self):
+        def create():
+            from linebot.v3.messaging import ApiClient, Configuration, MessagingApi
+            from utils.metrics import UPSTREAM_DURATION, instrument_methods
+            configuration = Configuration(access_token=os.environ["LINE_CHANNEL_ACCESS_TOKEN"], host=os.getenv("LINE_API_HOST"))
+            return instrument_methods(
+                MessagingApi(ApiClient(configuration)), UPSTREAM_DURATION, "operation",
+                methods=["reply_message", "push_message"], service="line"
+            )
+        return self._get("line_bot_api", create)
+
+    @property
+    def defer_scheduler(self) -> bool:
+        """スケジューラーの開始をフォーク後まで遅らせるか"""
+        return os.getenv(DEFER_SCHEDULER_ENV, "").lower() in ("1", "true", "yes")
+
+    def start_scheduler(self):
+        """このプロセスでスケジューラーを開始"""
+        service = self.notification_service
+        if not service.is_running:
+            service.start_scheduler()
+
+    def register_after_fork(self, callback: Callable[[], None]):
+        """フォーク後に呼ぶ処理を登録（スレッドプールやクライアントのキャッシュの破棄など）"""
+        self._after_fork_callbacks.append(callback)
+
+    def after_fork(self):
+        """
+        フォーク後のワーカーで呼ぶ。親プロセスから引き継いだ接続・スレッドを破棄する
+
+        - ログ出力スレッドを起動し直す
+        - ハンドラーの並行実行用のスレッドプールを破棄（次に使う時に作り直す）
+        - DBのコネクションプールを破棄（親の接続は閉じずに参照だけを捨てる）
+        - HTTPクライアントを持つサービスを破棄（次に使う時に作り直す）
+        - スケジューラースレッドはフォークで引き継がれないため、動作中の状態を解除する
+        - register_after_fork() で登録された処理を呼ぶ
+        """
+        # 親プロセスのロックが取得中のままコピーされている可能性があるため作り直す
+        self._lock = threading.RLock()
+        self.pid = os.getpid()
+
+        from utils.logger import configure_logging
+        configure_logging()
+
+        from utils.concurrency import reset_executor
+        reset_executor()
+
+        from models import database
+        engine = getattr(database.db, "engine", None) if database.db is not None else None
+        if engine is not None:
+            # close=False: 親プロセスと共有しているソケットを閉じない（SQLAlchemy推奨のフォーク対応）
+            engine.dispose(close=False)
+
+        for name in self.PER_PROCESS:
+            self._instances.pop(name, None)
+
+        notification_service = self._instances.get("notification_service")
+        if notification_service is not None and notification_service.is_running:
+            import schedule
+            schedule.clear()
+            notification_service.is_running = False
+            notification_service.scheduler_thread = None
+
+        for callback in self._after_fork_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[ServiceContainer] フォーク後処理エラー: {e}")
+                import traceback
+                traceback.print_exc()
+        print(f"[ServiceContainer] フォーク後の初期化完了: pid={self.pid}")
+
+    def warm_imports(self):
+        """
+        重いSDKを読み込む（preload時にマスターで呼び、読み込み済みモジュールをワーカーで共有する）
+        """
+        import importlib
+        for module_name in ("linebot.v3.messaging", "openai", "googleapiclient.discovery", "google.oauth2.credentials"):
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                print(f"[ServiceContainer] モジュール読み込みスキップ: {module_name} ({e})")
+
+
+container = ServiceContainer()
@@ -1,13 +1,20 @@
 import os
 import json
+import threading
 from typing import Dict, Optional
-from linebot.v3.messaging import Configuration, ApiClient, MessagingApi
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+Configuration, ApiClient, MessagingApi = lazy_import("linebot.v3.messaging", "Configuration", "ApiClient", "MessagingApi")
 
 class MultiTenantService:
     """マルチテナント対応サービスクラス"""
     
     def __init__(self):
         self.channel_configs = self._load_channel_configs()
+        # チャネルごとのMessagingApiクライアント（コネクションプールを使い回す）
+        self._messaging_apis: Dict[str, MessagingApi] = {}
+        self._messaging_apis_lock = threading.Lock()
     
     def _load_channel_configs(self) -> Dict[str, Dict]:
         """チャネル設定を環境変数から読み込み"""
@@ -51,15 +58,32 @@ class MultiTenantService:
         return None
     
     def get_messaging_api(self, channel_id: str) -> Optional[MessagingApi]:
-        """指定されたチャネルIDのMessagingApiクライアントを取得"""
+        """指定されたチャネルIDのMessagingApiクライアントを取得（作成済みのクライアントを再利用）"""
         config = self.get_channel_config(channel_id)
         if not config:
             return None
-        
+
+        access_token = config['access_token']
+        api = self._messaging_apis.get(access_token)
+        if api is None:
+            with self._messaging_apis_lock:
+                api = self._messaging_apis.get(access_token)
+                if api is None:
+                    api = self._create_messaging_api(access_token)
+                    if api is not None:
+                        self._messaging_apis[access_token] = api
+        return api
+
+    def _create_messaging_api(self, access_token: str) -> Optional[MessagingApi]:
+        """MessagingApiクライアントを作成"""
         try:
-            configuration = Configuration(access_token=config['access_token'])
+            configuration = Configuration(access_token=access_token, host=os.getenv('LINE_API_HOST'))
             api_client = ApiClient(configuration)
-            return MessagingApi(api_client)
+            from utils.metrics import UPSTREAM_DURATION, instrument_methods
+            return instrument_methods(
+                MessagingApi(api_client), UPSTREAM_DURATION, "operation",
+                methods=["reply_message", "push_message"], service="line"
+            )
         except Exception as e:
             print(f"[MultiTenantService] MessagingApi作成エラー: {e}")
             return None
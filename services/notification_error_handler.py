@@ -2,11 +2,14 @@
 通知サービスのエラーハンドリングとリトライロジック
 """
 import time
+import heapq
+import itertools
 import logging
-from typing import Callable, Any, Optional, Dict
+from typing import Callable, Any, Optional, Dict, List
 from enum import Enum
 from datetime import datetime
 import pytz
+from utils.metrics import NOTIFICATION_CALLS, NOTIFICATION_ERRORS, NOTIFICATION_RETRIES
 
 
 class ErrorType(Enum):
@@ -145,6 +148,23 @@ class NotificationErrorHandler:
 
         return delay
 
+    def _record_error(self, error: Exception) -> ErrorType:
+        """エラーを分類して統計に記録"""
+        self.error_stats['total_errors'] += 1
+        error_type = self.classify_error(error)
+        NOTIFICATION_ERRORS.labels(error_type=error_type.value).inc()
+
+        # エラー統計を更新
+        error_type_str = error_type.value
+        if error_type_str not in self.error_stats['errors_by_type']:
+            self.error_stats['errors_by_type'][error_type_str] = 0
+        self.error_stats['errors_by_type'][error_type_str] += 1
+        return error_type
+
+    def create_retry_queue(self, sleep_func: Callable = time.sleep, clock: Callable = time.monotonic) -> 'RetryQueue':
+        """この設定・統計を共有するリトライキューを作成"""
+        return RetryQueue(self, sleep_func=sleep_func, clock=clock)
+
     def execute_with_retry(
         self,
         func: Callable,
@@ -167,6 +187,7 @@ class NotificationErrorHandler:
             NotificationError: リトライ後も失敗した場合
         """
         self.error_stats['total_calls'] += 1
+        NOTIFICATION_CALLS.inc()
         attempt = 0
 
         while attempt <= self.config.max_retries:
@@ -185,14 +206,7 @@ class NotificationErrorHandler:
                 return result
 
             except Exception as e:
-                self.error_stats['total_errors'] += 1
-                error_type = self.classify_error(e)
-
-                # エラー統計を更新
-                error_type_str = error_type.value
-                if error_type_str not in self.error_stats['errors_by_type']:
-                    self.error_stats['errors_by_type'][error_type_str] = 0
-                self.error_stats['errors_by_type'][error_type_str] += 1
+                error_type = self._record_error(e)
 
                 # エラーログ
                 self.logger.error(
@@ -216,6 +230,7 @@ class NotificationErrorHandler:
                 if attempt <= self.config.max_retries:
                     delay = self.calculate_delay(attempt - 1, error_type)
                     self.error_stats['total_retries'] += 1
+                    NOTIFICATION_RETRIES.inc()
                     self.logger.warning(
                         f"[{operation_name}] {delay:.2f}秒後にリトライします..."
                     )
@@ -266,3 +281,120 @@ class NotificationErrorHandler:
         self.logger.info("エラータイプ別:")
         for error_type, count in stats['errors_by_type'].items():
             self.logger.info(f"  {error_type}: {count}")
+
+
+class _RetryJob:
+    """リトライキューに積まれる1件分の処理"""
+    def __init__(self, func: Callable, args: tuple, kwargs: dict, operation_name: str, key: Any):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.operation_name = operation_name
+        self.key = key
+        self.attempt = 0
+
+
+class RetryQueue:
+    """
+    ノンブロッキングな遅延リトライキュー（ヒープ実装）
+
+    失敗した処理をtime.sleepで待たずに実行予定時刻付きでヒープへ戻し、
+    その間に他の宛先の処理を進める。全体の所要時間は
+    リトライ合計ではなく、最も遅いリトライ系列で抑えられる。
+    統計は生成元のNotificationErrorHandlerに記録される。
+    """
+
+    def __init__(
+        self,
+        error_handler: NotificationErrorHandler,
+        sleep_func: Callable = time.sleep,
+        clock: Callable = time.monotonic
+    ):
+        self.error_handler = error_handler
+        self._sleep = sleep_func
+        self._clock = clock
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def submit(
+        self,
+        func: Callable,
+        *args,
+        operation_name: str = "operation",
+        key: Any = None,
+        **kwargs
+    ) -> None:
+        """
+        処理をキューに追加（初回は即時実行対象）
+
+        Args:
+            func: 実行する関数
+            operation_name: 操作名（ログ用）
+            key: 結果を識別するキー（省略時はoperation_name）
+            *args, **kwargs: funcに渡す引数
+        """
+        self.error_handler.error_stats['total_calls'] += 1
+        NOTIFICATION_CALLS.inc()
+        job = _RetryJob(func, args, kwargs, operation_name, key if key is not None else operation_name)
+        self._push(self._clock(), job)
+
+    def _push(self, due: float, job: _RetryJob) -> None:
+        # 同時刻のジョブは投入順に処理する
+        heapq.heappush(self._heap, (due, next(self._counter), job))
+
+    def run(self) -> Dict[Any, bool]:
+        """
+        キューが空になるまで処理を実行
+
+        Returns:
+            キーごとの成否（True: 成功, False: リトライ後も失敗）
+        """
+        handler = self.error_handler
+        config = handler.config
+        results: Dict[Any, bool] = {}
+
+        while self._heap:
+            due, _, job = heapq.heappop(self._heap)
+
+            # 先頭ジョブの実行予定時刻まで待機（待機するのはキュー全体で1回分のみ）
+            wait = due - self._clock()
+            if wait > 0:
+                self._sleep(wait)
+
+            try:
+                if job.attempt > 0:
+                    handler.logger.info(
+                        f"[{job.operation_name}] リトライ {job.attempt}/{config.max_retries}"
+                    )
+                job.func(*job.args, **job.kwargs)
+                if job.attempt > 0:
+                    handler.logger.info(f"[{job.operation_name}] リトライ成功（試行回数: {job.attempt + 1}）")
+                results[job.key] = True
+
+            except Exception as e:
+                error_type = handler._record_error(e)
+                handler.logger.error(
+                    f"[{job.operation_name}] エラー発生 "
+                    f"(試行回数: {job.attempt + 1}, エラータイプ: {error_type.value}): {str(e)}"
+                )
+
+                if not handler.should_retry(error_type, job.attempt):
+                    handler.logger.error(
+                        f"[{job.operation_name}] リトライ不可能なエラー、または最大リトライ回数に到達"
+                    )
+                    results[job.key] = False
+                    continue
+
+                delay = handler.calculate_delay(job.attempt, error_type)
+                job.attempt += 1
+                handler.error_stats['total_retries'] += 1
+                NOTIFICATION_RETRIES.inc()
+                handler.logger.warning(
+                    f"[{job.operation_name}] {delay:.2f}秒後にリトライします（キューに再投入）"
+                )
+                self._push(self._clock() + delay, job)
+
+        return results
@@ -4,15 +4,20 @@ import time
 import threading
 from datetime import datetime, timedelta
 import pytz
-from typing import List
+from typing import List, Optional
 # --- v3 importへ ---
 # from linebot import LineBotApi
 # from linebot.models import TextSendMessage
-from linebot.v3.messaging import MessagingApi, PushMessageRequest, TextMessage, FlexMessage, Configuration, ApiClient
-from models.database import Task
-from services.task_service import TaskService
+from utils.lazy_import import lazy_import
+
+# LINE SDKは読み込みが重いため最初に使う時に読み込む
+MessagingApi, PushMessageRequest, TextMessage, FlexMessage = lazy_import(
+    "linebot.v3.messaging", "MessagingApi", "PushMessageRequest", "TextMessage", "FlexMessage"
+)
+from models.database import Task, unit_of_work
 from services.notification_error_handler import (
     NotificationErrorHandler,
+    RetryQueue,
     RetryConfig,
     NotificationError,
     ErrorType
@@ -21,30 +26,44 @@ from services.notification_error_handler import (
 class NotificationService:
     """通知サービスクラス"""
 
+    # アウトボックスの1通知あたりの最大ドレイン回数
+    OUTBOX_MAX_ATTEMPTS = 5
+    # ドレインで1回に読むアウトボックスの行数
+    OUTBOX_DRAIN_PAGE_SIZE = 500
+    # 8時通知の送信時刻（JSTの時）。過ぎても事前作成のままの通知は定期ドレインで送信待ちにする
+    DAILY_NOTIFICATION_HOUR_JST = 8
+
     def __init__(self, retry_config: RetryConfig = None):
         import os
+        # サービス・クライアントはプロセス内で共有する（コンテナが作成・フォーク後に作り直す）
+        from services.container import container
 
         # マルチテナント対応: MultiTenantServiceを使用
-        from services.multi_tenant_service import MultiTenantService
-        self.multi_tenant_service = MultiTenantService()
-        self.task_service = TaskService()
+        self.multi_tenant_service = container.proxy("multi_tenant_service")
+        self.task_service = container.task_service
         self.scheduler_thread = None
         self.is_running = False
         # 重複実行防止用のタイムスタンプ
         self.last_notification_times = {}
         # データベース初期化
-        from models.database import init_db
-        self.db = init_db()
+        self.db = container.db
+        # 期限切れデータのスイーパー（バックログを実行間で保持する）
+        from services.ttl_sweeper import TaskCompactor, TTLSweeper
+        self.ttl_sweeper = TTLSweeper(self.db)
+        # アクティブでないタスクをtasks_archiveに移動するコンパクション
+        self.task_compactor = TaskCompactor(self.db)
+        # 朝の通知後にカレンダーを事前同期する（スレッドプールはフォーク後に作り直す）
+        from services.calendar_prefetch import CalendarPrefetcher
+        self.calendar_prefetcher = CalendarPrefetcher(container.proxy("calendar_service"))
+        container.register_after_fork(self.calendar_prefetcher.reset)
 
         # エラーハンドラーの初期化
         self.error_handler = NotificationErrorHandler(retry_config)
         
-        # LINE Bot API初期化
+        # LINE Bot API初期化（クライアントは最初の送信時に作成）
         channel_access_token = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
         if channel_access_token:
-            configuration = Configuration(access_token=channel_access_token)
-            api_client = ApiClient(configuration)
-            self.line_bot_api = MessagingApi(api_client)
+            self.line_bot_api = container.proxy("line_bot_api")
         else:
             self.line_bot_api = None
             print("[NotificationService] LINE_CHANNEL_ACCESS_TOKENが設定されていません")
@@ -57,7 +76,8 @@ class NotificationService:
         line_bot_api: MessagingApi,
         user_id: str,
         messages: list,
-        operation_name: str = "send_message"
+        operation_name: str = "send_message",
+        retry_queue: Optional[RetryQueue] = None
     ) -> bool:
         """
         LINE API呼び出しをリトライロジック付きで実行
@@ -67,9 +87,11 @@ class NotificationService:
             user_id: 送信先ユーザーID
             messages: 送信するメッセージリスト
             operation_name: 操作名（ログ用）
+            retry_queue: 一斉送信用の遅延リトライキュー（Noneの場合は即時リトライ）
 
         Returns:
             成功した場合True、失敗した場合False
+            （一斉送信中はキューへの投入に成功した時点でTrue）
         """
         def send_push_message():
             """実際のpush_message呼び出し"""
@@ -77,6 +99,15 @@ class NotificationService:
                 PushMessageRequest(to=user_id, messages=messages)
             )
 
+        # 一斉送信中は遅延リトライキューに積み、他ユーザーの処理を止めない
+        if retry_queue is not None:
+            retry_queue.submit(
+                send_push_message,
+                operation_name=f"{operation_name} to {user_id}",
+                key=user_id
+            )
+            return True
+
         try:
             self.error_handler.execute_with_retry(
                 send_push_message,
@@ -97,6 +128,15 @@ class NotificationService:
             )
             return False
 
+    def _flush_retry_queue(self, queue: RetryQueue, label: str) -> dict:
+        """キューに積まれた送信を実行し、ユーザーごとの成否を返す"""
+        results = queue.run()
+        failed = [user_id for user_id, ok in results.items() if not ok]
+        print(f"[{label}] 送信結果: 成功 {len(results) - len(failed)}件 / 失敗 {len(failed)}件")
+        if failed:
+            print(f"[{label}] リトライ後も送信失敗: {failed}")
+        return results
+
     def _check_duplicate_execution(self, notification_type: str, cooldown_minutes: int = 5) -> bool:
         """重複実行をチェックし、必要に応じて実行を防ぐ（DBベース）"""
         try:
@@ -152,17 +192,31 @@ class NotificationService:
         user_channels = self.db.get_all_user_channels()
         print(f"[send_daily_task_notification] チャネル情報を一括取得: {len(user_channels)}件")
 
+        # 送信内容をアウトボックスに登録してから送信する（再起動時は未送信分から再開）
+        run_id = self._get_outbox_run_id("daily_task_notification")
+        # 7:45に事前作成した分は確認だけして送信待ちにする
+        released = self._release_staged_notifications(run_id)
+        if released:
+            print(f"[send_daily_task_notification] 事前作成分を送信待ちに変更: {released}件")
+        staged_user_ids = set(self.db.get_outbox_user_ids(run_id))
+        if staged_user_ids:
+            print(f"[send_daily_task_notification] 登録済みのユーザーをスキップ: {len(staged_user_ids)}件 (run_id={run_id})")
+
         for user_id in user_ids:
+            if user_id in staged_user_ids:
+                continue
             try:
-                print(f"[send_daily_task_notification] ユーザー {user_id} に送信中...")
                 # 一括取得したデータを使用
                 user_channel_id = user_channels.get(user_id)
-                self._send_task_notification_to_user_multi_tenant(user_id, user_channel_id)
-                print(f"[send_daily_task_notification] ユーザー {user_id} に送信完了")
+                self._stage_task_notification(run_id, user_id, user_channel_id)
             except Exception as e:
-                print(f"[send_daily_task_notification] ユーザー {user_id} への送信エラー: {e}")
+                print(f"[send_daily_task_notification] ユーザー {user_id} の通知準備エラー: {e}")
                 import traceback
                 traceback.print_exc()
+
+        results = self.drain_outbox(run_id)
+        # 通知を受け取ったユーザーはすぐにタスクを選ぶことが多いため、返信前にカレンダーを同期しておく
+        self.calendar_prefetcher.schedule(user_id for (_, user_id), ok in results.items() if ok)
         print(f"[send_daily_task_notification] 完了: {datetime.now()}")
 
     def _send_task_notification_to_user_multi_tenant(self, user_id: str, user_channel_id: str = None):
@@ -182,28 +236,7 @@ class NotificationService:
                 print(f"[_send_task_notification_to_user_multi_tenant] チャネル {user_channel_id} のAPIクライアントが取得できません")
                 return
             
-            # 期限切れタスクを今日に移動（先に実施してから一覧を取得）
-            moved_count = self._move_overdue_tasks_to_today(user_id)
-            # タスク一覧を取得して通知メッセージを作成（8時通知では全てのタスクを表示）
-            tasks = self.task_service.get_user_tasks(user_id)
-
-            # タスク選択モードフラグをデータベースに設定
-            import json
-            flag_data = {
-                "mode": "schedule",
-                "timestamp": datetime.now(pytz.timezone('Asia/Tokyo')).isoformat(),
-                "task_count": len(tasks)
-            }
-            self.db.set_user_state(user_id, "task_select_mode", flag_data)
-            print(f"[_send_task_notification_to_user_multi_tenant] タスク選択モードフラグ設定: user_id={user_id}, タスク数={len(tasks)}")
-            
-            # タスク一覧コマンドと同じ詳細な形式で送信（朝8時は「今日やるタスク」ガイド）
-            morning_guide = "今日やるタスクを選んでください！\n例：１、３、５"
-            message = self.task_service.format_task_list(tasks, show_select_guide=True, guide_text=morning_guide)
-            
-            # 期限切れタスクが移動された場合は通知を追加
-            if moved_count > 0:
-                message = f"⚠️ {moved_count}個の期限切れタスクを今日に移動しました\n\n" + message
+            message = self._build_task_notification_message(user_id)
 
             # 通知送信（リトライロジック付き）
             success = self._send_message_with_retry(
@@ -223,7 +256,319 @@ class NotificationService:
             import traceback
             traceback.print_exc()
 
-    def _send_carryover_notification_to_user_multi_tenant(self, user_id: str, message: str, user_channel_id: str = None):
+    def _build_task_notification_message(self, user_id: str) -> str:
+        """8時通知のメッセージを作成（期限切れタスクの移動とタスク選択モード設定を含む）"""
+        # 期限切れタスクを今日に移動（先に実施してから一覧を取得）
+        moved_count = self._move_overdue_tasks_to_today(user_id)
+        # タスク一覧を取得して通知メッセージを作成（8時通知では全てのタスクを表示）
+        tasks = self.task_service.get_user_tasks(user_id)
+
+        self._set_task_select_mode(user_id, len(tasks))
+        return self._format_task_notification(tasks, moved_count)
+
+    def _format_task_notification(self, tasks: List[Task], moved_count: int = 0) -> str:
+        """8時通知の本文を作成"""
+        # タスク一覧コマンドと同じ詳細な形式で送信（朝8時は「今日やるタスク」ガイド）
+        morning_guide = "今日やるタスクを選んでください！\n例：１、３、５"
+        message = self.task_service.format_task_list(tasks, show_select_guide=True, guide_text=morning_guide)
+
+        # 期限切れタスクが移動された場合は通知を追加
+        if moved_count > 0:
+            message = f"⚠️ {moved_count}個の期限切れタスクを今日に移動しました\n\n" + message
+        return message
+
+    def _set_task_select_mode(self, user_id: str, task_count: int):
+        """タスク選択モードフラグをデータベースに設定"""
+        flag_data = {
+            "mode": "schedule",
+            "timestamp": datetime.now(pytz.timezone('Asia/Tokyo')).isoformat(),
+            "task_count": task_count
+        }
+        self.db.set_user_state(user_id, "task_select_mode", flag_data)
+        print(f"[_set_task_select_mode] タスク選択モードフラグ設定: user_id={user_id}, タスク数={task_count}")
+
+    def _compute_task_version(self, tasks: List[Task]) -> str:
+        """タスク一覧の内容からバージョン（ハッシュ）を計算"""
+        import hashlib
+        rows = sorted(
+            (t.task_id, t.name, t.duration_minutes, t.status, t.due_date or "", t.priority or "")
+            for t in tasks
+        )
+        return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()
+
+    def _get_outbox_run_id(self, notification_type: str) -> str:
+        """通知タイプとJSTの日付から実行IDを作成（同じ日の再実行は同じIDになる）"""
+        today = datetime.now(pytz.timezone('Asia/Tokyo')).strftime('%Y-%m-%d')
+        return f"{notification_type}:{today}"
+
+    def _make_retry_key(self, run_id: str, user_id: str) -> str:
+        """LINEのX-Line-Retry-Key用UUID（実行ID・ユーザーIDから決定的に生成）"""
+        import uuid
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{run_id}/{user_id}"))
+
+    def _stage_task_notification(self, run_id: str, user_id: str, user_channel_id: str = None) -> bool:
+        """8時通知の内容を作成してアウトボックスに登録"""
+        import json
+
+        if not user_channel_id:
+            user_channel_id = self._get_user_channel_id(user_id)
+        if not user_channel_id:
+            print(f"[_stage_task_notification] ユーザー {user_id} のチャネルIDが見つかりません")
+            return False
+
+        # 期限切れタスクの移動・選択モード設定・アウトボックス登録をユーザーごとに1回のコミットにまとめる
+        with unit_of_work():
+            message = self._build_task_notification_message(user_id)
+            entry = {
+                "user_id": user_id,
+                "channel_id": user_channel_id,
+                "payload": json.dumps({"messages": [message]}, ensure_ascii=False),
+                "retry_key": self._make_retry_key(run_id, user_id),
+            }
+            # ユーザーごとに即時登録し、途中で停止しても作成済みの分は失われないようにする
+            return self.db.enqueue_outbox_messages(run_id, "daily_task_notification", [entry]) > 0
+
+    def prepare_daily_task_notification(self):
+        """
+        8時通知を事前作成（JST 7:45）
+
+        期限切れタスクの移動と本文の作成を先に済ませ、アウトボックスに'staged'として保存する。
+        8時の送信ではタスクのバージョン確認とフラグ設定だけを行って送信する。
+        """
+        print(f"[prepare_daily_task_notification] 開始: {datetime.now()}")
+
+        if self._check_duplicate_execution("daily_task_notification_prepare", cooldown_minutes=1):
+            print(f"[prepare_daily_task_notification] 重複実行をスキップ")
+            return
+
+        import json
+
+        user_ids = self._get_active_user_ids()
+        user_channels = self.db.get_all_user_channels()
+        run_id = self._get_outbox_run_id("daily_task_notification")
+        staged_user_ids = set(self.db.get_outbox_user_ids(run_id))
+
+        staged = 0
+        for user_id in user_ids:
+            if user_id in staged_user_ids:
+                continue
+            try:
+                user_channel_id = user_channels.get(user_id) or self._get_user_channel_id(user_id)
+                if not user_channel_id:
+                    print(f"[prepare_daily_task_notification] ユーザー {user_id} のチャネルIDが見つかりません")
+                    continue
+
+                # 期限切れの判定は日付単位のため、7:45に移動しても8時と結果は変わらない
+                moved_count = self._move_overdue_tasks_to_today(user_id)
+                tasks = self.task_service.get_user_tasks(user_id)
+                payload = {
+                    "messages": [self._format_task_notification(tasks, moved_count)],
+                    "task_version": self._compute_task_version(tasks),
+                    "moved_count": moved_count,
+                }
+                entry = {
+                    "user_id": user_id,
+                    "channel_id": user_channel_id,
+                    "payload": json.dumps(payload, ensure_ascii=False),
+                    "retry_key": self._make_retry_key(run_id, user_id),
+                }
+                staged += self.db.enqueue_outbox_messages(run_id, "daily_task_notification", [entry], status='staged')
+            except Exception as e:
+                print(f"[prepare_daily_task_notification] ユーザー {user_id} の事前作成エラー: {e}")
+                import traceback
+                traceback.print_exc()
+
+        print(f"[prepare_daily_task_notification] 完了: {staged}件を事前作成 (run_id={run_id})")
+
+    def _release_staged_notifications(self, run_id: str) -> int:
+        """
+        事前作成した通知を確認して送信待ちにする
+
+        タスクはページ単位で一括取得し、事前作成後に変更されていた場合のみ本文を作り直す。
+        選択モードのフラグは set_user_states でまとめて設定し、送信待ちへの変更は1回のUPDATEで行う。
+
+        Returns:
+            送信待ちにした件数
+        """
+        import json
+
+        released = 0
+        after = None
+        while True:
+            rows = self.db.get_pending_outbox_messages(
+                run_id, limit=self.OUTBOX_DRAIN_PAGE_SIZE, status='staged', after=after
+            )
+            if not rows:
+                break
+            after = (rows[-1]['run_id'], rows[-1]['user_id'])
+
+            tasks_by_user = self.task_service.get_active_tasks_by_user([row['user_id'] for row in rows])
+            timestamp = datetime.now(pytz.timezone('Asia/Tokyo')).isoformat()
+            states = []
+            for row in rows:
+                user_id = row['user_id']
+                try:
+                    payload = json.loads(row['payload'])
+                    tasks = tasks_by_user.get(user_id, [])
+
+                    if self._compute_task_version(tasks) != payload.get('task_version'):
+                        print(f"[_release_staged_notifications] タスク変更を検出、本文を再作成: user_id={user_id}")
+                        payload['messages'] = [self._format_task_notification(tasks, payload.get('moved_count', 0))]
+                        payload['task_version'] = self._compute_task_version(tasks)
+                        # 変更のあったユーザーだけ本文を差し替えて個別に送信待ちにする（残りは最後に1回のUPDATEで変更）
+                        if self.db.release_outbox_message(run_id, user_id, json.dumps(payload, ensure_ascii=False)):
+                            released += 1
+
+                    states.append({
+                        "user_id": user_id,
+                        "state_type": "task_select_mode",
+                        "state_data": {"mode": "schedule", "timestamp": timestamp, "task_count": len(tasks)},
+                    })
+                except Exception as e:
+                    print(f"[_release_staged_notifications] ユーザー {user_id} の確認エラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+
+            self.db.set_user_states(states)
+
+            if len(rows) < self.OUTBOX_DRAIN_PAGE_SIZE:
+                break
+
+        return released + self.db.release_outbox_messages(run_id)
+
+    def _release_overdue_staged_notifications(self) -> int:
+        """
+        送信時刻を過ぎても事前作成（staged）のままの8時通知を送信待ちにする
+
+        7:45の事前作成後にプロセスが停止していた場合や、8時の送信が重複実行防止で止まった場合の取りこぼし対策。
+        前日以前の分は今日の通知と重複するため送信せず、期限切れとして'failed'にする。
+
+        Returns:
+            送信待ちにした件数
+        """
+        now = datetime.now(pytz.timezone('Asia/Tokyo'))
+        today_run_id = self._get_outbox_run_id("daily_task_notification")
+
+        released = 0
+        release_today = False
+        after = None
+        while True:
+            rows = self.db.get_pending_outbox_messages(
+                None, limit=self.OUTBOX_DRAIN_PAGE_SIZE, status='staged', after=after
+            )
+            if not rows:
+                break
+            for row in rows:
+                if row['run_id'] == today_run_id:
+                    release_today = now.hour >= self.DAILY_NOTIFICATION_HOUR_JST
+                elif row['run_id'] < today_run_id:
+                    self.db.update_outbox_status(row['run_id'], row['user_id'], 'failed', 'expired before release')
+            if len(rows) < self.OUTBOX_DRAIN_PAGE_SIZE:
+                break
+            after = (rows[-1]['run_id'], rows[-1]['user_id'])
+
+        if release_today:
+            released = self._release_staged_notifications(today_run_id)
+            print(f"[_release_overdue_staged_notifications] 送信時刻を過ぎた事前作成分を送信待ちに変更: {released}件")
+        return released
+
+    def drain_outbox_job(self) -> dict:
+        """定期ドレイン（送信時刻を過ぎた事前作成分を送信待ちにしてから未送信分を送信）"""
+        self._release_overdue_staged_notifications()
+        return self.drain_outbox()
+
+    def _push_with_retry_key(self, line_bot_api: MessagingApi, user_id: str, messages: list, retry_key: str):
+        """X-Line-Retry-Key付きでpush_messageを送信（受付済みの409は成功扱い）"""
+        try:
+            line_bot_api.push_message(
+                PushMessageRequest(to=user_id, messages=messages),
+                x_line_retry_key=retry_key
+            )
+        except Exception as e:
+            if getattr(e, 'status', None) == 409:
+                print(f"[_push_with_retry_key] 同じリトライキーで送信済み: user_id={user_id}")
+                return
+            raise
+
+    def drain_outbox(self, run_id: str = None) -> dict:
+        """
+        アウトボックスの未送信通知を送信
+
+        Args:
+            run_id: 対象の実行ID（Noneの場合は全ての未送信分）
+
+        Returns:
+            (run_id, user_id) ごとの成否
+        """
+        # 1回に読む件数ずつ、(run_id, user_id) の順に最後の行より後を読み進める
+        # （送信に失敗してpendingに戻した行は同じドレインでは読み直さない）
+        results = {}
+        after = None
+        drained = 0
+        while True:
+            rows = self.db.get_pending_outbox_messages(run_id, limit=self.OUTBOX_DRAIN_PAGE_SIZE, after=after)
+            if not rows:
+                break
+            drained += len(rows)
+            results.update(self._drain_outbox_rows(rows))
+            if len(rows) < self.OUTBOX_DRAIN_PAGE_SIZE:
+                break
+            after = (rows[-1]['run_id'], rows[-1]['user_id'])
+
+        if drained:
+            counts = self.db.get_outbox_counts(run_id)
+            print(f"[drain_outbox] 完了: {drained}件を処理 {counts}")
+        return results
+
+    def _drain_outbox_rows(self, rows: List[dict]) -> dict:
+        """アウトボックスの行を送信し、状態を更新する"""
+        import json
+
+        print(f"[drain_outbox] 未送信通知: {len(rows)}件")
+
+        queue = self.error_handler.create_retry_queue()
+        api_clients = {}
+        for row in rows:
+            key = (row['run_id'], row['user_id'])
+            channel_id = row['channel_id']
+            if channel_id not in api_clients:
+                api_clients[channel_id] = self.multi_tenant_service.get_messaging_api(channel_id)
+            line_bot_api = api_clients[channel_id]
+            if not line_bot_api:
+                print(f"[drain_outbox] チャネル {channel_id} のAPIクライアントが取得できません")
+                self.db.update_outbox_status(row['run_id'], row['user_id'], 'failed', 'messaging api unavailable')
+                continue
+
+            try:
+                texts = json.loads(row['payload']).get('messages', [])
+            except (ValueError, AttributeError) as e:
+                self.db.update_outbox_status(row['run_id'], row['user_id'], 'failed', f'invalid payload: {e}')
+                continue
+
+            queue.submit(
+                self._push_with_retry_key,
+                line_bot_api,
+                row['user_id'],
+                [TextMessage(text=text) for text in texts],
+                row['retry_key'],
+                operation_name=f"{row['notification_type']} to {row['user_id']}",
+                key=key
+            )
+
+        attempts_by_key = {(row['run_id'], row['user_id']): row['attempts'] or 0 for row in rows}
+        results = queue.run()
+        for (row_run_id, user_id), ok in results.items():
+            if ok:
+                self.db.update_outbox_status(row_run_id, user_id, 'sent')
+            elif attempts_by_key[(row_run_id, user_id)] + 1 >= self.OUTBOX_MAX_ATTEMPTS:
+                self.db.update_outbox_status(row_run_id, user_id, 'failed', 'max attempts exceeded')
+            else:
+                # 次回のドレインで再送する
+                self.db.update_outbox_status(row_run_id, user_id, 'pending', 'retry later')
+        return results
+
+    def _send_carryover_notification_to_user_multi_tenant(self, user_id: str, message: str, user_channel_id: str = None,
+                                                           retry_queue: Optional[RetryQueue] = None):
         """マルチテナント対応の21時通知送信"""
         try:
             # チャネルIDが渡されていない場合は個別取得（後方互換性のため）
@@ -245,7 +590,8 @@ class NotificationService:
                 line_bot_api=line_bot_api,
                 user_id=user_id,
                 messages=[TextMessage(text=message)],
-                operation_name="carryover_notification"
+                operation_name="carryover_notification",
+                retry_queue=retry_queue
             )
 
             if success:
@@ -357,8 +703,8 @@ class NotificationService:
             
             # 期限切れタスクを今日の日付に更新
             for task in overdue_tasks:
-                # 元のタスクをアーカイブ
-                self.task_service.archive_task(task.task_id)
+                # 元のタスクをアーカイブ（繰り越しのため週次集計には含めない）
+                self.task_service.archive_task(task.task_id, rollover=True)
                 # 今日の日付で新しいタスクを作成
                 self.task_service.create_task(user_id, {
                     'name': task.name,
@@ -504,23 +850,8 @@ class NotificationService:
     def send_weekly_report(self, user_id: str):
         """週次レポートを送信"""
         try:
-            # 過去1週間のタスク完了状況を取得
-            completed_tasks = self._get_completed_tasks_this_week(user_id)
-            total_tasks = len(completed_tasks)
-            
-            message = f"📊 週次レポート\n\n今週完了したタスク: {total_tasks}個\n\n"
-            
-            if completed_tasks:
-                message += "完了したタスク:\n"
-                for task in completed_tasks[:5]:  # 最大5個まで表示
-                    message += f"• {task.name}\n"
-                
-                if len(completed_tasks) > 5:
-                    message += f"... 他 {len(completed_tasks) - 5}個\n"
-            else:
-                message += "今週は完了したタスクがありません。\n"
-            
-            message += "\n来週も頑張りましょう！"
+            # 今週の集計（タスク完了時に加算済み）を1件読むだけ
+            message = self._build_weekly_report_message(self.db.get_weekly_stats(user_id))
 
             success = self._send_message_with_retry(
                 line_bot_api=self.line_bot_api,
@@ -556,15 +887,21 @@ class NotificationService:
         print(f"[start_scheduler] スケジューラー開始: {datetime.now()}")
         
         # Railway等UTCサーバーの場合、JST 8:00 = UTC 23:00、JST 21:00 = UTC 12:00、JST 18:00 = UTC 09:00
-        schedule.every().day.at("23:00").do(self.send_daily_task_notification)  # JST 8:00
-        schedule.every().sunday.at("09:00").do(self.send_future_task_selection)  # JST 18:00
+        schedule.every().day.at("22:45").do(self._timed_job, "prepare_daily_task_notification", self.prepare_daily_task_notification)  # JST 7:45
+        schedule.every().day.at("23:00").do(self._timed_job, "daily_task_notification", self.send_daily_task_notification)  # JST 8:00
+        schedule.every().sunday.at("09:00").do(self._timed_job, "future_task_selection", self.send_future_task_selection)  # JST 18:00
         # 週次レポートは不要のため無効化
         # schedule.every().sunday.at("11:00").do(self._send_weekly_reports_to_all_users)  # JST 20:00→UTC 11:00
-        schedule.every().day.at("12:00").do(self.send_carryover_check)  # JST 21:00
-        # セッションとキャッシュのクリーンアップ（毎時）
-        schedule.every().hour.do(self._cleanup_expired_data)
+        schedule.every().day.at("12:00").do(self._timed_job, "carryover_check", self.send_carryover_check)  # JST 21:00
+        # セッションとキャッシュのクリーンアップ（5分ごと、1回あたりの処理時間を抑えて少しずつ削除）
+        schedule.every(5).minutes.do(self._timed_job, "cleanup_expired_data", self._cleanup_expired_data)
+        # アーカイブ済みのタスクをtasks_archiveに移動（tasksをアクティブなタスクだけに保つ）
+        schedule.every(10).minutes.do(self._timed_job, "compact_tasks", self._compact_tasks)
+        # アウトボックスの未送信通知を再送（再起動時の取りこぼし対策）
+        schedule.every(5).minutes.do(self._timed_job, "drain_outbox", self.drain_outbox_job)
         
         print(f"[start_scheduler] スケジュール設定完了:")
+        print(f"[start_scheduler] - 毎日 22:45 UTC (JST 7:45): タスク一覧通知の事前作成")
         print(f"[start_scheduler] - 毎日 23:00 UTC (JST 8:00): タスク一覧通知")
         print(f"[start_scheduler] - 毎日 12:00 UTC (JST 21:00): タスク確認通知")
         print(f"[start_scheduler] - 日曜 09:00 UTC (JST 18:00): 未来タスク選択通知")
@@ -600,6 +937,13 @@ class NotificationService:
         self.scheduler_thread.start()
         print(f"[start_scheduler] スケジューラースレッド開始完了")
 
+    def _timed_job(self, job_name: str, func):
+        """スケジューラージョブを実行し、所要時間とSQL実行数をメトリクスに記録"""
+        from utils.metrics import SCHEDULER_JOB_DURATION, track
+        from utils.query_profiler import profile_queries
+        with track(SCHEDULER_JOB_DURATION, job=job_name), profile_queries(f"job:{job_name}"):
+            return func()
+
     def stop_scheduler(self):
         """スケジューラーを停止"""
         self.is_running = False
@@ -655,11 +999,29 @@ class NotificationService:
             self.send_weekly_report(user_id)
         print(f"[_send_weekly_reports_to_all_users] 完了: {datetime.now()}")
 
-    def _get_completed_tasks_this_week(self, user_id: str) -> List[Task]:
-        """今週完了したタスクを取得"""
-        # 実際の実装では、完了日時を記録するテーブルが必要
-        # ここでは簡略化のため、空のリストを返す
-        return []
+    def _build_weekly_report_message(self, stats: Optional[dict]) -> str:
+        """週次集計からレポートのメッセージを作成"""
+        stats = stats or {}
+        total_tasks = stats.get("completed_count", 0)
+        top_tasks = stats.get("top_tasks", [])
+
+        message = f"📊 週次レポート\n\n今週完了したタスク: {total_tasks}個\n"
+        if total_tasks:
+            message += f"合計時間: {stats.get('completed_minutes', 0)}分\n\n"
+            message += "完了したタスク:\n"
+            for task in top_tasks:  # 所要時間の長い順に最大5個まで
+                message += f"• {task['name']}（{task['duration_minutes']}分）\n"
+
+            if total_tasks > len(top_tasks):
+                message += f"... 他 {total_tasks - len(top_tasks)}個\n"
+        else:
+            message += "\n今週は完了したタスクがありません。\n"
+
+        if stats.get("archived_count"):
+            message += f"\nアーカイブしたタスク: {stats['archived_count']}個\n"
+
+        message += "\n来週も頑張りましょう！"
+        return message
 
     def send_custom_notification(self, user_id: str, message: str):
         """カスタム通知を送信（APIレスポンスをprint）"""
@@ -770,12 +1132,14 @@ class NotificationService:
         jst = pytz.timezone('Asia/Tokyo')
         today_str = datetime.now(jst).strftime('%Y-%m-%d')
         print(f"[send_carryover_check] 今日の日付: {today_str}")
+        # 全ユーザーのメッセージを先に作成し、タスク選択モードフラグは一括で設定する
+        messages = {}
+        states = []
         for user_id in user_ids:
             try:
-                print(f"[send_carryover_check] ユーザー {user_id} に送信中...")
                 tasks = self.task_service.get_user_tasks(user_id)
                 today_tasks = [t for t in tasks if t.due_date == today_str]
-                print(f"[send_carryover_check] 今日のタスク数: {len(today_tasks)}")
+                print(f"[send_carryover_check] ユーザー {user_id} の今日のタスク数: {len(today_tasks)}")
                 if not today_tasks:
                     msg = "📋 今日のタスク一覧\n＝＝＝＝＝＝\n本日分のタスクはありません。\n＝＝＝＝＝＝"
                 else:
@@ -784,25 +1148,43 @@ class NotificationService:
                         msg += f"{idx}. {t.name} ({t.duration_minutes}分)\n"
                     msg += "＝＝＝＝＝＝\n終わったタスクを選んでください！\n例：１、３、５"
 
-                    # タスク選択モードフラグをデータベースに設定
-                    import json
-                    flag_payload = {
-                        "mode": "complete",
-                        "target_date": today_str,
-                        "timestamp": datetime.now(jst).isoformat(),
-                    }
-                    self.db.set_user_state(user_id, "task_select_mode", flag_payload)
-                    print(f"[send_carryover_check] タスク選択モードフラグ設定: user_id={user_id}, payload={flag_payload}")
-                
-                print(f"[send_carryover_check] メッセージ送信: {msg[:100]}...")
-                # マルチテナント対応で通知送信（一括取得したチャネルIDを使用）
-                user_channel_id = user_channels.get(user_id)
-                self._send_carryover_notification_to_user_multi_tenant(user_id, msg, user_channel_id)
-                print(f"[send_carryover_check] ユーザー {user_id} に送信完了")
+                    states.append({
+                        "user_id": user_id,
+                        "state_type": "task_select_mode",
+                        "state_data": {
+                            "mode": "complete",
+                            "target_date": today_str,
+                            "timestamp": datetime.now(jst).isoformat(),
+                        },
+                    })
+                messages[user_id] = msg
             except Exception as e:
-                print(f"[send_carryover_check] ユーザー {user_id} への送信エラー: {e}")
+                print(f"[send_carryover_check] ユーザー {user_id} のメッセージ作成エラー: {e}")
                 import traceback
                 traceback.print_exc()
+
+        # 返信より前にフラグが保存されているよう、送信前に書き込む
+        if not self.db.set_user_states(states):
+            print(f"[send_carryover_check] ⚠️  タスク選択モードフラグの一括設定に失敗: {len(states)}件")
+        else:
+            print(f"[send_carryover_check] タスク選択モードフラグ一括設定: {len(states)}件")
+
+        # 送信失敗はキューに戻し、後続ユーザーの処理を先に進める（キューはこの実行専用）
+        retry_queue = self.error_handler.create_retry_queue()
+        try:
+            for user_id, msg in messages.items():
+                try:
+                    print(f"[send_carryover_check] ユーザー {user_id} に送信中: {msg[:100]}...")
+                    # マルチテナント対応で通知送信（一括取得したチャネルIDを使用）
+                    user_channel_id = user_channels.get(user_id)
+                    self._send_carryover_notification_to_user_multi_tenant(user_id, msg, user_channel_id, retry_queue)
+                    print(f"[send_carryover_check] ユーザー {user_id} に送信完了")
+                except Exception as e:
+                    print(f"[send_carryover_check] ユーザー {user_id} への送信エラー: {e}")
+                    import traceback
+                    traceback.print_exc()
+        finally:
+            self._flush_retry_queue(retry_queue, "send_carryover_check")
         print(f"[send_carryover_check] 完了: {datetime.now()}")
 
     def send_future_task_selection(self):
@@ -815,57 +1197,79 @@ class NotificationService:
             return
         
         try:
+            import json
             user_ids = self._get_active_user_ids()
             print(f"[send_future_task_selection] ユーザー数: {len(user_ids)}")
+
+            # 全ユーザーのメッセージを先に作成し、選択モードのセッション・フラグは一括で保存する
+            messages = {}
+            sessions = []
+            states = []
             for user_id in user_ids:
                 try:
-                    print(f"[send_future_task_selection] ユーザー {user_id} に送信中...")
-                    
                     # 未来タスク一覧を取得
                     future_tasks = self.task_service.get_user_future_tasks(user_id)
-                    print(f"[send_future_task_selection] 未来タスク数: {len(future_tasks)}")
-                    
+                    print(f"[send_future_task_selection] ユーザー {user_id} の未来タスク数: {len(future_tasks)}")
+
                     if not future_tasks:
                         message = "⭐未来タスク一覧\n━━━━━━━━━━━━\n登録されている未来タスクはありません。\n\n新しい未来タスクを追加してください！\n例: 「新規事業を考える 2時間」"
                     else:
                         message = self.task_service.format_future_task_list(future_tasks, show_select_guide=True)
-                        
-                        # 未来タスク選択モードをデータベースに保存（来週提案モード）
-                        import json
+
+                        # 未来タスク選択モード（mode=future_scheduleで来週提案モードとして識別）
                         future_selection_data = {
                             "mode": "future_schedule",
                             "timestamp": datetime.now(pytz.timezone('Asia/Tokyo')).isoformat()
                         }
-                        self.db.set_user_session(
-                            user_id,
-                            'future_task_selection',
-                            json.dumps(future_selection_data),
-                            expires_hours=48  # 48時間有効
-                        )
-                        print(f"[send_future_task_selection] 未来タスク選択モードデータ保存: user_id={user_id}")
-
-                        # タスク選択モードフラグを設定（mode=future_scheduleで未来タスク選択として識別）
-                        self.db.set_user_state(user_id, "task_select_mode", future_selection_data)
-                        print(f"[send_future_task_selection] タスク選択モードフラグ設定: user_id={user_id}, mode=future_schedule")
+                        sessions.append({
+                            "user_id": user_id,
+                            "session_type": "future_task_selection",
+                            "data": json.dumps(future_selection_data),
+                        })
+                        states.append({
+                            "user_id": user_id,
+                            "state_type": "task_select_mode",
+                            "state_data": future_selection_data,
+                        })
+                    messages[user_id] = message
+                except Exception as e:
+                    print(f"[send_future_task_selection] ユーザー {user_id} のメッセージ作成エラー: {e}")
+                    import traceback
+                    traceback.print_exc()
 
-                    print(f"[send_future_task_selection] メッセージ送信: {message[:100]}...")
+            # 返信より前に選択モードが保存されているよう、送信前に書き込む
+            if not self.db.set_user_sessions(sessions, expires_hours=48):  # 48時間有効
+                print(f"[send_future_task_selection] ⚠️  未来タスク選択モードデータの一括保存に失敗: {len(sessions)}件")
+            if not self.db.set_user_states(states):
+                print(f"[send_future_task_selection] ⚠️  タスク選択モードフラグの一括設定に失敗: {len(states)}件")
+            print(f"[send_future_task_selection] 未来タスク選択モード一括保存: {len(states)}件")
 
-                    success = self._send_message_with_retry(
-                        line_bot_api=self.line_bot_api,
-                        user_id=user_id,
-                        messages=[TextMessage(text=message)],
-                        operation_name="future_task_selection"
-                    )
+            # 送信失敗はキューに戻し、後続ユーザーの処理を先に進める（キューはこの実行専用）
+            retry_queue = self.error_handler.create_retry_queue()
+            try:
+                for user_id, message in messages.items():
+                    try:
+                        print(f"[send_future_task_selection] ユーザー {user_id} に送信中: {message[:100]}...")
+
+                        success = self._send_message_with_retry(
+                            line_bot_api=self.line_bot_api,
+                            user_id=user_id,
+                            messages=[TextMessage(text=message)],
+                            operation_name="future_task_selection",
+                            retry_queue=retry_queue
+                        )
 
-                    if success:
-                        print(f"[send_future_task_selection] ユーザー {user_id} に送信完了")
-                    else:
-                        print(f"[send_future_task_selection] ユーザー {user_id} への送信失敗（リトライ後）")
+                        if success:
+                            print(f"[send_future_task_selection] ユーザー {user_id} に送信完了")
+                        else:
+                            print(f"[send_future_task_selection] ユーザー {user_id} への送信失敗（リトライ後）")
 
-                except Exception as e:
-                    print(f"[send_future_task_selection] ユーザー {user_id} への送信エラー: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    except Exception as e:
+                        print(f"[send_future_task_selection] ユーザー {user_id} への送信エラー: {e}")
+                        import traceback
+                        traceback.print_exc()
+            finally:
+                self._flush_retry_queue(retry_queue, "send_future_task_selection")
             print(f"[send_future_task_selection] 完了: {datetime.now()}")
         except Exception as e:
             print(f"Error sending future task selection: {e}")
@@ -873,26 +1277,32 @@ class NotificationService:
             traceback.print_exc()
 
     def _cleanup_expired_data(self):
-        """期限切れのセッションとキャッシュをクリーンアップ"""
-        try:
-            print(f"[cleanup] クリーンアップ開始: {datetime.now()}")
+        """
+        期限切れのセッションとキャッシュをクリーンアップ
 
-            # データベースインスタンスを取得
-            from models.database import init_db
-            db = init_db()
+        一括のDELETEは大きなテーブルで書き込みロックを長く保持し、Webhookを待たせるため、
+        TTLスイーパーで小さなバッチに分け、時間の上限内で削除する（残りは次回に持ち越し）。
+        """
+        try:
+            self.ttl_sweeper.run_tick()
 
-            # 期限切れセッションを削除
-            sessions_deleted = db.cleanup_expired_sessions()
-            print(f"[cleanup] 削除したセッション数: {sessions_deleted}")
+        except Exception as e:
+            print(f"[cleanup] エラー: {e}")
+            import traceback
+            traceback.print_exc()
 
-            # 期限切れキャッシュを削除
-            cache_deleted = db.cleanup_expired_cache()
-            print(f"[cleanup] 削除したキャッシュ数: {cache_deleted}")
+    def _compact_tasks(self):
+        """
+        アクティブでないタスクをtasks_archiveに移動
 
-            print(f"[cleanup] クリーンアップ完了: {datetime.now()}")
+        繰り越しでアーカイブされたタスクがtasksに溜まり続けると、アクティブなタスクの取得が遅くなるため、
+        時間の上限内で少しずつアーカイブへ移動する（履歴はget_task_historyで両方から取得できる）。
+        """
+        try:
+            self.task_compactor.run_tick()
 
         except Exception as e:
-            print(f"[cleanup] エラー: {e}")
+            print(f"[compact_tasks] エラー: {e}")
             import traceback
             traceback.print_exc()
 
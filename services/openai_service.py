@@ -1,20 +1,46 @@
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, List, Dict, Optional
 from datetime import datetime, timedelta
-from openai import OpenAI
 from models.database import Task
 import hashlib
 import json
+from utils.logger import get_logger, lazy
+from utils.lazy_import import LazyObject, lazy_import
+from utils.metrics import UPSTREAM_DURATION, record_cache, track
+
+# openaiパッケージは読み込みが重いため最初にクライアントを作る時に読み込む
+OpenAI = lazy_import("openai", "OpenAI")
+
+logger = get_logger(__name__)
 
 class OpenAIService:
     """OpenAI APIを使用したスケジュール提案サービスクラス"""
 
+    # 同じプロンプトの実行中の呼び出しを待つ時間の上限（秒）。超えた場合は自分で呼び出す
+    INFLIGHT_WAIT_SECONDS = 15
+    # プロセス間の実行権の有効期間（秒）。実行中のプロセスが終了しても、この時間を過ぎれば他のプロセスが呼び出す
+    INFLIGHT_CLAIM_TTL_SECONDS = 30
+    # 他のプロセスの呼び出し結果をキャッシュで確認する間隔（秒）
+    INFLIGHT_POLL_SECONDS = 0.2
+
+    # スケジュール提案のシステムプロンプト（キャッシュのキーにも含める）
+    SCHEDULE_PROPOSAL_SYSTEM_CONTENT = "あなたは効率的なスケジュール管理の専門家です。与えられたタスクと空き時間をもとに、生産性を最大化するスケジュールを提案してください。"
+
     def __init__(self, db=None, enable_cache: bool = True, cache_ttl_hours: int = 24):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # HTTPクライアントは最初のAPI呼び出し時に作成する
+        self.client = LazyObject(lambda: OpenAI(api_key=os.getenv('OPENAI_API_KEY')))
         self.model = "gpt-4o-mini"  # または "gpt-4o"
         self.db = db
         self.enable_cache = enable_cache
         self.cache_ttl_hours = cache_ttl_hours
+        # キャッシュキー -> 実行中の呼び出しの結果（プロセス内で同じプロンプトの呼び出しを1回にまとめる）
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
 
     def generate_schedule_proposal(
         self,
@@ -31,8 +57,8 @@ class OpenAIService:
             return "タスクが選択されていません。"
 
         # デバッグ情報を追加
-        print(f"[DEBUG] OpenAIサービス: 受信したタスク数: {len(tasks)}")
-        print(f"[DEBUG] OpenAIサービス: 受信したタスク詳細: {[(i+1, task.name, task.duration_minutes) for i, task in enumerate(tasks)]}")
+        logger.debug("OpenAIサービス: 受信したタスク数: %s", len(tasks))
+        logger.debug("OpenAIサービス: 受信したタスク詳細: %s", lazy(lambda: [(i+1, task.name, task.duration_minutes) for i, task in enumerate(tasks)]))
         
         # タスク情報を整理（優先度付き）
         task_info = []
@@ -71,7 +97,7 @@ class OpenAIService:
         now_str = now_str[:-2] + ":" + now_str[-2:]  # +0900 → +09:00 形式に
         
         # デバッグ情報を追加
-        print(f"[DEBUG] OpenAIサービス: プロンプト作成前のタスク情報: {task_info}")
+        logger.debug("OpenAIサービス: プロンプト作成前のタスク情報: %s", task_info)
         
         # プロンプトを作成
         prompt = (
@@ -82,21 +108,47 @@ class OpenAIService:
         prompt += self._create_schedule_prompt(task_info, total_duration, free_time_str, week_info, now_str)
         
         # デバッグ情報を追加
-        print(f"[DEBUG] OpenAIサービス: 作成されたプロンプト: {prompt[:500]}...")
+        logger.debug("OpenAIサービス: 作成されたプロンプト: %s...", prompt[:500])
         
-        # リトライロジック付きでOpenAI APIを呼び出し
+        # 同じ時間帯に同じタスク・同じ空き時間で選び直した場合はキャッシュの提案を使う
+        from utils.cache_keys import schedule_proposal_cache_key
+        proposal_key = schedule_proposal_cache_key(tasks, free_times, week_info, base_date, now=now_jst)
+        raw = self._get_cached_or_compute(
+            self.model,
+            self._compute_prompt_hash(proposal_key + self.SCHEDULE_PROPOSAL_SYSTEM_CONTENT),
+            prompt,
+            lambda: self._request_schedule_proposal(prompt)
+        )
+        if raw:
+            proposal = self._format_schedule_output(raw)
+            if self._needs_fallback(proposal, tasks):
+                logger.debug("フォールバック判定: AI出力が要件を満たしていません。決定的スケジュールを生成します。")
+                fallback = self._build_deterministic_schedule(tasks, free_times, week_info, base_date)
+                if fallback:
+                    return fallback
+            return proposal
+
+        # 全てのリトライが失敗した場合はフォールバック
+        logger.debug("[OpenAI] All retries exhausted, falling back to deterministic schedule")
+        fallback = self._build_deterministic_schedule(tasks, free_times, week_info, base_date)
+        if fallback:
+            return fallback
+        return self._generate_fallback_schedule(tasks) or ""
+
+    def _request_schedule_proposal(self, prompt: str) -> str:
+        """リトライロジック付きでスケジュール提案を生成（全て失敗した場合は空文字）"""
         import time
         max_retries = 3
         base_delay = 1  # 秒
 
         for attempt in range(max_retries):
             try:
-                response = self.client.chat.completions.create(
+                response = self._create_completion("schedule_proposal",
                     model=self.model,
                     messages=[
                         {
                             "role": "system",
-                            "content": "あなたは効率的なスケジュール管理の専門家です。与えられたタスクと空き時間をもとに、生産性を最大化するスケジュールを提案してください。"
+                            "content": self.SCHEDULE_PROPOSAL_SYSTEM_CONTENT
                         },
                         {
                             "role": "user",
@@ -107,18 +159,11 @@ class OpenAIService:
                     temperature=0.7,
                     timeout=30  # 30秒タイムアウト
                 )
-                raw = response.choices[0].message.content or ""
-                proposal = self._format_schedule_output(raw)
-                if self._needs_fallback(proposal, tasks):
-                    print("[DEBUG] フォールバック判定: AI出力が要件を満たしていません。決定的スケジュールを生成します。")
-                    fallback = self._build_deterministic_schedule(tasks, free_times, week_info, base_date)
-                    if fallback:
-                        return fallback
-                return proposal
+                return response.choices[0].message.content or ""
 
             except Exception as e:
                 error_type = type(e).__name__
-                print(f"[OpenAI] API error (attempt {attempt + 1}/{max_retries}): {error_type} - {e}")
+                logger.error("[OpenAI] API error (attempt %s/%s): %s - %s", attempt + 1, max_retries, error_type, e)
 
                 # レート制限エラーの場合は長めに待機
                 is_rate_limit = "rate" in str(e).lower() or "429" in str(e)
@@ -128,15 +173,9 @@ class OpenAIService:
                     delay = base_delay * (2 ** attempt)
                     if is_rate_limit:
                         delay *= 3  # レート制限の場合は3倍長く待つ
-                    print(f"[OpenAI] Retrying in {delay} seconds...")
+                    logger.debug("[OpenAI] Retrying in %s seconds...", delay)
                     time.sleep(delay)
-                else:
-                    # 全てのリトライが失敗した場合はフォールバック
-                    print(f"[OpenAI] All retries exhausted, falling back to deterministic schedule")
-                    fallback = self._build_deterministic_schedule(tasks, free_times, week_info, base_date)
-            if fallback:
-                return fallback
-            return self._generate_fallback_schedule(tasks) or ""
+        return ""
 
     def generate_modified_schedule(self, user_id: str, modification: Dict) -> str:
         """修正されたスケジュールを生成"""
@@ -157,7 +196,7 @@ class OpenAIService:
 10:30 買い物 (30分)
 """
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion("modified_schedule",
                 model=self.model,
                 messages=[
                     {
@@ -265,15 +304,17 @@ class OpenAIService:
         schedule += "\n承認する場合は「承認」と返信してください。"
         return schedule
 
-    def get_priority_classification(self, prompt: str) -> str:
-        """タスクの優先度を分類"""
+    def get_priority_classification(self, prompt: str, cache_key: Optional[str] = None) -> str:
+        """タスクの優先度を分類（cache_key: utils.cache_keys.priority_cache_key で作成したキー）"""
         try:
             system_content = "あなたはタスク管理の専門家です。与えられたタスクの緊急度と重要度を分析し、適切な優先度カテゴリを選択してください。"
             result = self._get_cached_or_call_api(
                 prompt=prompt,
                 system_content=system_content,
                 max_tokens=50,
-                temperature=0.3
+                temperature=0.3,
+                call_type="priority_classification",
+                cache_key=cache_key
             )
             return result.strip() if result else "normal"
         except Exception as e:
@@ -301,7 +342,8 @@ class OpenAIService:
                 prompt=prompt,
                 system_content=system_content,
                 max_tokens=10,
-                temperature=0.3
+                temperature=0.3,
+                call_type="task_priority"
             )
             return result.strip().lower() if result else "medium"
         except Exception as e:
@@ -330,7 +372,7 @@ class OpenAIService:
 具体的で実践的な提案をお願いします。
 """
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion("task_optimization",
                 model=self.model,
                 messages=[
                     {
@@ -353,7 +395,7 @@ class OpenAIService:
     def _format_schedule_output(self, raw: str) -> str:
         """スケジュール提案の出力を指定フォーマットに整形・補正（重複案内文・理由・まとめ除去、本文が空の場合の補正）"""
         import re
-        print('AI raw output:', raw)  # デバッグ用
+        logger.debug("AI raw output: %s", raw)  # デバッグ用
         lines = [line.strip() for line in raw.split('\n') if line.strip()]
         result = []
         seen_guide = False
@@ -447,18 +489,18 @@ class OpenAIService:
         has_task_line = any(line.startswith('📝') for line in lines)
         contains_unassigned = any('未割り当てタスク' in line for line in lines)
         if not has_time_line or not has_task_line:
-            print(f"[DEBUG] フォールバック理由: 時刻行有={has_time_line}, タスク行有={has_task_line}")
+            logger.debug("フォールバック理由: 時刻行有=%s, タスク行有=%s", has_time_line, has_task_line)
             return True
         if contains_unassigned and not has_task_line:
-            print("[DEBUG] フォールバック理由: 未割り当てセクションのみ検出")
+            logger.debug("フォールバック理由: 未割り当てセクションのみ検出")
             return True
         normalized_proposal = proposal.replace(' ', '')
         for task in tasks:
             if task.name and task.name.replace(' ', '') not in normalized_proposal:
-                print(f"[DEBUG] フォールバック理由: タスク '{task.name}' が提案に含まれていません")
+                logger.debug("フォールバック理由: タスク '%s' が提案に含まれていません", task.name)
                 return True
         if 'エラー' in proposal:
-            print("[DEBUG] フォールバック理由: エラーメッセージを検出")
+            logger.debug("フォールバック理由: エラーメッセージを検出")
             return True
         return False
 
@@ -476,7 +518,7 @@ class OpenAIService:
         if not free_times:
             free_times = self._generate_default_free_times(week_info, base_date)
         if not free_times:
-            print("[DEBUG] 決定的スケジュール生成中止: 空き時間情報がありません。")
+            logger.debug("決定的スケジュール生成中止: 空き時間情報がありません。")
             return ""
 
         jst = pytz.timezone('Asia/Tokyo')
@@ -485,7 +527,7 @@ class OpenAIService:
             start = ft.get('start')
             end = ft.get('end')
             if not start or not end:
-                print(f"[DEBUG] 空き時間データ不正: start={start}, end={end}")
+                logger.debug("空き時間データ不正: start=%s, end=%s", start, end)
                 continue
             if start.tzinfo is None:
                 start = jst.localize(start)
@@ -496,12 +538,12 @@ class OpenAIService:
             else:
                 end = end.astimezone(jst)
             if end <= start:
-                print(f"[DEBUG] 空き時間スキップ: end<=start (start={start}, end={end})")
+                logger.debug("空き時間スキップ: end<=start (start=%s, end=%s)", start, end)
                 continue
             slots.append([start, end])
 
         if not slots:
-            print("[DEBUG] 決定的スケジュール生成中止: 有効な空き時間スロットがありません。")
+            logger.debug("決定的スケジュール生成中止: 有効な空き時間スロットがありません。")
             return ""
 
         slots.sort(key=lambda pair: pair[0])
@@ -509,7 +551,7 @@ class OpenAIService:
         assignments = []
         unassigned = []
 
-        print(f"[DEBUG] 決定的スケジュール割当開始: タスク数={len(remaining_tasks)}, スロット数={len(slots)}")
+        logger.debug("決定的スケジュール割当開始: タスク数=%s, スロット数=%s", len(remaining_tasks), len(slots))
         while remaining_tasks:
             task = remaining_tasks.popleft()
             duration = max(task.duration_minutes, 0)
@@ -517,21 +559,21 @@ class OpenAIService:
             for slot in slots:
                 slot_start, slot_end = slot
                 available = int((slot_end - slot_start).total_seconds() / 60)
-                print(f"[DEBUG] スロット確認: task={task.name}, duration={duration}, slot_start={slot_start}, slot_end={slot_end}, available={available}")
+                logger.debug("スロット確認: task=%s, duration=%s, slot_start=%s, slot_end=%s, available=%s", task.name, duration, slot_start, slot_end, available, extra={"sample_rate": 0.1})
                 if available >= duration and duration > 0:
                     assigned_start = slot_start
                     assigned_end = slot_start + timedelta(minutes=duration)
                     assignments.append((assigned_start, assigned_end, task))
                     slot[0] = assigned_end
                     assigned = True
-                    print(f"[DEBUG] 割当成功: task={task.name}, start={assigned_start}, end={assigned_end}")
+                    logger.debug("割当成功: task=%s, start=%s, end=%s", task.name, assigned_start, assigned_end)
                     break
             if not assigned:
-                print(f"[DEBUG] 割当失敗: task={task.name}")
+                logger.debug("割当失敗: task=%s", task.name)
                 unassigned.append(task)
 
         if not assignments:
-            print("[DEBUG] 決定的スケジュール生成失敗: 割当結果が空です。")
+            logger.debug("決定的スケジュール生成失敗: 割当結果が空です。")
             return ""
 
         weekday_map = ['月', '火', '水', '木', '金', '土', '日']
@@ -653,7 +695,8 @@ class OpenAIService:
                 prompt=prompt,
                 system_content=system_content,
                 max_tokens=20,
-                temperature=0.1
+                temperature=0.1,
+                call_type="due_date"
             )
             # 日付形式だけ抽出
             import re
@@ -699,10 +742,11 @@ JSON以外の余計な説明や文章は一切出力しないでください。
                 prompt=prompt,
                 system_content=system_content,
                 max_tokens=300,
-                temperature=0.1
+                temperature=0.1,
+                call_type="intent"
             )
 
-            print(f"[classify_user_intent] AI応答: {result_text}")
+            logger.debug("[classify_user_intent] AI応答: %s", result_text)
 
             # JSONパース
             import json
@@ -710,13 +754,13 @@ JSON以外の余計な説明や文章は一切出力しないでください。
             m = re.search(r'\{.*\}', result_text, re.DOTALL)
             if m:
                 result = json.loads(m.group(0))
-                print(f"[classify_user_intent] 分類結果: {result}")
+                logger.debug("[classify_user_intent] 分類結果: %s", result)
                 return result
 
             return {"intent": "other", "confidence": 0.0, "reason": "JSON解析エラー"}
 
         except Exception as e:
-            print(f"[classify_user_intent] エラー: {e}")
+            logger.error("[classify_user_intent] エラー: %s", e)
             return {"intent": "other", "confidence": 0.0, "reason": "分類エラー"}
 
     def _compute_prompt_hash(self, prompt: str) -> str:
@@ -729,43 +773,136 @@ JSON以外の余計な説明や文章は一切出力しないでください。
         system_content: str,
         max_tokens: int,
         temperature: float,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        call_type: str = "generic",
+        cache_key: Optional[str] = None
     ) -> str:
         """
         キャッシュをチェックし、存在すればそれを返す。
         存在しなければAPIを呼び出し、結果をキャッシュに保存してから返す。
+
+        Args:
+            cache_key: プロンプトの代わりにキャッシュのキーに使う正規化した文字列（utils.cache_keys）。
+                       プロンプトに毎回変わる値（現在時刻など）が入る呼び出しで、同じ結果になる呼び出しをまとめる
         """
         if model is None:
             model = self.model
 
+        # プロンプト（または正規化したキー）のハッシュを計算
+        prompt_hash = self._compute_prompt_hash((cache_key or prompt) + system_content)
+        return self._get_cached_or_compute(
+            model,
+            prompt_hash,
+            prompt,
+            lambda: self._call_openai_api(prompt, system_content, max_tokens, temperature, model, call_type=call_type)
+        )
+
+    def _get_cached_or_compute(self, model: str, prompt_hash: str, prompt: str, compute: Callable[[], str]) -> str:
+        """キャッシュにあればそれを返し、なければcompute()の結果を保存して返す（空の結果は保存しない）"""
         # キャッシュが無効化されている、またはdbが設定されていない場合は直接API呼び出し
         if not self.enable_cache or not self.db:
-            return self._call_openai_api(prompt, system_content, max_tokens, temperature, model)
-
-        # プロンプトのハッシュを計算
-        prompt_hash = self._compute_prompt_hash(prompt + system_content)
+            return compute()
 
         # キャッシュをチェック
         cached_response = self.db.get_cached_response(model, prompt_hash)
+        record_cache("openai_cache", bool(cached_response))
         if cached_response:
-            print(f"[_get_cached_or_call_api] キャッシュから取得: hash={prompt_hash[:16]}...")
+            logger.debug("[_get_cached_or_call_api] キャッシュから取得: hash=%s...", prompt_hash[:16])
             return cached_response
 
-        # キャッシュミス: APIを呼び出し
-        response = self._call_openai_api(prompt, system_content, max_tokens, temperature, model)
+        def call_and_cache() -> str:
+            # キャッシュミス: APIを呼び出し
+            response = compute()
+
+            # レスポンスをキャッシュに保存
+            if response:
+                self.db.set_cached_response(
+                    model=model,
+                    prompt_hash=prompt_hash,
+                    prompt_preview=prompt[:200],
+                    response=response,
+                    ttl_hours=self.cache_ttl_hours
+                )
+                logger.debug("[_get_cached_or_call_api] キャッシュに保存: hash=%s...", prompt_hash[:16])
+            return response
 
-        # レスポンスをキャッシュに保存
-        if response:
-            self.db.set_cached_response(
-                model=model,
-                prompt_hash=prompt_hash,
-                prompt_preview=prompt[:200],
-                response=response,
-                ttl_hours=self.cache_ttl_hours
-            )
-            print(f"[_get_cached_or_call_api] キャッシュに保存: hash={prompt_hash[:16]}...")
+        # 同じプロンプトを同時に呼び出している場合は、その結果を待って使う
+        return self._single_flight(model, prompt_hash, call_and_cache)
+
+    def _single_flight(self, model: str, prompt_hash: str, call_and_cache: Callable[[], str]) -> str:
+        """
+        同じキャッシュキーの呼び出しを1回にまとめる
+
+        プロセス内では最初の呼び出しの結果を後続の呼び出しが待つ。
+        プロセス間ではDBの実行権（openai_inflight）を取得できたプロセスだけが呼び出し、
+        他のプロセスは結果がキャッシュに保存されるのを待つ。
+        待ち時間が INFLIGHT_WAIT_SECONDS を超えた場合は自分で呼び出す。
+        """
+        cache_key = f"{model}:{prompt_hash}"
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[cache_key] = future
+
+        if not is_leader:
+            record_cache("openai_singleflight", True)
+            try:
+                return future.result(timeout=self.INFLIGHT_WAIT_SECONDS)
+            except FutureTimeoutError:
+                logger.warning("[_single_flight] 実行中の呼び出しがタイムアウトしたため再実行: hash=%s...", prompt_hash[:16])
+                return call_and_cache()
+
+        try:
+            response = self._call_with_claim(model, prompt_hash, call_and_cache)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+
+    def _call_with_claim(self, model: str, prompt_hash: str, call_and_cache: Callable[[], str]) -> str:
+        """DBの実行権を取得して呼び出す（他のプロセスが実行中の場合は結果のキャッシュを待つ）"""
+        cache_key = f"{model}:{prompt_hash}"
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + self.INFLIGHT_WAIT_SECONDS
+        claimed = self.db.claim_openai_request(cache_key, owner, self.INFLIGHT_CLAIM_TTL_SECONDS)
+        while not claimed:
+            time.sleep(self.INFLIGHT_POLL_SECONDS)
+            cached_response = self.db.get_cached_response(model, prompt_hash)
+            if cached_response:
+                record_cache("openai_singleflight", True)
+                logger.debug("[_single_flight] 他のプロセスの呼び出し結果を使用: hash=%s...", prompt_hash[:16])
+                return cached_response
+            if time.monotonic() >= deadline:
+                logger.warning("[_single_flight] 他のプロセスの呼び出しを待ちきれないため実行: hash=%s...", prompt_hash[:16])
+                break
+            # 実行中のプロセスが結果を保存せずに終わった場合（APIエラーなど）は実行権を取得できる
+            claimed = self.db.claim_openai_request(cache_key, owner, self.INFLIGHT_CLAIM_TTL_SECONDS)
+
+        if claimed:
+            # 最初のキャッシュ確認から実行権の取得までの間に、他のプロセスが保存して解放した場合はそれを使う
+            cached_response = self.db.get_cached_response(model, prompt_hash)
+            if cached_response:
+                self.db.release_openai_request(cache_key, owner)
+                record_cache("openai_singleflight", True)
+                return cached_response
+
+        record_cache("openai_singleflight", False)
+        try:
+            return call_and_cache()
+        finally:
+            if claimed:
+                self.db.release_openai_request(cache_key, owner)
 
-        return response
+    def _create_completion(self, call_type: str, **kwargs):
+        """chat.completions.createを呼び出す（呼び出し種別ごとの所要時間をメトリクスに記録）"""
+        with track(UPSTREAM_DURATION, service="openai", operation=call_type):
+            return self.client.chat.completions.create(**kwargs)
 
     def _call_openai_api(
         self,
@@ -773,11 +910,12 @@ JSON以外の余計な説明や文章は一切出力しないでください。
         system_content: str,
         max_tokens: int,
         temperature: float,
-        model: str
+        model: str,
+        call_type: str = "generic"
     ) -> str:
         """OpenAI APIを直接呼び出す"""
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion(call_type,
                 model=model,
                 messages=[
                     {"role": "system", "content": system_content},
@@ -820,7 +958,8 @@ JSON以外の余計な説明や文章は一切出力しないでください。
                 prompt=prompt,
                 system_content=system_content,
                 max_tokens=100,
-                temperature=0.0
+                temperature=0.0,
+                call_type="task_numbers"
             )
             import json
             import re
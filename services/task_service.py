@@ -5,6 +5,10 @@ import pytz
 from typing import List, Dict, Optional
 from models.database import Task
 from collections import defaultdict
+from utils.logger import get_logger
+from utils.tracing import traced
+
+logger = get_logger(__name__)
 
 class TaskService:
     """タスク管理サービスクラス"""
@@ -18,27 +22,27 @@ class TaskService:
 
     def parse_task_message(self, message: str) -> Dict:
         """LINEメッセージからタスク情報を解析"""
-        print(f"[parse_task_message] 入力: '{message}'")
+        logger.debug("[parse_task_message] 入力: '%s'", message)
         
         try:
             # 改行で区切られた複数タスクの場合は最初のタスクのみ処理
             if '\n' in message:
                 first_task = message.split('\n')[0]
-                print(f"[parse_task_message] 複数タスク検出、最初のタスクのみ処理: '{first_task}'")
+                logger.debug("[parse_task_message] 複数タスク検出、最初のタスクのみ処理: '%s'", first_task)
                 message = first_task
             
             result = self._parse_single_task(message)
-            print(f"[parse_task_message] 解析成功: {result}")
+            logger.debug("[parse_task_message] 解析成功: %s", result)
             return result
         except Exception as e:
-            print(f"[parse_task_message] 解析エラー: {e}")
+            logger.error("[parse_task_message] 解析エラー: %s", e)
             import traceback
             traceback.print_exc()
             raise
     
     def parse_multiple_tasks(self, message: str) -> List[Dict]:
         """改行で区切られた複数タスクを解析"""
-        print(f"[parse_multiple_tasks] 入力: '{message}'")
+        logger.debug("[parse_multiple_tasks] 入力: '%s'", message)
         
         tasks = []
         lines = message.strip().split('\n')
@@ -51,9 +55,9 @@ class TaskService:
             try:
                 task_info = self._parse_single_task(line)
                 tasks.append(task_info)
-                print(f"[parse_multiple_tasks] タスク{i+1}解析成功: {task_info['name']}")
+                logger.debug("[parse_multiple_tasks] タスク%s解析成功: %s", i+1, task_info['name'])
             except Exception as e:
-                print(f"[parse_multiple_tasks] タスク{i+1}解析エラー: {e}")
+                logger.error("[parse_multiple_tasks] タスク%s解析エラー: %s", i+1, e)
                 # エラーが発生したタスクはスキップして続行
                 continue
         
@@ -61,7 +65,7 @@ class TaskService:
     
     def _parse_single_task(self, message: str) -> Dict:
         """単一タスクの解析"""
-        print(f"[_parse_single_task] 入力: '{message}'")
+        logger.debug("[_parse_single_task] 入力: '%s'", message)
         
         try:
             # 時間パターンの定義
@@ -85,48 +89,48 @@ class TaskService:
             duration_minutes = None
             
             # 複合時間表現を先にチェック
-            print(f"[parse_task_message] 複合時間パターン検索開始: '{message}'")
+            logger.debug("[parse_task_message] 複合時間パターン検索開始: '%s'", message)
             for pattern in complex_time_patterns:
                 match = re.search(pattern, message)
                 if match:
-                    print(f"[parse_task_message] 複合時間パターンマッチ: {pattern}")
+                    logger.debug("[parse_task_message] 複合時間パターンマッチ: %s", pattern)
                     if '半' in pattern:
                         # 1時間半の場合
                         hours = int(match.group(1))
                         duration_minutes = hours * 60 + 30
-                        print(f"[parse_task_message] 複合時間抽出: {hours}時間半 → {duration_minutes}分")
+                        logger.debug("[parse_task_message] 複合時間抽出: %s時間半 → %s分", hours, duration_minutes)
                     else:
                         # 1時間30分の場合
                         hours = int(match.group(1))
                         minutes = int(match.group(2))
                         duration_minutes = hours * 60 + minutes
-                        print(f"[parse_task_message] 複合時間抽出: {hours}時間{minutes}分 → {duration_minutes}分")
+                        logger.debug("[parse_task_message] 複合時間抽出: %s時間%s分 → %s分", hours, minutes, duration_minutes)
                     message = re.sub(pattern, '', message)
-                    print(f"[parse_task_message] 複合時間除去後: '{message}'")
+                    logger.debug("[parse_task_message] 複合時間除去後: '%s'", message)
                     break
                 else:
-                    print(f"[parse_task_message] 複合時間パターンマッチなし: {pattern}")
+                    logger.debug("[parse_task_message] 複合時間パターンマッチなし: %s", pattern)
             
             # 単純な時間表現のパターン
             if not duration_minutes:
-                print(f"[parse_task_message] 単純時間パターン検索開始: '{message}'")
+                logger.debug("[parse_task_message] 単純時間パターン検索開始: '%s'", message)
                 for pattern in simple_time_patterns:
                     match = re.search(pattern, message)
                     if match:
                         duration_minutes = int(match.group(1))
-                        print(f"[parse_task_message] 単純時間抽出: {duration_minutes} (pattern: {pattern})")
+                        logger.debug("[parse_task_message] 単純時間抽出: %s (pattern: %s)", duration_minutes, pattern)
                         # 時間の場合は分に変換
                         if '時間' in pattern or 'hour' in pattern or 'h' in pattern:
                             duration_minutes *= 60
-                            print(f"[parse_task_message] 時間→分変換: {duration_minutes}")
+                            logger.debug("[parse_task_message] 時間→分変換: %s", duration_minutes)
                         message = re.sub(pattern, '', message)
-                        print(f"[parse_task_message] 単純時間除去後: '{message}'")
+                        logger.debug("[parse_task_message] 単純時間除去後: '%s'", message)
                         break
                     else:
-                        print(f"[parse_task_message] パターンマッチなし: {pattern}")
+                        logger.debug("[parse_task_message] パターンマッチなし: %s", pattern)
             if not duration_minutes:
-                print("[parse_task_message] 所要時間が見つかりませんでした")
-                print("[parse_task_message] デフォルトで30分を設定します")
+                logger.debug("[parse_task_message] 所要時間が見つかりませんでした")
+                logger.debug("[parse_task_message] デフォルトで30分を設定します")
                 duration_minutes = 30  # デフォルトで30分
             
             # 頻度の判定
@@ -136,7 +140,7 @@ class TaskService:
                 if keyword in message:
                     repeat = True
                     message = message.replace(keyword, '')
-                    print(f"[parse_task_message] 頻度抽出: {keyword} → repeat={repeat}")
+                    logger.debug("[parse_task_message] 頻度抽出: %s → repeat=%s", keyword, repeat)
                     break
             
             # 期日の抽出
@@ -157,7 +161,7 @@ class TaskService:
                 if keyword in message:
                     due_date = (today + timedelta(days=days)).strftime('%Y-%m-%d')
                     message = message.replace(keyword, '')
-                    print(f"[parse_task_message] 自然言語期日抽出: {keyword} → {due_date}")
+                    logger.debug("[parse_task_message] 自然言語期日抽出: %s → %s", keyword, due_date)
                     break
             
             # AIによる日付抽出（自然言語で見つからない場合）
@@ -165,37 +169,37 @@ class TaskService:
                 # より確実な自然言語日付処理を先に試行
                 due_date = self._parse_natural_date_expression(message)
                 if due_date:
-                    print(f"[parse_task_message] 自然言語日付処理: {due_date}")
+                    logger.debug("[parse_task_message] 自然言語日付処理: %s", due_date)
                     # 日付表現をメッセージから除去
                     message = self._remove_date_expressions(message)
                 else:
                     try:
-                        from services.openai_service import OpenAIService
-                        ai_service = OpenAIService(db=self.db, enable_cache=True, cache_ttl_hours=24)
+                        from services.container import container
+                        ai_service = container.openai_service
                         ai_date = ai_service.extract_due_date_from_text(message)
                         if ai_date:
                             due_date = ai_date
-                            print(f"[parse_task_message] AI日付抽出: {due_date}")
+                            logger.debug("[parse_task_message] AI日付抽出: %s", due_date)
                     except Exception as e:
-                        print(f"[parse_task_message] AI日付抽出エラー: {e}")
+                        logger.error("[parse_task_message] AI日付抽出エラー: %s", e)
             
             # 日付が抽出された場合（AIまたは自然言語）、日付表現をメッセージから除去
             if due_date:
-                print(f"[parse_task_message] 日付表現除去前: '{message}'")
+                logger.debug("[parse_task_message] 日付表現除去前: '%s'", message)
                 message = self._remove_date_expressions(message)
-                print(f"[parse_task_message] 日付表現除去後: '{message}'")
+                logger.debug("[parse_task_message] 日付表現除去後: '%s'", message)
             
             # タスク名の抽出
             task_name = re.sub(r'[\s　]+', ' ', message).strip()
-            print(f"[parse_task_message] タスク名抽出前: '{message}'")
-            print(f"[parse_task_message] タスク名抽出後: '{task_name}'")
+            logger.debug("[parse_task_message] タスク名抽出前: '%s'", message)
+            logger.debug("[parse_task_message] タスク名抽出後: '%s'", task_name)
             
             # 優先度記号（A、B、C）をタスク名から除去
             priority_removed = False
             if task_name.endswith(' A') or task_name.endswith(' B') or task_name.endswith(' C'):
                 task_name = task_name[:-2].strip()  # 末尾の「 A」「 B」「 C」を除去
                 priority_removed = True
-                print(f"[parse_task_message] 優先度記号除去後: '{task_name}'")
+                logger.debug("[parse_task_message] 優先度記号除去後: '%s'", task_name)
             
             # 入力検証
             if not task_name:
@@ -220,7 +224,7 @@ class TaskService:
                     detected_urgent = True
                 elif ' C' in original_message:
                     detected_important = True
-                print(f"[parse_task_message] 優先度記号判定: urgent={detected_urgent}, important={detected_important}")
+                logger.debug("[parse_task_message] 優先度記号判定: urgent=%s, important=%s", detected_urgent, detected_important)
             else:
                 # キーワードベースの判定
                 urgent_keywords = ['急ぎ', '緊急', 'urgent', '急', '早急', '至急', 'すぐ', '今すぐ']
@@ -258,7 +262,7 @@ class TaskService:
                 else:
                     priority = "normal"  # -（その他）
             
-            print(f"[parse_task_message] 結果: name='{task_name}', duration={duration_minutes}, repeat={repeat}, due_date={due_date}, priority={priority}")
+            logger.debug("[parse_task_message] 結果: name='%s', duration=%s, repeat=%s, due_date=%s, priority=%s", task_name, duration_minutes, repeat, due_date, priority)
             return {
                 'name': task_name,
                 'duration_minutes': duration_minutes,
@@ -267,7 +271,7 @@ class TaskService:
                 'priority': priority
             }
         except Exception as e:
-            print(f"[_parse_single_task] 解析エラー: {e}")
+            logger.error("[_parse_single_task] 解析エラー: %s", e)
             import traceback
             traceback.print_exc()
             raise
@@ -295,7 +299,7 @@ class TaskService:
                 if days_ahead < 0:  # 今週の日曜日が既に過ぎている場合（日曜日は0なので<0で判定）
                     days_ahead += 7
                 target_date = today + timedelta(days=days_ahead)
-                print(f"[DEBUG] 今週中: 今日={today.strftime('%Y-%m-%d %A')}, 日曜日={target_date.strftime('%Y-%m-%d %A')}")
+                logger.debug("今週中: 今日=%s, 日曜日=%s", today.strftime('%Y-%m-%d %A'), target_date.strftime('%Y-%m-%d %A'))
                 return target_date.strftime('%Y-%m-%d')
             
             # 今週+曜日の処理
@@ -315,7 +319,7 @@ class TaskService:
                 # 来週の日曜日を計算（日曜日は6）
                 days_ahead = 6 - today.weekday() + 7
                 target_date = today + timedelta(days=days_ahead)
-                print(f"[DEBUG] 来週中: 今日={today.strftime('%Y-%m-%d %A')}, 来週日曜日={target_date.strftime('%Y-%m-%d %A')}")
+                logger.debug("来週中: 今日=%s, 来週日曜日=%s", today.strftime('%Y-%m-%d %A'), target_date.strftime('%Y-%m-%d %A'))
                 return target_date.strftime('%Y-%m-%d')
             
             for weekday_name, weekday_num in weekday_map.items():
@@ -372,14 +376,14 @@ class TaskService:
         
         # 手動処理で見つからなかった場合、AIによる解析を試行
         try:
-            from services.openai_service import OpenAIService
-            ai_service = OpenAIService(db=self.db, enable_cache=True, cache_ttl_hours=24)
+            from services.container import container
+            ai_service = container.openai_service
             ai_result = ai_service.extract_due_date_from_text(text)
             if ai_result:
-                print(f"[_parse_natural_date_expression] AI解析結果: {ai_result}")
+                logger.debug("[_parse_natural_date_expression] AI解析結果: %s", ai_result)
                 return ai_result
         except Exception as e:
-            print(f"[_parse_natural_date_expression] AI解析エラー: {e}")
+            logger.error("[_parse_natural_date_expression] AI解析エラー: %s", e)
             # AI解析に失敗した場合はNoneを返す
         
         return None
@@ -432,8 +436,8 @@ class TaskService:
     def _determine_priority(self, task_name: str, due_date: str, duration_minutes: int) -> str:
         """タスクの優先度を判定（AIを使用）"""
         try:
-            from services.openai_service import OpenAIService
-            ai_service = OpenAIService(db=self.db, enable_cache=True, cache_ttl_hours=24)
+            from services.container import container
+            ai_service = container.openai_service
             # 現在の日付を取得
             jst = pytz.timezone('Asia/Tokyo')
             today = datetime.now(jst)
@@ -441,16 +445,16 @@ class TaskService:
             
             # 期日が今日の場合は強制的に緊急と判定
             if due_date == today_str:
-                print(f"[_determine_priority] 本日締切のため緊急判定: {task_name}")
+                logger.debug("[_determine_priority] 本日締切のため緊急判定: %s", task_name)
                 # 重要度を判定してAまたはBを決定
                 important_keywords = ['重要', '大切', '必須', '必要', 'essential', 'important', 'critical', 'key', '主要', '要件定義', 'システム', 'プロジェクト']
                 is_important = any(keyword in task_name for keyword in important_keywords)
                 
                 if is_important:
-                    print(f"[_determine_priority] 本日締切+重要 → A (urgent_important)")
+                    logger.debug("[_determine_priority] 本日締切+重要 → A (urgent_important)")
                     return "urgent_important"
                 else:
-                    print(f"[_determine_priority] 本日締切+重要でない → B (urgent_not_important)")
+                    logger.debug("[_determine_priority] 本日締切+重要でない → B (urgent_not_important)")
                     return "urgent_not_important"
             
             # 期日までの日数を計算
@@ -460,16 +464,17 @@ class TaskService:
                 # todayもJSTタイムゾーン付きなので、差分計算が安全
                 days_until_due = (due_date_obj.date() - today.date()).days
             else:
-                days_until_due = 7  # 期日がない場合は7日後と仮定
+                days_until_due = None
             
             # AIに優先度判定を依頼
+            # 日付・日数そのものではなくバケットを渡し、日付が変わっても同じ判定をキャッシュから使えるようにする
+            from utils.cache_keys import due_distance_bucket, duration_bucket, priority_cache_key
             prompt = f"""
             以下のタスクの緊急度と重要度を判定し、適切な優先度カテゴリを選択してください。
 
             タスク名: {task_name}
-            所要時間: {duration_minutes}分
-            期日: {due_date or '未設定'}
-            期日までの日数: {days_until_due}日
+            所要時間: {duration_bucket(duration_minutes)}
+            期日まで: {due_distance_bucket(days_until_due)}
 
             優先度カテゴリ:
             - urgent_important: 緊急かつ重要（最優先で処理すべき）
@@ -483,15 +488,17 @@ class TaskService:
 
             回答は上記のカテゴリ名のみを返してください。
             """
-            priority = ai_service.get_priority_classification(prompt)
+            priority = ai_service.get_priority_classification(
+                prompt, cache_key=priority_cache_key(task_name, duration_minutes, days_until_due)
+            )
             # 有効な優先度かチェック
             valid_priorities = ["urgent_important", "not_urgent_important", "urgent_not_important", "normal"]
             if priority not in valid_priorities:
                 priority = "normal"  # デフォルト
-            print(f"[_determine_priority] AI判定結果: {priority}")
+            logger.debug("[_determine_priority] AI判定結果: %s", priority)
             return priority
         except Exception as e:
-            print(f"[_determine_priority] AI判定エラー: {e}")
+            logger.error("[_determine_priority] AI判定エラー: %s", e)
             # エラーの場合は簡易判定
             return self._simple_priority_determination(task_name, due_date, duration_minutes)
 
@@ -513,13 +520,13 @@ class TaskService:
             tomorrow_str = (today + timedelta(days=1)).strftime('%Y-%m-%d')
             
             if due_date == today_str:
-                print(f"[_simple_priority_determination] 本日締切のため緊急判定: {task_name}")
+                logger.debug("[_simple_priority_determination] 本日締切のため緊急判定: %s", task_name)
                 # 重要度を判定してAまたはBを決定
                 if is_important:
-                    print(f"[_simple_priority_determination] 本日締切+重要 → A (urgent_important)")
+                    logger.debug("[_simple_priority_determination] 本日締切+重要 → A (urgent_important)")
                     return "urgent_important"
                 else:
-                    print(f"[_simple_priority_determination] 本日締切+重要でない → B (urgent_not_important)")
+                    logger.debug("[_simple_priority_determination] 本日締切+重要でない → B (urgent_not_important)")
                     return "urgent_not_important"
             elif due_date == tomorrow_str:
                 is_urgent = True
@@ -572,10 +579,15 @@ class TaskService:
         else:
             raise Exception("未来タスクの作成に失敗しました")
 
+    @traced("task_service.get_user_tasks")
     def get_user_tasks(self, user_id: str, status: str = "active", task_type: str = "daily") -> List[Task]:
         """ユーザーのタスク一覧を取得"""
         return self.db.get_user_tasks(user_id, status, task_type)
 
+    def get_active_tasks_by_user(self, user_ids: List[str]) -> Dict[str, List[Task]]:
+        """複数ユーザーのアクティブなタスク一覧を一括取得"""
+        return self.db.get_active_tasks_by_user(user_ids)
+
     def get_user_future_tasks(self, user_id: str, status: str = "active") -> List[Task]:
         """ユーザーの未来タスク一覧を取得"""
         return self.db.get_user_future_tasks(user_id, status)
@@ -738,13 +750,21 @@ class TaskService:
         all_tasks = self.get_user_tasks(user_id)
         return [task for task in all_tasks if task.repeat]
 
-    def archive_task(self, task_id: str) -> bool:
-        """タスクをアーカイブ"""
-        return self.db.update_task_status(task_id, "archived")
+    def archive_task(self, task_id: str, rollover: bool = False) -> bool:
+        """
+        タスクをアーカイブ
+
+        rollover=True は期日の繰り越しで新しいタスクに置き換える場合（ユーザーの削除ではないため週次集計に含めない）
+        """
+        return self.db.update_task_status(task_id, "archived", count_in_stats=not rollover)
 
     def reactivate_task(self, task_id: str) -> bool:
-        """タスクを再アクティブ化"""
-        return self.db.update_task_status(task_id, "active") 
+        """タスクを再アクティブ化（tasks_archiveに移動済みの場合はtasksに戻す）"""
+        return self.db.update_task_status(task_id, "active")
+
+    def get_task_history(self, user_id: str, since: Optional[datetime] = None, status: Optional[str] = None) -> List[Task]:
+        """アクティブでないタスクの履歴を取得（tasks_archiveを含む）"""
+        return self.db.get_task_history(user_id, since, status)
 
     def format_future_task_list(self, tasks: List[Task], show_select_guide: bool = True) -> str:
         """未来タスク一覧をフォーマット"""
@@ -768,7 +788,7 @@ class TaskService:
 
     def parse_future_task_message(self, message: str) -> Dict:
         """未来タスクメッセージからタスク情報を解析"""
-        print(f"[parse_future_task_message] 入力: '{message}'")
+        logger.debug("[parse_future_task_message] 入力: '%s'", message)
         
         # 時間パターンの定義
         complex_time_patterns = [
@@ -827,7 +847,7 @@ class TaskService:
         # 優先度の判定（未来タスクは基本的に重要）
         priority = "not_urgent_important"  # 未来タスクは基本的に重要だが緊急ではない
         
-        print(f"[parse_future_task_message] 結果: name='{task_name}', duration={duration_minutes}, priority={priority}")
+        logger.debug("[parse_future_task_message] 結果: name='%s', duration=%s, priority=%s", task_name, duration_minutes, priority)
         return {
             'name': task_name,
             'duration_minutes': duration_minutes,
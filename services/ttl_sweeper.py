@@ -0,0 +1,122 @@
+"""
+期限切れデータのスイーパーとタスクのコンパクション
+- TTLSweeper: openai_cache / user_sessions の期限切れ行を、小さなバッチに分けて少しずつ削除する
+- TaskCompactor: アクティブでないタスクを tasks から tasks_archive に少しずつ移動する
+
+1回の実行（tick）には時間の上限があり、バッチの間で他のリクエストに書き込みロックを譲る。
+上限までに処理しきれなかった分はバックログとして次回以降に持ち越す。
+"""
+import time
+from typing import Dict, Iterable, Optional
+
+from utils.logger import get_logger
+from utils.metrics import TTL_SWEEP_DELETED
+
+logger = get_logger(__name__)
+
+
+class TTLSweeper:
+    """期限切れ行を時間上限付きで少しずつ削除するスイーパー"""
+
+    LOG_NAME = "ttl_sweeper"
+    TABLES = ("user_sessions", "openai_cache")
+    # 1バッチの最大削除件数（1トランザクションでロックを保持する範囲）
+    BATCH_SIZE = 500
+    # 1回の実行で削除に使う時間の上限（秒）
+    TIME_BUDGET_SECONDS = 1.0
+    # バッチ間の待機時間（秒）。Webhookの書き込みを先に通す
+    PAUSE_SECONDS = 0.05
+
+    def __init__(
+        self,
+        db,
+        tables: Iterable[str] = TABLES,
+        batch_size: Optional[int] = None,
+        time_budget_seconds: Optional[float] = None,
+        pause_seconds: Optional[float] = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.db = db
+        self.tables = tuple(tables)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.time_budget_seconds = time_budget_seconds if time_budget_seconds is not None else self.TIME_BUDGET_SECONDS
+        self.pause_seconds = pause_seconds if pause_seconds is not None else self.PAUSE_SECONDS
+        self._clock = clock
+        self._sleep = sleep
+        # 前回の実行で削除しきれなかったテーブル
+        self.backlog = {table: False for table in self.tables}
+        # 起動からの累計削除件数
+        self.total_reclaimed = {table: 0 for table in self.tables}
+        self.last_result: Optional[Dict] = None
+
+    def _run_batch(self, table: str) -> int:
+        """1バッチ分を処理し、処理した行数を返す"""
+        return self.db.delete_expired_batch(table, self.batch_size)
+
+    @property
+    def has_backlog(self) -> bool:
+        """削除しきれていない期限切れ行があるか"""
+        return any(self.backlog.values())
+
+    def run_tick(self) -> Dict:
+        """
+        時間の上限まで期限切れ行をバッチで削除
+
+        テーブルを1バッチずつ交互に処理するため、1つのテーブルのバックログが
+        他のテーブルの削除を止めることはない。
+
+        Returns:
+            dict: reclaimed（テーブル別の削除件数）、batches、elapsed_seconds、backlog（削除しきれなかったテーブル）
+        """
+        start = self._clock()
+        deadline = start + self.time_budget_seconds
+        reclaimed = {table: 0 for table in self.tables}
+        pending = list(self.tables)
+        batches = 0
+
+        index = 0
+        while pending and self._clock() < deadline:
+            table = pending[index % len(pending)]
+            deleted = self._run_batch(table)
+            batches += 1
+            reclaimed[table] += deleted
+            if deleted < self.batch_size:
+                pending.remove(table)
+            else:
+                index += 1
+            # 次のバッチの前に他のリクエストへ書き込みロックを譲る
+            if pending and self._clock() < deadline:
+                self._sleep(self.pause_seconds)
+
+        for table in self.tables:
+            self.backlog[table] = table in pending
+            self.total_reclaimed[table] += reclaimed[table]
+            if reclaimed[table]:
+                TTL_SWEEP_DELETED.labels(table=table).inc(reclaimed[table])
+
+        result = {
+            "reclaimed": reclaimed,
+            "batches": batches,
+            "elapsed_seconds": round(self._clock() - start, 3),
+            "backlog": pending,
+        }
+        self.last_result = result
+        logger.debug(
+            "[%s] 処理 %s, バッチ数 %s, 所要 %s秒, 持ち越し %s",
+            self.LOG_NAME, reclaimed, batches, result['elapsed_seconds'], pending or 'なし',
+        )
+        return result
+
+
+class TaskCompactor(TTLSweeper):
+    """アクティブでないタスク（アーカイブ済みなど）を tasks_archive に移動し、tasksをアクティブなタスクだけに保つ"""
+
+    LOG_NAME = "task_compactor"
+    TABLES = ("tasks",)
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, tables=self.TABLES, **kwargs)
+
+    def _run_batch(self, table: str) -> int:
+        return self.db.archive_inactive_tasks(self.batch_size)
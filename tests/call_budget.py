@@ -0,0 +1,79 @@
+"""
+外部呼び出し回数の計測ハーネス
+
+Database / PostgreSQLDatabase のメソッド呼び出しをメソッド単位で数え、
+LINE / Google Calendar / OpenAI へのリクエストはスタブサーバー側（通信レベル）で数える。
+ラッパーを経由しない直接呼び出しも漏れなく数えるため、外部APIはクライアント側ではなく受信側で数える。
+"""
+from collections import Counter
+
+
+class CallBudgetExceeded(AssertionError):
+    """呼び出し回数が予算を超えた"""
+
+
+class CallCounter:
+    """
+    withブロック内の呼び出し回数を数える
+
+    使い方:
+        with CallCounter(db, upstreams) as calls:
+            client.post("/callback", ...)
+        calls.assert_within({"db": 30, "db.get_token": 2, "line": 1, "openai": 0})
+    """
+
+    def __init__(self, db, upstreams: dict):
+        self.db = db
+        self.upstreams = upstreams
+        self.db_calls = Counter()
+        self._originals = {}
+
+    def __enter__(self) -> "CallCounter":
+        for stub in self.upstreams.values():
+            stub.reset_counts()
+        self.db_calls.clear()
+
+        for name in dir(type(self.db)):
+            if name.startswith("_") or not callable(getattr(type(self.db), name, None)):
+                continue
+            self._originals[name] = self.db.__dict__.get(name)
+            setattr(self.db, name, self._wrap(name, getattr(self.db, name)))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for name, original in self._originals.items():
+            if original is None:
+                delattr(self.db, name)
+            else:
+                setattr(self.db, name, original)
+        self._originals = {}
+        return False
+
+    def _wrap(self, name: str, method):
+        def wrapper(*args, **kwargs):
+            self.db_calls[name] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def summary(self) -> dict:
+        """{"db": 合計, "db.<メソッド>": 回数, "line": 回数, "line.<リクエスト>": 回数, ...}"""
+        result = {"db": sum(self.db_calls.values())}
+        result.update({f"db.{name}": count for name, count in self.db_calls.items()})
+        for service, stub in self.upstreams.items():
+            result[service] = stub.calls
+            result.update({f"{service}.{request}": count for request, count in stub.requests.items()})
+        return result
+
+    def assert_within(self, budget: dict):
+        """
+        予算を超えた項目があればCallBudgetExceededを送出
+
+        Args:
+            budget: {"db": 上限, "db.get_token": 上限, "line": 上限, "google": 上限, "openai": 上限}
+        """
+        actual = self.summary()
+        over = {key: (actual.get(key, 0), limit) for key, limit in budget.items() if actual.get(key, 0) > limit}
+        if over:
+            details = ", ".join(f"{key}: {count} > {limit}" for key, (count, limit) in sorted(over.items()))
+            breakdown = "\n".join(f"  {key}: {count}" for key, count in sorted(actual.items()))
+            raise CallBudgetExceeded(f"呼び出し回数が予算を超えました（{details}）\n内訳:\n{breakdown}")
@@ -0,0 +1,50 @@
+"""
+テスト共通のフィクスチャ
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models.postgres_database import Base, PostgreSQLDatabase
+from utils.query_profiler import install_engine_hooks
+
+
+@pytest.fixture
+def pg_db(tmp_path):
+    """
+    SQLAlchemyのSQLiteエンジンを注入したPostgreSQLDatabase
+
+    PostgreSQLサーバーなしでセッション・UPSERTの動作を確認するためのもの。
+    checkouts（接続の取得回数）と commits（コミット回数）を数える。
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'pg.db'}")
+
+    # pysqliteでSAVEPOINTを正しく動かすための設定（SQLAlchemyのドキュメント記載の方法）
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    install_engine_hooks(engine)
+    Base.metadata.create_all(engine)
+    db = PostgreSQLDatabase.__new__(PostgreSQLDatabase)
+    db.engine = engine
+    db.Session = sessionmaker(bind=engine)
+    db.db_path = "PostgreSQL"
+
+    db.checkouts = 0
+    db.commits = 0
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(*args):
+        db.checkouts += 1
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        db.commits += 1
+
+    yield db
+    engine.dispose()
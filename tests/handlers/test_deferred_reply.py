@@ -0,0 +1,241 @@
+"""
+時間のかかるコマンドの先送り実行（reply-now / push-later）のユニットテスト
+"""
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from linebot.v3.messaging import ReplyMessageRequest, TextMessage
+
+from handlers import deferred_reply
+from handlers.deferred_reply import PushReplyClient, has_push_quota, run_command
+from handlers.selection_handler import handle_task_selection_process
+
+
+@pytest.fixture(autouse=True)
+def reset_quota(monkeypatch):
+    monkeypatch.delenv("DEFERRED_COMMANDS", raising=False)
+    deferred_reply.reset_quota_cache()
+    yield
+    deferred_reply.reset_quota_cache()
+
+
+def _line_api(quota_type="limited", limit=1000, usage=0):
+    line_bot_api = Mock()
+    line_bot_api.get_message_quota.return_value = SimpleNamespace(type=quota_type, value=limit)
+    line_bot_api.get_message_quota_consumption.return_value = SimpleNamespace(total_usage=usage)
+    return line_bot_api
+
+
+def _texts(call):
+    return [message.text for message in call[0][0].messages]
+
+
+class TestRunCommand:
+    """コマンドの実行方式"""
+
+    def test_deferred_replies_ack_and_pushes_result(self):
+        """受付を返信し、処理の返信はpushで送る"""
+        line_bot_api = _line_api()
+        done = threading.Event()
+
+        def handler(client, reply_token, user_id, text):
+            assert threading.current_thread().name.startswith("remind-background")
+            client.reply_message(ReplyMessageRequest(replyToken=reply_token, messages=[TextMessage(text=text)]))
+            done.set()
+            return True
+
+        assert run_command("schedule_proposal", line_bot_api, "token", "U1", handler, "提案") is True
+        assert done.wait(5)
+
+        assert _texts(line_bot_api.reply_message.call_args) == [deferred_reply.ACK_MESSAGES["schedule_proposal"]]
+        push_request = line_bot_api.push_message.call_args[0][0]
+        assert push_request.to == "U1"
+        assert [message.text for message in push_request.messages] == ["提案"]
+
+    def test_deferred_job_starts_new_trace(self):
+        """先送りした処理はリクエストのスパンを引き継がず、別のトレースに記録する"""
+        from utils.tracing import current_span, start_span
+        line_bot_api = _line_api()
+        done = threading.Event()
+        job_spans = []
+
+        def handler(client, reply_token, user_id):
+            job_spans.append(current_span())
+            done.set()
+
+        with start_span("webhook") as request_span:
+            assert run_command("schedule_approval", line_bot_api, "token", "U1", handler) is True
+        assert done.wait(5)
+
+        assert job_spans[0].trace_id != request_span.trace_id
+        assert not request_span.children
+
+    def test_unconfigured_command_runs_sync(self, monkeypatch):
+        """先送りしないコマンドはそのまま実行する"""
+        monkeypatch.setenv("DEFERRED_COMMANDS", "schedule_approval")
+        line_bot_api = _line_api()
+        handler = Mock(return_value=False)
+
+        assert run_command("schedule_proposal", line_bot_api, "token", "U1", handler, "x") is False
+        handler.assert_called_once_with(line_bot_api, "token", "U1", "x")
+        line_bot_api.get_message_quota.assert_not_called()
+
+    def test_empty_configuration_disables_deferral(self, monkeypatch):
+        """DEFERRED_COMMANDS が空なら全て同期実行"""
+        monkeypatch.setenv("DEFERRED_COMMANDS", "")
+        assert deferred_reply.deferred_commands() == set()
+
+    def test_ack_failure_runs_sync(self):
+        """受付を返信できなかった場合は同期実行して直接返信する"""
+        line_bot_api = _line_api()
+        line_bot_api.reply_message.side_effect = [RuntimeError("timeout"), None]
+        handler = Mock(return_value=True)
+
+        assert run_command("schedule_approval", line_bot_api, "token", "U1", handler) is True
+        handler.assert_called_once_with(line_bot_api, "token", "U1")
+
+    def test_deferred_exception_is_contained(self):
+        """先送りした処理の例外は返信後用のスレッドで記録するだけ"""
+        line_bot_api = _line_api()
+        done = threading.Event()
+
+        def handler(client, reply_token, user_id):
+            done.set()
+            raise RuntimeError("boom")
+
+        assert run_command("schedule_approval", line_bot_api, "token", "U1", handler) is True
+        assert done.wait(5)
+
+
+class TestPushQuota:
+    """pushの上限による同期実行への切り替え"""
+
+    def test_low_quota_runs_sync(self):
+        """残りが PUSH_QUOTA_RESERVE 以下なら同期実行"""
+        line_bot_api = _line_api(limit=1000, usage=1000 - deferred_reply.PUSH_QUOTA_RESERVE)
+        handler = Mock(return_value=True)
+
+        run_command("schedule_proposal", line_bot_api, "token", "U1", handler)
+        handler.assert_called_once_with(line_bot_api, "token", "U1")
+        line_bot_api.reply_message.assert_not_called()
+
+    def test_unlimited_quota(self):
+        """上限なしのプランは使用量を確認しない"""
+        line_bot_api = _line_api(quota_type="none")
+        assert has_push_quota(line_bot_api)
+        line_bot_api.get_message_quota_consumption.assert_not_called()
+
+    def test_unknown_quota_is_treated_as_exhausted(self):
+        """上限を確認できない場合は同期実行"""
+        line_bot_api = _line_api()
+        line_bot_api.get_message_quota.side_effect = RuntimeError("unavailable")
+        assert not has_push_quota(line_bot_api)
+
+    def test_quota_check_is_cached(self):
+        """確認結果は QUOTA_CHECK_INTERVAL_SECONDS の間使い回す"""
+        line_bot_api = _line_api()
+        assert has_push_quota(line_bot_api)
+        assert has_push_quota(line_bot_api)
+        assert line_bot_api.get_message_quota.call_count == 1
+
+    def test_rate_limited_push_stops_deferral(self):
+        """pushが上限（429）で失敗したら次の確認まで先送りしない"""
+        line_bot_api = _line_api()
+        assert has_push_quota(line_bot_api)
+        line_bot_api.push_message.side_effect = type("ApiException", (Exception,), {"status": 429})()
+
+        with pytest.raises(Exception):
+            PushReplyClient(line_bot_api, "U1").reply_message(
+                ReplyMessageRequest(replyToken="token", messages=[TextMessage(text="提案")])
+            )
+        assert not has_push_quota(line_bot_api)
+
+
+class TestDeferredScheduleProposal:
+    """スケジュール提案の先送り"""
+
+    def test_proposal_is_pushed(self):
+        """受付を返信してから提案を生成し、pushで送る"""
+        pushed = threading.Event()
+        line_bot_api = _line_api()
+        line_bot_api.push_message.side_effect = lambda request: pushed.set()
+        openai_service = Mock()
+        openai_service.extract_task_numbers_from_message.return_value = {"tasks": [1]}
+        openai_service.generate_schedule_proposal.return_value = "提案"
+        calendar_service = Mock()
+        calendar_service.get_free_busy_times.return_value = []
+        task_service = Mock()
+        task_service.get_user_tasks.return_value = [Mock(due_date=None, priority="normal", task_id="t1")]
+        db = Mock()
+
+        with patch('handlers.helpers.load_flag_data', return_value={"mode": "schedule"}), \
+                patch('handlers.helpers.delete_flag_file') as delete_flag_file:
+            result = handle_task_selection_process(
+                line_bot_api, "reply_token", "U1", "1", task_service, openai_service,
+                calendar_service, Mock(), Mock(return_value=True), Mock(), db,
+            )
+            assert pushed.wait(5)
+
+        assert result is True
+        delete_flag_file.assert_called_once_with("U1", "task_select")
+        assert _texts(line_bot_api.reply_message.call_args) == [deferred_reply.ACK_MESSAGES["schedule_proposal"]]
+        assert _texts(line_bot_api.push_message.call_args) == ["提案"]
+        db.set_user_session.assert_any_call("U1", "schedule_proposal", "提案", expires_hours=24)
+
+
+class TestScheduleApprovalClaim:
+    """承認処理中の「はい」の再送"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        from models.database import Database
+        db = Database(str(tmp_path / "approval.db"))
+        db.set_user_session("U1", "schedule_proposal", "提案", expires_hours=24)
+        db.set_user_session("U1", "selected_tasks", '["t1"]', expires_hours=24)
+        return db
+
+    def _approve(self, line_bot_api, calendar_service, db):
+        from handlers.approval_handler import handle_approval
+        task_service = Mock()
+        task_service.get_user_tasks.return_value = [Mock(task_id="t1", duration_minutes=30)]
+        task_service.get_user_tasks.return_value[0].name = "資料作成"
+        menu = {"type": "bubble", "body": {"type": "box", "layout": "vertical", "contents": [{"type": "text", "text": "メニュー"}]}}
+        return handle_approval(line_bot_api, "token", "U1", task_service, calendar_service, Mock(return_value=menu), db)
+
+    @pytest.fixture(autouse=True)
+    def sync_mode(self, monkeypatch):
+        monkeypatch.setenv("DEFERRED_COMMANDS", "")
+        with patch('handlers.approval_handler.load_flag_data', return_value=None), \
+                patch('handlers.approval_handler._format_schedule_display', return_value=""):
+            yield
+
+    def test_second_approval_does_not_add_events_again(self, db):
+        """処理中の提案は他の「はい」から取得できず、カレンダーへの追加は1回だけ"""
+        from handlers.approval_handler import APPROVAL_IN_PROGRESS_MESSAGE
+        line_bot_api = Mock()
+        calendar_service = Mock()
+        inner_results = []
+
+        def add_events(user_id, proposal):
+            # カレンダーへの追加中にもう一度「はい」が届いた場合
+            inner_results.append(self._approve(line_bot_api, calendar_service, db))
+            return 1
+
+        calendar_service.add_events_to_calendar.side_effect = add_events
+
+        assert self._approve(line_bot_api, calendar_service, db) is True
+        assert inner_results == [True]
+        assert calendar_service.add_events_to_calendar.call_count == 1
+        replies = [call[0][0].messages[0] for call in line_bot_api.reply_message.call_args_list]
+        assert [getattr(message, "text", None) for message in replies].count(APPROVAL_IN_PROGRESS_MESSAGE) == 1
+        assert db.get_user_session("U1", "schedule_proposal") is None
+
+    def test_failed_approval_restores_proposal(self, db):
+        """承認に失敗した場合は提案を戻し、もう一度承認できる"""
+        calendar_service = Mock()
+        calendar_service.add_events_to_calendar.side_effect = RuntimeError("calendar down")
+
+        assert self._approve(Mock(), calendar_service, db) is False
+        assert db.get_user_session("U1", "schedule_proposal") == "提案"
@@ -180,3 +180,80 @@ class TestHandleTaskSelectionProcess:
         # Assert
         assert result is False
         mock_line_bot_api.reply_message.assert_called_once()
+
+
+class TestSelectionConcurrency:
+    """スケジュール提案フローの並行実行"""
+
+    def test_calendar_fetch_overlaps_task_read(self):
+        """空き時間の取得（Calendar）とタスクの読み込みを同時に実行する"""
+        import threading
+
+        # 両方のステップが開始するまで互いに待つ（順番に実行すると完了しない）
+        barrier = threading.Barrier(2, timeout=5)
+        task = Mock(due_date=None, priority="normal", task_id="t1")
+
+        def get_user_tasks(user_id):
+            barrier.wait()
+            return [task]
+
+        def get_free_busy_times(user_id, date, max_age_seconds=None):
+            barrier.wait()
+            return []
+
+        mock_openai_service = Mock()
+        mock_openai_service.extract_task_numbers_from_message.return_value = {"tasks": [1]}
+        mock_openai_service.generate_schedule_proposal.return_value = "提案"
+        mock_calendar_service = Mock()
+        mock_calendar_service.get_free_busy_times.side_effect = get_free_busy_times
+        mock_task_service = Mock()
+        mock_task_service.get_user_tasks.side_effect = get_user_tasks
+        mock_line_bot_api = Mock()
+
+        with patch('handlers.helpers.load_flag_data', return_value={"mode": "schedule"}), \
+                patch('handlers.helpers.delete_flag_file'):
+            result = handle_task_selection_process(
+                mock_line_bot_api,
+                "reply_token",
+                "user_id",
+                "1",
+                mock_task_service,
+                mock_openai_service,
+                mock_calendar_service,
+                Mock(),
+                Mock(return_value=True),
+                Mock(),
+            )
+
+        assert result is True
+        mock_openai_service.generate_schedule_proposal.assert_called_once()
+        assert mock_openai_service.generate_schedule_proposal.call_args[0][1] == []
+        assert mock_line_bot_api.reply_message.call_args[0][0].messages[0].text == "提案"
+
+    def test_calendar_not_fetched_without_numbers(self):
+        """番号を認識できない場合はGoogle認証の確認・空き時間の取得を開始しない"""
+        mock_openai_service = Mock()
+        mock_openai_service.extract_task_numbers_from_message.return_value = {"tasks": []}
+        mock_calendar_service = Mock()
+        mock_is_google_authenticated = Mock(return_value=True)
+        mock_line_bot_api = Mock()
+
+        with patch('handlers.helpers.load_flag_data', return_value={"mode": "schedule"}), \
+                patch('handlers.helpers.delete_flag_file'):
+            result = handle_task_selection_process(
+                mock_line_bot_api,
+                "reply_token",
+                "user_id",
+                "おはよう",
+                Mock(),
+                mock_openai_service,
+                mock_calendar_service,
+                Mock(),
+                mock_is_google_authenticated,
+                Mock(),
+            )
+
+        assert result is False
+        mock_calendar_service.get_free_busy_times.assert_not_called()
+        mock_is_google_authenticated.assert_not_called()
+        assert "認識できませんでした" in mock_line_bot_api.reply_message.call_args[0][0].messages[0].text
@@ -0,0 +1,63 @@
+"""
+Webhookベンチマークハーネスのユニットテスト
+"""
+import base64
+import hashlib
+import hmac
+import json
+import urllib.request
+from benchmarks.bench_webhook import build_webhook_body, percentile, sign
+from benchmarks.upstream_stubs import GoogleCalendarStubHandler, OpenAIStubHandler, StubServer
+
+
+class TestBenchWebhook:
+    """署名・ペイロード・集計のテスト"""
+
+    def test_signature_matches_line_algorithm(self):
+        """LINEの署名方式（HMAC-SHA256 → Base64）と一致する"""
+        body = build_webhook_body("U123", "タスク一覧")
+        expected = base64.b64encode(hmac.new(b"secret", body, hashlib.sha256).digest()).decode()
+        assert sign(body, "secret") == expected
+        event = json.loads(body)["events"][0]
+        assert event["source"]["userId"] == "U123"
+        assert event["message"]["text"] == "タスク一覧"
+
+    def test_percentile(self):
+        """最近傍法のパーセンタイル"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) == 0.0
+
+
+class TestUpstreamStubs:
+    """スタブサーバーのテスト"""
+
+    def test_openai_stub_returns_completion(self):
+        """OpenAIスタブがChat Completions形式で応答する"""
+        server = StubServer(OpenAIStubHandler, content="hello").start()
+        try:
+            req = urllib.request.Request(
+                server.url + "/v1/chat/completions", data=b"{}", method="POST",
+                headers={"Content-Type": "application/json"},
+            )
+            with urllib.request.urlopen(req) as res:
+                payload = json.loads(res.read())
+            assert payload["choices"][0]["message"]["content"] == "hello"
+            assert server.calls == 1
+        finally:
+            server.stop()
+
+    def test_error_injection(self):
+        """エラー率1.0なら全リクエストが500になる"""
+        server = StubServer(GoogleCalendarStubHandler, error_rate=1.0).start()
+        try:
+            try:
+                urllib.request.urlopen(server.url + "/calendar/v3/calendars/primary/events")
+                assert False, "HTTPErrorが発生するはず"
+            except urllib.error.HTTPError as e:
+                assert e.code == 500
+            assert server.errors == 1
+        finally:
+            server.stop()
@@ -0,0 +1,183 @@
+"""
+Googleカレンダーのローカルミラー（syncTokenによる差分同期）のユニットテスト
+"""
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import pytz
+from googleapiclient.errors import HttpError
+
+from models.calendar_mirror import event_to_row, row_to_event
+from models.database import Database
+from services.calendar_service import CalendarService
+
+JST = pytz.timezone("Asia/Tokyo")
+
+
+def _today(hour: int = 0) -> datetime:
+    return datetime.now(JST).replace(hour=hour, minute=0, second=0, microsecond=0)
+
+
+def _event(event_id: str, hour: int, hours: int = 1, summary: str = "会議", days: int = 0) -> dict:
+    start = _today(hour) + timedelta(days=days)
+    return {
+        "id": event_id,
+        "summary": summary,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=hours)).isoformat()},
+    }
+
+
+class FakeCalendarApi:
+    """events().list / events().insert の応答を順番に返すスタブ"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.list_calls = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.list_calls.append(params)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            return Mock(execute=Mock(side_effect=response))
+        return Mock(execute=Mock(return_value=response))
+
+    def insert(self, calendarId, body):
+        return Mock(execute=Mock(return_value=dict(body, id="inserted")))
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def any_db(request, tmp_path):
+    """SQLite版とPostgreSQL版（SQLiteエンジン注入）の両方で実行する"""
+    if request.param == "sqlite":
+        return Database(str(tmp_path / "mirror.db"))
+    return request.getfixturevalue("pg_db")
+
+
+def _calendar(db, api: FakeCalendarApi) -> CalendarService:
+    service = CalendarService(db)
+
+    def authenticate_user(user_id):
+        service.service = api
+        return True
+
+    service.authenticate_user = Mock(side_effect=authenticate_user)
+    return service
+
+
+def _expire_mirror(service: CalendarService, monkeypatch):
+    """次の読み取りで同期が必要になるようにする"""
+    monkeypatch.setattr(service, "MIRROR_MAX_AGE_SECONDS", -1)
+
+
+class TestMirrorReads:
+    """ミラーからの読み取り"""
+
+    def test_reads_are_served_from_mirror(self, any_db):
+        """初回に全件同期し、以降の読み取りはAPIを呼ばない"""
+        api = FakeCalendarApi({"items": [_event("e1", 10), _event("e2", 14, summary="打合せ")], "nextSyncToken": "t1"})
+        service = _calendar(any_db, api)
+
+        assert [event["title"] for event in service.get_today_schedule("U1")] == ["会議", "打合せ"]
+        assert service.check_time_conflict("U1", _today(10) + timedelta(minutes=30), 30)
+        assert not service.check_time_conflict("U1", _today(12), 60)
+        free_times = service.get_free_busy_times("U1", _today() + timedelta(days=1))
+        assert free_times[0]["duration_minutes"] == 14 * 60
+
+        assert len(api.list_calls) == 1
+        assert "syncToken" not in api.list_calls[0]
+        assert "timeMin" in api.list_calls[0]
+        assert any_db.get_calendar_sync_state("U1")["sync_token"] == "t1"
+
+    def test_incremental_sync_applies_changes(self, any_db, monkeypatch):
+        """古くなったら syncToken で差分だけ取得し、変更・削除を反映する"""
+        api = FakeCalendarApi(
+            {"items": [_event("e1", 10), _event("e2", 14)], "nextSyncToken": "t1"},
+            {"items": [{"id": "e1", "status": "cancelled"}, _event("e2", 15, summary="移動")], "nextSyncToken": "t2"},
+        )
+        service = _calendar(any_db, api)
+        service.get_today_schedule("U1")
+        _expire_mirror(service, monkeypatch)
+
+        schedule = service.get_today_schedule("U1")
+        assert [event["title"] for event in schedule] == ["移動"]
+        assert api.list_calls[1]["syncToken"] == "t1"
+        assert "timeMin" not in api.list_calls[1]
+        assert any_db.get_calendar_sync_state("U1")["sync_token"] == "t2"
+
+    def test_expired_sync_token_triggers_full_sync(self, any_db, monkeypatch):
+        """syncTokenが無効（410）の場合は全件同期し直す"""
+        api = FakeCalendarApi(
+            {"items": [_event("e1", 10)], "nextSyncToken": "t1"},
+            HttpError(Mock(status=410, reason="Gone"), b"gone"),
+            {"items": [_event("e3", 9)], "nextSyncToken": "t3"},
+        )
+        service = _calendar(any_db, api)
+        service.get_today_schedule("U1")
+        _expire_mirror(service, monkeypatch)
+
+        assert [event["start"] for event in service.get_today_schedule("U1")] == [_today(9).isoformat()]
+        assert "timeMin" in api.list_calls[2]
+
+    def test_force_refresh(self, any_db):
+        """force_refreshの場合は新しいミラーでも同期する"""
+        api = FakeCalendarApi({"items": [], "nextSyncToken": "t1"}, {"items": [_event("e1", 10)], "nextSyncToken": "t2"})
+        service = _calendar(any_db, api)
+        assert service.get_today_schedule("U1") == []
+        assert len(service.get_today_schedule("U1", force_refresh=True)) == 1
+        assert len(api.list_calls) == 2
+
+    def test_paginated_full_sync(self, any_db):
+        """全件同期は全ページを取得し、最後のページの syncToken を保存する"""
+        api = FakeCalendarApi(
+            {"items": [_event("e1", 9)], "nextPageToken": "p2"},
+            {"items": [_event("e2", 11)], "nextSyncToken": "t1"},
+        )
+        service = _calendar(any_db, api)
+        assert len(service.get_today_schedule("U1")) == 2
+        assert api.list_calls[1]["pageToken"] == "p2"
+
+    def test_inserted_event_is_visible_immediately(self, any_db):
+        """自分で追加した予定は同期を待たずにミラーに反映する"""
+        api = FakeCalendarApi({"items": [], "nextSyncToken": "t1"})
+        service = _calendar(any_db, api)
+        service.get_today_schedule("U1")
+        assert service.add_event_to_calendar("U1", "資料作成", _today(13), 60)
+        assert service.check_time_conflict("U1", _today(13), 30)
+        assert len(api.list_calls) == 1
+
+    def test_outside_window_reads_api(self, any_db):
+        """ミラーの保持期間外はAPIから直接取得する"""
+        api = FakeCalendarApi({"items": [_event("e1", 10, days=60)]})
+        service = _calendar(any_db, api)
+        schedule = service.get_day_schedule("U1", _today() + timedelta(days=60))
+        assert len(schedule) == 1
+        assert api.list_calls[0]["orderBy"] == "startTime"
+        assert any_db.get_calendar_sync_state("U1") is None
+
+    def test_authentication_failure(self, any_db):
+        """認証できない場合は予定なし・重複ありとして扱う"""
+        service = CalendarService(any_db)
+        service.authenticate_user = Mock(return_value=False)
+        assert service.get_today_schedule("U1") == []
+        assert service.check_time_conflict("U1", _today(10), 30)
+
+
+class TestEventRows:
+    """イベントとミラーの行の変換"""
+
+    def test_all_day_event_round_trip(self):
+        """終日イベントは日付のまま戻し、期間はJSTの1日分"""
+        event = {"id": "a1", "start": {"date": "2026-10-19"}, "end": {"date": "2026-10-20"}}
+        row = event_to_row(event)
+        assert (row["start_at"], row["end_at"]) == ("2026-10-18T15:00:00Z", "2026-10-19T15:00:00Z")
+        restored = row_to_event([row[column] for column in ("event_id", "summary", "description", "start_raw", "end_raw", "all_day")])
+        assert restored == event
+
+    def test_event_without_time_is_skipped(self):
+        """開始・終了のないイベントは保存しない"""
+        assert event_to_row({"id": "x", "start": {}, "end": {}}) is None
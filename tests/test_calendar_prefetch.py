@@ -0,0 +1,158 @@
+"""
+朝の通知後のカレンダー事前同期（CalendarPrefetcher）のユニットテスト
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytz
+from prometheus_client import REGISTRY
+
+from models.database import Database
+from services.calendar_prefetch import CalendarPrefetcher
+from services.calendar_service import CalendarService
+
+JST = pytz.timezone("Asia/Tokyo")
+
+
+def _wait(futures):
+    return [future.result(timeout=5) for future in futures]
+
+
+def _cache_count(cache, result):
+    return REGISTRY.get_sample_value("remind_cache_requests_total", {"cache": cache, "result": result}) or 0.0
+
+
+class TestPrefetcher:
+    """事前同期の予約と実行"""
+
+    def test_syncs_each_user_once(self):
+        """ユーザーごとに1回、強制的に同期する（認証でトークンも更新される）"""
+        calendar_service = Mock()
+        calendar_service.sync_calendar.return_value = True
+        prefetcher = CalendarPrefetcher(calendar_service)
+
+        assert _wait(prefetcher.schedule(["U1", "U2", "U1"])) == [True, True]
+        calendar_service.sync_calendar.assert_any_call("U1", force=True, prefetch=True)
+        assert calendar_service.sync_calendar.call_count == 2
+        assert prefetcher.stats == {"scheduled": 2, "synced": 2, "failed": 0, "expired": 0}
+
+    def test_concurrency_is_bounded(self):
+        """同時に同期するユーザー数は max_concurrency まで"""
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def sync_calendar(user_id, force=False, prefetch=False):
+            with lock:
+                running.append(user_id)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(user_id)
+            return True
+
+        prefetcher = CalendarPrefetcher(Mock(sync_calendar=Mock(side_effect=sync_calendar)), max_concurrency=2)
+        _wait(prefetcher.schedule([f"U{i}" for i in range(6)]))
+        assert max(peak) <= 2
+
+    def test_failures_are_counted(self):
+        """同期の失敗・例外は他のユーザーの同期を止めない"""
+        calendar_service = Mock()
+        calendar_service.sync_calendar.side_effect = [False, RuntimeError("boom")]
+        prefetcher = CalendarPrefetcher(calendar_service, max_concurrency=1)
+
+        assert _wait(prefetcher.schedule(["U1", "U2"])) == [False, False]
+        assert prefetcher.stats["failed"] == 2
+
+    def test_expired_jobs_are_skipped(self):
+        """期限を過ぎてから開始する同期は行わない"""
+        now = [0.0]
+        calendar_service = Mock()
+        prefetcher = CalendarPrefetcher(calendar_service, deadline_seconds=10, clock=lambda: now[0])
+        # 予約後に時間を進める（開始時には期限切れ）
+        start = threading.Event()
+        original = prefetcher._prefetch_user
+
+        def delayed(user_id, deadline):
+            start.wait(5)
+            return original(user_id, deadline)
+
+        prefetcher._prefetch_user = delayed
+        futures = prefetcher.schedule(["U1"])
+        now[0] = 11
+        start.set()
+
+        assert _wait(futures) == [False]
+        calendar_service.sync_calendar.assert_not_called()
+        assert prefetcher.stats["expired"] == 1
+
+    def test_nothing_to_schedule(self):
+        """対象ユーザーがいなければスレッドプールを作らない"""
+        prefetcher = CalendarPrefetcher(Mock())
+        assert prefetcher.schedule([]) == []
+        assert prefetcher._executor is None
+
+    def test_reset_after_fork(self):
+        """フォーク後はスレッドプールを作り直す"""
+        prefetcher = CalendarPrefetcher(Mock(sync_calendar=Mock(return_value=True)))
+        _wait(prefetcher.schedule(["U1"]))
+        executor = prefetcher._executor
+        prefetcher.reset()
+        _wait(prefetcher.schedule(["U1"]))
+        assert prefetcher._executor is not executor
+        executor.shutdown(wait=False)
+
+
+class TestPrefetchedSelection:
+    """事前同期したミラーを使うタスク選択の読み取り"""
+
+    def _service(self, tmp_path):
+        service = CalendarService(Database(str(tmp_path / "prefetch.db")))
+        api = Mock()
+        api.events.return_value.list.return_value.execute.return_value = {"items": [], "nextSyncToken": "t1"}
+
+        def authenticate_user(user_id):
+            service.service = api
+            return True
+
+        service.authenticate_user = Mock(side_effect=authenticate_user)
+        return service, api
+
+    def test_selection_reads_prefetched_mirror(self, tmp_path, monkeypatch):
+        """通常の鮮度を過ぎても、事前同期から PREFETCH_MAX_AGE_SECONDS 以内なら同期しない"""
+        service, api = self._service(tmp_path)
+        assert service.sync_calendar("U1", force=True, prefetch=True)
+        monkeypatch.setattr(service, "MIRROR_MAX_AGE_SECONDS", -1)
+        hits = _cache_count("calendar_prefetch", "hit")
+
+        tomorrow = datetime.now(JST) + timedelta(days=1)
+        free_times = service.get_free_busy_times("U1", tomorrow, max_age_seconds=service.PREFETCH_MAX_AGE_SECONDS)
+
+        assert free_times
+        assert api.events.return_value.list.call_count == 1
+        assert _cache_count("calendar_prefetch", "hit") == hits + 1
+
+    def test_regular_sync_keeps_normal_age(self, tmp_path, monkeypatch):
+        """事前同期でない同期の後は、PREFETCH_MAX_AGE_SECONDS 以内でも通常の鮮度で同期し直す"""
+        service, api = self._service(tmp_path)
+        assert service.sync_calendar("U1", force=True)
+        monkeypatch.setattr(service, "MIRROR_MAX_AGE_SECONDS", -1)
+
+        tomorrow = datetime.now(JST) + timedelta(days=1)
+        service.get_free_busy_times("U1", tomorrow, max_age_seconds=service.PREFETCH_MAX_AGE_SECONDS)
+
+        assert api.events.return_value.list.call_count == 2
+        assert service.db.get_calendar_sync_state("U1")["prefetched"] is False
+
+    def test_selection_without_prefetch_syncs(self, tmp_path):
+        """事前同期がなければ同期してから読み、ミスとして記録する"""
+        service, api = self._service(tmp_path)
+        misses = _cache_count("calendar_prefetch", "miss")
+
+        tomorrow = datetime.now(JST) + timedelta(days=1)
+        service.get_free_busy_times("U1", tomorrow, max_age_seconds=service.PREFETCH_MAX_AGE_SECONDS)
+
+        assert api.events.return_value.list.call_count == 1
+        assert _cache_count("calendar_prefetch", "miss") == misses + 1
@@ -0,0 +1,194 @@
+"""
+ユーザーフローごとの外部呼び出し回数の予算テスト
+
+署名付きWebhookを /callback に送り、DBメソッド呼び出しと LINE / Google Calendar / OpenAI への
+リクエスト数が予算内に収まることを確認する。authenticate_user や get_user_tasks の追加、
+OpenAI呼び出しの追加などの往復回数の増加（N+1）を検出するためのもの。
+
+予算を意図的に変える場合は、BUDGETS を実測値に合わせて更新する（失敗時のメッセージに内訳が出る）。
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Tuple
+from unittest.mock import patch
+
+import pytest
+import pytz
+
+from benchmarks.bench_webhook import SCENARIOS, _seed_user, build_environment, build_webhook_body, sign
+from benchmarks.upstream_stubs import start_upstreams
+from tests.call_budget import CallBudgetExceeded, CallCounter
+
+
+def _setup_deletion(db, user_id):
+    from handlers.helpers import create_flag_file
+    task_ids = _seed_user(db, user_id)
+    create_flag_file(user_id, "task_select", {"mode": "complete"})
+    db.set_user_session(user_id, "selected_tasks", json.dumps(task_ids[:1]))
+
+
+def _setup_completion_check(db, user_id):
+    today = datetime.now(pytz.timezone("Asia/Tokyo")).strftime("%Y-%m-%d")
+    _seed_user(db, user_id, due_date=today)
+    db.set_user_state(user_id, "task_select_mode", {"mode": "complete", "target_date": today})
+
+
+# フロー名 -> (送信するメッセージ, 事前状態を作る関数)
+FLOWS = {
+    "task_add": SCENARIOS["task_add"],
+    "morning_selection": SCENARIOS["number_select"],
+    "approval": SCENARIOS["approve"],
+    "deletion": ("はい", _setup_deletion),
+    "completion_check": ("1", _setup_completion_check),
+}
+
+# フロー名 -> 予算（"db" は合計、"db.<メソッド>" は個別、"line" / "google" / "openai" はリクエスト数）
+# 予算は現状の実測値。減らせた場合は予算も下げる
+# OpenAIのキャッシュミス1回につき、プロセス間で呼び出しをまとめるための実行権の取得・取得後のキャッシュの再確認・解放（DB 3回）を含む
+BUDGETS = {
+    "task_add": {"db": 8, "db.get_token": 1, "db.get_user_tasks": 1, "line": 1, "google": 0, "openai": 0},
+    # カレンダーミラーが空の状態から始めるため、初回の同期（Google 1回 + 同期状態の読み書き）を含む
+    # スケジュール提案もOpenAIのキャッシュを通す（キャッシュの確認・再確認・保存と実行権の取得・解放でDB 5回）
+    # LINE: 先送り（デフォルト）のため、pushの残り通数の確認2回 + 受付の返信 + 結果のpush
+    "morning_selection": {"db": 33, "db.get_token": 3, "db.get_user_tasks": 1, "line": 4, "google": 1, "openai": 2},
+    # Google: イベント追加（タスク3件）+ 今日の予定を読むためのミラーの初回同期
+    # 提案を処理中のセッションに移す（二重承認の防止）DB 1回を含む。LINEは morning_selection と同じく先送りの4回
+    "approval": {"db": 35, "db.get_token": 5, "db.get_user_tasks": 1, "line": 4, "google": 4, "openai": 1},
+    "deletion": {"db": 19, "db.get_token": 1, "db.get_user_tasks": 1, "line": 1, "google": 0, "openai": 1},
+    "completion_check": {"db": 17, "db.get_token": 1, "db.get_user_tasks": 1, "line": 1, "google": 0, "openai": 0},
+}
+
+# 先送りするフロー -> 返信までの予算（提案の生成・カレンダーへの追加は返信後のため含まない）
+# OpenAI 1回はメッセージの解釈、morning_selection の Google 1回は空き時間の読み込み（提案の生成前に並行して行う）
+DEFERRED_REQUEST_BUDGETS = {
+    "morning_selection": {"db": 26, "line": 3, "google": 1, "openai": 1},
+    "approval": {"db": 19, "line": 3, "google": 0, "openai": 1},
+}
+
+
+@pytest.fixture(scope="module")
+def remind(tmp_path_factory):
+    """スタブサーバーと一時SQLiteに向けてアプリを起動"""
+    workdir = tmp_path_factory.mktemp("call_budget")
+    upstreams = start_upstreams()
+    env = build_environment(upstreams, str(workdir))
+    saved_env = {key: os.environ.get(key) for key in list(env) + ["DATABASE_URL"]}
+    os.environ.update(env)
+    os.environ.pop("DATABASE_URL", None)
+    saved_cwd = os.getcwd()
+    os.chdir(workdir)  # app.py が client_secrets.json をカレントディレクトリに書き出すため
+
+    import models.database as database
+    saved_db = database.db
+    database.db = database._instrument_db(database.Database(str(workdir / "tasks.db")))
+    try:
+        import app as remind_app
+        import schedule
+        schedule.clear()  # テスト中に定期ジョブが動かないようにする（stop_schedulerは最大60秒待つため使わない）
+        yield remind_app, upstreams
+    finally:
+        database.db = saved_db
+        os.chdir(saved_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        for stub in upstreams.values():
+            stub.stop()
+
+
+def _run_flow(remind, flow: str, user_id: str) -> Tuple[CallCounter, dict]:
+    """
+    フローを実行し、返信後に続く処理（先送りしたコマンド）の完了まで数える
+
+    Returns:
+        (全体の呼び出し回数, 返信までの呼び出し回数)
+    """
+    from handlers import deferred_reply
+    from utils.concurrency import submit_background
+
+    remind_app, upstreams = remind
+    message, setup = FLOWS[flow]
+    setup(remind_app.db, user_id)
+    body = build_webhook_body(user_id, message)
+    client = remind_app.app.test_client()
+    # pushの残り通数の確認結果はフローごとに確認し直す（実行順で回数が変わらないようにする）
+    deferred_reply.reset_quota_cache()
+
+    # 先送りした処理は返信までの回数を記録してから開始する
+    futures = []
+    replied = threading.Event()
+
+    def submit_after_reply(func, *args, **kwargs):
+        def run_after_reply():
+            replied.wait(30)
+            return func(*args, **kwargs)
+        future = submit_background(run_after_reply)
+        futures.append(future)
+        return future
+
+    with patch("handlers.deferred_reply.submit_background", side_effect=submit_after_reply), \
+            CallCounter(remind_app.db, upstreams) as calls:
+        response = client.post("/callback", data=body, headers={
+            "Content-Type": "application/json",
+            "X-Line-Signature": sign(body),
+        })
+        request_calls = calls.summary()
+        replied.set()
+        for future in futures:
+            future.result(timeout=30)
+    assert response.status_code == 200
+    return calls, request_calls
+
+
+class TestCallBudgets:
+    """ユーザーフローごとの呼び出し回数"""
+
+    @pytest.mark.parametrize("flow", list(FLOWS))
+    def test_flow_within_budget(self, remind, flow):
+        """各フローが予算内に収まる（デフォルトの設定。先送りしたコマンドは完了まで数える）"""
+        calls, _ = _run_flow(remind, flow, f"Ubudget{flow}")
+        assert calls.summary()["line"] >= 1, "返信が送信されていません"
+        calls.assert_within(BUDGETS[flow])
+
+    @pytest.mark.parametrize("flow", list(DEFERRED_REQUEST_BUDGETS))
+    def test_deferred_request_within_budget(self, remind, flow):
+        """先送りするコマンドは、受付の返信までに時間のかかる呼び出しをしない"""
+        calls, request_calls = _run_flow(remind, flow, f"Ubudgetdeferred{flow}")
+        assert request_calls.get("line.POST /v2/bot/message/reply", 0) == 1
+        assert calls.summary().get("line.POST /v2/bot/message/push", 0) == 1, "結果がpushで送信されていません"
+        over = {key: (request_calls.get(key, 0), limit)
+                for key, limit in DEFERRED_REQUEST_BUDGETS[flow].items() if request_calls.get(key, 0) > limit}
+        assert not over, f"返信までの呼び出し回数が予算を超えました: {over}"
+
+    @pytest.mark.parametrize("flow", list(DEFERRED_REQUEST_BUDGETS))
+    def test_sync_flow_within_budget(self, remind, flow, monkeypatch):
+        """先送りしない設定（DEFERRED_COMMANDS=""）でも同じ予算に収まる"""
+        monkeypatch.setenv("DEFERRED_COMMANDS", "")
+        calls, _ = _run_flow(remind, flow, f"Ubudgetsync{flow}")
+        # 同期実行ではpushの残り通数も確認せず、返信1回だけ
+        assert calls.summary()["line"] == 1
+        calls.assert_within(BUDGETS[flow])
+
+
+class TestCallCounter:
+    """ハーネス自体のテスト"""
+
+    def test_budget_violation_reports_breakdown(self, remind):
+        """予算超過時は内訳付きで失敗する"""
+        calls, _ = _run_flow(remind, "task_add", "Ubudgetviolation")
+        with pytest.raises(CallBudgetExceeded) as excinfo:
+            calls.assert_within({"db": 0})
+        assert "db.get_token" in str(excinfo.value)
+
+    def test_db_methods_restored(self, remind):
+        """計測後はDBメソッドが元に戻る"""
+        remind_app, upstreams = remind
+        db = remind_app.db
+        before = db.get_token
+        with CallCounter(db, upstreams):
+            assert db.get_token is not before
+        assert db.get_token is before
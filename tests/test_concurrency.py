@@ -0,0 +1,86 @@
+"""
+並行実行ユーティリティ（スレッドプール・ステップごとのタイムアウト）のユニットテスト
+"""
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from utils import concurrency
+from utils.concurrency import StepTimeout, submit, wait_for, wait_or_default
+from utils.tracing import current_span, start_span
+
+
+class TestSteps:
+    """ステップの実行と待機"""
+
+    def test_steps_run_concurrently(self):
+        """互いに待ち合わせるステップが同時に実行される"""
+        barrier = threading.Barrier(3, timeout=5)
+        futures = [submit(barrier.wait) for _ in range(2)]
+        barrier.wait()
+        # 3者が揃わなければBrokenBarrierErrorになる
+        assert len({wait_for(future, 5, "step") for future in futures}) == 2
+
+    def test_context_is_propagated(self):
+        """ステップは呼び出し元のcontextvars（現在のスパン）を引き継ぐ"""
+        with start_span("test.parent") as parent:
+            assert wait_for(submit(current_span), 5, "step") is parent
+
+    def test_timeout(self):
+        """制限時間内に終わらなければStepTimeout"""
+        release = threading.Event()
+        future = submit(release.wait, 5)
+        try:
+            with pytest.raises(StepTimeout):
+                wait_for(future, 0.05, "slow_step")
+        finally:
+            release.set()
+
+    def test_step_exception_is_raised(self):
+        """ステップの例外は待つ側で送出される"""
+        with pytest.raises(ValueError):
+            wait_for(submit(Mock(side_effect=ValueError("boom"))), 5, "step")
+
+    def test_wait_or_default(self):
+        """結果がなくても続行できるステップは既定値を返す"""
+        assert wait_or_default(submit(Mock(side_effect=RuntimeError("boom"))), 5, "step", default=[]) == []
+        assert wait_or_default(submit(time.sleep, 0.5), 0.01, "slow_step", default=False) is False
+
+
+class TestExecutor:
+    """スレッドプール"""
+
+    def test_reset_after_fork(self, monkeypatch, tmp_path):
+        """フォーク後の初期化でスレッドプールを作り直す"""
+        from models import database
+        from models.database import Database
+        from services.container import ServiceContainer
+
+        monkeypatch.setattr(database, "db", Database(str(tmp_path / "fork.db")))
+        executor = concurrency.get_executor()
+        ServiceContainer().after_fork()
+        assert concurrency.get_executor() is not executor
+        executor.shutdown(wait=False)
+
+
+class TestAddEventsInParallel:
+    """カレンダーへの予定の並行追加"""
+
+    def test_counts_successes(self, tmp_path):
+        """全ての予定を同時に追加し、成功した件数を返す"""
+        from models.database import Database
+        from services.calendar_service import CalendarService
+
+        service = CalendarService(Database(str(tmp_path / "events.db")))
+        barrier = threading.Barrier(3, timeout=5)
+
+        def add_event(user_id, task_name, start_time, duration):
+            barrier.wait()
+            return task_name != "失敗"
+
+        service.add_event_to_calendar = Mock(side_effect=add_event)
+        events = [("資料作成", None, 30), ("会議準備", None, 60), ("失敗", None, 15)]
+        assert service.add_events_in_parallel("U1", events) == 2
+        assert service.add_events_in_parallel("U1", []) == 0
@@ -0,0 +1,95 @@
+"""
+CalendarServiceの空き時間キャッシュ（ユーザー・日付ごと、分単位のバケット）のユニットテスト
+"""
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import pytz
+
+from models.database import Database
+from services.calendar_service import CalendarService
+
+JST = pytz.timezone("Asia/Tokyo")
+
+
+def _tomorrow(hour: int = 0) -> datetime:
+    return (datetime.now(JST) + timedelta(days=1)).replace(hour=hour, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """予定の読み取りをスタブにしたCalendarService（バケットは固定）"""
+    service = CalendarService(Database(str(tmp_path / "slots.db")))
+    meeting = _tomorrow(10)
+    service._list_events = Mock(return_value=[{
+        "id": "e1",
+        "start": {"dateTime": meeting.isoformat()},
+        "end": {"dateTime": (meeting + timedelta(hours=1)).isoformat()},
+    }])
+    monkeypatch.setattr(CalendarService, "_free_slot_bucket", staticmethod(lambda: "bucket-1"))
+    return service
+
+
+class TestFreeSlotCache:
+    """空き時間のキャッシュ"""
+
+    def test_hit_within_same_bucket(self, service):
+        """同じ分の間は予定を読まずにキャッシュから返す"""
+        first = service.get_free_busy_times("U1", _tomorrow())
+        second = service.get_free_busy_times("U1", _tomorrow(9))
+        assert first == second
+        assert service._list_events.call_count == 1
+        assert service.free_slot_cache_stats == {"hit": 1, "miss": 1}
+
+    def test_miss_in_next_bucket(self, service, monkeypatch):
+        """分が変わったら計算し直す"""
+        service.get_free_busy_times("U1", _tomorrow())
+        monkeypatch.setattr(CalendarService, "_free_slot_bucket", staticmethod(lambda: "bucket-2"))
+        service.get_free_busy_times("U1", _tomorrow())
+        assert service._list_events.call_count == 2
+        assert len(service._free_slot_cache) == 1
+
+    def test_keyed_by_user_and_date(self, service):
+        """ユーザー・日付ごとに別々にキャッシュする"""
+        service.get_free_busy_times("U1", _tomorrow())
+        service.get_free_busy_times("U2", _tomorrow())
+        service.get_free_busy_times("U1", _tomorrow() + timedelta(days=1))
+        assert service._list_events.call_count == 3
+
+    def test_returns_copies(self, service):
+        """呼び出し側が結果を書き換えてもキャッシュは変わらない"""
+        service.get_free_busy_times("U1", _tomorrow())[0]["date"] = "changed"
+        assert "date" not in service.get_free_busy_times("U1", _tomorrow())[0]
+
+    def test_force_refresh_bypasses_cache(self, service):
+        """force_refreshの場合はキャッシュを使わない"""
+        service.get_free_busy_times("U1", _tomorrow())
+        service.get_free_busy_times("U1", _tomorrow(), force_refresh=True)
+        assert service._list_events.call_count == 2
+
+    def test_empty_result_is_not_cached(self, service):
+        """空の結果（認証失敗の場合もある）はキャッシュしない"""
+        service._list_events.return_value = None
+        service.get_free_busy_times("U1", _tomorrow())
+        service.get_free_busy_times("U1", _tomorrow())
+        assert service._list_events.call_count == 2
+
+    def test_invalidated_by_inserted_event(self, service):
+        """予定を追加したらそのユーザーのキャッシュを破棄する"""
+        service.get_free_busy_times("U1", _tomorrow())
+        service.get_free_busy_times("U2", _tomorrow())
+        api = Mock()
+        api.events.return_value.insert.return_value.execute.return_value = {"id": "new"}
+        service.authenticate_user = Mock(side_effect=lambda user_id: setattr(service, "service", api) or True)
+        assert service.add_event_to_calendar("U1", "資料作成", _tomorrow(13), 60)
+
+        assert ("U1", _tomorrow().date()) not in service._free_slot_cache
+        assert ("U2", _tomorrow().date()) in service._free_slot_cache
+
+    def test_invalidated_by_schedule_approval(self, service):
+        """スケジュールの承認（提案の反映）でキャッシュを破棄する"""
+        service.get_free_busy_times("U1", _tomorrow())
+        service.add_events_to_calendar("U1", "")
+        service.get_free_busy_times("U1", _tomorrow())
+        assert service._list_events.call_count == 2
@@ -0,0 +1,80 @@
+"""
+ロギングユーティリティのユニットテスト
+"""
+import io
+import logging
+import pytest
+from unittest.mock import Mock, patch
+from utils.logger import (
+    SamplingFilter,
+    configure_logging,
+    flush_logging,
+    get_logger,
+    lazy,
+    _parse_module_levels,
+)
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """ログ出力先をStringIOに差し替える"""
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+    monkeypatch.setenv("LOG_LEVELS", "services.task_service=DEBUG")
+    out = io.StringIO()
+    configure_logging(stream=out, force=True)
+    yield out
+    flush_logging()
+    logging.getLogger("remind.services.task_service").setLevel(logging.NOTSET)
+
+
+class TestLogger:
+    """ロガーのテスト"""
+
+    def test_debug_disabled_skips_lazy_evaluation(self, stream):
+        """DEBUG無効時は遅延引数が評価されない"""
+        func = Mock(return_value="heavy")
+        get_logger("handlers.selection_handler").debug("一覧: %s", lazy(func))
+        flush_logging()
+
+        func.assert_not_called()
+        assert stream.getvalue() == ""
+
+    def test_module_level_override(self, stream):
+        """モジュール別レベルでDEBUGを有効にできる"""
+        get_logger("services.task_service").debug("入力: %s", lazy(lambda: "テスト"))
+        flush_logging()
+
+        assert "入力: テスト" in stream.getvalue()
+        assert "[remind.services.task_service]" in stream.getvalue()
+
+    def test_info_is_written_through_queue(self, stream):
+        """INFOはキュー経由で出力される"""
+        get_logger("app").info("起動: %s", 1)
+        flush_logging()
+
+        assert "起動: 1" in stream.getvalue()
+
+    def test_parse_module_levels(self):
+        """モジュール別レベル設定を解析できる（不正な値は無視）"""
+        levels = _parse_module_levels("a.b=debug, c=WARNING,broken,d=NOPE")
+        assert levels == {"a.b": logging.DEBUG, "c": logging.WARNING}
+
+
+class TestSamplingFilter:
+    """サンプリングフィルターのテスト"""
+
+    def _record(self, **extra):
+        record = logging.LogRecord("remind", logging.DEBUG, __file__, 1, "msg", None, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_records_without_rate_pass(self):
+        """sample_rate指定なしは常に通過"""
+        assert SamplingFilter().filter(self._record()) is True
+
+    def test_sampling_by_rate(self):
+        """sample_rateに応じて間引かれる"""
+        sampling = SamplingFilter()
+        with patch("utils.logger.random.random", return_value=0.5):
+            assert sampling.filter(self._record(sample_rate=0.1)) is False
+            assert sampling.filter(self._record(sample_rate=0.9)) is True
@@ -0,0 +1,78 @@
+"""
+メトリクスユーティリティのユニットテスト
+"""
+import pytest
+from prometheus_client import REGISTRY
+from utils.metrics import (
+    DB_QUERY_DURATION,
+    UPSTREAM_DURATION,
+    instrument_methods,
+    record_cache,
+    render_metrics,
+    track,
+)
+
+
+def _count(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class FakeClient:
+    def push_message(self, request):
+        return "ok"
+
+    def reply_message(self, request):
+        raise ConnectionError("Network error")
+
+    def _private(self):
+        return "private"
+
+
+class TestMetrics:
+    """メトリクス記録のテスト"""
+
+    def test_track_records_outcome(self):
+        """成功・失敗がoutcomeラベルで記録される"""
+        labels = {"service": "test", "operation": "track"}
+        before_ok = _count("remind_upstream_duration_seconds_count", outcome="success", **labels)
+        before_ng = _count("remind_upstream_duration_seconds_count", outcome="error", **labels)
+
+        with track(UPSTREAM_DURATION, **labels):
+            pass
+        with pytest.raises(ValueError):
+            with track(UPSTREAM_DURATION, **labels):
+                raise ValueError("boom")
+
+        assert _count("remind_upstream_duration_seconds_count", outcome="success", **labels) == before_ok + 1
+        assert _count("remind_upstream_duration_seconds_count", outcome="error", **labels) == before_ng + 1
+
+    def test_instrument_methods_wraps_public_methods(self):
+        """公開メソッドのみ計測対象になり、戻り値・例外はそのまま"""
+        client = instrument_methods(FakeClient(), DB_QUERY_DURATION, "method")
+        before = _count("remind_db_query_duration_seconds_count", method="push_message")
+
+        assert client.push_message(None) == "ok"
+        with pytest.raises(ConnectionError):
+            client.reply_message(None)
+        assert client._private() == "private"
+
+        assert _count("remind_db_query_duration_seconds_count", method="push_message") == before + 1
+        assert _count("remind_db_query_duration_seconds_count", method="_private") == 0
+
+    def test_instrument_methods_is_idempotent(self):
+        """二重に計測ラッパーを付けない"""
+        client = instrument_methods(FakeClient(), DB_QUERY_DURATION, "method", methods=["push_message"])
+        wrapped = client.push_message
+        instrument_methods(client, DB_QUERY_DURATION, "method", methods=["push_message"])
+        assert client.push_message is wrapped
+
+    def test_record_cache_and_render(self):
+        """キャッシュのヒット・ミスが出力に含まれる"""
+        before = _count("remind_cache_requests_total", cache="test_cache", result="hit")
+        record_cache("test_cache", True)
+        record_cache("test_cache", False)
+
+        assert _count("remind_cache_requests_total", cache="test_cache", result="hit") == before + 1
+        body, content_type = render_metrics()
+        assert b"remind_cache_requests_total" in body
+        assert content_type.startswith("text/plain")
@@ -0,0 +1,128 @@
+"""
+スキーマのバージョン管理（マイグレーション）のユニットテスト
+"""
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from models import migrations
+from models.database import Database
+from models.migrations import apply_postgres_migrations, apply_sqlite_migrations
+from utils.query_profiler import install_engine_hooks, profile_queries
+
+
+def _versions(conn):
+    return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+
+class TestSQLiteMigrations:
+    """SQLiteのマイグレーション"""
+
+    def test_fresh_database(self, tmp_path):
+        """新規DBでは全てのマイグレーションを適用して記録する"""
+        db = Database(str(tmp_path / "fresh.db"))
+        conn = sqlite3.connect(db.db_path)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert {"tasks", "tokens", "user_states", "user_sessions", "notification_outbox"} <= tables
+        assert _versions(conn) == [version for version, _, _ in migrations.SQLITE_MIGRATIONS]
+        conn.close()
+
+    def test_warm_boot_runs_single_statement(self, tmp_path):
+        """適用済みのDBではバージョン確認の1文だけを実行する"""
+        path = str(tmp_path / "warm.db")
+        Database(path)
+        with profile_queries("test:boot") as profile:
+            Database(path)
+        assert profile.statements == 1
+
+    def test_legacy_database_without_schema_version(self, tmp_path):
+        """schema_version導入前のDB（カラム不足）にも適用できる"""
+        path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE tasks (task_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, name TEXT NOT NULL, "
+                     "duration_minutes INTEGER NOT NULL, repeat BOOLEAN NOT NULL, status TEXT DEFAULT 'active', "
+                     "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, due_date TEXT)")
+        conn.execute("INSERT INTO tasks (task_id, user_id, name, duration_minutes, repeat) VALUES ('t1', 'U1', '資料作成', 30, 0)")
+        conn.commit()
+
+        assert apply_sqlite_migrations(conn) == migrations.SQLITE_MIGRATIONS[-1][0]
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        assert {"task_type", "priority"} <= columns
+        assert conn.execute("SELECT task_type, priority FROM tasks").fetchone() == ("daily", "normal")
+        conn.close()
+
+    def test_only_new_migrations_applied(self, tmp_path, monkeypatch):
+        """追加したマイグレーションだけが適用される"""
+        path = str(tmp_path / "upgrade.db")
+        Database(path)
+        applied = []
+        monkeypatch.setattr(migrations, "SQLITE_MIGRATIONS", migrations.SQLITE_MIGRATIONS + [
+            (99, "test column", lambda cursor: applied.append(cursor.execute("ALTER TABLE tokens ADD COLUMN note TEXT")))
+        ])
+        conn = sqlite3.connect(path)
+        assert apply_sqlite_migrations(conn) == 99
+        assert apply_sqlite_migrations(conn) == 99
+        assert len(applied) == 1
+        assert _versions(conn)[-1] == 99
+        conn.close()
+
+    def test_concurrent_workers_apply_once(self, tmp_path, monkeypatch):
+        """複数ワーカーが同時に起動しても1回だけ適用される"""
+        path = str(tmp_path / "race.db")
+        calls = []
+        original = migrations._sqlite_initial_schema
+        monkeypatch.setattr(migrations, "SQLITE_MIGRATIONS", [
+            (1, "initial schema", lambda cursor: (calls.append(1), original(cursor)))
+        ])
+        errors = []
+
+        def worker():
+            conn = sqlite3.connect(path, timeout=10)
+            try:
+                apply_sqlite_migrations(conn)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert calls == [1]
+
+
+class TestPostgresMigrations:
+    """PostgreSQL版（SQLAlchemyエンジン）のマイグレーション"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'pg.db'}")
+        install_engine_hooks(engine)
+        yield engine
+        engine.dispose()
+
+    def test_creates_tables_and_records_version(self, engine):
+        """テーブルを作成しバージョンを記録する"""
+        assert apply_postgres_migrations(engine) == migrations.POSTGRES_MIGRATIONS[-1][0]
+        assert {"tasks", "user_states", "notification_outbox", "schema_version"} <= set(inspect(engine).get_table_names())
+
+    def test_warm_boot_runs_single_statement(self, engine):
+        """適用済みのDBではカタログを参照せずバージョン確認の1文だけを実行する"""
+        apply_postgres_migrations(engine)
+        with profile_queries("test:boot") as profile:
+            apply_postgres_migrations(engine)
+        assert profile.statements == 1
+
+    def test_adds_missing_user_state_columns(self, engine):
+        """古いuser_statesテーブルに不足カラムを追加する"""
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE user_states (user_id VARCHAR NOT NULL, state_type VARCHAR NOT NULL, "
+                              "created_at TIMESTAMP, PRIMARY KEY (user_id, state_type))"))
+        apply_postgres_migrations(engine)
+        columns = {col["name"] for col in inspect(engine).get_columns("user_states")}
+        assert {"state_data", "updated_at"} <= columns
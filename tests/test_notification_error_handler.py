@@ -2,13 +2,13 @@
 通知エラーハンドリング機能のユニットテスト
 """
 import pytest
-import time
 from unittest.mock import Mock, patch
 from services.notification_error_handler import (
     NotificationErrorHandler,
     RetryConfig,
     NotificationError,
-    ErrorType
+    ErrorType,
+    RetryQueue
 )
 
 
@@ -223,5 +223,136 @@ class TestErrorStats:
         assert stats['total_retries'] == 0
 
 
+class FakeClock:
+    """sleepで時刻が進む疑似時計"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRetryQueue:
+    """遅延リトライキューのテスト"""
+
+    @pytest.fixture
+    def error_handler(self):
+        config = RetryConfig(max_retries=2, initial_delay=1.0, max_delay=10.0)
+        return NotificationErrorHandler(config)
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    def test_all_success_no_sleep(self, error_handler, clock):
+        """全件成功時は待機しない"""
+        queue = error_handler.create_retry_queue(sleep_func=clock.sleep, clock=clock)
+        for user_id in ["u1", "u2", "u3"]:
+            queue.submit(Mock(return_value=None), operation_name="push", key=user_id)
+
+        results = queue.run()
+
+        assert results == {"u1": True, "u2": True, "u3": True}
+        assert clock.sleeps == []
+        assert error_handler.get_stats()['total_calls'] == 3
+
+    def test_failure_does_not_block_other_recipients(self, error_handler, clock):
+        """失敗した宛先の待機中に他の宛先が先に処理される"""
+        order = []
+
+        def flaky():
+            order.append("u1")
+            if order.count("u1") == 1:
+                raise ConnectionError("Network error")
+
+        def ok(user_id):
+            order.append(user_id)
+
+        queue = error_handler.create_retry_queue(sleep_func=clock.sleep, clock=clock)
+        queue.submit(flaky, operation_name="push", key="u1")
+        queue.submit(ok, "u2", operation_name="push", key="u2")
+        queue.submit(ok, "u3", operation_name="push", key="u3")
+
+        results = queue.run()
+
+        assert results == {"u1": True, "u2": True, "u3": True}
+        assert order == ["u1", "u2", "u3", "u1"]
+
+    def test_total_wait_bounded_by_slowest_retry(self, error_handler, clock):
+        """全体の待機時間はリトライ合計ではなく最も遅い系列で抑えられる"""
+        queue = error_handler.create_retry_queue(sleep_func=clock.sleep, clock=clock)
+        funcs = []
+        for i in range(5):
+            func = Mock(side_effect=ConnectionError("Network error"))
+            funcs.append(func)
+            queue.submit(func, operation_name="push", key=f"u{i}")
+
+        with patch('random.uniform', return_value=0.0):
+            results = queue.run()
+
+        assert all(ok is False for ok in results.values())
+        for func in funcs:
+            assert func.call_count == 3
+        # 1宛先あたりの遅延は 1.0 + 2.0 = 3.0秒、5宛先でも合計は3.0秒
+        assert sum(clock.sleeps) == pytest.approx(3.0)
+
+    def test_non_retryable_error_fails_immediately(self, error_handler, clock):
+        """リトライ不可能なエラーは再投入されない"""
+        func = Mock(side_effect=Exception("HTTP 401: Unauthorized"))
+        queue = error_handler.create_retry_queue(sleep_func=clock.sleep, clock=clock)
+        queue.submit(func, operation_name="push", key="u1")
+
+        results = queue.run()
+
+        assert results == {"u1": False}
+        assert func.call_count == 1
+        assert len(queue) == 0
+
+    def test_stats_flow_into_handler(self, error_handler, clock):
+        """キュー経由のリトライも統計に記録される"""
+        queue = error_handler.create_retry_queue(sleep_func=clock.sleep, clock=clock)
+        queue.submit(
+            Mock(side_effect=[ConnectionError("Network error"), None]),
+            operation_name="push",
+            key="u1"
+        )
+        queue.submit(Mock(return_value=None), operation_name="push", key="u2")
+
+        queue.run()
+
+        stats = error_handler.get_stats()
+        assert stats['total_calls'] == 2
+        assert stats['total_errors'] == 1
+        assert stats['total_retries'] == 1
+        assert stats['errors_by_type'][ErrorType.NETWORK_ERROR.value] == 1
+        assert isinstance(queue, RetryQueue)
+
+
+class TestServiceRetryQueue:
+    """通知サービスの一斉送信と遅延リトライキュー"""
+
+    def test_queue_is_used_only_by_its_fan_out(self):
+        """キューを渡された送信だけが積まれ、同時に行われる他の送信は即時に送る"""
+        from linebot.v3.messaging import TextMessage
+        from services.notification_service import NotificationService
+        service = NotificationService.__new__(NotificationService)
+        service.error_handler = NotificationErrorHandler(RetryConfig(max_retries=0))
+        line_bot_api = Mock()
+        queue = service.error_handler.create_retry_queue()
+        messages = [TextMessage(text="通知")]
+
+        assert service._send_message_with_retry(line_bot_api, "u1", messages, "fan_out", retry_queue=queue)
+        assert service._send_message_with_retry(line_bot_api, "u2", messages, "single")
+        assert [c[0][0].to for c in line_bot_api.push_message.call_args_list] == ["u2"]
+
+        assert service._flush_retry_queue(queue, "fan_out") == {"u1": True}
+        assert [c[0][0].to for c in line_bot_api.push_message.call_args_list] == ["u2", "u1"]
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
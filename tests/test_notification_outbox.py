@@ -0,0 +1,295 @@
+"""
+通知アウトボックスのユニットテスト
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+import pytz
+from unittest.mock import Mock
+from models.database import Database, Task
+from services.notification_service import NotificationService
+from services.notification_error_handler import NotificationErrorHandler, RetryConfig
+
+
+@pytest.fixture
+def db():
+    """テスト用データベースのセットアップ"""
+    test_db_path = "test_notification_outbox.db"
+    if os.path.exists(test_db_path):
+        os.remove(test_db_path)
+
+    db = Database(test_db_path)
+    yield db
+
+    if os.path.exists(test_db_path):
+        os.remove(test_db_path)
+
+
+def _freeze_jst(monkeypatch, hour, minute=0):
+    """notification_service の現在時刻をJSTの 2024-01-02 hour:minute に固定"""
+    fixed = pytz.timezone("Asia/Tokyo").localize(datetime(2024, 1, 2, hour, minute))
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed.astimezone(tz) if tz else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr("services.notification_service.datetime", FixedDatetime)
+
+
+def _entry(user_id, text="テスト通知"):
+    return {
+        "user_id": user_id,
+        "channel_id": "default",
+        "payload": json.dumps({"messages": [text]}, ensure_ascii=False),
+        "retry_key": f"key-{user_id}",
+    }
+
+
+class TestOutboxStorage:
+    """アウトボックスの保存・取得のテスト"""
+
+    def test_enqueue_is_idempotent(self, db):
+        """同じrun_id・user_idは二重登録されない"""
+        run_id = "daily_task_notification:2024-01-01"
+        assert db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1"), _entry("u2")]) == 2
+        assert db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1", "別の内容")]) == 0
+
+        pending = db.get_pending_outbox_messages(run_id)
+        assert [row["user_id"] for row in pending] == ["u1", "u2"]
+        assert json.loads(pending[0]["payload"]) == {"messages": ["テスト通知"]}
+        assert sorted(db.get_outbox_user_ids(run_id)) == ["u1", "u2"]
+
+    def test_status_update_and_counts(self, db):
+        """状態更新で試行回数が増え、件数集計に反映される"""
+        run_id = "daily_task_notification:2024-01-01"
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1"), _entry("u2"), _entry("u3")])
+
+        assert db.update_outbox_status(run_id, "u1", "sent") is True
+        assert db.update_outbox_status(run_id, "u2", "failed", "error") is True
+
+        assert db.get_outbox_counts(run_id) == {"staged": 0, "pending": 1, "sent": 1, "failed": 1}
+        pending = db.get_pending_outbox_messages(run_id)
+        assert [row["user_id"] for row in pending] == ["u3"]
+        assert pending[0]["attempts"] == 0
+
+    @pytest.mark.parametrize("backend", ["sqlite", "postgres"])
+    def test_keyset_paging(self, request, backend):
+        """after より後の行だけを run_id・user_id 順に取得する"""
+        any_db = request.getfixturevalue("db" if backend == "sqlite" else "pg_db")
+        any_db.enqueue_outbox_messages("r1", "daily_task_notification", [_entry("u2"), _entry("u1")])
+        any_db.enqueue_outbox_messages("r2", "daily_task_notification", [_entry("u0")])
+
+        first = any_db.get_pending_outbox_messages(limit=2)
+        assert [(row["run_id"], row["user_id"]) for row in first] == [("r1", "u1"), ("r1", "u2")]
+        rest = any_db.get_pending_outbox_messages(limit=2, after=("r1", "u2"))
+        assert [(row["run_id"], row["user_id"]) for row in rest] == [("r2", "u0")]
+
+
+class TestDrainOutbox:
+    """アウトボックスのドレイン処理のテスト"""
+
+    @pytest.fixture
+    def service(self, db):
+        """DB以外の依存をモックにしたNotificationService"""
+        service = NotificationService.__new__(NotificationService)
+        service.db = db
+        service.error_handler = NotificationErrorHandler(RetryConfig(max_retries=0))
+        service.line_api = Mock()
+        service.multi_tenant_service = Mock()
+        service.multi_tenant_service.get_messaging_api.return_value = service.line_api
+        return service
+
+    def test_drain_sends_pending_with_retry_key(self, service, db):
+        """未送信分だけがリトライキー付きで送信される"""
+        run_id = "daily_task_notification:2024-01-01"
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1"), _entry("u2")])
+        db.update_outbox_status(run_id, "u1", "sent")
+
+        results = service.drain_outbox(run_id)
+
+        assert results == {(run_id, "u2"): True}
+        assert service.line_api.push_message.call_count == 1
+        _, kwargs = service.line_api.push_message.call_args
+        assert kwargs["x_line_retry_key"] == "key-u2"
+        assert db.get_outbox_counts(run_id) == {"staged": 0, "pending": 0, "sent": 2, "failed": 0}
+
+    def test_drain_keeps_failed_rows_pending(self, service, db):
+        """送信失敗は次回のドレインのためにpendingのまま残る"""
+        run_id = "daily_task_notification:2024-01-01"
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1")])
+        service.line_api.push_message.side_effect = ConnectionError("Network error")
+
+        service.drain_outbox(run_id)
+
+        pending = db.get_pending_outbox_messages(run_id)
+        assert len(pending) == 1
+        assert pending[0]["attempts"] == 1
+
+    def test_conflict_means_already_delivered(self, service, db):
+        """409（同じリトライキーで受付済み）は送信済みとして扱う"""
+        run_id = "daily_task_notification:2024-01-01"
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry("u1")])
+        conflict = Exception("Conflict")
+        conflict.status = 409
+        service.line_api.push_message.side_effect = conflict
+
+        service.drain_outbox(run_id)
+
+        assert db.get_outbox_counts(run_id)["sent"] == 1
+
+    def test_drain_reads_all_pages(self, service, db):
+        """1回に読む件数を超える未送信分も同じドレインで全て送信する"""
+        run_id = "daily_task_notification:2024-01-01"
+        service.OUTBOX_DRAIN_PAGE_SIZE = 2
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry(f"u{i}") for i in range(5)])
+
+        results = service.drain_outbox(run_id)
+
+        assert len(results) == 5
+        assert service.line_api.push_message.call_count == 5
+        assert db.get_outbox_counts(run_id)["sent"] == 5
+
+    def test_failed_rows_are_not_reread_in_same_drain(self, service, db):
+        """pendingに戻した行は同じドレインで読み直さない"""
+        run_id = "daily_task_notification:2024-01-01"
+        service.OUTBOX_DRAIN_PAGE_SIZE = 2
+        db.enqueue_outbox_messages(run_id, "daily_task_notification", [_entry(f"u{i}") for i in range(3)])
+        service.line_api.push_message.side_effect = ConnectionError("Network error")
+
+        service.drain_outbox(run_id)
+
+        assert service.line_api.push_message.call_count == 3
+        assert [row["attempts"] for row in db.get_pending_outbox_messages(run_id)] == [1, 1, 1]
+
+    def test_retry_key_is_deterministic(self, service):
+        """同じ実行・ユーザーのリトライキーは常に同じ"""
+        key1 = service._make_retry_key("daily_task_notification:2024-01-01", "u1")
+        key2 = service._make_retry_key("daily_task_notification:2024-01-01", "u1")
+        key3 = service._make_retry_key("daily_task_notification:2024-01-02", "u1")
+        assert key1 == key2
+        assert key1 != key3
+
+
+class TestPreparedDigest:
+    """8時通知の事前作成（7:45）のテスト"""
+
+    @pytest.fixture
+    def service(self, db):
+        service = NotificationService.__new__(NotificationService)
+        service.db = db
+        service.error_handler = NotificationErrorHandler(RetryConfig(max_retries=0))
+        service.line_api = Mock()
+        service.multi_tenant_service = Mock()
+        service.multi_tenant_service.get_messaging_api.return_value = service.line_api
+        service.task_service = Mock()
+        service.task_service.format_task_list.side_effect = lambda tasks, **kwargs: f"タスク{len(tasks)}件"
+        service.task_service.get_active_tasks_by_user.side_effect = lambda user_ids: {
+            user_id: service.task_service.get_user_tasks.return_value for user_id in user_ids
+        }
+        service._check_duplicate_execution = Mock(return_value=False)
+        service._get_active_user_ids = Mock(return_value=["u1"])
+        service._move_overdue_tasks_to_today = Mock(return_value=0)
+        service.calendar_prefetcher = Mock()
+        db.save_user_channel("u1", "default")
+        return service
+
+    def _sent_texts(self, service):
+        request = service.line_api.push_message.call_args[0][0]
+        return [m.text for m in request.messages]
+
+    def test_prepare_stages_without_sending(self, service, db):
+        """事前作成ではstagedとして保存され、送信されない"""
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+
+        service.prepare_daily_task_notification()
+        service.drain_outbox()
+
+        run_id = service._get_outbox_run_id("daily_task_notification")
+        assert db.get_outbox_counts(run_id)["staged"] == 1
+        service.line_api.push_message.assert_not_called()
+
+    def test_send_uses_prepared_digest(self, service, db):
+        """タスクに変更がなければ事前作成の本文をそのまま送る"""
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+        service.prepare_daily_task_notification()
+        service.task_service.format_task_list.reset_mock()
+
+        service.send_daily_task_notification()
+
+        service.task_service.format_task_list.assert_not_called()
+        assert self._sent_texts(service) == ["タスク1件"]
+        assert db.get_user_state("u1", "task_select_mode")["task_count"] == 1
+
+    def test_send_rerenders_when_tasks_changed(self, service, db):
+        """事前作成後にタスクが追加された場合は本文を作り直す"""
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+        service.prepare_daily_task_notification()
+        service.task_service.get_user_tasks.return_value = [
+            Task("t1", "u1", "資料作成", 30, False),
+            Task("t2", "u1", "メール返信", 15, False),
+        ]
+
+        service.send_daily_task_notification()
+
+        assert self._sent_texts(service) == ["タスク2件"]
+        assert db.get_user_state("u1", "task_select_mode")["task_count"] == 2
+
+    def test_release_uses_bulk_queries(self, service, db, monkeypatch):
+        """8時の確認ではユーザーごとの取得・フラグ設定・送信待ち変更を行わない"""
+        service._get_active_user_ids.return_value = ["u1", "u2", "u3"]
+        for user_id in ("u2", "u3"):
+            db.save_user_channel(user_id, "default")
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+        service.prepare_daily_task_notification()
+        service.task_service.get_user_tasks.reset_mock()
+        set_user_state = Mock(wraps=db.set_user_state)
+        release_outbox_message = Mock(wraps=db.release_outbox_message)
+        monkeypatch.setattr(db, "set_user_state", set_user_state)
+        monkeypatch.setattr(db, "release_outbox_message", release_outbox_message)
+
+        run_id = service._get_outbox_run_id("daily_task_notification")
+        assert service._release_staged_notifications(run_id) == 3
+
+        service.task_service.get_user_tasks.assert_not_called()
+        service.task_service.get_active_tasks_by_user.assert_called_once()
+        set_user_state.assert_not_called()
+        release_outbox_message.assert_not_called()
+        assert db.get_outbox_counts(run_id)["pending"] == 3
+        assert db.get_user_state("u3", "task_select_mode")["task_count"] == 1
+
+    def test_send_schedules_calendar_prefetch(self, service, db):
+        """送信できたユーザーのカレンダーの事前同期を予約する"""
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+
+        service.send_daily_task_notification()
+
+        assert list(service.calendar_prefetcher.schedule.call_args[0][0]) == ["u1"]
+
+    def test_periodic_drain_releases_overdue_digest(self, service, db, monkeypatch):
+        """8時の送信が実行されなかった場合は、定期ドレインで事前作成分を送る"""
+        service.task_service.get_user_tasks.return_value = [Task("t1", "u1", "資料作成", 30, False)]
+        _freeze_jst(monkeypatch, 7, 45)
+        service.prepare_daily_task_notification()
+
+        _freeze_jst(monkeypatch, 7, 55)
+        service.drain_outbox_job()
+        service.line_api.push_message.assert_not_called()
+
+        _freeze_jst(monkeypatch, 8, 5)
+        service.drain_outbox_job()
+        assert self._sent_texts(service) == ["タスク1件"]
+        assert db.get_outbox_counts("daily_task_notification:2024-01-02")["sent"] == 1
+
+    def test_periodic_drain_expires_previous_days(self, service, db, monkeypatch):
+        """前日以前の事前作成分は送らずに期限切れにする"""
+        db.enqueue_outbox_messages("daily_task_notification:2024-01-01", "daily_task_notification",
+                                   [_entry("u1")], status='staged')
+        _freeze_jst(monkeypatch, 9)
+
+        service.drain_outbox_job()
+
+        service.line_api.push_message.assert_not_called()
+        assert db.get_outbox_counts("daily_task_notification:2024-01-01")["failed"] == 1
@@ -225,5 +225,222 @@ class TestOpenAIServiceCache:
             # Note: 実際のテストでは、モックの呼び出し回数を確認できます
 
 
+class TestSingleFlight:
+    """同じプロンプトの同時呼び出しを1回にまとめるテスト"""
+
+    @pytest.fixture
+    def openai_service(self, tmp_path):
+        service = OpenAIService(db=Database(str(tmp_path / "single_flight.db")), enable_cache=True)
+        service.INFLIGHT_POLL_SECONDS = 0.01
+        return service
+
+    def _call(self, service, prompt="1,2"):
+        return service._get_cached_or_call_api(prompt=prompt, system_content="sys", max_tokens=10, temperature=0.0)
+
+    def _cache_key(self, service, prompt="1,2"):
+        return f"{service.model}:{service._compute_prompt_hash(prompt + 'sys')}"
+
+    def test_concurrent_calls_share_one_request(self, openai_service):
+        """プロセス内の同時呼び出しは最初の呼び出しの結果を待つ"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_api(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return "result"
+
+        with patch.object(openai_service, '_call_openai_api', side_effect=slow_api) as api, \
+                ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(self._call, openai_service)
+            assert started.wait(5)
+            followers = [pool.submit(self._call, openai_service) for _ in range(3)]
+            # 後続の呼び出しがキャッシュミスを確認して待ち始めるまで待つ
+            time.sleep(0.05)
+            assert not any(f.done() for f in followers)
+            release.set()
+            results = [leader.result(5)] + [f.result(5) for f in followers]
+
+        assert results == ["result"] * 4
+        assert api.call_count == 1
+        assert openai_service._inflight == {}
+
+    def test_waits_for_other_process(self, openai_service):
+        """他のプロセスが実行権を持っている場合は、結果がキャッシュに保存されるのを待つ"""
+        import threading
+
+        db = openai_service.db
+        cache_key = self._cache_key(openai_service)
+        assert db.claim_openai_request(cache_key, "other-process", 30)
+
+        def other_process_finishes():
+            db.set_cached_response(openai_service.model, cache_key.split(":", 1)[1], "1,2", "from other", 24)
+            db.release_openai_request(cache_key, "other-process")
+
+        timer = threading.Timer(0.05, other_process_finishes)
+        timer.start()
+        with patch.object(openai_service, '_call_openai_api', side_effect=Exception("Should not be called")):
+            assert self._call(openai_service) == "from other"
+        timer.join()
+
+    def test_takes_over_when_other_process_gives_up(self, openai_service):
+        """他のプロセスが結果を保存せずに実行権を解放したら自分で呼び出す"""
+        db = openai_service.db
+        cache_key = self._cache_key(openai_service)
+        assert db.claim_openai_request(cache_key, "other-process", 30)
+
+        import threading
+        with patch.object(openai_service, '_call_openai_api', return_value="mine") as api:
+            threading.Timer(0.05, db.release_openai_request, (cache_key, "other-process")).start()
+            assert self._call(openai_service) == "mine"
+        assert api.call_count == 1
+        # 呼び出し後は実行権を解放している
+        assert db.claim_openai_request(cache_key, "next", 30)
+
+    def test_rechecks_cache_after_claim(self, openai_service):
+        """実行権を取得するまでの間に他のプロセスが結果を保存していれば呼び出さない"""
+        db = openai_service.db
+        cache_key = self._cache_key(openai_service)
+        claim = db.claim_openai_request
+
+        def other_process_finished_first(key, owner, ttl_seconds):
+            db.set_cached_response(openai_service.model, key.split(":", 1)[1], "1,2", "from other", 24)
+            return claim(key, owner, ttl_seconds)
+
+        with patch.object(db, 'claim_openai_request', side_effect=other_process_finished_first), \
+                patch.object(openai_service, '_call_openai_api', side_effect=Exception("Should not be called")):
+            assert self._call(openai_service) == "from other"
+        # 取得した実行権は解放している
+        assert db.claim_openai_request(cache_key, "next", 30)
+
+    def test_wait_is_bounded(self, openai_service):
+        """待ち時間の上限を過ぎたら自分で呼び出す"""
+        openai_service.INFLIGHT_WAIT_SECONDS = 0.05
+        assert openai_service.db.claim_openai_request(self._cache_key(openai_service), "stuck", 30)
+
+        with patch.object(openai_service, '_call_openai_api', return_value="mine"):
+            assert self._call(openai_service) == "mine"
+
+
+class TestInflightClaims:
+    """実行権（openai_inflight）のテスト"""
+
+    @pytest.fixture(params=["sqlite", "postgres"])
+    def any_db(self, request, tmp_path):
+        if request.param == "sqlite":
+            return Database(str(tmp_path / "claims.db"))
+        return request.getfixturevalue("pg_db")
+
+    def test_claim_is_exclusive(self, any_db):
+        """有効な実行権は1つだけ取得できる"""
+        assert any_db.claim_openai_request("m:h", "a", 30)
+        assert not any_db.claim_openai_request("m:h", "b", 30)
+        assert any_db.claim_openai_request("m:other", "b", 30)
+
+    def test_release_only_own_claim(self, any_db):
+        """解放できるのは自分が取得した実行権だけ"""
+        any_db.claim_openai_request("m:h", "a", 30)
+        any_db.release_openai_request("m:h", "b")
+        assert not any_db.claim_openai_request("m:h", "b", 30)
+        any_db.release_openai_request("m:h", "a")
+        assert any_db.claim_openai_request("m:h", "b", 30)
+
+    def test_expired_claim_is_taken_over(self, any_db):
+        """期限切れの実行権は上書きして取得できる"""
+        assert any_db.claim_openai_request("m:h", "crashed", -1)
+        assert any_db.claim_openai_request("m:h", "b", 30)
+
+    def test_claim_is_committed_inside_unit_of_work(self, pg_db):
+        """リクエストのユニットオブワーク内でも、実行権とキャッシュはすぐに他のプロセスから見える"""
+        from models.postgres_database import OpenAICacheModel, OpenAIInflightModel, unit_of_work
+
+        with unit_of_work(pg_db):
+            assert pg_db.claim_openai_request("m:h", "a", 30)
+            assert pg_db.set_cached_response("m", "h", "prompt", "response", 24)
+
+            other = pg_db.Session()
+            try:
+                assert other.query(OpenAIInflightModel).filter_by(cache_key="m:h").count() == 1
+                assert other.query(OpenAICacheModel).filter_by(cache_key="m:h").count() == 1
+            finally:
+                other.close()
+
+
+class TestCacheKeys:
+    """キャッシュのキーの正規化テスト"""
+
+    @staticmethod
+    def _tasks():
+        from models.database import Task
+        return [
+            Task("t1", "U1", "資料作成", 60, False, priority="urgent_important"),
+            Task("t2", "U1", "メール返信", 15, False),
+        ]
+
+    @staticmethod
+    def _free_times(start_hour=9, start_minute=0):
+        import pytz
+        start = pytz.timezone("Asia/Tokyo").localize(datetime(2026, 10, 19, start_hour, start_minute))
+        end = start.replace(hour=start_hour + 2, minute=0)
+        return [{"start": start, "end": end, "duration_minutes": int((end - start).total_seconds() // 60)}]
+
+    def test_proposal_key_ignores_order_and_seconds(self):
+        """タスクの並び順や同じ時間帯内の時刻の違いではキーが変わらない"""
+        from utils.cache_keys import schedule_proposal_cache_key
+        tasks = self._tasks()
+        key1 = schedule_proposal_cache_key(tasks, self._free_times(), now=datetime(2026, 10, 19, 8, 31, 5))
+        key2 = schedule_proposal_cache_key(list(reversed(tasks)), self._free_times(), now=datetime(2026, 10, 19, 8, 59, 59))
+        assert key1 == key2
+
+    def test_proposal_key_ignores_current_minute_in_first_slot(self):
+        """今日の最初の空き時間が現在時刻から始まっても、同じ時間帯の間はキーが変わらない"""
+        from utils.cache_keys import schedule_proposal_cache_key
+        key1 = schedule_proposal_cache_key(self._tasks(), self._free_times(9, 1), now=datetime(2026, 10, 19, 9, 1))
+        key2 = schedule_proposal_cache_key(self._tasks(), self._free_times(9, 17), now=datetime(2026, 10, 19, 9, 17))
+        assert key1 == key2
+
+    def test_proposal_key_changes_with_inputs(self):
+        """空き時間・時間帯・対象週が変わればキーも変わる"""
+        from utils.cache_keys import schedule_proposal_cache_key
+        now = datetime(2026, 10, 19, 8, 31)
+        key = schedule_proposal_cache_key(self._tasks(), self._free_times(), now=now)
+        assert key != schedule_proposal_cache_key(self._tasks(), self._free_times(10), now=now)
+        assert key != schedule_proposal_cache_key(self._tasks(), self._free_times(), now=now + timedelta(minutes=30))
+        assert key != schedule_proposal_cache_key(self._tasks(), self._free_times(), week_info="来週", now=now)
+
+    def test_priority_key(self):
+        """タスク名の表記ゆれと同じバケット内の日数の違いではキーが変わらない"""
+        from utils.cache_keys import priority_cache_key
+        assert priority_cache_key("ＡＢＣ　報告書", 45, 5) == priority_cache_key("abc 報告書", 60, 4)
+        assert priority_cache_key("報告書", 45, 5) != priority_cache_key("報告書", 45, 1)
+        assert priority_cache_key("報告書", 45, None) != priority_cache_key("報告書", 45, -1)
+
+    def test_schedule_proposal_is_cached(self, tmp_path):
+        """同じ時間帯に同じ入力で提案を作り直す場合はAPIを呼ばない"""
+        service = OpenAIService(db=Database(str(tmp_path / "proposal.db")), enable_cache=True)
+        with patch('utils.cache_keys.time_bucket', return_value="2026-10-19T08:30"), \
+                patch.object(service, '_request_schedule_proposal', return_value="提案") as request:
+            first = service.generate_schedule_proposal(self._tasks(), self._free_times())
+            second = service.generate_schedule_proposal(list(reversed(self._tasks())), self._free_times())
+
+        assert request.call_count == 1
+        assert "資料作成" in first and "資料作成" in second
+
+    def test_failed_proposal_falls_back_without_caching(self, tmp_path):
+        """全てのリトライが失敗した場合は決定的なスケジュールを返し、キャッシュには保存しない"""
+        service = OpenAIService(db=Database(str(tmp_path / "proposal.db")), enable_cache=True)
+        with patch.object(service, '_create_completion', side_effect=RuntimeError("timeout")) as create, \
+                patch('time.sleep'):
+            proposal = service.generate_schedule_proposal(self._tasks(), self._free_times())
+
+        assert create.call_count == 3
+        assert "資料作成" in proposal
+        assert service.db.get_cache_stats()['total_count'] == 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,168 @@
+"""
+PostgreSQLDatabase のUPSERT（INSERT ... ON CONFLICT DO UPDATE）と一括書き込みのユニットテスト
+"""
+import json
+from unittest.mock import Mock
+
+import pytest
+
+from models.database import Database
+from models.postgres_database import OpenAICacheModel, UserStateModel
+from utils.query_profiler import profile_queries
+
+
+def _statements(profile, verb: str) -> int:
+    """指定したSQL種別（INSERT / SELECT など）の実行回数"""
+    return sum(stats.count for stats in profile._stats.values() if stats.statement.startswith(verb))
+
+
+class TestSingleUpserts:
+    """1件のUPSERT"""
+
+    @pytest.mark.parametrize("write", [
+        lambda db: db.save_token("U1", '{"token": "a"}'),
+        lambda db: db.save_user_channel("U1", "C1"),
+        lambda db: db.set_user_state("U1", "task_select_mode", {"mode": "schedule"}),
+        lambda db: db.set_user_session("U1", "selected_tasks", "[1]", expires_hours=1),
+        lambda db: db.set_cached_response("gpt-4o-mini", "hash", "prompt", "response"),
+    ])
+    def test_single_statement_without_select(self, pg_db, write):
+        """SELECTせずにINSERT 1文で保存する"""
+        with profile_queries("test:upsert") as profile:
+            assert write(pg_db)
+        assert _statements(profile, "INSERT") == 1
+        assert _statements(profile, "SELECT") == 0
+
+    def test_updates_existing_rows(self, pg_db):
+        """既存の行は上書きする"""
+        pg_db.save_token("U1", '{"token": "a"}')
+        pg_db.save_token("U1", '{"token": "b"}')
+        pg_db.save_user_channel("U1", "C1")
+        pg_db.save_user_channel("U1", "C2")
+        pg_db.set_user_session("U1", "selected_tasks", "[1]")
+        pg_db.set_user_session("U1", "selected_tasks", "[2]")
+        assert pg_db.get_token("U1") == '{"token": "b"}'
+        assert pg_db.get_user_channel("U1") == "C2"
+        assert pg_db.get_user_session("U1", "selected_tasks") == "[2]"
+
+    def test_state_keeps_created_at(self, pg_db):
+        """状態の更新ではcreated_atを維持しupdated_atだけ進める"""
+        pg_db.set_user_state("U1", "task_select_mode", {"mode": "schedule"})
+        session = pg_db.Session()
+        created_at = session.query(UserStateModel).one().created_at
+        session.close()
+
+        pg_db.set_user_state("U1", "task_select_mode", {"mode": "complete"})
+        session = pg_db.Session()
+        row = session.query(UserStateModel).one()
+        session.close()
+        assert row.created_at == created_at
+        assert row.updated_at >= created_at
+        assert json.loads(row.state_data) == {"mode": "complete"}
+
+    def test_cache_overwrite_resets_hit_count(self, pg_db):
+        """キャッシュの上書きでヒット数をリセットする"""
+        pg_db.set_cached_response("gpt-4o-mini", "hash", "prompt", "old")
+        session = pg_db.Session()
+        session.query(OpenAICacheModel).update({"hit_count": 3})
+        session.commit()
+        session.close()
+
+        pg_db.set_cached_response("gpt-4o-mini", "hash", "prompt", "new")
+        session = pg_db.Session()
+        row = session.query(OpenAICacheModel).one()
+        session.close()
+        assert (row.response, row.hit_count) == ("new", 0)
+
+
+class TestBulkUpserts:
+    """複数行UPSERT"""
+
+    def test_bulk_states_in_one_statement(self, pg_db):
+        """複数ユーザーの状態を1文で保存し、同じキーは最後の値を使う"""
+        pg_db.set_user_state("U1", "task_select_mode", {"mode": "schedule"})
+        entries = [
+            {"user_id": f"U{i}", "state_type": "task_select_mode", "state_data": {"mode": "complete", "n": i}}
+            for i in range(1, 6)
+        ]
+        entries.append({"user_id": "U5", "state_type": "task_select_mode", "state_data": {"mode": "last"}})
+        with profile_queries("test:bulk") as profile:
+            assert pg_db.set_user_states(entries)
+        assert _statements(profile, "INSERT") == 1
+        assert pg_db.get_user_state("U1", "task_select_mode") == {"mode": "complete", "n": 1}
+        assert pg_db.get_user_state("U5", "task_select_mode") == {"mode": "last"}
+
+    def test_bulk_states_chunked(self, pg_db):
+        """行数が多い場合は分割して保存する"""
+        pg_db.UPSERT_CHUNK_SIZE = 2
+        entries = [{"user_id": f"U{i}", "state_type": "delete_mode", "state_data": {"n": i}} for i in range(5)]
+        with profile_queries("test:bulk") as profile:
+            assert pg_db.set_user_states(entries)
+        assert _statements(profile, "INSERT") == 3
+        assert pg_db.get_user_state("U4", "delete_mode") == {"n": 4}
+
+    def test_bulk_sessions(self, pg_db):
+        """複数ユーザーのセッションを1文で保存する"""
+        entries = [{"user_id": f"U{i}", "session_type": "future_task_selection", "data": "{}"} for i in range(3)]
+        with profile_queries("test:bulk") as profile:
+            assert pg_db.set_user_sessions(entries, expires_hours=48)
+        assert _statements(profile, "INSERT") == 1
+        assert pg_db.get_user_session("U2", "future_task_selection") == "{}"
+
+    def test_sqlite_bulk_variants(self, tmp_path):
+        """SQLite版も同じ結果になる"""
+        db = Database(str(tmp_path / "bulk.db"))
+        db.set_user_state("U1", "task_select_mode", {"mode": "schedule"})
+        assert db.set_user_states([
+            {"user_id": "U1", "state_type": "task_select_mode", "state_data": {"mode": "complete"}},
+            {"user_id": "U2", "state_type": "task_select_mode", "state_data": {"mode": "complete"}},
+        ])
+        assert db.set_user_sessions([{"user_id": "U1", "session_type": "future_task_selection", "data": "{}"}], 48)
+        assert db.get_user_state("U1", "task_select_mode") == {"mode": "complete"}
+        assert db.get_user_state("U2", "task_select_mode") == {"mode": "complete"}
+        assert db.get_user_session("U1", "future_task_selection") == "{}"
+
+
+class TestJobsUseBulkWrites:
+    """スケジューラージョブの一括書き込み"""
+
+    def _service(self, users):
+        from services.notification_service import NotificationService
+        service = NotificationService.__new__(NotificationService)
+        service.db = Mock()
+        service.db.get_all_user_channels.return_value = {}
+        service.task_service = Mock()
+        service._check_duplicate_execution = Mock(return_value=False)
+        service._get_active_user_ids = Mock(return_value=users)
+        service.error_handler = Mock()
+        service._flush_retry_queue = Mock()
+        service._send_carryover_notification_to_user_multi_tenant = Mock()
+        service._send_message_with_retry = Mock(return_value=True)
+        service.line_bot_api = Mock()
+        return service
+
+    def test_carryover_check_writes_states_once(self):
+        """21時の確認はフラグを1回の一括書き込みで設定してから送信する"""
+        from datetime import datetime
+        import pytz
+        today = datetime.now(pytz.timezone("Asia/Tokyo")).strftime("%Y-%m-%d")
+        service = self._service(["U1", "U2", "U3"])
+        service.task_service.get_user_tasks.return_value = [
+            Mock(due_date=today, duration_minutes=30, name="資料作成")
+        ]
+        service.send_carryover_check()
+        service.db.set_user_state.assert_not_called()
+        service.db.set_user_states.assert_called_once()
+        assert [e["user_id"] for e in service.db.set_user_states.call_args[0][0]] == ["U1", "U2", "U3"]
+        assert service._send_carryover_notification_to_user_multi_tenant.call_count == 3
+
+    def test_future_task_selection_writes_once(self):
+        """未来タスク選択通知はセッション・フラグをそれぞれ1回で保存する"""
+        service = self._service(["U1", "U2"])
+        service.task_service.get_user_future_tasks.return_value = [Mock()]
+        service.task_service.format_future_task_list.return_value = "⭐未来タスク一覧"
+        service.send_future_task_selection()
+        service.db.set_user_session.assert_not_called()
+        service.db.set_user_sessions.assert_called_once()
+        service.db.set_user_states.assert_called_once()
+        assert service._send_message_with_retry.call_count == 2
@@ -0,0 +1,93 @@
+"""
+クエリプロファイラーのユニットテスト
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from models.database import Database, Task
+from utils.query_profiler import current_profile, install_engine_hooks, profile_queries
+from utils.tracing import start_span, tracer
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    return Database(str(tmp_path / "profiler.db"))
+
+
+def _create_task(db, user_id):
+    db.create_task(Task(task_id=f"t-{user_id}", user_id=user_id, name="資料作成", duration_minutes=30, repeat=False))
+
+
+class TestSQLiteProfiling:
+    """SQLite（計測付き接続）の記録"""
+
+    def test_records_statements_and_rows(self, sqlite_db):
+        """SQL文の数と取得行数を記録する"""
+        _create_task(sqlite_db, "U1")
+        with profile_queries("webhook:test") as profile:
+            tasks = sqlite_db.get_user_tasks("U1")
+        assert len(tasks) == 1
+        assert profile.statements == 1
+        assert profile.rows == 1
+        assert current_profile() is None
+
+    def test_no_recording_outside_scope(self, sqlite_db):
+        """スコープ外では記録しない"""
+        _create_task(sqlite_db, "U1")
+        assert sqlite_db.get_user_tasks("U1")
+        assert current_profile() is None
+
+    def test_detects_n_plus_one(self, sqlite_db):
+        """同じSQLがパラメータ違いで閾値以上実行されるとN+1として検出する"""
+        user_ids = [f"U{i}" for i in range(6)]
+        for user_id in user_ids:
+            _create_task(sqlite_db, user_id)
+
+        with profile_queries("job:test") as profile:
+            for user_id in user_ids:
+                sqlite_db.get_user_tasks(user_id)
+
+        suspects = profile.n_plus_one()
+        assert len(suspects) == 1
+        assert suspects[0]["count"] == 6
+        assert "FROM tasks" in suspects[0]["statement"]
+
+    def test_same_parameters_not_n_plus_one(self, sqlite_db):
+        """同じパラメータの繰り返しはN+1とみなさない"""
+        with profile_queries("job:test") as profile:
+            for _ in range(6):
+                sqlite_db.get_user_tasks("U1")
+        assert profile.n_plus_one() == []
+
+    def test_nested_scope_uses_outer_profile(self, sqlite_db):
+        """入れ子のスコープは外側にまとめて記録する"""
+        with profile_queries("job:outer") as outer:
+            with profile_queries("webhook:inner") as inner:
+                sqlite_db.get_user_tasks("U1")
+        assert inner is outer
+        assert outer.statements == 1
+
+    def test_summary_attached_to_span(self, sqlite_db):
+        """集計が現在のスパンの属性に入る"""
+        tracer.memory_exporter.clear()
+        with start_span("webhook:test"):
+            with profile_queries("webhook:test"):
+                sqlite_db.get_user_tasks("U1")
+        trace = tracer.memory_exporter.traces[-1]
+        assert trace["attributes"]["db.statements"] == 1
+
+
+class TestEngineProfiling:
+    """SQLAlchemyエンジンイベントの記録"""
+
+    def test_engine_hooks(self):
+        engine = install_engine_hooks(create_engine("sqlite://"))
+        install_engine_hooks(engine)  # 重複登録しない
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (v INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1), (2)"))
+
+        with profile_queries("webhook:test") as profile:
+            with engine.connect() as conn:
+                rows = conn.execute(text("SELECT v FROM t")).fetchall()
+        assert len(rows) == 2
+        assert profile.statements == 1
@@ -0,0 +1,157 @@
+"""
+サービスコンテナ（プロセスごとの共有インスタンスとフォーク後の初期化）のユニットテスト
+"""
+import os
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from models import database
+from models.database import Database
+from services.container import ServiceContainer
+
+
+@pytest.fixture
+def container(tmp_path, monkeypatch):
+    """一時的なSQLite DBを使う新しいコンテナ"""
+    monkeypatch.setattr(database, "db", Database(str(tmp_path / "container.db")))
+    monkeypatch.setenv("LINE_CHANNEL_ACCESS_TOKEN", "test")
+    monkeypatch.setenv("LINE_CHANNEL_SECRET", "test")
+    return ServiceContainer()
+
+
+class TestSharedInstances:
+    """共有インスタンス"""
+
+    def test_one_instance_per_service(self, container):
+        """同じサービスは1回だけ作成し、DBを共有する"""
+        assert container.task_service is container.task_service
+        assert container.openai_service is container.openai_service
+        assert container.task_service.db is database.db
+        assert container.calendar_service.db is database.db
+        assert container.openai_service.db is database.db
+
+    def test_notification_service_uses_container(self, container, monkeypatch):
+        """通知サービスはコンテナのタスクサービス・DBを使う"""
+        import services.container as container_module
+        monkeypatch.setattr(container_module, "container", container)
+        service = container.notification_service
+        assert service.task_service is container.task_service
+        assert service.db is database.db
+
+    def test_created_once_across_threads(self, container, monkeypatch):
+        """複数スレッドから同時に使っても1回だけ作成する"""
+        created = []
+        barrier = threading.Barrier(8)
+
+        def factory(self):
+            return self._get("counted", lambda: created.append(1) or object())
+
+        monkeypatch.setattr(ServiceContainer, "multi_tenant_service", property(factory))
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(container.multi_tenant_service)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert created == [1]
+        assert len({id(result) for result in results}) == 1
+
+    def test_unknown_proxy_name(self, container):
+        """存在しないサービス名のプロキシは作成できない"""
+        with pytest.raises(AttributeError):
+            container.proxy("unknown_service")
+
+    def test_messaging_api_reused_per_channel(self, monkeypatch):
+        """チャネルごとのMessagingApiクライアントを使い回す"""
+        from services.multi_tenant_service import MultiTenantService
+        monkeypatch.delenv("MULTI_CHANNEL_CONFIGS", raising=False)
+        monkeypatch.setenv("LINE_CHANNEL_ACCESS_TOKEN", "test")
+        monkeypatch.setenv("LINE_CHANNEL_SECRET", "test")
+        service = MultiTenantService()
+        service._create_messaging_api = Mock(side_effect=lambda token: object())
+        assert service.get_messaging_api("C1") is service.get_messaging_api("C2")
+        assert service._create_messaging_api.call_count == 1
+
+    def test_calendar_client_is_per_thread(self, container):
+        """共有したカレンダーサービスでも、認証済みクライアントはスレッドごとに保持する"""
+        calendar_service = container.calendar_service
+        calendar_service.service = "main"
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(calendar_service.service))
+        thread.start()
+        thread.join()
+        assert seen == [None]
+        assert calendar_service.service == "main"
+
+
+class TestAfterFork:
+    """フォーク後の初期化"""
+
+    def test_recreates_per_process_services(self, container):
+        """HTTPクライアントを持つサービスは作り直し、プロキシは新しい実体を参照する"""
+        proxy = container.proxy("openai_service")
+        openai_service = container.openai_service
+        task_service = container.task_service
+        assert proxy.model == openai_service.model
+
+        container.after_fork()
+        assert container.openai_service is not openai_service
+        assert proxy._resolve() is container.openai_service
+        assert container.task_service is task_service
+
+    def test_disposes_engine_pool_without_closing(self, container, monkeypatch):
+        """DBのコネクションプールは親の接続を閉じずに破棄する"""
+        engine = Mock()
+        monkeypatch.setattr(database, "db", Mock(engine=engine))
+        container.after_fork()
+        engine.dispose.assert_called_once_with(close=False)
+
+    def test_resets_inherited_scheduler_state(self, container):
+        """親で動作中だったスケジューラーの状態を解除する"""
+        service = Mock(is_running=True, scheduler_thread=Mock())
+        container._instances["notification_service"] = service
+        container.after_fork()
+        assert service.is_running is False
+        assert service.scheduler_thread is None
+
+    def test_runs_registered_callbacks(self, container):
+        """登録した処理を呼び、失敗しても残りを続ける"""
+        calls = []
+        container.register_after_fork(Mock(side_effect=RuntimeError("boom")))
+        container.register_after_fork(lambda: calls.append(os.getpid()))
+        container.after_fork()
+        assert calls == [os.getpid()]
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="fork非対応の環境")
+    def test_forked_child_uses_own_clients(self, container):
+        """フォークした子プロセスは親と別のクライアントを使う"""
+        parent_client = container.openai_service
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                container.after_fork()
+                ok = container.pid == os.getpid() and container.openai_service is not parent_client
+                os.write(write_fd, b"1" if ok else b"0")
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        assert result == b"1"
+        assert container.openai_service is parent_client
+
+    def test_deferred_scheduler(self, container, monkeypatch):
+        """preload時はマスターでスケジューラーを開始しない"""
+        monkeypatch.setenv("REMIND_DEFER_SCHEDULER", "1")
+        assert container.defer_scheduler
+        monkeypatch.delenv("REMIND_DEFER_SCHEDULER")
+        assert not container.defer_scheduler
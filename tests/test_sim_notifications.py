@@ -0,0 +1,37 @@
+"""
+通知ジョブのスケールシミュレーションのユニットテスト
+"""
+import random
+from benchmarks.sim_notifications import FakeCalendarPrefetcher, generate_rows, parse_distribution
+
+
+class TestSimulationData:
+    """合成データ生成のテスト"""
+
+    def test_parse_distribution(self):
+        """分布指定の解釈"""
+        rng = random.Random(0)
+        assert parse_distribution("fixed:3", rng)() == 3
+        uniform = parse_distribution("uniform:1-2", rng)
+        assert all(uniform() in (1, 2) for _ in range(50))
+        poisson = parse_distribution("poisson:4", rng)
+        samples = [poisson() for _ in range(2000)]
+        assert 3.5 < sum(samples) / len(samples) < 4.5
+
+    def test_generate_rows(self):
+        """ユーザー数・タスク数・未来タスクの種別"""
+        rng = random.Random(0)
+        tokens, channels, tasks = generate_rows(
+            10, parse_distribution("fixed:2", rng), parse_distribution("fixed:1", rng),
+            channels=3, overdue_ratio=0.5, today_ratio=0.5, rng=rng,
+        )
+        assert len(tokens) == 10
+        assert {c["channel_id"] for c in channels} == {"sim-channel-0", "sim-channel-1", "sim-channel-2"}
+        assert len(tasks) == 30
+        assert sum(1 for t in tasks if t["task_type"] == "future") == 10
+
+    def test_fake_prefetcher_counts_users(self):
+        """偽の事前同期は予約されたユーザー数だけを数える（Googleに接続しない）"""
+        prefetcher = FakeCalendarPrefetcher()
+        assert prefetcher.schedule(user_id for user_id in ["U1", "U2", "U1"]) == []
+        assert prefetcher.scheduled == 2
@@ -0,0 +1,131 @@
+"""
+起動時間（app のimport時間）と遅延読み込みのテスト
+
+app のimportが予算を超えた場合や、重いSDKがimport時に読み込まれるようになった場合に失敗する。
+予算は環境変数 IMPORT_TIME_BUDGET_MS で変更できる（デフォルト: 1500ms）。
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+from typing import Optional
+
+import pytest
+
+from utils.lazy_import import LazyObject, lazy_import
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import時に読み込んではいけないモジュール（最初のWebhook・ジョブで読み込む）
+HEAVY_MODULES = [
+    "linebot.v3.messaging",
+    "openai",
+    "googleapiclient.discovery",
+    "google_auth_oauthlib.flow",
+    "sqlalchemy",
+]
+
+IMPORT_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+import app
+elapsed_ms = (time.perf_counter() - start) * 1000
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print("IMPORT_RESULT " + json.dumps({{"elapsed_ms": elapsed_ms, "loaded": loaded}}), flush=True)
+os._exit(0)  # スケジューラースレッドの停止を待たずに終了
+"""
+
+
+def _import_app(tmp_path) -> dict:
+    """新しいプロセスで app をimportし、所要時間と読み込まれた重いモジュールを返す"""
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    env.update({
+        "FLASK_SECRET_KEY": "test",
+        "LINE_CHANNEL_ACCESS_TOKEN": "test",
+        "LINE_CHANNEL_SECRET": "test",
+        "OPENAI_API_KEY": "test",
+        "CLIENT_SECRETS_JSON": '{"web": {}}',
+        "PYTHONPATH": REPO_ROOT,
+    })
+    # 1回目は.pycの作成を含むため、2回目を計測する
+    for _ in range(2):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT.format(heavy=HEAVY_MODULES)],
+            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+        )
+    lines = [line for line in result.stdout.splitlines() if line.startswith("IMPORT_RESULT ")]
+    assert lines, f"app のimportに失敗しました:\n{result.stderr[-2000:]}"
+    return json.loads(lines[-1][len("IMPORT_RESULT "):])
+
+
+@pytest.fixture(scope="module")
+def imported(tmp_path_factory):
+    return _import_app(tmp_path_factory.mktemp("import_app"))
+
+
+class TestImportBudget:
+    """app のimport時間"""
+
+    def test_heavy_sdks_not_loaded(self, imported):
+        """重いSDKはimport時に読み込まない"""
+        assert imported["loaded"] == []
+
+    def test_import_within_budget(self, imported):
+        """import時間が予算内に収まる"""
+        budget_ms = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+        assert imported["elapsed_ms"] <= budget_ms, (
+            f"app のimportに{imported['elapsed_ms']:.0f}msかかりました（予算: {budget_ms:.0f}ms）。"
+            f"python -X importtime -c 'import app' で内訳を確認してください"
+        )
+
+
+class TestLazyObject:
+    """遅延作成プロキシ"""
+
+    def test_created_on_first_use(self):
+        """最初の属性アクセスまで作成しない"""
+        created = []
+        proxy = LazyObject(lambda: created.append(1) or {"a": 1})
+        assert not proxy.is_resolved
+        assert created == []
+        assert proxy.get("a") == 1
+        assert proxy.get("a") == 1
+        assert created == [1]
+
+    def test_created_once_across_threads(self):
+        """複数スレッドから同時に使っても1回だけ作成する"""
+        created = []
+        barrier = threading.Barrier(8)
+
+        def factory():
+            created.append(1)
+            return object()
+
+        proxy = LazyObject(factory)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(proxy._resolve())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(created) == 1
+        assert len({id(result) for result in results}) == 1
+
+    def test_type_hints_do_not_import(self):
+        """型ヒント（Optional[X]）で使っても読み込まない"""
+        proxy = lazy_import("json", "JSONDecoder")
+        Optional[proxy]
+        assert not proxy.is_resolved
+        assert isinstance(proxy(), json.JSONDecoder)
+
+    def test_multiple_names(self):
+        """複数の名前をまとめて遅延読み込みできる"""
+        dumps, loads = lazy_import("json", "dumps", "loads")
+        assert loads(dumps({"a": 1})) == {"a": 1}
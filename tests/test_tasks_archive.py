@@ -0,0 +1,131 @@
+"""
+タスクのホット/コールド分割（tasks_archiveへのコンパクション）のユニットテスト
+"""
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models.database import Database, Task
+from models.postgres_database import TaskArchiveModel, TaskModel
+from services.ttl_sweeper import TaskCompactor
+from utils.query_profiler import profile_queries
+
+
+def _task(task_id: str, status: str = "active", user_id: str = "U1") -> Task:
+    return Task(task_id=task_id, user_id=user_id, name=f"タスク{task_id}", duration_minutes=30,
+                repeat=False, status=status, due_date="2026-01-01")
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    return Database(str(tmp_path / "archive.db"))
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def any_db(request, tmp_path):
+    """SQLite版とPostgreSQL版（SQLiteエンジン注入）の両方で実行する"""
+    if request.param == "sqlite":
+        return Database(str(tmp_path / "archive.db"))
+    return request.getfixturevalue("pg_db")
+
+
+def _create(db, *tasks):
+    for task in tasks:
+        assert db.create_task(task)
+
+
+class TestCompaction:
+    """コンパクション"""
+
+    def test_moves_only_inactive_tasks(self, any_db):
+        """アクティブでないタスクだけをアーカイブへ移動する"""
+        _create(any_db, _task("a1"), _task("x1", "archived"), _task("x2", "archived"), _task("c1", "completed"))
+        assert any_db.archive_inactive_tasks(10) == 3
+        assert any_db.archive_inactive_tasks(10) == 0
+        assert [t.task_id for t in any_db.get_user_tasks("U1")] == ["a1"]
+        assert {t.task_id for t in any_db.get_user_tasks("U1", status="archived")} == {"x1", "x2"}
+
+    def test_batch_size_limits_rows(self, any_db):
+        """1回の移動はbatch_size件まで"""
+        _create(any_db, *[_task(f"x{i}", "archived") for i in range(5)])
+        assert any_db.archive_inactive_tasks(2) == 2
+        assert len(any_db.get_user_tasks("U1", status="archived")) == 5
+
+    def test_task_by_id_and_reactivation(self, any_db):
+        """アーカイブ済みのタスクもIDで取得でき、再アクティブ化でtasksに戻る"""
+        _create(any_db, _task("x1", "archived"))
+        any_db.archive_inactive_tasks(10)
+        assert any_db.get_task_by_id("x1").status == "archived"
+
+        assert any_db.update_task_status("x1", "active")
+        assert [t.task_id for t in any_db.get_user_tasks("U1")] == ["x1"]
+        assert any_db.archive_inactive_tasks(10) == 0
+
+    def test_history_spans_hot_and_archive(self, any_db):
+        """履歴はコンパクション前後の両方から取得する"""
+        _create(any_db, _task("c1", "completed"), _task("c2", "completed"), _task("x1", "archived"), _task("a1"))
+        any_db.archive_inactive_tasks(1)
+        history = any_db.get_task_history("U1")
+        assert {t.task_id for t in history} == {"c1", "c2", "x1"}
+        completed = any_db.get_task_history("U1", since=datetime.now() - timedelta(days=7), status="completed")
+        assert {t.task_id for t in completed} == {"c1", "c2"}
+        # 未移動のタスクはsinceに関係なく含める
+        assert any_db.get_task_history("U1", since=datetime.now() + timedelta(days=1), status="completed") != []
+
+    def test_history_since_is_compared_in_utc(self, sqlite_db, monkeypatch):
+        """archived_at（UTC）との比較では、ローカル時刻・タイムゾーン付きのsinceをUTCに揃える"""
+        monkeypatch.setenv("TZ", "Asia/Tokyo")
+        time.tzset()
+        try:
+            _create(sqlite_db, _task("c1", "completed"))
+            sqlite_db.archive_inactive_tasks(10)
+            for now in (datetime.now(), datetime.now(timezone.utc)):
+                assert [t.task_id for t in sqlite_db.get_task_history("U1", since=now - timedelta(minutes=5))] == ["c1"]
+                assert sqlite_db.get_task_history("U1", since=now + timedelta(minutes=5)) == []
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+    def test_compactor_runs_until_done(self, sqlite_db):
+        """コンパクションは時間内にバッチを繰り返して全て移動する"""
+        _create(sqlite_db, *[_task(f"x{i}", "archived") for i in range(7)])
+        result = TaskCompactor(sqlite_db, batch_size=3, pause_seconds=0).run_tick()
+        assert result["reclaimed"] == {"tasks": 7}
+        assert result["backlog"] == []
+
+
+class TestHotReads:
+    """アクティブなタスクの取得"""
+
+    def test_active_read_does_not_touch_archive(self, sqlite_db):
+        """アクティブなタスクの取得はtasks_archiveを参照しない"""
+        _create(sqlite_db, _task("a1"))
+        with profile_queries("test:hot") as profile:
+            sqlite_db.get_user_tasks("U1")
+        assert not any("tasks_archive" in stats.statement for stats in profile._stats.values())
+
+    def test_active_read_uses_index(self, sqlite_db):
+        """アクティブなタスクの取得はインデックスを使う"""
+        conn = sqlite3.connect(sqlite_db.db_path)
+        plan = " ".join(str(row) for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE user_id = ? AND status = ? AND task_type = ?",
+            ("U1", "active", "daily")
+        ))
+        conn.close()
+        assert "idx_tasks_user_status_type" in plan
+
+    def test_bulk_read_groups_by_user(self, any_db):
+        """複数ユーザーのアクティブなタスクをユーザーごとにまとめて取得する"""
+        _create(any_db, _task("a1"), _task("a2", user_id="U2"), _task("a3", status="completed"))
+        tasks_by_user = any_db.get_active_tasks_by_user(["U1", "U2", "U3"])
+        assert {user_id: [t.task_id for t in tasks] for user_id, tasks in tasks_by_user.items()} == {
+            "U1": ["a1"], "U2": ["a2"], "U3": []
+        }
+
+    def test_postgres_archive_model_matches_tasks(self):
+        """アーカイブのモデルはtasksの全カラムを持つ"""
+        task_columns = {column.name for column in TaskModel.__table__.columns}
+        archive_columns = {column.name for column in TaskArchiveModel.__table__.columns}
+        assert task_columns | {"archived_at"} == archive_columns
@@ -0,0 +1,152 @@
+"""
+トレーシングユーティリティのユニットテスト
+"""
+import contextvars
+import json
+import threading
+import pytest
+from utils.metrics import DB_QUERY_DURATION, UPSTREAM_DURATION, WEBHOOK_DURATION, track
+from utils.tracing import Tracer, current_span, start_root_span, start_span, traced, tracer
+
+
+@pytest.fixture(autouse=True)
+def clear_traces():
+    tracer.memory_exporter.clear()
+    yield
+    tracer.memory_exporter.clear()
+
+
+class TestTracing:
+    """スパンツリー記録のテスト"""
+
+    def test_nested_spans_build_tree(self):
+        """ネストしたスパンが1つのトレースにまとまる"""
+        with start_span("root", user_id="u1"):
+            with start_span("child1"):
+                with start_span("grandchild"):
+                    pass
+            with start_span("child2"):
+                pass
+
+        assert len(tracer.memory_exporter.traces) == 1
+        trace = tracer.memory_exporter.traces[0]
+        assert trace["name"] == "root"
+        assert trace["attributes"] == {"user_id": "u1"}
+        assert [c["name"] for c in trace["children"]] == ["child1", "child2"]
+        assert trace["children"][0]["children"][0]["name"] == "grandchild"
+        assert current_span() is None
+
+    def test_error_recorded_and_reraised(self):
+        """例外はスパンに記録され、そのまま送出される"""
+        with pytest.raises(ValueError):
+            with start_span("root"):
+                with start_span("failing"):
+                    raise ValueError("boom")
+
+        trace = tracer.memory_exporter.traces[0]
+        assert trace["error"] == "ValueError: boom"
+        assert trace["children"][0]["error"] == "ValueError: boom"
+
+    def test_track_creates_spans(self):
+        """メトリクスのtrackがスパン名付きで記録される"""
+        with track(WEBHOOK_DURATION, command="approve"):
+            with track(DB_QUERY_DURATION, method="get_user_session"):
+                pass
+            with track(UPSTREAM_DURATION, service="google_calendar", operation="events_insert"):
+                pass
+
+        trace = tracer.memory_exporter.traces[0]
+        assert trace["name"] == "webhook:approve"
+        assert [c["name"] for c in trace["children"]] == [
+            "db.get_user_session", "google_calendar.events_insert"
+        ]
+
+    def test_traced_decorator(self):
+        """デコレーターで関数呼び出しがスパンになる"""
+        @traced("service.work")
+        def work():
+            return current_span().name
+
+        with start_span("root"):
+            assert work() == "service.work"
+
+        assert tracer.memory_exporter.traces[0]["children"][0]["name"] == "service.work"
+
+    def test_copied_context_joins_trace(self):
+        """copy_contextで別スレッドに渡すと同じトレースに記録される"""
+        with start_span("root2"):
+            ctx = contextvars.copy_context()
+
+            def worker():
+                with start_span("worker"):
+                    pass
+
+            thread = threading.Thread(target=ctx.run, args=(worker,))
+            thread.start()
+            thread.join()
+
+        trace = tracer.memory_exporter.traces[-1]
+        assert trace["name"] == "root2"
+        assert [c["name"] for c in trace["children"]] == ["worker"]
+
+    def test_children_are_capped(self, monkeypatch):
+        """子スパンは上限までだけ記録し、超えた分は件数を残す"""
+        monkeypatch.setattr(tracer, "max_children", 3)
+        with start_span("loop"):
+            for i in range(5):
+                with start_span(f"query{i}"):
+                    pass
+
+        trace = tracer.memory_exporter.traces[-1]
+        assert [c["name"] for c in trace["children"]] == ["query0", "query1", "query2"]
+        assert trace["dropped_children"] == 2
+
+    def test_root_span_starts_new_trace(self):
+        """ルートスパンは現在のスパンを引き継がず、別のトレースとして書き出される"""
+        with start_span("request") as request:
+            with start_root_span("job") as job:
+                pass
+            assert current_span() is request
+
+        assert [t["name"] for t in tracer.memory_exporter.traces] == ["job", "request"]
+        assert job.trace_id != request.trace_id
+        assert job.attributes["parent_trace_id"] == request.trace_id
+        assert tracer.memory_exporter.traces[1]["children"] == []
+
+
+class TestExporters:
+    """エクスポーターのテスト"""
+
+    def test_jsonl_exporter_and_slow_capture(self, tmp_path, monkeypatch):
+        """JSONL出力と閾値超過トレースの保存"""
+        all_path = tmp_path / "traces.jsonl"
+        slow_path = tmp_path / "slow.jsonl"
+        monkeypatch.setenv("TRACE_JSONL_PATH", str(all_path))
+        monkeypatch.setenv("SLOW_TRACE_PATH", str(slow_path))
+        monkeypatch.setenv("SLOW_TRACE_THRESHOLD_MS", "0")
+
+        local = Tracer()
+        with local.span("job:drain_outbox"):
+            with local.span("db.get_pending_outbox_messages"):
+                pass
+
+        lines = all_path.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 1
+        trace = json.loads(lines[0])
+        assert trace["name"] == "job:drain_outbox"
+        assert trace["children"][0]["name"] == "db.get_pending_outbox_messages"
+        assert len(slow_path.read_text(encoding="utf-8").splitlines()) == 1
+
+    def test_fast_trace_not_captured_as_slow(self, tmp_path, monkeypatch):
+        """閾値未満のトレースはスロートレースに保存されない"""
+        slow_path = tmp_path / "slow.jsonl"
+        monkeypatch.delenv("TRACE_JSONL_PATH", raising=False)
+        monkeypatch.setenv("SLOW_TRACE_PATH", str(slow_path))
+        monkeypatch.setenv("SLOW_TRACE_THRESHOLD_MS", "60000")
+
+        local = Tracer()
+        with local.span("webhook:other"):
+            pass
+
+        assert len(local.memory_exporter.traces) == 1
+        assert not slow_path.exists()
@@ -0,0 +1,143 @@
+"""
+TTLスイーパー（期限切れデータの少しずつの削除）のユニットテスト
+"""
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+from models.database import Database
+from models.postgres_database import OpenAICacheModel, UserSessionModel
+from services.ttl_sweeper import TTLSweeper
+
+
+def _insert_sqlite_sessions(db: Database, expired: int, active: int):
+    """期限切れ・有効なセッションを直接作成（期限は読み取り側と同じCURRENT_TIMESTAMP基準）"""
+    conn = sqlite3.connect(db.db_path)
+    conn.executemany(
+        "INSERT INTO user_sessions (user_id, session_type, data, expires_at) VALUES (?, 'selected_tasks', '[]', datetime('now', '-1 hour'))",
+        [(f"E{i}",) for i in range(expired)]
+    )
+    conn.executemany(
+        "INSERT INTO user_sessions (user_id, session_type, data, expires_at) VALUES (?, 'selected_tasks', '[]', datetime('now', '+1 hour'))",
+        [(f"A{i}",) for i in range(active)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _count(db: Database, table: str) -> int:
+    conn = sqlite3.connect(db.db_path)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+
+class FakeClock:
+    """テスト用の時計（削除のたびにテスト側で進める）"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeleteExpiredBatch:
+    """DBのバッチ削除"""
+
+    def test_sqlite_deletes_at_most_batch_size(self, tmp_path):
+        """1回の削除は最大batch_size件で、有効な行は残す"""
+        db = Database(str(tmp_path / "sweep.db"))
+        _insert_sqlite_sessions(db, expired=7, active=3)
+        assert db.delete_expired_batch("user_sessions", 5) == 5
+        assert db.delete_expired_batch("user_sessions", 5) == 2
+        assert db.delete_expired_batch("user_sessions", 5) == 0
+        assert _count(db, "user_sessions") == 3
+
+    def test_postgres_deletes_by_primary_key(self, pg_db):
+        """PostgreSQL版は主キーで絞って削除する（複合主キーのセッションも含む）"""
+        session = pg_db.Session()
+        past = datetime.now() - timedelta(hours=1)
+        future = datetime.now() + timedelta(hours=1)
+        session.add_all(
+            [UserSessionModel(user_id=f"E{i}", session_type="selected_tasks", data="[]", expires_at=past) for i in range(4)]
+            + [UserSessionModel(user_id="A0", session_type="selected_tasks", data="[]", expires_at=future),
+               UserSessionModel(user_id="N0", session_type="selected_tasks", data="[]", expires_at=None)]
+            + [OpenAICacheModel(cache_key=f"k{i}", model="m", prompt_hash="h", response="r", expires_at=past) for i in range(3)]
+        )
+        session.commit()
+        session.close()
+
+        assert pg_db.delete_expired_batch("user_sessions", 3) == 3
+        assert pg_db.delete_expired_batch("user_sessions", 3) == 1
+        assert pg_db.delete_expired_batch("openai_cache", 10) == 3
+
+        session = pg_db.Session()
+        assert {row.user_id for row in session.query(UserSessionModel)} == {"A0", "N0"}
+        assert session.query(OpenAICacheModel).count() == 0
+        session.close()
+
+
+class TestTTLSweeper:
+    """スイーパーの実行"""
+
+    def test_reclaims_all_expired_rows_within_budget(self, tmp_path):
+        """時間内に削除しきれば持ち越しはない"""
+        db = Database(str(tmp_path / "sweep.db"))
+        _insert_sqlite_sessions(db, expired=12, active=2)
+        sweeper = TTLSweeper(db, batch_size=5, time_budget_seconds=10, pause_seconds=0)
+        result = sweeper.run_tick()
+        assert result["reclaimed"] == {"user_sessions": 12, "openai_cache": 0}
+        assert result["backlog"] == []
+        assert not sweeper.has_backlog
+        assert _count(db, "user_sessions") == 2
+
+    def test_stops_at_time_budget_and_carries_backlog(self):
+        """時間の上限で止め、残りは次回に持ち越す"""
+        clock = FakeClock()
+        db = Mock()
+
+        def delete_batch(table, batch_size):
+            clock.now += 0.4
+            return batch_size if table == "user_sessions" else 0
+
+        db.delete_expired_batch.side_effect = delete_batch
+        sleeps = []
+        sweeper = TTLSweeper(db, batch_size=100, time_budget_seconds=1.0, pause_seconds=0.05,
+                             clock=clock, sleep=sleeps.append)
+
+        result = sweeper.run_tick()
+        assert result["batches"] == 3
+        assert result["reclaimed"] == {"user_sessions": 200, "openai_cache": 0}
+        assert result["backlog"] == ["user_sessions"]
+        assert sweeper.backlog == {"user_sessions": True, "openai_cache": False}
+        assert sleeps == [0.05, 0.05]
+
+        sweeper.run_tick()
+        assert sweeper.total_reclaimed["user_sessions"] == 400
+
+    def test_tables_are_interleaved(self):
+        """大きなテーブルがあっても他のテーブルの削除を止めない"""
+        db = Mock()
+        calls = []
+
+        def delete_batch(table, batch_size):
+            calls.append(table)
+            return batch_size if table == "user_sessions" and calls.count(table) < 3 else 1
+
+        db.delete_expired_batch.side_effect = delete_batch
+        TTLSweeper(db, batch_size=10, time_budget_seconds=10, pause_seconds=0).run_tick()
+        assert calls[:2] == ["user_sessions", "openai_cache"]
+        assert calls.count("openai_cache") == 1
+
+    @pytest.mark.parametrize("deleted", [0, 3])
+    def test_yields_only_while_work_remains(self, deleted):
+        """バッチの間では待機し、削除するものがなくなったら待機せずに終了する"""
+        db = Mock()
+        db.delete_expired_batch.return_value = deleted
+        sleeps = []
+        TTLSweeper(db, batch_size=10, pause_seconds=0.05, sleep=sleeps.append).run_tick()
+        assert sleeps == [0.05]
+        assert db.delete_expired_batch.call_count == 2
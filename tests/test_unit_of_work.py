@@ -0,0 +1,119 @@
+"""
+PostgreSQLDatabase のユニットオブワーク（リクエスト単位の共有セッション）のユニットテスト
+
+PostgreSQLサーバーなしで動かすため、SQLAlchemyのSQLiteエンジンを注入して検証する（conftest.py の pg_db）。
+"""
+import threading
+
+import pytest
+from sqlalchemy import event, text
+
+from models.postgres_database import unit_of_work
+from utils.metrics import UPSTREAM_DURATION, track
+
+
+def _count_savepoints(pg_db) -> list:
+    """SAVEPOINT文の実行を記録するリストを返す"""
+    savepoints = []
+
+    @event.listens_for(pg_db.engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, *args):
+        if statement.startswith("SAVEPOINT"):
+            savepoints.append(statement)
+
+    return savepoints
+
+
+class TestUnitOfWork:
+    """ユニットオブワーク"""
+
+    def test_scope_shares_one_connection_and_commit(self, pg_db):
+        """スコープ内の読み書きは1つの接続と1回のコミットにまとまる"""
+        with unit_of_work(pg_db):
+            assert pg_db.save_token("U1", '{"token": "a"}')
+            assert pg_db.set_user_state("U1", "task_select_mode", {"mode": "schedule"})
+            assert pg_db.get_user_state("U1", "task_select_mode") == {"mode": "schedule"}
+            assert pg_db.get_token("U1") == '{"token": "a"}'
+        assert pg_db.checkouts == 1
+        assert pg_db.commits == 1
+        assert pg_db.get_user_state("U1", "task_select_mode") == {"mode": "schedule"}
+
+    def test_per_method_sessions_outside_scope(self, pg_db):
+        """スコープ外では従来どおりメソッドごとにコミットする"""
+        assert pg_db.save_token("U1", '{"token": "a"}')
+        assert pg_db.set_user_state("U1", "task_select_mode", {"mode": "schedule"})
+        assert pg_db.checkouts == 2
+        assert pg_db.commits == 2
+        assert pg_db.get_token("U1") == '{"token": "a"}'
+
+    def test_exception_rolls_back_scope(self, pg_db):
+        """スコープが例外で終了した場合は全て取り消す"""
+        with pytest.raises(RuntimeError):
+            with unit_of_work(pg_db):
+                pg_db.save_token("U1", '{"token": "a"}')
+                raise RuntimeError("handler failed")
+        assert pg_db.get_token("U1") is None
+
+    def test_failed_method_only_rolls_back_itself(self, pg_db):
+        """メソッドが失敗しても、そのメソッドの変更だけが取り消される"""
+        with unit_of_work(pg_db):
+            assert pg_db.save_token("U1", '{"token": "a"}')
+            assert not pg_db.save_token("U2", None)  # NOT NULL違反で失敗
+            assert pg_db.set_user_state("U1", "task_select_mode", {"mode": "complete"})
+        assert pg_db.get_token("U1") == '{"token": "a"}'
+        assert pg_db.get_token("U2") is None
+        assert pg_db.get_user_state("U1", "task_select_mode") == {"mode": "complete"}
+
+    def test_nested_scope_reuses_outer(self, pg_db):
+        """ネストしたスコープは外側にまとめる"""
+        with unit_of_work(pg_db):
+            with unit_of_work(pg_db):
+                pg_db.save_token("U1", '{"token": "a"}')
+            pg_db.save_token("U2", '{"token": "b"}')
+        assert pg_db.checkouts == 1
+        assert pg_db.commits == 1
+
+    def test_other_thread_uses_own_session(self, pg_db):
+        """別スレッドからの呼び出しは共有セッションを使わない"""
+        results = []
+        with unit_of_work(pg_db):
+            pg_db.save_token("U1", '{"token": "a"}')
+            shared = pg_db._get_session()._session
+            thread = threading.Thread(target=lambda: results.append(pg_db._get_session()))
+            thread.start()
+            thread.join()
+        assert results[0] is not shared
+        results[0].close()
+
+    def test_reads_do_not_open_savepoints(self, pg_db):
+        """セーブポイントは書き込むメソッドだけが使う"""
+        savepoints = _count_savepoints(pg_db)
+        with unit_of_work(pg_db):
+            pg_db.get_token("U1")
+            pg_db.get_user_state("U1", "task_select_mode")
+            assert savepoints == []
+            pg_db.save_token("U1", '{"token": "a"}')
+        assert len(savepoints) == 1
+
+    def test_upstream_call_commits_first(self, pg_db):
+        """外部APIの呼び出し前にそこまでの書き込みをコミットする"""
+        with unit_of_work(pg_db):
+            pg_db.save_token("U1", '{"token": "a"}')
+            with track(UPSTREAM_DURATION, service="line", operation="reply_message"):
+                other = pg_db.Session()
+                try:
+                    assert other.execute(text("SELECT token_json FROM tokens")).scalar() == '{"token": "a"}'
+                finally:
+                    other.close()
+            pg_db.save_token("U2", '{"token": "b"}')
+        assert pg_db.commits == 2
+        assert pg_db.get_token("U2") == '{"token": "b"}'
+
+    def test_scope_continues_after_read_error(self, pg_db):
+        """読み取りが失敗してもスコープ内の後続の操作は使える"""
+        with pg_db.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE user_states")
+        with unit_of_work(pg_db):
+            assert pg_db.get_user_state("U1", "task_select_mode") is None
+            assert pg_db.save_token("U2", '{"token": "b"}')
+        assert pg_db.get_token("U2") == '{"token": "b"}'
@@ -152,5 +152,42 @@ class TestUserSessionsCRUD:
         assert db.get_user_session(user2, session_type) == data2
 
 
+class TestClaimUserSession:
+    """処理中のセッションへの移動（実行権の取得）のテスト"""
+
+    @pytest.fixture(params=["sqlite", "postgres"])
+    def any_db(self, request, tmp_path):
+        if request.param == "sqlite":
+            return Database(str(tmp_path / "claim.db"))
+        return request.getfixturevalue("pg_db")
+
+    def test_claim_is_exclusive(self, any_db):
+        """取得できるのは1回だけで、データは処理中のセッションに移る"""
+        any_db.set_user_session("u1", "schedule_proposal", "提案", expires_hours=24)
+
+        assert any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving")
+        assert not any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving")
+        assert any_db.get_user_session("u1", "schedule_proposal") is None
+        assert any_db.get_user_session("u1", "schedule_proposal_approving") == "提案"
+
+    def test_claim_fails_while_other_is_in_progress(self, any_db):
+        """処理中に新しいセッションが作られても、処理中のセッションがある間は取得できない"""
+        any_db.set_user_session("u1", "schedule_proposal", "提案1", expires_hours=24)
+        assert any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving")
+        any_db.set_user_session("u1", "schedule_proposal", "提案2", expires_hours=24)
+
+        assert not any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving")
+        assert any_db.get_user_session("u1", "schedule_proposal") == "提案2"
+
+    def test_expired_claim_is_replaced(self, any_db):
+        """処理が停止して期限切れになった処理中のセッションは置き換える"""
+        any_db.set_user_session("u1", "schedule_proposal", "提案1", expires_hours=24)
+        assert any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving", expires_minutes=-1)
+        any_db.set_user_session("u1", "schedule_proposal", "提案2", expires_hours=24)
+
+        assert any_db.claim_user_session("u1", "schedule_proposal", "schedule_proposal_approving")
+        assert any_db.get_user_session("u1", "schedule_proposal_approving") == "提案2"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
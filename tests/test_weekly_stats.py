@@ -0,0 +1,141 @@
+"""
+週次集計（user_stats_weekly）のユニットテスト
+"""
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+import pytz
+
+from models.database import Database, Task
+from models.weekly_stats import iso_week_key, merge_top_tasks
+from utils.query_profiler import profile_queries
+
+
+def _task(task_id: str, minutes: int = 30, user_id: str = "U1") -> Task:
+    return Task(task_id=task_id, user_id=user_id, name=f"タスク{task_id}", duration_minutes=minutes,
+                repeat=False, status="active", due_date="2026-01-01")
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def any_db(request, tmp_path):
+    """SQLite版とPostgreSQL版（SQLiteエンジン注入）の両方で実行する"""
+    if request.param == "sqlite":
+        return Database(str(tmp_path / "weekly.db"))
+    return request.getfixturevalue("pg_db")
+
+
+class TestWeeklyStats:
+    """タスクの状態変更による集計"""
+
+    def test_counts_completed_and_archived(self, any_db):
+        """完了・アーカイブの件数と分数を加算する"""
+        for task in (_task("c1", 30), _task("c2", 45), _task("x1", 20)):
+            assert any_db.create_task(task)
+        assert any_db.update_task_status("c1", "completed")
+        assert any_db.update_task_status("c2", "completed")
+        assert any_db.update_task_status("x1", "archived")
+
+        stats = any_db.get_weekly_stats("U1")
+        assert stats["iso_week"] == iso_week_key()
+        assert (stats["completed_count"], stats["completed_minutes"]) == (2, 75)
+        assert (stats["archived_count"], stats["archived_minutes"]) == (1, 20)
+        assert [task["name"] for task in stats["top_tasks"]] == ["タスクc2", "タスクc1"]
+
+    def test_same_status_is_not_counted_twice(self, any_db):
+        """同じ状態への更新やアクティブへの戻しは加算しない"""
+        assert any_db.create_task(_task("c1"))
+        assert any_db.update_task_status("c1", "completed")
+        assert any_db.update_task_status("c1", "completed")
+        assert any_db.update_task_status("c1", "active")
+        assert any_db.get_weekly_stats("U1")["completed_count"] == 1
+
+    def test_archived_task_completion_is_counted(self, any_db):
+        """tasks_archiveに移動済みのタスクの状態変更も集計する"""
+        assert any_db.create_task(_task("x1", 15))
+        assert any_db.update_task_status("x1", "archived")
+        any_db.archive_inactive_tasks(10)
+        assert any_db.update_task_status("x1", "completed")
+        stats = any_db.get_weekly_stats("U1")
+        assert (stats["archived_count"], stats["completed_count"]) == (1, 1)
+
+    def test_rollover_archive_is_not_counted(self, any_db):
+        """期日の繰り越しによるアーカイブは週次集計に含めない"""
+        from services.task_service import TaskService
+        task_service = TaskService(any_db)
+        for task in (_task("r1", 30), _task("x1", 20)):
+            assert any_db.create_task(task)
+        assert task_service.archive_task("r1", rollover=True)
+        assert task_service.archive_task("x1")
+
+        stats = any_db.get_weekly_stats("U1")
+        assert (stats["archived_count"], stats["archived_minutes"]) == (1, 20)
+        assert any_db.get_task_by_id("r1").status == "archived"
+
+    def test_no_stats(self, any_db):
+        """集計がないユーザー・週はNone"""
+        assert any_db.get_weekly_stats("U1") is None
+        assert any_db.get_weekly_stats("U1", "2020-W01") is None
+
+    def test_read_is_single_statement(self, tmp_path):
+        """週次集計の取得は1回のクエリで済む"""
+        db = Database(str(tmp_path / "weekly.db"))
+        db.create_task(_task("c1"))
+        db.update_task_status("c1", "completed")
+        with profile_queries("test:weekly") as profile:
+            db.get_weekly_stats("U1")
+        assert sum(stats.count for stats in profile._stats.values()) == 1
+
+
+class TestHelpers:
+    """共通処理"""
+
+    def test_iso_week_uses_jst(self):
+        """週の境界は日本時間で判定する（UTCの日曜15時はJSTの月曜）"""
+        sunday_utc = pytz.utc.localize(datetime(2026, 10, 18, 15, 30))
+        assert iso_week_key(sunday_utc) == "2026-W43"
+        assert iso_week_key(datetime(2026, 10, 18, 12, 0)) == "2026-W42"
+
+    def test_top_tasks_are_limited(self):
+        """上位タスクは所要時間の長い順にlimit件まで"""
+        top = None
+        for minutes in (10, 60, 30, 5):
+            top = merge_top_tasks(top, f"t{minutes}", minutes, limit=2)
+        assert top == '[{"name": "t60", "duration_minutes": 60}, {"name": "t30", "duration_minutes": 30}]'
+
+
+class TestWeeklyReport:
+    """週次レポートのメッセージ"""
+
+    def _service(self):
+        from services.notification_service import NotificationService
+        return NotificationService.__new__(NotificationService)
+
+    def test_message_from_stats(self):
+        """集計から件数・合計時間・上位タスクを表示する"""
+        message = self._service()._build_weekly_report_message({
+            "completed_count": 7, "completed_minutes": 210, "archived_count": 2,
+            "top_tasks": [{"name": "資料作成", "duration_minutes": 90}],
+        })
+        assert "今週完了したタスク: 7個" in message
+        assert "合計時間: 210分" in message
+        assert "• 資料作成（90分）" in message
+        assert "... 他 6個" in message
+        assert "アーカイブしたタスク: 2個" in message
+
+    def test_message_without_stats(self):
+        """集計がなければ完了なしのメッセージ"""
+        message = self._service()._build_weekly_report_message(None)
+        assert "今週は完了したタスクがありません。" in message
+
+    def test_report_reads_aggregate_only(self):
+        """レポート送信はタスクを走査せず集計を読むだけ"""
+        service = self._service()
+        service.db = Mock()
+        service.db.get_weekly_stats.return_value = {"completed_count": 1, "top_tasks": []}
+        service.line_bot_api = Mock()
+        service._send_message_with_retry = Mock(return_value=True)
+        service.send_weekly_report("U1")
+        service.db.get_weekly_stats.assert_called_once_with("U1")
+        service.db.get_user_tasks.assert_not_called()
+        service.db.get_task_history.assert_not_called()
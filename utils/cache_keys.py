@@ -0,0 +1,113 @@
+"""
+OpenAIキャッシュのキーの正規化
+プロンプトには秒単位の現在時刻や当日の日数など毎回変わる値が入るため、プロンプト全体のハッシュでは
+同じ結果になる呼び出しでもキャッシュに当たらない。呼び出し種別ごとに結果を左右する要素だけを
+固定の形式の文字列にし、OpenAIService._get_cached_or_call_api の cache_key に渡す。
+
+- スケジュール提案: 時刻のバケット（PROPOSAL_BUCKET_MINUTES 分単位）・タスクの集合（並び順を問わない）・
+  空き時間の指紋（境界を同じバケットに切り捨てる）・対象（今日 / 来週）
+- 優先度判定: 正規化したタスク名・所要時間のバケット・期日までの日数のバケット
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from utils.timezone import get_jst_now, to_jst
+
+# スケジュール提案のキャッシュを使い回す時間の単位（分）
+PROPOSAL_BUCKET_MINUTES = 30
+
+# (上限の分数, ラベル)。上限以下の最初のバケットを使う
+DURATION_BUCKETS = ((15, "15分以内"), (30, "30分以内"), (60, "1時間以内"), (120, "2時間以内"), (240, "4時間以内"))
+# (上限の日数, ラベル)
+DUE_DISTANCE_BUCKETS = ((0, "今日"), (1, "明日"), (3, "3日以内"), (7, "1週間以内"), (14, "2週間以内"), (30, "1か月以内"))
+
+
+def _canonical(call_type: str, **features) -> str:
+    """呼び出し種別と要素を固定の形式（キー順・区切り）のJSONにする"""
+    return json.dumps({"call_type": call_type, **features}, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """全角・半角、大文字・小文字、空白の違いをなくす"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _floor_to_bucket(value: datetime, minutes: int) -> datetime:
+    """JSTの時刻を minutes 分単位に切り捨てる"""
+    value = to_jst(value)
+    return value.replace(minute=value.minute - value.minute % minutes, second=0, microsecond=0)
+
+
+def time_bucket(now: Optional[datetime] = None, minutes: int = PROPOSAL_BUCKET_MINUTES) -> str:
+    """JSTの現在時刻を minutes 分単位に切り捨てた文字列"""
+    return _floor_to_bucket(now or get_jst_now(), minutes).strftime("%Y-%m-%dT%H:%M")
+
+
+def duration_bucket(duration_minutes: Optional[int]) -> str:
+    """所要時間のバケット"""
+    duration_minutes = duration_minutes or 0
+    for upper, label in DURATION_BUCKETS:
+        if duration_minutes <= upper:
+            return label
+    return "4時間超"
+
+
+def due_distance_bucket(days_until_due: Optional[int]) -> str:
+    """期日までの日数のバケット（Noneは期日なし）"""
+    if days_until_due is None:
+        return "未設定"
+    if days_until_due < 0:
+        return "期限切れ"
+    for upper, label in DUE_DISTANCE_BUCKETS:
+        if days_until_due <= upper:
+            return label
+    return "1か月以上先"
+
+
+def free_slots_fingerprint(free_times: Optional[Iterable[dict]], minutes: int = PROPOSAL_BUCKET_MINUTES) -> str:
+    """
+    空き時間の指紋（開始・終了を minutes 分単位に切り捨てた時刻から作るハッシュ）
+
+    今日の最初の空き時間は現在時刻（分単位）から始まるため、そのままでは1分ごとに指紋が変わる。
+    時刻のバケットと同じ単位に切り捨て、同じ時間帯の間は同じ指紋にする。
+    """
+    slots: List[str] = sorted(
+        f"{_floor_to_bucket(slot['start'], minutes).strftime('%Y-%m-%dT%H:%M')}"
+        f"/{_floor_to_bucket(slot['end'], minutes).strftime('%Y-%m-%dT%H:%M')}"
+        for slot in (free_times or [])
+    )
+    return hashlib.sha256("|".join(slots).encode("utf-8")).hexdigest()[:16]
+
+
+def schedule_proposal_cache_key(tasks, free_times, week_info: str = "", base_date: Optional[datetime] = None,
+                                now: Optional[datetime] = None) -> str:
+    """スケジュール提案のキャッシュキー（同じ時間帯に同じタスクを同じ空き時間で選び直した場合に一致する）"""
+    task_set = sorted(
+        [normalize_text(task.name), task.duration_minutes or 0, task.priority or "normal", bool(task.repeat)]
+        for task in tasks
+    )
+    return _canonical(
+        "schedule_proposal",
+        bucket=time_bucket(now),
+        tasks=task_set,
+        free_slots=free_slots_fingerprint(free_times),
+        week_info=week_info or "",
+        base_date=to_jst(base_date).strftime("%Y-%m-%d") if base_date else "",
+    )
+
+
+def priority_cache_key(task_name: str, duration_minutes: Optional[int], days_until_due: Optional[int]) -> str:
+    """優先度判定のキャッシュキー（日付が変わっても期日までの日数のバケットが同じなら一致する）"""
+    return _canonical(
+        "priority_classification",
+        name=normalize_text(task_name),
+        duration=duration_bucket(duration_minutes),
+        due=due_distance_bucket(days_until_due),
+    )
@@ -0,0 +1,131 @@
+"""
+並行実行ユーティリティ
+Webhook処理の中で互いに依存しないI/O（DB読み取り・Google Calendar・OpenAI）を同時に実行し、
+フロー全体の待ち時間を各ステップの合計ではなく最も長いステップに近づける
+
+使い方:
+    tasks_future = submit(task_service.get_user_tasks, user_id)
+    numbers = ...  # 呼び出し元のスレッドで別の処理
+    all_tasks = wait_for(tasks_future, timeout=10, name="get_user_tasks")
+
+ステップは現在のcontextvars（トレースのスパン・クエリプロファイル）を引き継いで実行するため、
+別スレッドで実行しても同じトレースに記録される。
+
+返信後も続ける処理（受付メッセージを返信してから結果をpushで送るコマンドなど）は
+submit_background() で別のスレッドプールに渡す。I/O用のプールで待ち合わせるステップと
+同じプールを使うと、プールが埋まった時に互いを待って止まるため分けている。
+
+環境変数:
+    IO_POOL_MAX_WORKERS: スレッドプールの最大スレッド数（デフォルト: 16）
+    BACKGROUND_POOL_MAX_WORKERS: 返信後の処理用スレッドプールの最大スレッド数（デフォルト: 4）
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+from utils.logger import get_logger
+from utils.metrics import run_before_upstream_hooks
+
+logger = get_logger(__name__)
+
+IO_POOL_MAX_WORKERS = int(os.getenv('IO_POOL_MAX_WORKERS', '16'))
+BACKGROUND_POOL_MAX_WORKERS = int(os.getenv('BACKGROUND_POOL_MAX_WORKERS', '4'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_background_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class StepTimeout(TimeoutError):
+    """ステップが制限時間内に終わらなかった"""
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """I/O用のスレッドプール（プロセスごとに最初に使う時に作成）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IO_POOL_MAX_WORKERS, thread_name_prefix="remind-io")
+    return _executor
+
+
+def get_background_executor() -> ThreadPoolExecutor:
+    """返信後の処理用のスレッドプール（プロセスごとに最初に使う時に作成）"""
+    global _background_executor
+    if _background_executor is None:
+        with _executor_lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=BACKGROUND_POOL_MAX_WORKERS, thread_name_prefix="remind-background"
+                )
+    return _background_executor
+
+
+def reset_executor():
+    """
+    フォーク後にスレッドプールを破棄（次に使う時に作り直す）
+
+    親プロセスのワーカースレッドは子プロセスに引き継がれないため、
+    親のプールを使うとステップが実行されないまま待ち続けることになる。
+    """
+    global _executor, _background_executor, _executor_lock
+    _executor_lock = threading.Lock()
+    _executor = None
+    _background_executor = None
+
+
+def submit(func: Callable, *args, **kwargs) -> Future:
+    """
+    ステップをスレッドプールで開始（現在のcontextvarsを引き継ぐ）
+
+    ステップは外部APIを呼ぶことが多く、呼び出し元はその結果を待つため、
+    待っている間にDBのトランザクションを開いたままにしないよう先にコミットする。
+    """
+    run_before_upstream_hooks()
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, func, *args, **kwargs)
+
+
+def submit_background(func: Callable, *args, **kwargs) -> Future:
+    """
+    返信後も続ける処理を開始（現在のcontextvarsを引き継ぐ）
+
+    リクエストのスパンも引き継ぐため、処理側で utils.tracing.start_root_span() を使って別のトレースにする。
+    """
+    context = contextvars.copy_context()
+    return get_background_executor().submit(context.run, func, *args, **kwargs)
+
+
+def wait_for(future: Future, timeout: float, name: str) -> Any:
+    """
+    ステップの結果を待つ
+
+    Args:
+        future: submit() の戻り値
+        timeout: 待つ時間の上限（秒）
+        name: ログ・例外に出すステップ名
+
+    Returns:
+        ステップの戻り値（ステップの例外はそのまま送出）
+
+    Raises:
+        StepTimeout: 制限時間内に終わらなかった場合（ステップ自体は中断できないため実行を続ける）
+    """
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.warning("ステップがタイムアウト: %s (%s秒)", name, timeout)
+        raise StepTimeout(f"{name} が{timeout}秒以内に終わりませんでした")
+
+
+def wait_or_default(future: Future, timeout: float, name: str, default: Any = None) -> Any:
+    """ステップの結果を待ち、タイムアウト・例外の場合はdefaultを返す（結果がなくても続行できるステップ用）"""
+    try:
+        return wait_for(future, timeout, name)
+    except Exception as e:
+        logger.warning("ステップ失敗のため既定値を使用: %s: %s", name, e)
+        return default
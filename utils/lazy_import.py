@@ -0,0 +1,87 @@
+"""
+重い依存の遅延読み込み
+LINE SDK・OpenAI・Google APIクライアントなど、読み込みに時間がかかるモジュールやサービスを
+最初に使う時まで読み込まない（ワーカー起動から最初のWebhook処理までの時間を短縮する）
+
+使い方:
+    from utils.lazy_import import LazyObject, lazy_import
+    TextMessage, ReplyMessageRequest = lazy_import("linebot.v3.messaging", "TextMessage", "ReplyMessageRequest")
+    TextMessage(text="...")                              # 初回の呼び出しでlinebot.v3.messagingを読み込む
+    openai_service = LazyObject(lambda: OpenAIService())  # 初回の属性アクセスで作成する
+"""
+import importlib
+import threading
+
+
+class LazyObject:
+    """
+    最初の属性アクセス・呼び出し時に factory() で実体を作成し、以降は実体に委譲するプロキシ
+
+    名前の参照先を変えずに済むため、モジュール変数やmock.patchの対象はそのまま使える。
+    isinstance() の第2引数や except 節には使えない（例外クラスは通常どおりimportする）。
+    """
+
+    __slots__ = ("_factory", "_target", "_lock", "__weakref__")
+
+    _UNSET = object()
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", LazyObject._UNSET)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self):
+        target = object.__getattribute__(self, "_target")
+        if target is LazyObject._UNSET:
+            with object.__getattribute__(self, "_lock"):
+                target = object.__getattribute__(self, "_target")
+                if target is LazyObject._UNSET:
+                    target = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    @property
+    def is_resolved(self) -> bool:
+        """実体を作成済みか"""
+        return object.__getattribute__(self, "_target") is not LazyObject._UNSET
+
+    def __getattr__(self, name):
+        # typing（Optional[X]など）やmockが調べる特殊属性では読み込まない
+        if name.startswith("__") and name.endswith("__") and not self.is_resolved:
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __bool__(self) -> bool:
+        # 遅延作成するのはクライアント・サービス・クラスのみで、いずれも常に真
+        return True
+
+    def __repr__(self) -> str:
+        if self.is_resolved:
+            return repr(self._resolve())
+        return f"<LazyObject (未作成) {object.__getattribute__(self, '_factory')!r}>"
+
+
+def lazy_import(module_name: str, *names: str):
+    """
+    モジュールの属性を遅延読み込みするプロキシを作成
+
+    Args:
+        module_name: モジュール名（例: "linebot.v3.messaging"）
+        *names: 属性名。省略時はモジュール自体
+
+    Returns:
+        LazyObject（namesが2つ以上の場合はそのタプル）
+    """
+    if not names:
+        return LazyObject(lambda: importlib.import_module(module_name))
+    proxies = tuple(
+        LazyObject(lambda name=name: getattr(importlib.import_module(module_name), name))
+        for name in names
+    )
+    return proxies[0] if len(proxies) == 1 else proxies
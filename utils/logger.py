@@ -0,0 +1,150 @@
+"""
+ロギングユーティリティ
+モジュール単位のログレベル、遅延フォーマット、高頻度ログのサンプリング、
+キュー経由の非同期出力を提供する
+
+使い方:
+    from utils.logger import get_logger
+    logger = get_logger(__name__)
+    logger.debug("スロット確認: %s", slot)                         # DEBUG無効時はフォーマットしない
+    logger.debug("候補: %s", c, extra={"sample_rate": 0.01})        # 1%だけ出力
+    logger.debug("一覧: %s", lazy(lambda: [t.name for t in tasks]))  # 出力時のみ評価
+
+環境変数:
+    LOG_LEVEL:  全体のログレベル（デフォルト: INFO）
+    LOG_LEVELS: モジュール別レベル（例: "services.task_service=DEBUG,handlers=WARNING"）
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+ROOT_LOGGER_NAME = "remind"
+
+_lock = threading.Lock()
+_listener = None
+_configured_pid = None
+
+
+class SamplingFilter(logging.Filter):
+    """extra={'sample_rate': r} が指定されたレコードを確率rで通過させる"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None or rate >= 1.0:
+            return True
+        return random.random() < rate
+
+
+class _LazyValue:
+    """出力時に初めて評価される値"""
+    __slots__ = ("_func",)
+
+    def __init__(self, func):
+        self._func = func
+
+    def __str__(self) -> str:
+        return str(self._func())
+
+    def __repr__(self) -> str:
+        return repr(self._func())
+
+
+def lazy(func) -> _LazyValue:
+    """
+    ログ引数の評価を出力時まで遅延させる
+
+    リスト内包表記やDB参照など、引数の計算自体が重い場合に使う。
+    DEBUGが無効ならfuncは呼ばれない。
+    """
+    return _LazyValue(func)
+
+
+def _parse_module_levels(spec: str) -> dict:
+    """'a.b=DEBUG,c=WARNING' 形式の設定を辞書に変換"""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        name, level = name.strip(), level.strip().upper()
+        if name and level in logging._nameToLevel:
+            levels[name] = logging._nameToLevel[level]
+    return levels
+
+
+def configure_logging(stream=None, force: bool = False):
+    """
+    ロガーを初期化（プロセスごとに1回）
+
+    出力はQueueHandler経由でバックグラウンドスレッドが書き込むため、
+    リクエスト処理スレッドが標準出力の書き込みでブロックされない。
+    fork後の子プロセスでは新しいリスナースレッドを起動し直す。
+    """
+    global _listener, _configured_pid
+
+    with _lock:
+        if _configured_pid == os.getpid() and not force:
+            return
+
+        if _listener is not None and _configured_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        root.setLevel(logging._nameToLevel.get(os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
+        root.propagate = False
+
+        for name, level in _parse_module_levels(os.getenv("LOG_LEVELS", "")).items():
+            logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}").setLevel(level)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(logging.Formatter(
+            "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter())
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        _configured_pid = os.getpid()
+
+
+def flush_logging():
+    """キューに残っているログを書き出す（プロセス終了時・テスト用）"""
+    global _listener, _configured_pid
+    with _lock:
+        if _listener is not None and _configured_pid == os.getpid():
+            _listener.stop()
+            _listener = None
+            _configured_pid = None
+
+
+atexit.register(flush_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    モジュール用ロガーを取得
+
+    Args:
+        name: モジュール名（通常は__name__）
+
+    Returns:
+        "remind." 配下のロガー
+    """
+    configure_logging()
+    if name == "__main__" or not name:
+        name = "main"
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
@@ -0,0 +1,223 @@
+"""
+メトリクスユーティリティ
+Prometheus形式のヒストグラム・カウンターを定義し、/metrics 用の出力を生成する
+
+gunicornの複数ワーカーで集計する場合は、起動前に環境変数
+PROMETHEUS_MULTIPROC_DIR に空のディレクトリを指定する。
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from utils.tracing import start_span
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+# 外部API・DBは数ms〜数十秒まで幅があるため、バケットを広めに取る
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+WEBHOOK_DURATION = Histogram(
+    "remind_webhook_duration_seconds",
+    "Webhook処理時間（コマンド別）",
+    ["command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPSTREAM_DURATION = Histogram(
+    "remind_upstream_duration_seconds",
+    "外部API呼び出し時間（LINE / Google Calendar / OpenAI）",
+    ["service", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_QUERY_DURATION = Histogram(
+    "remind_db_query_duration_seconds",
+    "データベースメソッドの実行時間",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SCHEDULER_JOB_DURATION = Histogram(
+    "remind_scheduler_job_duration_seconds",
+    "スケジューラージョブの実行時間",
+    ["job"],
+    buckets=LATENCY_BUCKETS + (120.0, 300.0, 600.0),
+)
+
+DB_STATEMENTS_PER_SCOPE = Histogram(
+    "remind_db_statements_per_scope",
+    "1リクエスト / 1ジョブあたりのSQL実行数",
+    ["scope"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 20000, 100000),
+)
+
+DB_N_PLUS_ONE = Counter(
+    "remind_db_n_plus_one_total",
+    "N+1の可能性があるSQLの検出回数",
+    ["scope"],
+)
+
+CACHE_REQUESTS = Counter(
+    "remind_cache_requests_total",
+    "キャッシュ参照回数（ヒット率 = hit / (hit + miss)）",
+    ["cache", "result"],
+)
+
+TTL_SWEEP_DELETED = Counter(
+    "remind_ttl_sweep_deleted_total",
+    "TTLスイーパーが削除した期限切れの行数（tasksはアーカイブへ移動した行数）",
+    ["table"],
+)
+
+COMMAND_MODE = Counter(
+    "remind_command_mode_total",
+    "時間のかかるコマンドの実行方式（deferred: 受付を返信して結果をpush / sync: 同期実行）",
+    ["command", "mode"],
+)
+
+NOTIFICATION_CALLS = Counter(
+    "remind_notification_calls_total",
+    "通知送信の呼び出し回数",
+)
+
+NOTIFICATION_RETRIES = Counter(
+    "remind_notification_retries_total",
+    "通知送信のリトライ回数",
+)
+
+NOTIFICATION_ERRORS = Counter(
+    "remind_notification_errors_total",
+    "通知送信のエラー回数（エラータイプ別）",
+    ["error_type"],
+)
+
+
+# 外部API呼び出しの直前に実行する処理（DBのユニットオブワークのコミット。models.postgres_database が登録する）
+_before_upstream_hooks = []
+
+
+def register_before_upstream(hook):
+    """外部API（LINE / Google / OpenAI）を呼び出す直前に実行する処理を登録"""
+    if hook not in _before_upstream_hooks:
+        _before_upstream_hooks.append(hook)
+
+
+def run_before_upstream_hooks():
+    """登録された処理を実行（コミットの失敗などの例外は呼び出し元にそのまま送出する）"""
+    for hook in _before_upstream_hooks:
+        hook()
+
+
+def _span_name(histogram: Histogram, labels: dict) -> str:
+    """ヒストグラムとラベルからトレースのスパン名を組み立てる"""
+    if histogram is WEBHOOK_DURATION:
+        return f"webhook:{labels.get('command')}"
+    if histogram is SCHEDULER_JOB_DURATION:
+        return f"job:{labels.get('job')}"
+    if histogram is DB_QUERY_DURATION:
+        return f"db.{labels.get('method')}"
+    if histogram is UPSTREAM_DURATION:
+        return f"{labels.get('service')}.{labels.get('operation')}"
+    return histogram._name
+
+
+@contextmanager
+def track(histogram: Histogram, **labels):
+    """
+    ブロックの実行時間をヒストグラムに記録し、同じ区間をトレースのスパンとしても記録する
+
+    ヒストグラムに 'outcome' ラベルがある場合は、例外の有無で success / error を付与する。
+    外部API呼び出し（UPSTREAM_DURATION）の場合は、計測の前に register_before_upstream の処理を実行する。
+    """
+    if histogram is UPSTREAM_DURATION:
+        run_before_upstream_hooks()
+    with_outcome = "outcome" in histogram._labelnames and "outcome" not in labels
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        with start_span(_span_name(histogram, labels)):
+            yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        if with_outcome:
+            labels["outcome"] = outcome
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def timed(histogram: Histogram, **labels):
+    """関数の実行時間をヒストグラムに記録するデコレーター"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(histogram, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    """キャッシュのヒット・ミスを記録"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def instrument_methods(obj, histogram: Histogram, label: str, methods=None, **labels):
+    """
+    インスタンスの公開メソッドを計測付きのラッパーに差し替える
+
+    Args:
+        obj: 対象インスタンス（DBクライアント、MessagingApiなど）
+        histogram: 記録先のヒストグラム
+        label: メソッド名を入れるラベル名
+        methods: 対象メソッド名のリスト（Noneの場合は '_' で始まらない全メソッド）
+        **labels: 追加の固定ラベル
+
+    Returns:
+        obj（同じインスタンス）
+    """
+    if getattr(obj, "_metrics_instrumented", False):
+        return obj
+
+    names = methods if methods is not None else [
+        name for name in dir(type(obj))
+        if not name.startswith("_") and callable(getattr(type(obj), name, None))
+    ]
+    for name in names:
+        method = getattr(obj, name, None)
+        if method is None or not callable(method):
+            continue
+        setattr(obj, name, timed(histogram, **{label: name}, **labels)(method))
+
+    obj._metrics_instrumented = True
+    return obj
+
+
+def render_metrics():
+    """
+    /metrics のレスポンス本文とContent-Typeを返す
+
+    PROMETHEUS_MULTIPROC_DIR が設定されている場合は全ワーカーの値を集計する。
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """終了したワーカーのメトリクスファイルを整理（gunicornのchild_exitフックから呼ぶ）"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
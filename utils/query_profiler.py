@@ -0,0 +1,254 @@
+"""
+クエリプロファイラー
+Webhookリクエスト・スケジューラージョブ単位でSQL文・所要時間・行数を記録し、N+1を検出する
+
+PostgreSQLはSQLAlchemyのエンジンイベント、SQLiteは計測付きの接続（ProfilingConnection）で記録する。
+profile_queries() のスコープ外では何も記録しない。
+
+環境変数:
+    QUERY_N_PLUS_ONE_THRESHOLD: 同じSQL文がパラメータ違いでこの回数以上実行されたらN+1とみなす（デフォルト: 5）
+"""
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("query_profile", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class StatementStats:
+    """同じSQL文（正規化後）の集計"""
+
+    __slots__ = ("statement", "count", "total_ms", "rows", "parameters", "_profile")
+
+    def __init__(self, statement: str, profile: "QueryProfile"):
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.rows = 0
+        # N+1判定には「異なるパラメータが2種類以上あるか」だけが必要なため2件までしか保持しない
+        self.parameters = set()
+        self._profile = profile
+
+    def add_rows(self, n: int):
+        self.rows += n
+        self._profile.rows += n
+
+
+class QueryProfile:
+    """
+    1リクエスト（またはジョブ）分のクエリ集計
+
+    大量のユーザーを処理するジョブでもメモリが増えないよう、SQL文ごとの集計だけを保持する。
+    """
+
+    def __init__(self, label: str, n_plus_one_threshold: Optional[int] = None):
+        self.label = label
+        self.n_plus_one_threshold = n_plus_one_threshold or int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+        self.statements = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float, rows: int = 0, parameters=None) -> StatementStats:
+        normalized = _normalize(statement)
+        try:
+            param_key = hash(repr(parameters))
+        except Exception:
+            param_key = id(parameters)
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                stats = self._stats[normalized] = StatementStats(normalized, self)
+            stats.count += 1
+            stats.total_ms += duration_ms
+            if len(stats.parameters) < 2:
+                stats.parameters.add(param_key)
+            self.statements += 1
+            self.total_ms += duration_ms
+        if rows:
+            stats.add_rows(rows)
+        return stats
+
+    def n_plus_one(self) -> List[dict]:
+        """同じSQL文がパラメータ違いで閾値以上実行されたものを回数の多い順に返す"""
+        suspects = [
+            {
+                "statement": stats.statement[:200],
+                "count": stats.count,
+                "rows": stats.rows,
+                "total_ms": round(stats.total_ms, 3),
+            }
+            for stats in self._stats.values()
+            if stats.count >= self.n_plus_one_threshold and len(stats.parameters) > 1
+        ]
+        return sorted(suspects, key=lambda s: s["count"], reverse=True)
+
+    def summary(self) -> dict:
+        return {
+            "label": self.label,
+            "statements": self.statements,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "n_plus_one": self.n_plus_one(),
+        }
+
+
+def current_profile() -> Optional[QueryProfile]:
+    """現在のスコープのプロファイルを取得"""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_queries(label: str):
+    """
+    ブロック内のクエリを記録し、終了時にトレース・メトリクス・ログへ集計を出力
+
+    既にスコープ内の場合は外側のプロファイルにまとめて記録する。
+
+    Args:
+        label: "webhook:<コマンド>" / "job:<ジョブ名>" 形式（':'の前がメトリクスのscopeラベルになる）
+    """
+    parent = _current_profile.get()
+    if parent is not None:
+        yield parent
+        return
+
+    profile = QueryProfile(label)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        _report(profile)
+
+
+def _report(profile: QueryProfile):
+    """集計を現在のスパン・メトリクス・ログに出力"""
+    try:
+        summary = profile.summary()
+        scope = profile.label.split(":", 1)[0]
+
+        from utils.tracing import current_span
+        span = current_span()
+        if span is not None:
+            span.attributes["db.statements"] = summary["statements"]
+            span.attributes["db.rows"] = summary["rows"]
+            span.attributes["db.time_ms"] = summary["total_ms"]
+            if summary["n_plus_one"]:
+                span.attributes["db.n_plus_one"] = summary["n_plus_one"][:3]
+
+        from utils.metrics import DB_N_PLUS_ONE, DB_STATEMENTS_PER_SCOPE
+        DB_STATEMENTS_PER_SCOPE.labels(scope=scope).observe(summary["statements"])
+        for suspect in summary["n_plus_one"]:
+            DB_N_PLUS_ONE.labels(scope=scope).inc()
+            logger.warning(
+                "N+1の可能性: %s で同じSQLを%d回実行 (%.1fms): %s",
+                profile.label, suspect["count"], suspect["total_ms"], suspect["statement"]
+            )
+    except Exception as e:
+        logger.error("クエリ集計の出力エラー: %s", e)
+
+
+def install_engine_hooks(engine):
+    """SQLAlchemyエンジンにプロファイラーのイベントを登録（重複登録しない）"""
+    if getattr(engine, "_query_profiler_installed", False):
+        return engine
+
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_profile.get() is not None and context is not None:
+            context._profiler_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        start = getattr(context, "_profiler_start", None)
+        if profile is None or start is None:
+            return
+        rows = cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0
+        profile.record(statement, (time.perf_counter() - start) * 1000, rows, parameters)
+
+    engine._query_profiler_installed = True
+    return engine
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """実行時間と取得行数を現在のプロファイルに記録するカーソル"""
+
+    _record = None
+
+    def execute(self, sql, parameters=()):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record = profile.record(sql, (time.perf_counter() - start) * 1000, 0, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record = profile.record(sql, (time.perf_counter() - start) * 1000, 0, "executemany")
+
+    def _count(self, n: int):
+        if self._record is not None and n:
+            self._record.add_rows(n)
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """ProfilingCursorを使うSQLite接続（sqlite3.connect(path, factory=ProfilingConnection)）"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfilingCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,200 @@
+"""
+トレーシングユーティリティ
+Webhookイベント・スケジューラージョブ単位でスパンのツリーを記録する
+
+スパンはcontextvarsで親子関係を引き継ぐ。別スレッドで処理する場合は
+contextvars.copy_context().run(...) で呼び出すと同じトレースに記録される。
+
+環境変数:
+    TRACE_JSONL_PATH:        全トレースをJSONLで書き出すファイル（未設定なら書き出さない）
+    SLOW_TRACE_THRESHOLD_MS: スロートレースとして保存する閾値（デフォルト: 3000ms）
+    SLOW_TRACE_PATH:         スロートレースの保存先（デフォルト: slow_traces.jsonl）
+    TRACE_MAX_CHILDREN:      1スパンに記録する子スパンの上限（デフォルト: 200。超えた分は件数だけ数える）
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """処理区間（子スパンを持つ）"""
+
+    __slots__ = ("name", "trace_id", "attributes", "children", "dropped_children", "start_time", "start",
+                 "duration_ms", "error")
+
+    def __init__(self, name: str, trace_id: str, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+        # 上限を超えて記録しなかった子スパンの数
+        self.dropped_children = 0
+        self.start_time = datetime.now()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_time": self.start_time.isoformat(),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+            "dropped_children": self.dropped_children,
+        }
+
+
+class InMemoryExporter:
+    """直近のトレースをメモリに保持（テスト・デバッグ用）"""
+
+    def __init__(self, max_traces: int = 100):
+        self.traces = deque(maxlen=max_traces)
+
+    def export(self, trace: dict):
+        self.traces.append(trace)
+
+    def clear(self):
+        self.traces.clear()
+
+
+class JsonlFileExporter:
+    """トレースを1行1JSONでファイルに追記"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: dict):
+        line = json.dumps(trace, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Tracer:
+    """トレースの開始・終了とエクスポートを管理"""
+
+    def __init__(self):
+        self.memory_exporter = InMemoryExporter()
+        self.exporters = [self.memory_exporter]
+        if os.getenv("TRACE_JSONL_PATH"):
+            self.exporters.append(JsonlFileExporter(os.getenv("TRACE_JSONL_PATH")))
+        self.slow_threshold_ms = float(os.getenv("SLOW_TRACE_THRESHOLD_MS", "3000"))
+        self.slow_exporter = JsonlFileExporter(os.getenv("SLOW_TRACE_PATH", "slow_traces.jsonl"))
+        # ループ内のクエリなどで子スパンが際限なく増えないようにする
+        self.max_children = int(os.getenv("TRACE_MAX_CHILDREN", "200"))
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        スパンを開始（現在のスパンがなければ新しいトレースのルートになる）
+
+        Yields:
+            Span
+        """
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        span = Span(name, trace_id, attributes)
+        if parent is not None:
+            if len(parent.children) < self.max_children:
+                parent.children.append(span)
+            else:
+                parent.dropped_children += 1
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            if parent is None:
+                self._export(span)
+
+    @contextmanager
+    def root_span(self, name: str, **attributes):
+        """
+        現在のスパンを引き継がず、新しいトレースのルートとしてスパンを開始
+
+        返信後も続ける処理など、元のリクエストのトレースが書き出された後に動く処理用。
+        元のトレースIDは attributes の parent_trace_id に残す。
+
+        Yields:
+            Span
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            attributes.setdefault("parent_trace_id", parent.trace_id)
+        token = _current_span.set(None)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _current_span.reset(token)
+
+    def _export(self, root: Span):
+        trace = {"trace_id": root.trace_id, **root.to_dict()}
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.error("[Tracer] エクスポートエラー: %s", e)
+
+        if root.duration_ms >= self.slow_threshold_ms:
+            try:
+                self.slow_exporter.export(trace)
+                logger.info("[Tracer] スロートレースを保存: %s (%.0fms)", root.name, root.duration_ms)
+            except Exception as e:
+                logger.error("[Tracer] スロートレース保存エラー: %s", e)
+
+
+tracer = Tracer()
+
+
+def start_span(name: str, **attributes):
+    """グローバルトレーサーでスパンを開始"""
+    return tracer.span(name, **attributes)
+
+
+def start_root_span(name: str, **attributes):
+    """グローバルトレーサーで新しいトレースのルートスパンを開始"""
+    return tracer.root_span(name, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    """現在のスパンを取得"""
+    return _current_span.get()
+
+
+def traced(name: Optional[str] = None):
+    """関数呼び出しをスパンとして記録するデコレーター"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator